@@ -3,35 +3,27 @@ from flask_wtf.csrf import CSRFProtect
 # from flask_session import Session  # 🚨 DISABLED: Python 3.13互換性問題のため無効化
 import os
 import random
-from datetime import datetime, timedelta
+from datetime import date, datetime
 from collections import defaultdict
 import logging
 from typing import Dict, List
 import re
 import html
 from functools import wraps
-import threading
-try:
-    import fcntl
-except ImportError:
-    fcntl = None  # Windows環境では使用不可
 import time
 import uuid
 
-# 🚨 PHASE 1: Session State Lock Mechanism for Race Condition Resolution
-session_locks = {}
-session_lock = threading.Lock()
-
 # 新しいファイルからインポート
 from config import Config, ExamConfig, SRSConfig, DataConfig, LIGHTWEIGHT_DEPARTMENT_MAPPING
 # 🚨 ULTRA SYNC FIX: データ混合防止のため統一インポート
-from utils import DataLoadError, DataValidationError, get_sample_data_improved, load_rccm_data_files
-from math_notation_html_filter import create_math_notation_filter
+from utils import DataLoadError, DataValidationError
+from math_notation_html_filter import create_math_template_filter
 
 # 🎯 REFACTORING PHASE 1: ヘルパー関数のインポート（リスクゼロ）
 from helpers.decorators import (
     require_questions, require_api_key, handle_errors,
-    track_performance, require_session_data, api_json_response
+    track_performance, require_session_data, api_json_response,
+    rate_limit, rate_limit_identities
 )
 from helpers.department_helpers import (
     get_department_name, get_department_id, validate_department_id,
@@ -50,10 +42,21 @@ from services.question_service import QuestionService
 
 # 🎯 REFACTORING PHASE 4: SRSサービスのインポート
 from services.srs_service import SRSService
+from services.srs_due_queue import SRSDueQueue
+from services.weighted_sampler import ReviewSampler
 
 # 🎯 REFACTORING PHASE 5: 統計サービスのインポート
 from services.statistics_service import StatisticsService
 
+# 🎯 PHASE 13 PERFORMANCE: 不変問題レコード
+from services.question_record import Question
+from services.question_bank import question_bank
+from services.session_store import init_server_side_session
+from services.user_lock import StripedUserLock
+from services.rate_limiter import init_rate_limiter
+from werkzeug.middleware.proxy_fix import ProxyFix
+from services.derived_cache import init_derived_cache
+
 # 🎯 REFACTORING PHASE 6-19: Blueprintのインポート
 from blueprints.api_blueprint import api_bp
 from blueprints.data_blueprint import data_bp
@@ -97,9 +100,6 @@ logging.basicConfig(
     handlers=handlers
 )
 
-# 🔥 CRITICAL: セッション競合状態解決のためのロック管理
-session_locks = {}
-lock_cleanup_lock = threading.Lock()
 logger = logging.getLogger(__name__)
 
 # Flask アプリケーション初期化
@@ -110,12 +110,28 @@ app.config.from_object(Config)
 
 # 🚨 DISABLED: Flask-Session無効化（Python 3.13互換性問題のため）
 # Session(app)
+# → 組み込みのサーバーサイドセッション（CookieにはセッションIDのみ、SESSION_TYPE のバックエンドに本体を保存）
+session_store = init_server_side_session(app)
+
+# ユーザー単位の排他制御（固定数のストライプ + fcntlのレコードロックで gunicorn ワーカー間も直列化）
+user_lock = StripedUserLock(Config.USER_LOCK_FILE, Config.USER_LOCK_STRIPES, Config.USER_LOCK_TIMEOUT)
+
+# プロキシ配下（Render）では X-Forwarded-For のクライアントアドレスを remote_addr に使う（レート制限の 'ip' キー）
+if Config.TRUSTED_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=Config.TRUSTED_PROXY_HOPS)
+
+# レート制限（ファイルにマップしたトークンバケット表を全ワーカーで共有、ルートには @rate_limit で適用）
+rate_limiter = init_rate_limiter(app)
+
+# 分析画面のキャッシュ（ユーザー・状態バージョン・画面ごと、状態が変わるまで再計算しない）
+derived_cache = init_derived_cache(app)
 
 # 🎯 ULTRA SIMPLE FIX: HTTP 413エラー解決 - MAX_CONTENT_LENGTH調整
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB (デフォルト16MB → 50MB)
 
 # 🎯 MATHEMATICAL NOTATION HTML FILTER: 数学記法を正しいHTMLに変換
-math_filter = create_math_notation_filter()
+# 問題バンクの問題文・選択肢・解説は読み込み時に変換済みのHTMLを返し、それ以外はメモ付きで変換
+math_filter = create_math_template_filter(question_bank.rendered_html)
 
 @app.template_filter('math')
 def math_notation_filter(text):
@@ -150,65 +166,6 @@ session_data_manager = None
 enterprise_user_manager = None
 enterprise_data_manager = None
 
-# 問題データのキャッシュ
-_questions_cache = None
-_cache_timestamp = None
-
-def get_rccm_questions_with_cache():
-    """RCCMの問題データをキャッシュ付きで取得"""
-    global _questions_cache, _cache_timestamp
-
-    # キャッシュが有効かチェック（5分間）
-    if (_questions_cache is not None and
-        _cache_timestamp is not None and
-        time.time() - _cache_timestamp < 300):
-        return _questions_cache
-
-    try:
-        # データディレクトリから問題データを読み込み
-        data_dir = DataConfig.BASE_DIR + "/data"
-        questions = load_rccm_data_files(data_dir)
-
-        # キャッシュを更新
-        _questions_cache = questions
-        _cache_timestamp = time.time()
-
-        logger.info(f"問題データキャッシュ更新: {len(questions)}問")
-        return questions
-
-    except Exception as e:
-        logger.error(f"問題データ読み込みエラー: {e}")
-        # フォールバック用のサンプルデータ
-        fallback_data = get_sample_data_improved()
-        _questions_cache = fallback_data
-        _cache_timestamp = time.time()
-        return fallback_data
-
-# 🔥 CRITICAL: セッション安全性確保のための排他制御関数
-def get_session_lock(user_id):
-    """ユーザー固有のセッションロックを取得"""
-    global session_locks, lock_cleanup_lock
-    
-    with lock_cleanup_lock:
-        if user_id not in session_locks:
-            session_locks[user_id] = threading.RLock()
-        return session_locks[user_id]
-
-def cleanup_old_locks():
-    """古いロックをクリーンアップ（メモリリーク防止）"""
-    global session_locks, lock_cleanup_lock
-    
-    try:
-        with lock_cleanup_lock:
-            # 使用されていないロックを定期的にクリーンアップ
-            # 本番環境では定期タスクで実行
-            if len(session_locks) > 100:  # 100ユーザー以上でクリーンアップ
-                # 実装を簡略化：全てクリア（実際の使用中ロックは再作成される）
-                session_locks.clear()
-                logger.info("セッションロックのクリーンアップを実行しました")
-    except Exception as e:
-        logger.error(f"ロッククリーンアップエラー: {e}")
-
 def generate_unique_session_id():
     """一意なセッションIDを生成"""
     return f"{uuid.uuid4().hex[:8]}_{int(time.time())}"
@@ -219,10 +176,8 @@ def safe_session_operation(user_id, operation_func, *args, **kwargs):
         logger.error("user_idが提供されていません - セッション操作をスキップ")
         return None
     
-    session_lock = get_session_lock(user_id)
-    
     try:
-        with session_lock:
+        with user_lock(user_id):
             return operation_func(*args, **kwargs)
     except Exception as e:
         logger.error(f"セッション操作エラー (user_id: {user_id}): {e}")
@@ -334,14 +289,14 @@ def get_due_review_questions(session, max_count=50):
     """
     return SRSService.get_due_review_questions(session, max_count)
 
-def get_adaptive_review_list(session):
+def get_adaptive_review_list(session, count=None):
     """
     アダプティブな復習リストを生成
 
     🎯 PHASE 4 REFACTORING: SRSServiceへのラッパー関数
-    後方互換性のため、既存の関数シグネチャを維持
+    後方互換性のため、既存の関数シグネチャを維持（count は省略可）
     """
-    return SRSService.get_adaptive_review_list(session)
+    return SRSService.get_adaptive_review_list(session, count)
 
 def cleanup_mastered_questions(session):
     """
@@ -355,29 +310,21 @@ def cleanup_mastered_questions(session):
 # validate_exam_parameters function is imported from schemas.validation_schemas
 # Removing duplicate local function to resolve signature mismatch
 
-def rate_limit_check(max_requests=1000, window_minutes=60):
-    """レート制限チェック"""
-    now = datetime.now()
-    window_start = now - timedelta(minutes=window_minutes)
-    
-    # セッションからリクエスト履歴を取得
-    request_history = session.get('request_history', [])
-    
-    # 古いリクエストを除去
-    request_history = [req_time for req_time in request_history if datetime.fromisoformat(req_time) > window_start]
-    
-    # 現在のリクエストを追加
-    request_history.append(now.isoformat())
-    
-    # セッションに保存
-    session['request_history'] = request_history
-    session.modified = True
-    
-    # レート制限チェック
-    if len(request_history) > max_requests:
-        return False
-    
-    return True
+def rate_limit_check(policy='default'):
+    """
+    レート制限チェック（共有トークンバケット、セッションには保存しない）
+
+    Args:
+        policy: RATE_LIMIT_POLICIES のポリシー名
+
+    Returns:
+        bool: 許可される場合True
+    """
+    try:
+        return rate_limiter.check(policy, rate_limit_identities()).allowed
+    except Exception as e:
+        logger.error(f"レート制限チェックエラー: {e}")
+        return True
 
 def validate_question_data_integrity(questions):
     """問題データの整合性チェックと自動修復"""
@@ -406,11 +353,12 @@ def validate_question_data_integrity(questions):
             question_type = question.get('question_type', '')
             if question_type not in ['basic', 'specialist']:
                 # 年度があれば専門、なければ基礎と推定
-                if question.get('year'):
-                    question['question_type'] = 'specialist'
+                inferred_type = 'specialist' if question.get('year') else 'basic'
+                if isinstance(question, Question):
+                    question = question.replace(question_type=inferred_type)
                 else:
-                    question['question_type'] = 'basic'
-                logger.debug(f"問題{question.get('id')}: 問題種別を推定設定 ({question['question_type']})")
+                    question['question_type'] = inferred_type
+                logger.debug(f"問題{question.get('id')}: 問題種別を推定設定 ({inferred_type})")
             
             valid_questions.append(question)
             
@@ -425,22 +373,11 @@ def validate_question_data_integrity(questions):
     return valid_questions
 
 # 🚨 PHASE 1: Session State Management Functions (Critical Race Condition Fix)
-def acquire_session_lock(session_id):
-    """セッション状態の排他制御を取得"""
-    global session_locks, session_lock
-    
-    with session_lock:
-        if session_id not in session_locks:
-            session_locks[session_id] = threading.Lock()
-    
-    # セッション固有のロックを取得
-    return session_locks[session_id]
-
 def get_current_session_state():
     """セッション状態の安全な読み取り（Single Source of Truth）"""
     session_id = session.get('session_id', str(uuid.uuid4()))
     
-    with acquire_session_lock(session_id):
+    with user_lock(session_id):
         return {
             'session_id': session_id,
             'exam_question_ids': session.get('exam_question_ids', []),
@@ -456,7 +393,7 @@ def update_session_state(state_dict, force_modified=True):
     """セッション状態の安全な更新（Race Condition Prevention）"""
     session_id = session.get('session_id', str(uuid.uuid4()))
     
-    with acquire_session_lock(session_id):
+    with user_lock(session_id):
         # セッション状態を安全に更新
         for key, value in state_dict.items():
             if key != 'session_id':  # session_idは更新しない
@@ -473,79 +410,38 @@ def update_session_state(state_dict, force_modified=True):
         if 'exam_question_ids' in state_dict:
             logger.info(f"🔒 Session State Updated: {len(state_dict['exam_question_ids'])} questions, current: {state_dict.get('exam_current', 'N/A')}")
 
-def load_questions():
+def load_emergency_questions():
     """
-    RCCM統合問題データの読み込み（4-1基礎・4-2専門対応）
-    キャッシュ機能と詳細エラーハンドリング
+    🆘 緊急フォールバック: CSVから1問も読み込めなかった場合に4-1.csvを直接読み込み
     """
-    global _questions_cache, _cache_timestamp
-    
-    current_time = datetime.now()
-    
-    # キャッシュが有効かチェック
-    if (_questions_cache is not None and 
-        _cache_timestamp is not None and 
-        (current_time - _cache_timestamp).seconds < DataConfig.CACHE_TIMEOUT):
-        logger.debug("キャッシュからデータを返却")
-        return _questions_cache
-    
-    logger.info("RCCM統合問題データの読み込み開始")
-    
-    # 🎯 CLAUDE.md準拠: キャッシュ強制クリア（本番環境の古いキャッシュ対策）
-    _questions_cache = None
-    _cache_timestamp = None
-    logger.info("[CACHE] CLAUDE.md compliant: Cache clearing initiated")
-    
-    # 🎯 ULTRA SYNC 根本解決: フォールバック処理完全無効化
-    # 本番環境でload_rccm_data_filesのみ使用を強制
-    data_dir = os.path.dirname(DataConfig.QUESTIONS_CSV)
-    logger.info(f"🎯 CLAUDE.md準拠: 正規データロード強制開始 - data_dir={data_dir}")
-    
-    # 🔥 EMERGENCY FIX: 直接CSVファイル読み込み（緊急修正）
-    try:
-        questions = load_rccm_data_files(data_dir)
-        logger.info(f"🎯 CLAUDE.md準拠: load_rccm_data_files returned {len(questions) if questions else 0} questions")
-
-        if not questions:
-            logger.warning("🚨 統合関数が0件返却 - 直接読み込みに切り替え")
-            # 緊急フォールバック: 4-1.csvを直接読み込み
-            basic_file = os.path.join(data_dir, '4-1.csv')
-            if os.path.exists(basic_file):
-                from utils import load_questions_improved
-                questions = load_questions_improved(basic_file)
-                logger.info(f"🆘 緊急フォールバック成功: {len(questions)}問を4-1.csvから読み込み")
-            else:
-                logger.error(f"🚨 基礎ファイル不存在: {basic_file}")
-                questions = []
-    except Exception as e:
-        logger.error(f"🚨 データ読み込みエラー: {e}")
-        # 最後の手段: 直接4-1.csvを読み込み
-        basic_file = os.path.join(data_dir, '4-1.csv')
-        if os.path.exists(basic_file):
-            from utils import load_questions_improved
-            questions = load_questions_improved(basic_file)
-            logger.info(f"🆘 最終フォールバック成功: {len(questions)}問")
-        else:
-            questions = []
+    basic_file = os.path.join(os.path.dirname(DataConfig.QUESTIONS_CSV), '4-1.csv')
+    if not os.path.exists(basic_file):
+        logger.error(f"🚨 基礎ファイル不存在: {basic_file}")
+        return []
+    try:
+        from utils import load_questions_improved
+        questions = load_questions_improved(basic_file)
+        logger.info(f"🆘 緊急フォールバック成功: {len(questions)}問を4-1.csvから読み込み")
+        return questions
+    except Exception as e:
+        logger.error(f"🚨 全ての読み込み方法が失敗: {e}")
+        return []
 
-    if not questions:
-        logger.error(f"🚨 全ての読み込み方法が失敗")
-        questions = []  # 空リストではなく例外を出さないよう修正
-    
-    # データ整合性チェック
-    logger.info(f"🎯 CLAUDE.md準拠: データ整合性チェック開始")
-    validated_questions = validate_question_data_integrity(questions)
-    _questions_cache = validated_questions
-    _cache_timestamp = current_time
-    logger.info(f"✅ CLAUDE.md準拠: 正規RCCM統合データ読み込み完了: {len(validated_questions)}問 (ID体系=基礎1-202,専門1000+)")
-    return validated_questions
+# 📚 問題バンクレジストリ: 全ルート・サービスはこの1つの版を共有する
+# ファイル単位のパーティションごとにデータ整合性チェックを適用
+question_bank.configure(validator=validate_question_data_integrity, fallback=load_emergency_questions)
+
+def load_questions():
+    """
+    RCCM統合問題データの取得（4-1基礎・4-2専門対応）
+    問題バンクレジストリの現在の版を返す（ロックなし・不変タプル）
+    """
+    return question_bank.questions()
 
 def clear_questions_cache():
-    """問題データキャッシュのクリア"""
-    global _questions_cache, _cache_timestamp
-    _questions_cache = None
-    _cache_timestamp = None
-    logger.info("問題データキャッシュをクリア")
+    """問題データの再構築（新しい版を公開するまで旧版で応答を継続）"""
+    question_bank.rebuild()
+    logger.info("問題データキャッシュをクリア（問題バンク再構築）")
 
 # 🔥 CRITICAL: ウルトラシンク復習セッション管理システム（統合管理）
 def validate_review_session_integrity(session_data):
@@ -614,12 +510,9 @@ def create_robust_review_session(user_session, all_questions, review_type='mixed
         for qid in wrong_questions[-10:]:  # 最近10問の間違い
             review_question_ids.add(qid)
         
-        # 有効な問題IDのみを保持
-        valid_review_ids = []
-        for qid in review_question_ids:
-            # 問題データが存在するかチェック
-            if any(int(q.get('id', 0)) == qid for q in all_questions):
-                valid_review_ids.append(qid)
+        # 有効な問題IDのみを保持（ID索引でO(1)判定）
+        index = question_bank.index()
+        valid_review_ids = [qid for qid in review_question_ids if qid in index]
         
         # 最低限の復習問題数を保証
         if len(valid_review_ids) < 3:
@@ -685,31 +578,12 @@ def safe_update_review_session(session_data, question_ids, current_index=0):
 # Removed old update_srs_data function - replaced with update_advanced_srs_data
 
 def get_due_questions(user_session, all_questions):
-    """復習が必要な問題を取得"""
-    if 'srs_data' not in user_session:
-        return []
-    
-    srs_data = user_session['srs_data']
-    today = datetime.now().date()
-    due_questions = []
-    
-    for question_id, data in srs_data.items():
-        try:
-            next_review = datetime.fromisoformat(data['next_review']).date()
-            if next_review <= today:
-                question = next((q for q in all_questions if str(q.get('id', 0)) == question_id), None)
-                if question:
-                    due_questions.append({
-                        'question': question,
-                        'srs_data': data,
-                        'days_overdue': (today - next_review).days
-                    })
-        except (ValueError, KeyError) as e:
-            logger.warning(f"SRSデータ解析エラー (ID: {question_id}): {e}")
-            continue
-    
-    due_questions.sort(key=lambda x: x['days_overdue'], reverse=True)
-    return due_questions
+    """
+    復習が必要な問題を取得
+
+    🎯 PHASE 21: advanced_srs の復習期限キューを使う QuestionService に委譲
+    """
+    return QuestionService.get_due_questions(user_session, all_questions)
 
 def get_mixed_questions(user_session, all_questions, requested_category='全体', session_size=None, department='', question_type='', year=None):
     """新問題と復習問題をミックスした出題（RCCM部門対応版）"""
@@ -744,8 +618,9 @@ def get_mixed_questions(user_session, all_questions, requested_category='全体'
     # 残りを新問題で埋める（学習効率重視の選択）
     remaining_count = session_size - len(selected_questions)
     
-    # 問題フィルタリング条件
-    available_questions = all_questions
+    # 問題フィルタリング条件（属性値ごとのビットセットのAND / ANDNOT）
+    index = question_bank.index()
+    available = index.full_mask
     
     # AI学習分析による弱点重視出題
     weak_categories = []
@@ -762,22 +637,18 @@ def get_mixed_questions(user_session, all_questions, requested_category='全体'
     if question_type:
         # 基礎科目の場合
         if question_type == 'basic':
-            available_questions = [q for q in available_questions 
-                                 if q.get('question_type') == 'basic' 
-                                 and q.get('year') is None]  # 基礎科目は年度なし
-            logger.info(f"基礎科目フィルタ適用: 結果 {len(available_questions)}問")
+            available = index.mask(question_type='basic', has_year=False)  # 基礎科目は年度なし
+            logger.info(f"基礎科目フィルタ適用: 結果 {index.count(available)}問")
         
         # 専門科目の場合
         elif question_type == 'specialist':
-            available_questions = [q for q in available_questions 
-                                 if q.get('question_type') == 'specialist' 
-                                 and q.get('year') is not None]  # 専門科目は年度必須
-            logger.info(f"専門科目フィルタ適用: 結果 {len(available_questions)}問")
+            available = index.mask(question_type='specialist', has_year=True)  # 専門科目は年度必須
+            logger.info(f"専門科目フィルタ適用: 結果 {index.count(available)}問")
         
         # その他の場合
         else:
-            available_questions = [q for q in available_questions if q.get('question_type') == question_type]
-            logger.info(f"問題種別フィルタ適用: {question_type}, 結果: {len(available_questions)}問")
+            available = index.mask(question_type=question_type)
+            logger.info(f"問題種別フィルタ適用: {question_type}, 結果: {index.count(available)}問")
         
         # 専門科目で部門指定がある場合のみ部門フィルタ適用
         if question_type == 'specialist' and department:
@@ -788,59 +659,54 @@ def get_mixed_questions(user_session, all_questions, requested_category='全体'
             target_categories = LIGHTWEIGHT_DEPARTMENT_MAPPING.get(department, department)
             logger.info(f"✅ 日本語直接マッチング: {department} → {target_categories}")
             
-            logger.info(f"🔍 フィルタリング前の問題数={len(available_questions)}, 専門科目問題数={len([q for q in available_questions if q.get('question_type') == 'specialist'])}")
+            logger.info(f"🔍 フィルタリング前の問題数={index.count(available)}")
             
-            # 日本語カテゴリでマッチング（category フィールドを使用）
-            # 選択部門名（日本語）とCSVのcategory（日本語）の直接一致のみ
-            dept_match_questions = [q for q in available_questions 
-                                  if q.get('category') == target_categories]
-            if dept_match_questions:
-                available_questions = dept_match_questions
-                logger.info(f"専門科目部門マッチング成功: {len(available_questions)}問")
+            # 日本語カテゴリでマッチング（category フィールドの索引を使用）
+            # 選択部門名（日本語）とCSVのcategory（日本語）の一致のみ
+            dept_match = available & index.mask(category=target_categories)
+            if dept_match:
+                available = dept_match
+                logger.info(f"専門科目部門マッチング成功: {index.count(available)}問")
             else:
                 logger.warning(f"専門科目部門マッチング失敗: {target_categories} に該当する問題が見つかりません")
     
     # 部門でフィルタリング（基礎科目の場合はスキップ、専門科目で既に適用済みの場合もスキップ）
     elif department and question_type != 'basic' and question_type != 'specialist':
-        available_questions = [q for q in available_questions if q.get('department') == department]
-        logger.info(f"部門フィルタ適用: {department}, 結果: {len(available_questions)}問")
+        available = index.mask(department=department)
+        logger.info(f"部門フィルタ適用: {department}, 結果: {index.count(available)}問")
     
     # カテゴリでフィルタリング（文字化け考慮）
     if requested_category != '全体':
-        pre_category_count = len(available_questions)
-        # 正確な文字列マッチング
-        available_questions = [q for q in available_questions if q.get('category') == requested_category]
+        pre_category_count = index.count(available)
+        # カテゴリのビットセットとの積
+        available &= index.mask(category=requested_category)
         
         # 文字化けしている場合のフォールバック（部分マッチ）
-        if len(available_questions) == 0 and requested_category:
+        if not available and requested_category:
             # 文字化けを考慮した部分マッチ
             logger.warning(f"正確なカテゴリマッチ失敗: {requested_category}, 部分マッチを試行")
-            for q in [q for q in all_questions if q.get('question_type') == question_type]:
+            partial_ids = []
+            for q in index.select(question_type=question_type or None):
                 category = q.get('category', '')
                 # 道路、トンネル等の主要カテゴリのマッチング
                 if ('道路' in category and ('道' in requested_category or 'road' in requested_category.lower())) or \
                    ('トンネル' in category and ('トンネル' in requested_category or 'tunnel' in requested_category.lower())) or \
                    ('河川' in category and ('河川' in requested_category or 'civil' in requested_category.lower())) or \
                    ('土質' in category and ('土質' in requested_category or 'soil' in requested_category.lower())):
-                    if q not in available_questions:
-                        available_questions.append(q)
+                    partial_ids.append(q['id'])
+            available = index.mask_of_ids(partial_ids)
         
-        logger.info(f"カテゴリフィルタ適用: {requested_category}, {pre_category_count} → {len(available_questions)}問")
+        logger.info(f"カテゴリフィルタ適用: {requested_category}, {pre_category_count} → {index.count(available)}問")
     
     # 年度でフィルタリング（専門科目のみ対象）
     if year:
-        pre_year_count = len(available_questions)
-        available_questions = [q for q in available_questions 
-                              if str(q.get('year', '')) == str(year) 
-                              and q.get('question_type') == 'specialist']
-        logger.info(f"年度フィルタ適用: {year}年度, {pre_year_count} → {len(available_questions)}問")
-    
-    # 既に選択済みの問題を除外
-    selected_ids = [int(q.get('id', 0)) for q in selected_questions]
-    new_questions = [q for q in available_questions if int(q.get('id', 0)) not in selected_ids]
+        pre_year_count = index.count(available)
+        available &= index.mask(question_type='specialist', year=year)
+        logger.info(f"年度フィルタ適用: {year}年度, {pre_year_count} → {index.count(available)}問")
     
-    random.shuffle(new_questions)
-    selected_questions.extend(new_questions[:remaining_count])
+    # 既に選択済みの問題を除外（ANDNOT）し、候補から直接サンプリング
+    available &= ~index.mask_of_ids(q.get('id') for q in selected_questions)
+    selected_questions.extend(index.sample(available, remaining_count))
     
     random.shuffle(selected_questions)
     
@@ -867,7 +733,9 @@ def before_request():
     if request.endpoint == 'question_types' or '/departments/' in request.path and '/types' in request.path:
         logger.info(f"🔍 ULTRA SYNC DEBUG: before_request for question_types, path: {request.path}, endpoint: {request.endpoint}")
     
-    session.permanent = True
+    # 既にpermanentのセッションでは代入しない（変更のないリクエストでセッションを書き込まない）
+    if not session.permanent:
+        session.permanent = True
     
     # セッションIDの取得（簡素化）
     if 'session_id' not in session:
@@ -882,7 +750,8 @@ def before_request():
             'exam_current': 0,
             'history': [],
             'bookmarks': [],
-            'srs_data': {}
+            'srs_data': {},
+            SessionService.KEY_QUESTION_ID_SCHEME: SessionService.QUESTION_ID_SCHEME
         }
         update_session_state(initial_state)
         
@@ -895,6 +764,9 @@ def before_request():
                 session_data_manager.load_session_data(session, session['session_id'], user_name)
             except Exception as e:
                 logger.warning(f"セッションデータロード失敗（続行可能）: {e}")
+    elif session.get(SessionService.KEY_QUESTION_ID_SCHEME) != SessionService.QUESTION_ID_SCHEME:
+        # 旧ID体系（通し番号）のセッションを固定IDへ移行
+        SessionService.migrate_question_ids(question_bank.current().legacy_id_map())
 
 @app.after_request
 def after_request_data_save(response):
@@ -912,10 +784,8 @@ def after_request_data_save(response):
             except Exception as e:
                 logger.warning(f"セッション自動保存失敗（続行可能）: {e}")
     
-    # セッション修正フラグを明示的に設定
-    if hasattr(session, 'modified'):
-        session.modified = True
-    
+    # セッションの保存は変更されたキーだけをサーバーサイドセッションが判定する
+    # （ここで session.modified を立てると読み取りだけのページでも書き込みが発生する）
     return response
 
 @app.route('/')
@@ -1032,13 +902,13 @@ def submit_answer():
     return exam()
 
 @app.route('/exam', methods=['GET', 'POST'])
+@rate_limit('answer', methods=['POST'])
 def exam():
     """シンプル統合版exam関数 - 問題文と選択肢の一致を保証"""
     try:
-        # データ読み込み
-        data_dir = os.path.dirname(DataConfig.QUESTIONS_CSV)
-        all_questions = load_rccm_data_files(data_dir)
-        if not all_questions:
+        # データ読み込み（問題バンクレジストリ・索引）
+        bank = question_bank.current()
+        if not bank.questions:
             return render_template('error.html', error="問題データが存在しません。")
 
         # POST処理（回答送信）
@@ -1058,12 +928,8 @@ def exam():
             except (ValueError, TypeError):
                 return render_template('error.html', error="問題IDが無効です。")
 
-            # 問題を直接IDで検索
-            current_question = None
-            for q in all_questions:
-                if q.get('id') == qid:
-                    current_question = q
-                    break
+            # 問題をID索引で取得
+            current_question = bank.get(qid)
 
             if not current_question:
                 return render_template('error.html', error="指定された問題が見つかりません。")
@@ -1071,17 +937,22 @@ def exam():
             # 正答チェック
             is_correct = (answer == current_question.get('correct_answer'))
 
-            # 履歴追加
-            if 'history' not in session:
-                session['history'] = []
+            # 回答時間（秒）
+            try:
+                elapsed = max(0.0, round(float(request.form.get('elapsed', 0)), 1))
+            except (ValueError, TypeError):
+                elapsed = 0.0
 
-            session['history'].append({
+            # 履歴追加（直近のリングバッファ + 全期間の集計カウンタ）
+            SessionService.add_to_history({
                 'id': qid,
                 'category': current_question.get('category', '不明'),
                 'question_type': current_question.get('question_type', 'basic'),
+                'department': session.get('selected_department', ''),
                 'is_correct': is_correct,
                 'user_answer': answer,
                 'correct_answer': current_question.get('correct_answer', ''),
+                'elapsed': elapsed,
                 'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             })
 
@@ -1093,6 +964,7 @@ def exam():
 
                 srs_data = session['advanced_srs']
                 qid_str = str(qid)
+                old_srs = dict(srs_data[qid_str]) if qid_str in srs_data else None
 
                 # 新規登録または既存データ更新
                 if qid_str not in srs_data:
@@ -1111,6 +983,7 @@ def exam():
                     srs_data[qid_str]['next_review'] = datetime.now().isoformat()
 
                 session['advanced_srs'] = srs_data
+                SRSDueQueue.record_change(session, qid_str, old_srs, srs_data[qid_str])
 
             session.modified = True
 
@@ -1182,23 +1055,23 @@ def exam():
                 session['selected_department'] = department
 
             if question_type == 'basic':
-                questions = [q for q in all_questions if q.get('question_type') == 'basic']
+                questions = bank.index.ids(question_type='basic')
             elif question_type == 'specialist':
-                questions = [q for q in all_questions if q.get('question_type') == 'specialist']
                 if department:
                     # LIGHTWEIGHT_DEPARTMENT_MAPPINGを使用
                     target_category = LIGHTWEIGHT_DEPARTMENT_MAPPING.get(department, department)
-                    questions = [q for q in questions if q.get('category') == target_category]
+                    questions = bank.index.ids(question_type='specialist', category=target_category)
+                else:
+                    questions = bank.index.ids(question_type='specialist')
             else:
-                questions = all_questions
+                questions = bank.index.all_ids
 
             if not questions:
                 return render_template('error.html', error="指定された条件の問題が見つかりません。")
 
             # 指定された問数をランダム選択
             import random
-            selected_questions = random.sample(questions, min(count, len(questions)))
-            exam_question_ids = [q.get('id') for q in selected_questions]
+            exam_question_ids = random.sample(questions, min(count, len(questions)))
 
             session['exam_question_ids'] = exam_question_ids
             session['exam_current'] = 0
@@ -1210,11 +1083,7 @@ def exam():
             return redirect(url_for('result'))
 
         current_qid = exam_question_ids[current_index]
-        current_question = None
-        for q in all_questions:
-            if q.get('id') == current_qid:
-                current_question = q
-                break
+        current_question = bank.get(current_qid)
 
         if not current_question:
             return render_template('error.html', error="問題データが見つかりません。")
@@ -1345,18 +1214,19 @@ def statistics():
     """
     try:
         history = session.get('history', [])
+        rollup = SessionService.get_history_rollup()
 
-        # 全体統計（StatisticsServiceを使用）
-        overall_stats = StatisticsService.get_overall_statistics(history)
+        # 全体統計（StatisticsServiceを使用・全期間の集計カウンタ）
+        overall_stats = StatisticsService.get_overall_statistics(rollup)
 
         # 基礎・専門別統計（StatisticsServiceを使用）
-        basic_specialty_details = StatisticsService.get_basic_specialty_statistics(history)
+        basic_specialty_details = StatisticsService.get_basic_specialty_statistics(rollup)
 
-        # 最近の履歴（StatisticsServiceを使用）
+        # 最近の履歴（StatisticsServiceを使用・直近の履歴）
         exam_history = StatisticsService.get_recent_history(history, limit=30)
 
         # 日付別統計（StatisticsServiceを使用）
-        daily_accuracy_list = StatisticsService.get_daily_statistics(history)
+        daily_accuracy_list = StatisticsService.get_daily_statistics(rollup)
 
         return render_template(
             'statistics.html',
@@ -1376,11 +1246,10 @@ def department_statistics():
     try:
         from department_statistics import department_statistics as dept_stats_analyzer
         
-        # 現在のユーザーセッション
-        user_session = session
-        
-        # 包括的な部門別統計レポートを生成
-        report = dept_stats_analyzer.generate_comprehensive_department_report(user_session)
+        # 包括的な部門別統計レポートを生成（状態が変わるまでキャッシュ）
+        report = derived_cache.get_or_compute(
+            session, ('department_report',),
+            lambda: dept_stats_analyzer.generate_comprehensive_department_report(session))
         
         # 部門情報を追加
         departments = LIGHTWEIGHT_DEPARTMENT_MAPPING
@@ -1407,19 +1276,11 @@ def departments():
         
         # 各部門の学習進捗を計算
         department_progress = {}
-        history = session.get('history', [])
+        rollup = SessionService.get_history_rollup()
         
         for dept_id, dept_info in LIGHTWEIGHT_DEPARTMENT_MAPPING.items():
-            # この部門での問題数と正答数を集計
-            dept_history = [h for h in history if h.get('department') == dept_id]
-            total_answered = len(dept_history)
-            correct_count = sum(1 for h in dept_history if h.get('is_correct', False))
-            
-            department_progress[dept_id] = {
-                'total_answered': total_answered,
-                'correct_count': correct_count,
-                'accuracy': (correct_count / total_answered * 100) if total_answered > 0 else 0.0
-            }
+            # この部門での問題数と正答数（集計カウンタ）
+            department_progress[dept_id] = StatisticsService.get_rollup_progress(rollup, 'department', dept_id)
         
         return render_template(
             'departments.html',
@@ -1530,20 +1391,12 @@ def question_types(department_id):
 
         # 各問題種別の学習進捗を計算
         type_progress = {}
-        history = session.get('history', [])
+        rollup = SessionService.get_history_rollup()
 
         for type_id in ['basic', 'specialist']:
-            # この部門・種別での問題数と正答数を集計
-            type_history = [h for h in history
-                          if h.get('department') == department_id and h.get('question_type') == type_id]
-            total_answered = len(type_history)
-            correct_count = sum(1 for h in type_history if h.get('is_correct', False))
-
-            type_progress[type_id] = {
-                'total_answered': total_answered,
-                'correct_count': correct_count,
-                'accuracy': (correct_count / total_answered * 100) if total_answered > 0 else 0.0
-            }
+            # この部門・種別での問題数と正答数（集計カウンタ）
+            type_progress[type_id] = StatisticsService.get_rollup_progress(
+                rollup, 'department_type', department_id, type_id)
 
         # ULTRA SYNC DEBUG: テンプレート描画前確認
         logger.info(f"✅ ULTRA SYNC DEBUG: Rendering question_types.html for department '{department_id}' ({department_info['name']})")
@@ -1582,11 +1435,8 @@ def department_categories(department_id, question_type):
         department_info = LIGHTWEIGHT_DEPARTMENT_MAPPING[department_id]
         type_info = {'basic': {'name': '基礎科目'}, 'specialist': {'name': '専門科目'}}[question_type]
         
-        questions = load_questions()
-        
-        # 指定された部門・問題種別の問題のみをフィルタリング
-        filtered_questions = [q for q in questions 
-                             if q.get('department') == department_id and q.get('question_type') == question_type]
+        # 指定された部門・問題種別の問題のみをフィルタリング（索引）
+        filtered_questions = question_bank.current().select(department=department_id, question_type=question_type)
         
         # カテゴリ情報を集計
         category_details = {}
@@ -1604,21 +1454,12 @@ def department_categories(department_id, question_type):
         
         # 統計情報を追加（部門・種別を考慮）
         cat_stats = session.get('category_stats', {})
+        rollup = SessionService.get_history_rollup()
         for cat, stat in cat_stats.items():
             if cat in category_details:
-                # 部門・種別別の統計が必要な場合は履歴から計算
-                history = session.get('history', [])
-                dept_type_history = [h for h in history 
-                                   if h.get('department') == department_id 
-                                   and h.get('question_type') == question_type 
-                                   and h.get('category') == cat]
-                
-                total = len(dept_type_history)
-                correct = sum(1 for h in dept_type_history if h.get('is_correct', False))
-                
-                category_details[cat]['total_answered'] = total
-                category_details[cat]['correct_count'] = correct
-                category_details[cat]['accuracy'] = (correct / total * 100) if total > 0 else 0.0
+                # 部門・種別・カテゴリ別の統計（集計カウンタ）
+                category_details[cat].update(StatisticsService.get_rollup_progress(
+                    rollup, 'department_type_category', department_id, question_type, cat))
         
         # 進捗率計算
         progresses = {}
@@ -1661,34 +1502,36 @@ def department_study(department):
         session['selected_department'] = department_key
         session.modified = True
         
-        # 問題データを読み込み
-        questions = load_questions()
+        # 問題索引
+        index = question_bank.index()
         
+        # 集計カウンタ（全期間）
+        rollup = SessionService.get_history_rollup()
+
         # 4-1基礎問題（全部門共通）の統計
-        basic_questions = [q for q in questions if q.get('question_type') == 'basic']
-        basic_history = [h for h in session.get('history', []) if h.get('question_type') == 'basic']
+        basic_questions = index.ids(question_type='basic')
+        basic_progress = StatisticsService.get_rollup_progress(rollup, 'question_type', 'basic')
         basic_stats = {
             'total_questions': len(basic_questions),
-            'answered': len(basic_history),
-            'correct': sum(1 for h in basic_history if h.get('is_correct', False)),
-            'accuracy': (sum(1 for h in basic_history if h.get('is_correct', False)) / len(basic_history) * 100) if basic_history else 0.0
+            'answered': basic_progress['total_answered'],
+            'correct': basic_progress['correct_count'],
+            'accuracy': basic_progress['accuracy']
         }
         
         # 4-2専門問題（選択部門のみ）の統計
-        specialist_questions = [q for q in questions 
-                              if q.get('question_type') == 'specialist' and q.get('department') == department_key]
-        specialist_history = [h for h in session.get('history', []) 
-                             if h.get('question_type') == 'specialist' and h.get('department') == department_key]
+        specialist_questions = index.ids(question_type='specialist', department=department_key)
+        specialist_progress = StatisticsService.get_rollup_progress(
+            rollup, 'department_type', department_key, 'specialist')
         specialist_stats = {
             'total_questions': len(specialist_questions),
-            'answered': len(specialist_history),
-            'correct': sum(1 for h in specialist_history if h.get('is_correct', False)),
-            'accuracy': (sum(1 for h in specialist_history if h.get('is_correct', False)) / len(specialist_history) * 100) if specialist_history else 0.0
+            'answered': specialist_progress['total_answered'],
+            'correct': specialist_progress['correct_count'],
+            'accuracy': specialist_progress['accuracy']
         }
         
-        # 復習対象問題数
-        review_questions = [h for h in session.get('history', []) 
-                           if not h.get('is_correct', False) and h.get('department') == department_key]
+        # 復習対象問題数（この部門での不正解数）
+        department_progress = StatisticsService.get_rollup_progress(rollup, 'department', department_key)
+        review_count = department_progress['total_answered'] - department_progress['correct_count']
         
         logger.info(f"部門特化学習画面表示: {department} ({department_info['name']})")
         logger.info(f"4-1基礎: {basic_stats['total_questions']}問, 4-2専門: {specialist_stats['total_questions']}問")
@@ -1699,7 +1542,7 @@ def department_study(department):
             department_key=department_key,
             basic_stats=basic_stats,
             specialist_stats=specialist_stats,
-            review_count=len(review_questions),
+            review_count=review_count,
             question_types={'basic': {'name': '基礎科目'}, 'specialist': {'name': '専門科目'}}
         )
         
@@ -1711,37 +1554,32 @@ def department_study(department):
 def categories():
     """部門別問題選択画面（選択部門+共通のみ表示）"""
     try:
-        questions = load_questions()
+        index = question_bank.index()
         cat_stats = session.get('category_stats', {})
         
         # 現在選択されている部門を取得
         selected_department = session.get('selected_department', request.args.get('department'))
         
-        # カテゴリ情報を集計（選択部門+共通のみ）
+        # フィルタリング: 共通問題 OR 選択部門の専門問題のみ（部門未選択の場合は全表示）
+        included_ids = None
+        if selected_department:
+            included_ids = frozenset(index.ids(question_type='basic')).union(
+                index.ids(category='共通'),
+                index.ids(question_type='specialist', department=selected_department))
+        
+        # カテゴリ情報を集計（カテゴリ索引の件数）
         category_details = {}
-        for q in questions:
-            cat = q.get('category')
-            q_dept = q.get('department', '')
-            q_type = q.get('question_type', '')
-            
-            # フィルタリング: 共通問題 OR 選択部門の専門問題のみ
-            include_question = False
-            if q_type == 'basic' or cat == '共通':  # 基礎科目（共通）は常に表示
-                include_question = True
-            elif selected_department and q_dept == selected_department and q_type == 'specialist':  # 選択部門の専門問題のみ
-                include_question = True
-            elif not selected_department:  # 部門未選択の場合は全表示
-                include_question = True
-            
-            if include_question and cat:
-                if cat not in category_details:
-                    category_details[cat] = {
-                        'total_questions': 0,
-                        'total_answered': 0,
-                        'correct_count': 0,
-                        'accuracy': 0.0
-                    }
-                category_details[cat]['total_questions'] += 1
+        for cat, category_ids in index.by_category.items():
+            if not cat:
+                continue
+            total_questions = len(category_ids) if included_ids is None else len(index.intersect(category_ids, included_ids))
+            if total_questions:
+                category_details[cat] = {
+                    'total_questions': total_questions,
+                    'total_answered': 0,
+                    'correct_count': 0,
+                    'accuracy': 0.0
+                }
         
         # 統計情報を追加
         for cat, stat in cat_stats.items():
@@ -1803,8 +1641,8 @@ def review_list():
                                      departments=LIGHTWEIGHT_DEPARTMENT_MAPPING,
                                      srs_stats={'total_questions': 0, 'due_now': 0, 'mastered': 0, 'in_progress': 0})
 
-            questions_dict = {str(q.get('id')): q for q in all_questions if q.get('id')}
-            logger.info(f"問題データロード成功: {len(all_questions)}問, 辞書変換: {len(questions_dict)}問")
+            index = question_bank.index()
+            logger.info(f"問題データロード成功: {len(all_questions)}問")
 
         except Exception as data_error:
             logger.error(f"問題データ読み込みエラー: {data_error}")
@@ -1826,12 +1664,13 @@ def review_list():
             'high_priority': 0
         }
         
-        from datetime import datetime
-        now = datetime.now()
+        # 次回復習日時は復習期限キューのエポック秒を使う（問題ごとのISO文字列の解析なし）
+        review_epochs = {entry[1]: entry[0] for entry in SRSDueQueue.load(session).entries}
+        now_ts = datetime.now().timestamp()
         
         for qid in all_review_ids:
-            if qid in questions_dict:
-                question = questions_dict[qid]
+            question = index.get(qid)
+            if question is not None:
                 
                 # SRSデータを取得
                 srs_info = srs_data.get(qid, {})
@@ -1862,15 +1701,9 @@ def review_list():
                 else:
                     srs_stats['in_progress'] += 1
                     
-                    # 復習期限チェック
-                    try:
-                        if question_data['next_review']:
-                            next_review = datetime.fromisoformat(question_data['next_review'])
-                            if next_review <= now:
-                                srs_stats['due_now'] += 1
-                        else:
-                            srs_stats['due_now'] += 1  # 未設定は即座に復習対象
-                    except ValueError:
+                    # 復習期限チェック（未設定・日時エラーはエポック秒0 = 即座に復習対象）
+                    next_review_epoch = review_epochs.get(str(qid), 0)
+                    if next_review_epoch <= now_ts:
                         srs_stats['due_now'] += 1
                     
                     # 高優先度（間違いが多い）問題
@@ -1887,13 +1720,12 @@ def review_list():
                 else:
                     wrong_ratio = question_data['wrong_count'] / max(1, question_data['total_attempts'])
                     overdue_bonus = 0
-                    try:
-                        if question_data['next_review']:
-                            next_review = datetime.fromisoformat(question_data['next_review'])
-                            days_overdue = max(0, (now - next_review).days)
+                    if question_data['next_review']:
+                        if next_review_epoch:
+                            days_overdue = max(0, int(now_ts - next_review_epoch) // 86400)
                             overdue_bonus = days_overdue * 10
-                    except ValueError:
-                        overdue_bonus = 100  # 日時エラーは高優先度
+                        else:
+                            overdue_bonus = 100  # 日時エラーは高優先度
                     
                     priority = (wrong_ratio * 100) + overdue_bonus + question_data['difficulty_level']
                 
@@ -2067,22 +1899,17 @@ def reset():
     """リセット画面"""
     if request.method == 'POST':
         session.clear()
-        # 強制的なキャッシュクリア
-        clear_questions_cache()
-        logger.info("セッションとキャッシュを完全リセット")
+        # 注: 問題バンクは全ユーザー共有の不変データのため、ユーザー単位のリセットでは再構築しない
+        logger.info("セッションを完全リセット")
         return redirect(url_for('index'))
     
-    # 現在のデータ分析
-    history = session.get('history', [])
+    # 現在のデータ分析（全期間の集計カウンタ）
+    overall_stats = StatisticsService.get_overall_statistics(SessionService.get_history_rollup())
     analytics = {
-        'total_questions': len(history),
-        'accuracy': 0
+        'total_questions': overall_stats['total_quizzes'],
+        'accuracy': round(overall_stats['total_accuracy'], 1)
     }
     
-    if history:
-        correct = sum(1 for h in history if h.get('is_correct'))
-        analytics['accuracy'] = round((correct / len(history)) * 100, 1)
-    
     return render_template('reset_confirm.html', analytics=analytics)
 
 @app.route('/force_reset')
@@ -2091,8 +1918,6 @@ def force_reset():
     try:
         # セッション完全削除
         session.clear()
-        # キャッシュクリア
-        clear_questions_cache()
         # セッションIDも新規生成
         session['session_id'] = os.urandom(16).hex()
         session.permanent = True
@@ -2111,14 +1936,14 @@ def help_page():
     """包括的なヘルプページ"""
 
     # 統計データを取得
-    history = session.get('history', [])
+    overall_stats = StatisticsService.get_overall_statistics(SessionService.get_history_rollup())
     srs_data = session.get('advanced_srs', {})
     bookmarks = session.get('bookmarks', [])
 
     help_data = {
         'total_questions': ExamConfig.QUESTIONS_PER_SESSION,
         'departments': LIGHTWEIGHT_DEPARTMENT_MAPPING,
-        'total_solved': len(history),
+        'total_solved': overall_stats['total_quizzes'],
         'review_count': len(srs_data),
         'bookmark_count': len(bookmarks),
         'features': {
@@ -2188,13 +2013,12 @@ def bookmarks_page():
                                  total_count=0,
                                  message="まだ復習問題が登録されていません。")
         
-        # 問題データを読み込み
-        all_questions = load_questions()
         questions = []
         
-        # ブックマークされた問題の詳細情報を取得
+        # ブックマークされた問題の詳細情報を取得（ID索引）
+        index = question_bank.index()
         for qid in bookmarks:
-            question = next((q for q in all_questions if str(q.get('id', '')) == str(qid)), None)
+            question = index.get(qid)
             if question:
                 # 部門名を取得
                 dept_key = question.get('department', '')
@@ -2231,9 +2055,8 @@ def review_quiz():
         
         # 問題データロード（エラーハンドリング強化）
         try:
-            # データディレクトリの設定
-            data_dir = os.path.dirname(DataConfig.QUESTIONS_CSV)
-            all_questions = load_rccm_data_files(data_dir)
+            # 問題バンクレジストリから取得
+            all_questions = load_questions()
             if not all_questions:
                 logger.error("問題データが空です")
                 return render_template('error.html', 
@@ -2258,32 +2081,6 @@ def review_quiz():
                 logger.warning(f"ブックマークがリスト型ではありません: {type(bookmarks)} - 初期化")
                 bookmarks = []
             
-            # 🔥 ULTRA堅牢: SRSデータの詳細検証と修復
-            valid_srs_data = {}
-            for qid, srs_info in srs_data.items():
-                try:
-                    # SRS情報の型チェック
-                    if not isinstance(srs_info, dict):
-                        logger.warning(f"SRS情報が無効な型: 問題ID {qid}, 型: {type(srs_info)}")
-                        continue
-                    
-                    # 🔥 FIXED: SRSデータフィールド名を実際のデータ構造に合わせて修正
-                    # 実際のSRSデータは: incorrect_count, level, category, next_review, question_type
-                    # より柔軟な検証にして、最低限の情報があれば受け入れる
-                    if 'incorrect_count' in srs_info:
-                        # 間違い回数があれば復習対象として扱う
-                        incorrect_count = int(srs_info.get('incorrect_count', 0))
-                        if incorrect_count >= 0:  # 0以上であれば有効
-                            valid_srs_data[qid] = srs_info
-                    else:
-                        logger.warning(f"SRS情報に必要フィールド(incorrect_count)が不足: 問題ID {qid}, フィールド: {srs_info.keys()}")
-                except (ValueError, TypeError) as field_error:
-                    logger.warning(f"SRS情報の数値変換エラー: 問題ID {qid}, エラー: {field_error}")
-                    continue
-            
-            logger.info(f"SRSデータ検証: 元データ{len(srs_data)}問 → 有効データ{len(valid_srs_data)}問")
-            srs_data = valid_srs_data
-            
             # 🔥 ULTRA堅牢: ブックマークデータの詳細検証と修復
             valid_bookmarks = []
             for bookmark in bookmarks:
@@ -2301,24 +2098,13 @@ def review_quiz():
             
             logger.info(f"ブックマーク検証: 元データ{len(bookmarks)}問 → 有効データ{len(valid_bookmarks)}問")
             bookmarks = valid_bookmarks
-                
-            # すべての復習対象問題IDを統合（重複除去）
-            all_review_ids = set()
-            
-            # SRSデータから取得（文字列に変換してから統合）
-            for qid in srs_data.keys():
-                if qid and str(qid).strip():  # 空文字や None をスキップ
-                    all_review_ids.add(str(qid))
-            
-            # ブックマークから取得（文字列に変換してから統合）
-            for qid in bookmarks:
-                if qid and str(qid).strip():  # 空文字や None をスキップ
-                    all_review_ids.add(str(qid))
             
-            # リストに変換
-            review_question_ids = list(all_review_ids)
+            # 🚀 PHASE 22: SRSデータは重み（間違い率×難易度）のフェンウィック木索引から抽出
+            # （マスター済み・無効な形式の記録は索引の作成時に除外済み）
+            review_sampler = ReviewSampler.load(session) if srs_data else ReviewSampler()
             
-            logger.info(f"復習対象問題統合: SRS={len(srs_data)}問, ブックマーク={len(bookmarks)}問, 統合後={len(review_question_ids)}問")
+            logger.info(f"復習対象問題: SRS={len(review_sampler.ids)}問（重み合計{review_sampler.total_weight}）, "
+                        f"ブックマーク={len(bookmarks)}問")
             
         except Exception as integration_error:
             logger.error(f"復習データ統合エラー: {integration_error}")
@@ -2326,9 +2112,8 @@ def review_quiz():
                                  error="復習データの処理中にエラーが発生しました。",
                                  error_type="data_integration_error")
         
-        if not review_question_ids:
+        if review_sampler.total_weight <= 0 and not bookmarks:
             # SRSデータがない場合の案内メッセージ
-            srs_data = session.get('advanced_srs', {})
             if not srs_data:
                 return render_template('error.html', 
                                      error="復習リストが空です。まず問題を解いて間違えることで、科学的な復習システムが学習を開始します。",
@@ -2338,129 +2123,44 @@ def review_quiz():
                                      error="現在復習が必要な問題がありません。素晴らしい！新しい問題に挑戦するか、時間が経ってから復習してください。",
                                      error_type="all_mastered")
         
-        # 🔥 CRITICAL: 問題データマッチングと弱点スコア計算（ウルトラシンク対応）
+        # 🔥 ULTRA CRITICAL: 最終問題選択とセッション設定（ウルトラシンク対応）
         try:
-            # 問題IDから実際の問題データを取得（安全性強化）
-            questions_dict = {}
-            for q in all_questions:
-                try:
-                    q_id = str(q.get('id', ''))
-                    if q_id and q_id.strip():  # 空文字チェック
-                        questions_dict[q_id] = q
-                except Exception as q_parse_error:
-                    logger.warning(f"問題ID変換エラー: {q_parse_error}, question={q}")
-                    continue
-            
-            logger.info(f"問題辞書作成完了: {len(questions_dict)}問")
-            
-            review_questions_with_score = []
-            successful_matches = 0
-            failed_matches = 0
+            # 問題IDから実際の問題データを取得（ID索引でO(1)）
+            index = question_bank.index()
+            target_session_size = 10  # 理想は10問
             
-            for qid in review_question_ids:
-                try:
-                    if qid in questions_dict:
-                        question = questions_dict[qid]
-                        
-                        # 弱点スコア計算（安全性強化）
-                        try:
-                            srs_info = srs_data.get(qid, {})
-                            
-                            # 🔥 FIXED: 実際のSRSデータ構造に合わせてフィールド名を修正
-                            wrong_count = max(0, int(srs_info.get('incorrect_count', 0)))
-                            total_attempts = max(1, wrong_count + 1)  # 間違い回数+1で概算
-                            difficulty_level = max(0, float(srs_info.get('level', 1) * 2))  # レベルから難易度を概算
-                            
-                            # 復習期限チェック（エラーハンドリング強化）
-                            overdue_bonus = 0
-                            next_review = srs_info.get('next_review', '')
-                            if next_review:
-                                try:
-                                    from datetime import datetime
-                                    next_review_date = datetime.fromisoformat(next_review)
-                                    days_overdue = max(0, (datetime.now() - next_review_date).days)
-                                    overdue_bonus = min(50, days_overdue * 2)  # 最大50に制限
-                                except Exception as date_error:
-                                    logger.debug(f"日付解析エラー（問題ID: {qid}）: {date_error}")
-                                    overdue_bonus = 5  # デフォルト値
-                            
-                            # 弱点スコア計算（オーバーフロー防止）
-                            error_rate = min(1.0, wrong_count / total_attempts)
-                            weakness_score = min(1000, (error_rate * 100) + difficulty_level + overdue_bonus)
-                            
-                            review_questions_with_score.append({
-                                'question': question,
-                                'weakness_score': weakness_score,
-                                'wrong_count': wrong_count,
-                                'total_attempts': total_attempts,
-                                'overdue_bonus': overdue_bonus
-                            })
-                            
-                            successful_matches += 1
-                            
-                        except Exception as score_error:
-                            logger.warning(f"弱点スコア計算エラー（問題ID: {qid}）: {score_error}")
-                            # エラーが発生した問題もデフォルトスコアで追加
-                            review_questions_with_score.append({
-                                'question': question,
-                                'weakness_score': 50,  # デフォルトスコア
-                                'wrong_count': 1,
-                                'total_attempts': 1,
-                                'overdue_bonus': 0
-                            })
-                            successful_matches += 1
-                    else:
-                        failed_matches += 1
-                        logger.debug(f"問題IDが見つかりません: {qid}")
-                        
-                except Exception as match_error:
-                    logger.warning(f"問題マッチングエラー（ID: {qid}）: {match_error}")
-                    failed_matches += 1
-                    continue
+            # 🚀 PHASE 22: 弱点の重みに比例した確率で重複なしに抽出（O(k log n)）
+            # 問題バンクにないIDを除いても足りるよう、理想の2倍を抽出
+            drawn_ids = review_sampler.sample(target_session_size * 2)
+            selected_review_items = []
+            for qid in drawn_ids:
+                question = index.get(qid)
+                if question is not None and len(selected_review_items) < target_session_size:
+                    selected_review_items.append({'question': question, 'weight': review_sampler.weight(qid)})
             
-            logger.info(f"問題マッチング結果: 成功={successful_matches}問, 失敗={failed_matches}問")
+            # SRSデータのない（またはマスター済みの）ブックマークは最低の重みで補充
+            if len(selected_review_items) < target_session_size:
+                selected_ids = {str(item['question'].get('id')) for item in selected_review_items}
+                for qid in bookmarks:
+                    if len(selected_review_items) >= target_session_size:
+                        break
+                    sid = str(qid)
+                    question = index.get(qid)
+                    if question is not None and sid not in selected_ids:
+                        selected_ids.add(sid)
+                        selected_review_items.append({'question': question, 'weight': 0})
             
-        except Exception as processing_error:
-            logger.error(f"弱点スコア処理の重大エラー: {processing_error}")
-            return render_template('error.html', 
-                                 error="復習問題の評価中にエラーが発生しました。",
-                                 error_type="score_processing_error")
-        
-        if not review_questions_with_score:
-            return render_template('error.html', 
-                                 error="復習対象の問題が見つかりません。新しい問題を解いて間違えることで復習リストが作成されます。",
-                                 error_type="no_filtered_questions")
-        
-        # 🔥 ULTRA CRITICAL: 最終問題選択とセッション設定（ウルトラシンク対応）
-        try:
-            # 🔥 ULTRA堅牢: 弱点スコア順でソート（安全なソート・完全エラーハンドリング）
-            try:
-                # 各問題の弱点スコアが数値であることを確認
-                for item in review_questions_with_score:
-                    if not isinstance(item.get('weakness_score'), (int, float)):
-                        item['weakness_score'] = 50.0  # デフォルトスコア
-                
-                review_questions_with_score.sort(key=lambda x: float(x.get('weakness_score', 0)), reverse=True)
-                logger.info(f"弱点スコア順ソート完了: {len(review_questions_with_score)}問")
-            except Exception as sort_error:
-                logger.warning(f"ソートエラー（デフォルト順序を使用）: {sort_error}")
-                # ソートに失敗してもそのまま続行
+            logger.info(f"問題マッチング結果: 抽出{len(drawn_ids)}問 → 選択{len(selected_review_items)}問")
             
             # 🔥 ULTRA CRITICAL: セッション問題数の動的決定（最低保証とユーザー要求バランス）
-            available_questions = len(review_questions_with_score)
-            min_session_size = min(3, available_questions)  # 最低3問、または利用可能問題数
-            target_session_size = 10  # 理想は10問
-            session_size = min(target_session_size, available_questions)  # 利用可能問題数に制限
-            
-            if session_size < min_session_size:
-                logger.error(f"復習問題が不足: 利用可能{available_questions}問, 最低必要{min_session_size}問")
+            session_size = len(selected_review_items)
+            if session_size == 0:
                 return render_template('error.html', 
-                                     error=f"復習問題が不足しています（{available_questions}問）。もう少し問題を解いてから復習してください。",
-                                     error_type="insufficient_review_questions")
+                                     error="復習対象の問題が見つかりません。新しい問題を解いて間違えることで復習リストが作成されます。",
+                                     error_type="no_filtered_questions")
             
-            logger.info(f"復習セッション問題数決定: 理想{target_session_size}問 → 実際{session_size}問（利用可能{available_questions}問）")
+            logger.info(f"復習セッション問題数決定: 理想{target_session_size}問 → 実際{session_size}問")
             
-            selected_review_items = review_questions_with_score[:session_size]
             review_questions = []
             
             # 問題データの安全な抽出
@@ -2479,16 +2179,13 @@ def review_quiz():
                                      error="復習問題の準備中に問題が発生しました。しばらく待ってから再度お試しください。",
                                      error_type="final_question_preparation_error")
             
-            logger.info(f"復習問題最終選択: 全{len(review_questions_with_score)}問中{len(review_questions)}問を弱点スコア順で選択")
+            logger.info(f"復習問題最終選択: {len(review_questions)}問を弱点の重み付きで選択")
             
-            # 上位問題のスコア情報をログ出力（安全な範囲）
+            # 上位問題の重みをログ出力（安全な範囲）
             for i, item in enumerate(selected_review_items[:min(5, len(selected_review_items))]):
                 try:
                     q_id = item.get('question', {}).get('id', 'unknown')
-                    score = item.get('weakness_score', 0)
-                    wrong = item.get('wrong_count', 0)
-                    total = item.get('total_attempts', 1)
-                    logger.info(f"  {i+1}位: 問題ID{q_id}, 弱点スコア{score:.1f}, 間違い{wrong}/{total}")
+                    logger.info(f"  {i+1}番目: 問題ID{q_id}, 重み{item.get('weight', 0)}")
                 except Exception as log_error:
                     logger.debug(f"ログ出力エラー: {log_error}")
             
@@ -2536,7 +2233,7 @@ def review_quiz():
                     session.permanent = False
                     
                     logger.info(f"復習セッション設定完了: {len(question_ids)}問, モード: {category_name}")
-                    logger.info(f"復習詳細: 弱点スコア順優先, 全部門対象, 問題ID={question_ids[:5] if question_ids else []}")
+                    logger.info(f"復習詳細: 弱点の重み付き抽出, 全部門対象, 問題ID={question_ids[:5] if question_ids else []}")
                     
                 except Exception as set_error:
                     logger.error(f"セッション変数設定エラー: {set_error}")
@@ -2615,9 +2312,8 @@ def create_review_test_data():
         from datetime import datetime, timedelta
         import random
         
-        # データディレクトリの設定
-        data_dir = os.path.dirname(DataConfig.QUESTIONS_CSV)
-        all_questions = load_rccm_data_files(data_dir)
+        # 問題バンクレジストリから取得
+        all_questions = load_questions()
         if not all_questions:
             return "問題データが見つかりません", 400
         
@@ -2657,6 +2353,7 @@ def create_review_test_data():
         
         # セッションに保存
         session['advanced_srs'] = srs_data
+        SRSDueQueue.invalidate(session)
         session['bookmarks'] = bookmarks
         session.modified = True
         
@@ -2681,6 +2378,7 @@ def clear_session_debug():
     try:
         # 復習関連データのみクリア
         session.pop('advanced_srs', None)
+        SRSDueQueue.invalidate(session)
         session.pop('bookmarks', None)
         session.pop('exam_question_ids', None)
         session.pop('exam_current', None)
@@ -2710,7 +2408,9 @@ def achievements():
         
         # 学習インサイト
         try:
-            insights = gamification_manager.get_study_insights(session) if gamification_manager else {}
+            insights = derived_cache.get_or_compute(
+                session, ('study_insights', date.today().isoformat()),
+                lambda: gamification_manager.get_study_insights(session)) if gamification_manager else {}
         except Exception as e:
             logger.error(f"ゲーミフィケーション状態取得エラー: {e}")
             insights = {}
@@ -2718,7 +2418,9 @@ def achievements():
         
         # 学習カレンダー
         try:
-            calendar_data = gamification_manager.generate_study_calendar(session) if gamification_manager else {}
+            calendar_data = derived_cache.get_or_compute(
+                session, ('study_calendar', None, date.today().isoformat()),
+                lambda: gamification_manager.generate_study_calendar(session)) if gamification_manager else {}
         except Exception as e:
             logger.error(f"学習カレンダー生成エラー: {e}")
             calendar_data = {}
@@ -2739,9 +2441,13 @@ def achievements():
 def study_calendar():
     """学習カレンダー画面"""
     try:
-        calendar_data = gamification_manager.generate_study_calendar(session, months=6)
+        calendar_data = derived_cache.get_or_compute(
+            session, ('study_calendar', 6, date.today().isoformat()),
+            lambda: gamification_manager.generate_study_calendar(session, months=6))
         try:
-            insights = gamification_manager.get_study_insights(session) if gamification_manager else {}
+            insights = derived_cache.get_or_compute(
+                session, ('study_insights', date.today().isoformat()),
+                lambda: gamification_manager.get_study_insights(session)) if gamification_manager else {}
         except Exception as e:
             logger.error(f"ゲーミフィケーション状態取得エラー: {e}")
             insights = {}
@@ -2767,25 +2473,26 @@ def ai_analysis():
         # 部門フィルタを取得
         department_filter = request.args.get('department')
         
-        # AI分析実行（部門別）
+        # AI分析実行（部門別、状態が変わるまでキャッシュ）
         try:
-            analysis_result = ai_analyzer.analyze_weak_areas(session, department_filter) if ai_analyzer else {}
+            analysis_result = derived_cache.get_or_compute(
+                session, ('ai_analysis', department_filter),
+                lambda: ai_analyzer.analyze_weak_areas(session, department_filter)) if ai_analyzer else {}
         except Exception as e:
             logger.error(f"AI分析エラー: {e}")
             analysis_result = {}
         
         # 推奨学習モード取得
-        recommended_mode = adaptive_engine.get_learning_mode_recommendation(session, analysis_result)
+        recommended_mode = derived_cache.get_or_compute(
+            session, ('learning_mode', department_filter),
+            lambda: adaptive_engine.get_learning_mode_recommendation(session, analysis_result))
         
         # 利用可能な部門リスト
         available_departments = {}
-        history = session.get('history', [])
-        for entry in history:
-            dept = entry.get('department')
-            if dept and dept in LIGHTWEIGHT_DEPARTMENT_MAPPING:
-                if dept not in available_departments:
-                    available_departments[dept] = {'count': 0, 'name': LIGHTWEIGHT_DEPARTMENT_MAPPING[dept]['name']}
-                available_departments[dept]['count'] += 1
+        department_counts = StatisticsService.get_rollup_counts(SessionService.get_history_rollup(), 'department')
+        for dept, (count, _, _) in department_counts.items():
+            if dept in LIGHTWEIGHT_DEPARTMENT_MAPPING:
+                available_departments[dept] = {'count': count, 'name': LIGHTWEIGHT_DEPARTMENT_MAPPING[dept]}
         
         return render_template(
             'ai_analysis.html',
@@ -2955,8 +2662,9 @@ def learner_insights():
     try:
         department = request.args.get('department', session.get('selected_department', ''))
         
-        # 学習者インサイト取得
-        insights = adaptive_engine.get_learner_insights(session, department)
+        # 学習者インサイト取得（状態が変わるまでキャッシュ）
+        insights = derived_cache.get_or_compute(
+            session, ('learner_insights', department), lambda: adaptive_engine.get_learner_insights(session, department))
         
         # 部門情報
         departments = LIGHTWEIGHT_DEPARTMENT_MAPPING
@@ -3012,15 +2720,17 @@ def learning_optimization():
 def learning_plan():
     """個人学習プラン画面"""
     try:
-        # AI分析実行
-        analysis_result = ai_analyzer.analyze_weak_areas(session)
+        # AI分析実行（/ai_analysis の部門指定なしと共有）
+        analysis_result = derived_cache.get_or_compute(
+            session, ('ai_analysis', None), lambda: ai_analyzer.analyze_weak_areas(session))
         
         # 学習プラン詳細
         learning_plan = analysis_result.get('learning_plan', {})
         weak_areas = analysis_result.get('weak_areas', {})
         
         # 推奨スケジュール生成
-        schedule = generate_weekly_schedule(learning_plan, weak_areas)
+        schedule = derived_cache.get_or_compute(
+            session, ('learning_plan',), lambda: generate_weekly_schedule(learning_plan, weak_areas))
         
         return render_template(
             'learning_plan.html',
@@ -3427,10 +3137,8 @@ def admin_api_reports(report_type):
 def admin_api_refresh():
     """データ更新API"""
     try:
-        # キャッシュをクリア
-        global _questions_cache, _cache_timestamp
-        _questions_cache = None
-        _cache_timestamp = None
+        # 問題バンクを再構築
+        clear_questions_cache()
         
         # 新しい管理者ダッシュボードインスタンスを作成
         from admin_dashboard import AdminDashboard
@@ -3757,27 +3465,35 @@ try:
     # 環境変数で読み込み方式を選択（デフォルト: 高速化モード）
     fast_mode = os.environ.get('RCCM_FAST_MODE', 'true').lower() == 'true'
     
+    # 学習進捗ストア（SQLite）: 従来モードの自動保存・読み込みでも使うため両モードで初期化
+    try:
+        from data_manager import DataManager, SessionDataManager, EnterpriseUserManager
+
+        data_manager = DataManager()
+        session_data_manager = SessionDataManager(data_manager)
+        enterprise_user_manager = EnterpriseUserManager(data_manager)
+        logger.info("[DATA_MANAGER] Progress store initialized")
+    except Exception as store_error:
+        logger.warning(f"[DATA_MANAGER] Progress store unavailable: {store_error}")
+        # フォールバック: 基本機能のみで継続
+        data_manager = None
+        session_data_manager = None
+        enterprise_user_manager = None
+
     if fast_mode:
         # 高速化モード: 遅延インポートでデータ管理初期化
         logger.info("[ENTERPRISE] High-speed mode: Enterprise data loading started")
         
         # 遅延インポート: データ管理 (Ultra Sync Safe Fallback)
         try:
-            from data_manager import DataManager, SessionDataManager, EnterpriseUserManager
             from utils import enterprise_data_manager as edm
 
             # グローバル変数に代入
-            data_manager = DataManager()
-            session_data_manager = SessionDataManager(data_manager)
-            enterprise_user_manager = EnterpriseUserManager(data_manager)
             enterprise_data_manager = edm
             logger.info("[DATA_MANAGER] Enterprise data management modules loaded successfully")
         except ImportError as import_error:
             logger.warning(f"[DATA_MANAGER] Optional module not found: {import_error}")
             # フォールバック: 基本機能のみで継続
-            data_manager = None
-            session_data_manager = None
-            enterprise_user_manager = None
             enterprise_data_manager = None
         
         # 遅延インポート: 機能モジュール (オプション)
@@ -0,0 +1,98 @@
+"""
+CP932クリーニング（utils.clean_unicode_for_cp932）のベンチマーク
+- 従来方式: 12回の str.replace + 1文字ずつ encode('cp932') を試して連結
+- 現行方式: encode(strict) による一括チェック + str.translate 1回
+
+data/ の全ソースCSVの問題文・選択肢・解説を対象に、出力の一致と処理時間を比較します。
+
+使い方:
+    python benchmark_cp932_cleaning.py
+    python benchmark_cp932_cleaning.py --data-dir data --repeat 5
+"""
+import argparse
+import csv
+import io
+import logging
+import os
+import sys
+import time
+
+from services.bank_snapshot import get_source_files
+from services.encoding_manifest import read_text
+from utils import CP932_REPLACEMENTS, _CP932_TABLE, clean_unicode_for_cp932
+
+TEXT_FIELDS = ('question', 'option_a', 'option_b', 'option_c', 'option_d', 'explanation')
+
+
+def clean_unicode_for_cp932_legacy(text):
+    """従来の実装（比較用）"""
+    if not text:
+        return text
+
+    cleaned_text = text
+    for problematic_char, replacement in CP932_REPLACEMENTS.items():
+        cleaned_text = cleaned_text.replace(problematic_char, replacement)
+
+    result = ""
+    for char in cleaned_text:
+        try:
+            char.encode('cp932')
+            result += char
+        except UnicodeEncodeError:
+            result += '?'
+    return result
+
+
+def load_fields(data_dir):
+    """全ソースCSVのテキストフィールドを読み込む（validate_question_data と同じく strip 済み）"""
+    texts = []
+    for filename, _, _ in get_source_files(data_dir):
+        path = os.path.join(data_dir, filename)
+        if not os.path.exists(path):
+            continue
+        text, _ = read_text(path)
+        for row in csv.DictReader(io.StringIO(text, newline='')):
+            for field in TEXT_FIELDS:
+                texts.append(str(row.get(field) or '').strip())
+    return texts
+
+
+def time_all(func, texts, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CP932クリーニングのベンチマーク')
+    parser.add_argument('--data-dir', default='data', help='データディレクトリ')
+    parser.add_argument('--repeat', type=int, default=3, help='繰り返し回数（最良値を採用）')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    texts = load_fields(args.data_dir)
+    total_chars = sum(len(text) for text in texts)
+
+    print('=== CP932 Cleaning Benchmark ===\n')
+    print(f'対象: {len(texts)}フィールド / {total_chars:,}文字')
+
+    mismatches = [text for text in texts if clean_unicode_for_cp932(text) != clean_unicode_for_cp932_legacy(text)]
+    print(f'出力の不一致: {len(mismatches)}')
+    changed = sum(1 for text in texts if clean_unicode_for_cp932(text) is not text)
+    print(f'置換が必要だったフィールド: {changed}')
+    print(f'エンコード不可としてキャッシュされた文字: {sorted(_CP932_TABLE.unencodable)}')
+
+    legacy_seconds = time_all(clean_unicode_for_cp932_legacy, texts, args.repeat)
+    current_seconds = time_all(clean_unicode_for_cp932, texts, args.repeat)
+    print(f'\n従来方式: {legacy_seconds * 1000:8.1f}ms ({legacy_seconds / len(texts) * 1e6:.2f}µs/フィールド)')
+    print(f'現行方式: {current_seconds * 1000:8.1f}ms ({current_seconds / len(texts) * 1e6:.2f}µs/フィールド)')
+    print(f'高速化: {legacy_seconds / current_seconds:.1f}倍')
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
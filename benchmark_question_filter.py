@@ -0,0 +1,92 @@
+"""
+出題選択（複数条件の絞り込み + 無作為抽出）のベンチマーク
+- 従来方式: 全問題を条件で走査 → シャッフル → 先頭k件
+- ビットセット方式: QuestionIndex.mask() の AND / ANDNOT → sample()
+
+問題数を増やしてもビットセット方式のセッション作成コストがほぼ一定であることを確認します。
+
+使い方:
+    python benchmark_question_filter.py
+    python benchmark_question_filter.py --sizes 5000 50000 200000 --repeat 200
+"""
+import argparse
+import random
+import sys
+import time
+
+from services.question_index import QuestionIndex
+
+CATEGORIES = ['道路', 'トンネル', '河川、砂防及び海岸・海洋', '都市計画及び地方計画', '造園',
+              '建設環境', '鋼構造及びコンクリート', '土質及び基礎', '施工計画、施工設備及び積算',
+              '上水道及び工業用水道', '森林土木', '農業土木']
+YEARS = list(range(2008, 2020))
+SESSION_SIZE = 10
+
+
+def build_questions(size, seed=0):
+    """合成問題バンクを作成（基礎科目2割・専門科目8割）"""
+    rng = random.Random(seed)
+    questions = []
+    for i in range(size):
+        if rng.random() < 0.2:
+            questions.append({'id': 1000001 + i, 'question_type': 'basic', 'category': '共通', 'year': None})
+        else:
+            questions.append({'id': 2000001 + i, 'question_type': 'specialist',
+                              'category': rng.choice(CATEGORIES), 'year': rng.choice(YEARS)})
+    return questions
+
+
+def select_linear(questions, category, year, exclude_ids):
+    """従来方式: 線形走査 + シャッフル"""
+    candidates = [q for q in questions
+                  if q['question_type'] == 'specialist' and q.get('year')
+                  and q['category'] == category and q['year'] == year
+                  and q['id'] not in exclude_ids]
+    random.shuffle(candidates)
+    return candidates[:SESSION_SIZE]
+
+
+def select_bitset(index, category, year, exclude_ids):
+    """ビットセット方式: AND / ANDNOT + k個のビットを抽出"""
+    available = index.mask(question_type='specialist', has_year=True)
+    available &= index.mask(category=category)
+    available &= index.mask(question_type='specialist', year=year)
+    available &= ~index.mask_of_ids(exclude_ids)
+    return index.sample(available, SESSION_SIZE)
+
+
+def time_per_call(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='出題選択のベンチマーク')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5000, 20000, 50000], help='問題数')
+    parser.add_argument('--repeat', type=int, default=100, help='1条件あたりの繰り返し回数')
+    args = parser.parse_args()
+
+    print('=== Question Filter Benchmark ===')
+    print(f"{'問題数':>8} {'線形走査(µs)':>14} {'ビットセット(µs)':>16} {'倍率':>7}")
+    for size in args.sizes:
+        questions = build_questions(size)
+        index = QuestionIndex(questions)
+        exclude_ids = [q['id'] for q in random.sample(questions, 5)]
+
+        # 初回のビットセット作成（索引構築時の一度きりのコスト）を計測から除外
+        for category in CATEGORIES:
+            select_bitset(index, category, YEARS[0], exclude_ids)
+        for year in YEARS:
+            select_bitset(index, CATEGORIES[0], year, exclude_ids)
+
+        category, year = '道路', 2015
+        linear_us = time_per_call(lambda: select_linear(questions, category, year, exclude_ids), args.repeat)
+        bitset_us = time_per_call(lambda: select_bitset(index, category, year, exclude_ids), args.repeat)
+        print(f'{size:>8} {linear_us:>14.1f} {bitset_us:>16.1f} {linear_us / bitset_us:>6.1f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
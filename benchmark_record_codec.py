@@ -0,0 +1,130 @@
+"""
+学習記録のコンパクト符号化のベンチマーク
+- 往復検証: 履歴・SRSデータ（旧形式・不明項目を含む）を符号化 → 復元して元と一致すること
+- サイズ: タグ付きJSONとコンパクト形式のバイト数
+- 復元時間: 値の復元、およびセッション読み込み（JSONの全復元 / コンパクト形式の遅延復元）
+
+使い方:
+    python benchmark_record_codec.py
+    python benchmark_record_codec.py --history 300 --srs 2000 --repeat 200
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from services.record_codec import HISTORY_SCHEMA, SRS_SCHEMA, decode_records, encode_records
+from services.session_store import ServerSideSession, dumps_item, dumps_value, loads_value
+
+CATEGORIES = ['共通', '道路', 'トンネル', '河川、砂防及び海岸・海洋', '都市計画及び地方計画', '土質及び基礎']
+DEPARTMENTS = ['road', 'tunnel', 'river', 'urban', 'soil', '']
+
+
+def build_history(size, rng):
+    """合成の回答履歴（旧形式の項目欠け・スキーマ外の記録を含む）"""
+    start = datetime(2026, 4, 1, 9, 0, 0)
+    history = []
+    for i in range(size):
+        entry = {
+            'id': 1000001 + rng.randrange(20000),
+            'category': rng.choice(CATEGORIES),
+            'question_type': rng.choice(['basic', 'specialist']),
+            'department': rng.choice(DEPARTMENTS),
+            'is_correct': rng.random() < 0.6,
+            'user_answer': rng.choice('ABCD'),
+            'correct_answer': rng.choice('ABCD'),
+            'elapsed': round(rng.uniform(3, 120), 1),
+            'date': (start + timedelta(minutes=3 * i)).strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        if i % 40 == 0:
+            # user-015以前の記録（部門・回答時間なし）
+            del entry['department'], entry['elapsed']
+        history.append(entry)
+    history.insert(size // 2, {'question_id': '4-1-12', 'is_correct': False, 'file_source': '4-1.csv'})
+    return history
+
+
+def build_srs(size, rng):
+    """合成のSRSデータ（回答画面形式とSRSService形式の混在）"""
+    srs = {}
+    for i in range(size):
+        moment = datetime(2026, 4, 1) + timedelta(seconds=rng.randrange(200 * 86400), microseconds=rng.randrange(10 ** 6))
+        if i % 2:
+            srs[str(1000001 + i)] = {
+                'level': rng.randint(1, 5), 'next_review': moment.isoformat(), 'incorrect_count': rng.randint(1, 9),
+                'added_date': moment.strftime('%Y-%m-%d %H:%M:%S'),
+                'question_type': rng.choice(['basic', 'specialist']), 'category': rng.choice(CATEGORIES),
+            }
+        else:
+            srs[str(1000001 + i)] = {
+                'correct_count': rng.randint(0, 5), 'wrong_count': rng.randint(0, 5), 'total_attempts': rng.randint(1, 10),
+                'first_attempt': moment.isoformat(), 'last_attempt': moment.isoformat(), 'mastered': rng.random() < 0.2,
+                'difficulty_level': rng.choice([5, 4.5, 6.0, 7, 2.5]), 'next_review': moment.isoformat(),
+                'interval_days': rng.randint(1, 60),
+            }
+    srs['legacy-key'] = {'level': 1, 'note': 'スキーマ外'}
+    return srs
+
+
+def same_types(left, right):
+    """値だけでなく型（bool / int / float）も一致するか"""
+    if type(left) is not type(right):
+        return False
+    if isinstance(left, dict):
+        return left.keys() == right.keys() and all(same_types(left[k], right[k]) for k in left)
+    if isinstance(left, list):
+        return len(left) == len(right) and all(same_types(a, b) for a, b in zip(left, right))
+    return left == right
+
+
+def time_per_call(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description='学習記録のコンパクト符号化のベンチマーク')
+    parser.add_argument('--history', type=int, default=300, help='履歴件数（SessionService.HISTORY_LIMIT相当）')
+    parser.add_argument('--srs', type=int, default=1000, help='SRSデータの問題数')
+    parser.add_argument('--repeat', type=int, default=100, help='繰り返し回数')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    values = {'history': build_history(args.history, rng), 'advanced_srs': build_srs(args.srs, rng)}
+    schemas = {'history': HISTORY_SCHEMA, 'advanced_srs': SRS_SCHEMA}
+    failed = False
+
+    print('=== Record Codec Benchmark ===\n')
+    print(f"{'キー':<14} {'JSON(B)':>9} {'コンパクト(B)':>14} {'縮小':>6} {'JSON復元(ms)':>13} {'コンパクト復元(ms)':>19} {'往復':>5}")
+    for name, value in values.items():
+        schema = schemas[name]
+        json_data = dumps_value(value)
+        compact_data = encode_records(schema, value)
+        ok = same_types(decode_records(schema, compact_data), value)
+        failed |= not ok
+        json_ms = time_per_call(lambda: loads_value(json_data), args.repeat)
+        compact_ms = time_per_call(lambda: decode_records(schema, compact_data), args.repeat)
+        print(f'{name:<14} {len(json_data):>9} {len(compact_data):>14} {len(json_data) / len(compact_data):>5.1f}x '
+              f'{json_ms:>13.2f} {compact_ms:>19.2f} {"OK" if ok else "NG":>5}')
+
+    # セッション読み込み（履歴・SRSに触れないリクエスト）
+    session_values = dict(values, session_id='0' * 32, _permanent=True, exam_current=3,
+                          exam_question_ids=list(range(1000001, 1000011)), bookmarks=['1000002'])
+    json_raw = {key: dumps_value(value) for key, value in session_values.items()}
+    compact_raw = {key: dumps_item(key, value) for key, value in session_values.items()}
+    json_open_ms = time_per_call(lambda: {key: loads_value(data) for key, data in json_raw.items()}, args.repeat)
+    lazy_open_ms = time_per_call(lambda: ServerSideSession.from_raw('sid', compact_raw, 0).get('exam_current'),
+                                 args.repeat)
+    print('\n=== セッション読み込み（履歴・SRSに触れないリクエスト）===')
+    print(f'JSON全復元:         {json_open_ms:8.3f}ms')
+    print(f'コンパクト遅延復元: {lazy_open_ms:8.3f}ms ({json_open_ms / lazy_open_ms:.0f}倍)')
+
+    print('\n結果:', 'NG' if failed else 'OK')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
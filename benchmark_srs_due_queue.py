@@ -0,0 +1,106 @@
+"""
+復習期限キューのベンチマーク
+- 一致検証: 全件走査（next_review のISO文字列を毎回解析）と同じ優先度・件数になること
+- 参照時間: 復習対象の優先度上位・期限切れ件数を全件走査 / 期限順の索引で求める時間
+- 更新時間: 1問の回答ごとに索引を更新する時間
+
+使い方:
+    python benchmark_srs_due_queue.py
+    python benchmark_srs_due_queue.py --srs 10000 --repeat 200
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from services.srs_due_queue import SRSDueQueue
+
+
+def build_srs(size, rng, now):
+    """合成のSRSデータ（期限切れ・未来・マスター済み・日時エラーの混在）"""
+    srs = {}
+    for i in range(size):
+        next_review = now + timedelta(days=rng.uniform(-30, 60))
+        srs[str(1000001 + i)] = {
+            'correct_count': rng.randint(0, 5), 'wrong_count': rng.randint(0, 5), 'total_attempts': rng.randint(1, 10),
+            'mastered': rng.random() < 0.15, 'difficulty_level': rng.choice([2.5, 4.5, 5, 6.0, 7]),
+            'next_review': next_review.isoformat() if i % 97 else 'invalid', 'interval_days': rng.randint(1, 60),
+        }
+    return srs
+
+
+def scan_top(srs_data, limit, now):
+    """従来の全件走査（SRSService.get_due_review_questions の旧実装）"""
+    due_questions = []
+    for qid, data in srs_data.items():
+        if data.get('mastered', False):
+            continue
+        try:
+            next_review = datetime.fromisoformat(data['next_review'])
+            if next_review <= now:
+                wrong_ratio = data['wrong_count'] / max(1, data['total_attempts'])
+                due_questions.append((qid, (wrong_ratio * 100) + (now - next_review).days + data['difficulty_level']))
+        except (ValueError, KeyError):
+            due_questions.append((qid, 999))
+    due_questions.sort(key=lambda x: x[1], reverse=True)
+    return due_questions[:limit], len(due_questions)
+
+
+def time_per_call(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description='復習期限キューのベンチマーク')
+    parser.add_argument('--srs', type=int, default=5000, help='SRSデータの問題数')
+    parser.add_argument('--limit', type=int, default=50, help='優先度上位の取得件数')
+    parser.add_argument('--repeat', type=int, default=100, help='繰り返し回数')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    now = datetime.now()
+    now_ts = now.timestamp()
+    srs = build_srs(args.srs, rng, now)
+    queue = SRSDueQueue.from_srs(srs)
+
+    expected, expected_due = scan_top(srs, args.limit, now)
+    actual = queue.top(args.limit, now_ts)
+    ok = ([priority for _, priority in expected] == [priority for _, priority in actual]
+          and expected_due == queue.due_count(now_ts))
+
+    # 回答1問ごとの更新（期限を先へ送る。record_change が索引に行う処理）が
+    # 全件から作り直した索引と一致すること
+    qids = rng.sample(sorted(srs), min(args.repeat, len(srs)))
+
+    def update_one():
+        qid = qids.pop()
+        old = dict(srs[qid])
+        srs[qid]['next_review'] = (now + timedelta(days=rng.randint(1, 30))).isoformat()
+        queue.replace(qid, old, srs[qid])
+
+    update_ms = time_per_call(update_one, len(qids))
+    ok &= queue.entries == SRSDueQueue.from_srs(srs).entries
+
+    scan_ms = time_per_call(lambda: scan_top(srs, args.limit, now), args.repeat)
+    top_ms = time_per_call(lambda: queue.top(args.limit, now_ts), args.repeat)
+    count_ms = time_per_call(lambda: queue.due_count(now_ts), args.repeat)
+    build_ms = time_per_call(lambda: SRSDueQueue.from_srs(srs), max(1, args.repeat // 10))
+
+    print('=== SRS Due Queue Benchmark ===\n')
+    print(f'問題数: {len(srs)}  期限切れ: {queue.due_count(now_ts)}  上位: {args.limit}')
+    print(f'全件走査（上位N件）:   {scan_ms:8.3f}ms')
+    print(f'索引（上位N件）:       {top_ms:8.3f}ms ({scan_ms / top_ms:.0f}倍)')
+    print(f'索引（期限切れ件数）:  {count_ms * 1e3:8.3f}us')
+    print(f'索引の更新（1問）:     {update_ms:8.3f}ms')
+    print(f'索引の作成（初回のみ）: {build_ms:8.3f}ms')
+
+    print('\n結果:', 'OK' if ok else 'NG')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+SRS一括計算エンジンのベンチマーク
+- 一致検証: 同じ記録（複数ユーザー）で NumPy の配列演算と純Pythonの計算が同じ次回間隔・
+  復習期限・統計・再計算結果（変更した行と書き戻した記録）になること
+- 計算時間: 配列の作成・再計算・統計を NumPy / 純Python で行う時間
+
+NumPy がない環境では純Pythonの時間のみを表示します（一致検証は行いません）。
+
+使い方:
+    python benchmark_srs_engine.py
+    python benchmark_srs_engine.py --users 200 --srs 2000 --intervals 1,2,5,12,30,90
+"""
+import argparse
+import copy
+import math
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from reschedule_srs import parse_intervals
+from services.srs_engine import NUMPY_AVAILABLE, SRSBatch
+from services.srs_service import SRSService
+
+
+def build_records(users, size, rng, now):
+    """合成のSRS状態（期限切れ・未来・マスター済み・日時エラー・対象外の混在）"""
+    records = []
+    for u in range(users):
+        user_id = f'user{u:05d}'
+        for i in range(size):
+            last_attempt = now - timedelta(days=rng.uniform(0, 90))
+            interval = rng.randint(1, 60)
+            data = {
+                'correct_count': rng.randint(0, 7), 'wrong_count': rng.randint(0, 12),
+                'total_attempts': rng.randint(1, 20), 'difficulty_level': rng.choice([2.5, 4.5, 5, 6.0, 7]),
+                'mastered': rng.random() < 0.15, 'interval_days': interval,
+                'last_attempt': last_attempt.isoformat(),
+                'next_review': (last_attempt + timedelta(days=interval)).isoformat() if i % 97 else 'invalid',
+            }
+            if i % 211 == 0:
+                del data['total_attempts']
+            records.append((user_id, str(1000001 + i), data))
+    return records
+
+
+def run(records, intervals, now_ts, vectorized):
+    """1つの計算エンジンで全件を処理（記録は複製して使う）"""
+    batch = SRSBatch.from_records(copy.deepcopy(records), vectorized=vectorized)
+    result = {
+        'intervals': [int(x) for x in batch.next_intervals(intervals)],
+        'due': [bool(x) for x in batch.due_mask(now_ts)],
+    }
+    result['rows'] = [int(i) for i in batch.reschedule(intervals)]
+    result['updated'] = batch.apply(result['rows'])
+    result['statistics'] = batch.statistics(now_ts)
+    return result
+
+
+def same_statistics(a, b):
+    return all(math.isclose(a[key], b[key], rel_tol=1e-12) if isinstance(a[key], float) else a[key] == b[key]
+               for key in a)
+
+
+def time_once(records, intervals, now_ts, vectorized):
+    records = copy.deepcopy(records)
+    start = time.perf_counter()
+    batch = SRSBatch.from_records(records, vectorized=vectorized)
+    built = time.perf_counter()
+    batch.apply(batch.reschedule(intervals))
+    batch.statistics(now_ts)
+    return (built - start) * 1e3, (time.perf_counter() - built) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SRS一括計算エンジンのベンチマーク')
+    parser.add_argument('--users', type=int, default=50, help='ユーザー数')
+    parser.add_argument('--srs', type=int, default=1000, help='ユーザーあたりの問題数')
+    parser.add_argument('--intervals', type=parse_intervals, default=[1, 2, 5, 12, 30, 90],
+                        help=f'再計算に使う基本間隔（現在: {SRSService.BASE_INTERVALS}）')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    now = datetime.now()
+    now_ts = now.timestamp()
+    records = build_records(args.users, args.srs, rng, now)
+
+    print('=== SRS Batch Engine Benchmark ===\n')
+    print(f'記録数: {len(records)}（{args.users}ユーザー × {args.srs}問）  基本間隔: {args.intervals}')
+
+    python_build, python_calc = time_once(records, args.intervals, now_ts, vectorized=False)
+    print(f'純Python: 作成 {python_build:8.1f}ms  再計算・書き戻し・統計 {python_calc:8.1f}ms')
+
+    if not NUMPY_AVAILABLE:
+        print('\nNumPy がないため一致検証は行いません')
+        return 0
+
+    numpy_build, numpy_calc = time_once(records, args.intervals, now_ts, vectorized=True)
+    print(f'NumPy:    作成 {numpy_build:8.1f}ms  再計算・書き戻し・統計 {numpy_calc:8.1f}ms '
+          f'({python_calc / numpy_calc:.0f}倍)')
+
+    expected = run(records, args.intervals, now_ts, vectorized=False)
+    actual = run(records, args.intervals, now_ts, vectorized=True)
+    checks = {
+        '次回間隔': expected['intervals'] == actual['intervals'],
+        '復習期限': expected['due'] == actual['due'],
+        '変更した行': expected['rows'] == actual['rows'],
+        '書き戻した記録': expected['updated'] == actual['updated'],
+        '統計': same_statistics(expected['statistics'], actual['statistics']),
+    }
+    print(f"\n変更した記録: {len(expected['rows'])}  統計: {expected['statistics']}")
+    for name, matched in checks.items():
+        print(f"  {name}: {'一致' if matched else '不一致'}")
+
+    ok = all(checks.values())
+    print('\n結果:', 'OK' if ok else 'NG')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+重み付き復習問題抽出のベンチマーク
+- 分布検証: 1問を抽出したときの各問題の出現率が重みの比率に一致すること
+- 抽出時間: IDを重みの回数だけ複製してシャッフル / フェンウィック木から k 問を抽出
+- 更新時間: 1問の重みを変更する時間
+
+使い方:
+    python benchmark_weighted_sampler.py
+    python benchmark_weighted_sampler.py --srs 10000 --k 10 --repeat 200
+"""
+import argparse
+import random
+import sys
+import time
+from collections import Counter
+
+from services.weighted_sampler import FenwickSampler, review_weight
+
+
+def build_weights(size, rng):
+    """SRSService形式の合成データから重みを求める"""
+    return [review_weight({'wrong_count': rng.randint(0, 10), 'total_attempts': 10,
+                           'difficulty_level': rng.choice([2.5, 5, 7.5, 10])}) for _ in range(size)]
+
+
+def replicated_list(weights, rng):
+    """従来の方式（IDを重みの回数だけ複製してシャッフル）"""
+    items = []
+    for index, weight in enumerate(weights):
+        items.extend([index] * weight)
+    rng.shuffle(items)
+    return items
+
+
+def time_per_call(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description='重み付き復習問題抽出のベンチマーク')
+    parser.add_argument('--srs', type=int, default=5000, help='問題数')
+    parser.add_argument('--k', type=int, default=10, help='抽出数（/exam/review は10問）')
+    parser.add_argument('--repeat', type=int, default=100, help='繰り返し回数')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    weights = build_weights(args.srs, rng)
+    sampler = FenwickSampler(list(weights))
+
+    # 分布検証（少数の要素で十分な回数を抽出）
+    small = FenwickSampler([1, 2, 3, 14])
+    counts = Counter(small.sample(1, rng)[0] for _ in range(40000))
+    ok = all(abs(counts[i] / 40000 - weight / 20) < 0.01 for i, weight in enumerate([1, 2, 3, 14]))
+
+    drawn = sampler.sample(args.k, rng)
+    ok &= len(set(drawn)) == len(drawn) == args.k and sampler.tree == FenwickSampler(list(weights)).tree
+
+    replicate_ms = time_per_call(lambda: replicated_list(weights, rng), max(1, args.repeat // 10))
+    sample_ms = time_per_call(lambda: sampler.sample(args.k, rng), args.repeat)
+    update_ms = time_per_call(lambda: sampler.update(rng.randrange(args.srs), rng.randint(1, 20)), args.repeat)
+
+    print('=== Weighted Sampler Benchmark ===\n')
+    print(f'問題数: {args.srs}  重み合計: {sampler.total}  抽出数: {args.k}')
+    print(f'複製+シャッフル:     {replicate_ms:8.3f}ms')
+    print(f'フェンウィック木抽出: {sample_ms:8.3f}ms ({replicate_ms / sample_ms:.0f}倍)')
+    print(f'重みの更新（1問）:   {update_ms * 1e3:8.3f}us')
+
+    print('\n結果:', 'OK' if ok else 'NG')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
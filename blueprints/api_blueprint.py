@@ -9,6 +9,9 @@ Phase 6 Refactoring - API Routes Modularization
 from flask import Blueprint, request, jsonify, session
 import logging
 
+from helpers.decorators import rate_limit
+from services.question_bank import question_bank
+
 logger = logging.getLogger(__name__)
 
 # Blueprint作成
@@ -20,6 +23,7 @@ api_bp = Blueprint('api', __name__, url_prefix='/api')
 # =============================================================================
 
 @api_bp.route('/bookmark', methods=['POST'])
+@rate_limit('api')
 def bookmark_question():
     """
     問題のブックマーク機能（JSON API）
@@ -68,6 +72,7 @@ def get_bookmarks():
 
 
 @api_bp.route('/bookmark', methods=['DELETE'])
+@rate_limit('api')
 def remove_bookmark():
     """
     復習リストから問題を除外（JSON API）
@@ -102,6 +107,7 @@ def remove_bookmark():
 # =============================================================================
 
 @api_bp.route('/review/questions', methods=['POST'])
+@rate_limit('api')
 def get_review_questions():
     """
     復習リストの問題詳細を一括取得（JSON API）
@@ -109,27 +115,22 @@ def get_review_questions():
     🎯 PHASE 7 REFACTORING: app.pyから移動
     """
     try:
-        # 循環インポート回避のためローカルインポート
-        from app import load_questions
-
         data = request.get_json()
         question_ids = data.get('question_ids', [])
 
         if not question_ids:
             return jsonify({'questions': []})
 
-        questions = load_questions()
+        index = question_bank.index()
         review_questions = []
 
-        for qid in question_ids:
-            question = next((q for q in questions if int(q.get('id', 0)) == int(qid)), None)
-            if question:
-                review_questions.append({
-                    'id': question.get('id'),
-                    'category': question.get('category'),
-                    'question': question.get('question')[:100] + '...' if len(question.get('question', '')) > 100 else question.get('question'),
-                    'difficulty': question.get('difficulty', '標準')
-                })
+        for question in index.resolve(question_ids):
+            review_questions.append({
+                'id': question.get('id'),
+                'category': question.get('category'),
+                'question': question.get('question')[:100] + '...' if len(question.get('question', '')) > 100 else question.get('question'),
+                'difficulty': question.get('difficulty', '標準')
+            })
 
         return jsonify({'questions': review_questions})
 
@@ -139,6 +140,7 @@ def get_review_questions():
 
 
 @api_bp.route('/review/remove', methods=['POST'])
+@rate_limit('api')
 def remove_from_review():
     """
     復習リストから問題を削除（JSON API）
@@ -168,6 +170,7 @@ def remove_from_review():
 
 
 @api_bp.route('/review/bulk_remove', methods=['POST'])
+@rate_limit('api')
 def bulk_remove_from_review():
     """
     復習リストから複数問題を削除（JSON API）
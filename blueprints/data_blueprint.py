@@ -9,6 +9,8 @@ Phase 8 Refactoring - Data Export & Cache API Routes
 from flask import Blueprint, request, jsonify, session
 import logging
 
+from services.question_bank import question_bank
+
 logger = logging.getLogger(__name__)
 
 # Blueprint作成
@@ -28,12 +30,17 @@ def export_data():
     """
     try:
         # 循環インポート回避のためローカルインポート
-        from app import data_manager
+        from app import data_manager, session_data_manager
+
+        if data_manager is None:
+            return jsonify({'error': '学習進捗ストアが利用できません'}), 503
 
         session_id = session.get('session_id')
         if not session_id:
             return jsonify({'error': 'セッションが見つかりません'}), 400
 
+        # 未保存の回答記録を書いてから、セッションIDの索引で読み出す
+        session_data_manager.auto_save_trigger(session, session_id, session.get('user_name'))
         export_data = data_manager.get_data_export(session_id)
         if export_data:
             return jsonify(export_data)
@@ -66,3 +73,26 @@ def clear_cache():
     except Exception as e:
         logger.error(f"キャッシュクリアエラー: {e}")
         return jsonify({'error': 'キャッシュクリアに失敗しました'}), 500
+
+
+@data_bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """
+    問題バンク・キャッシュ・セッション書き込み・ユーザーロック・レート制限・分析画面キャッシュの統計情報（JSON API）
+    """
+    try:
+        # 循環インポート回避のためローカルインポート
+        from app import derived_cache, math_filter, rate_limiter, session_store, user_lock
+
+        return jsonify({
+            'question_bank': question_bank.stats(),
+            'math_filter': math_filter.stats(),
+            'session': session_store.stats(),
+            'user_lock': user_lock.stats(),
+            'rate_limit': rate_limiter.stats(),
+            'derived_views': derived_cache.stats(),
+        })
+
+    except Exception as e:
+        logger.error(f"キャッシュ統計取得エラー: {e}")
+        return jsonify({'error': 'キャッシュ統計の取得に失敗しました'}), 500
@@ -9,6 +9,8 @@ Phase 11 Refactoring - Mobile API Routes
 from flask import Blueprint, request, jsonify, session
 import logging
 
+from services.question_bank import question_bank
+
 logger = logging.getLogger(__name__)
 
 # Blueprint作成
@@ -112,10 +114,9 @@ def mobile_optimized_question(question_id):
     """
     try:
         # 循環インポート回避のためローカルインポート
-        from app import load_questions, mobile_manager
+        from app import mobile_manager
 
-        questions = load_questions()
-        question = next((q for q in questions if int(q.get('id', 0)) == question_id), None)
+        question = question_bank.get_question(question_id)
 
         if not question:
             return jsonify({'error': '問題が見つかりません'}), 404
@@ -137,9 +138,9 @@ def mobile_cache_questions():
     """
     try:
         # 循環インポート回避のためローカルインポート
-        from app import load_questions, mobile_manager
+        from app import mobile_manager
 
-        questions = load_questions()
+        questions = question_bank.questions()
         cache_data = mobile_manager.generate_mobile_cache_data(questions)
         return jsonify(cache_data)
 
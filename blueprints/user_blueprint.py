@@ -29,7 +29,7 @@ def api_users_list():
     """
     try:
         # 循環インポート回避のためローカルインポート
-        from app import api_manager
+        from app import api_manager, data_manager
 
         # API認証チェック
         api_key = request.headers.get('X-API-Key')
@@ -40,18 +40,19 @@ def api_users_list():
         if not validation['valid']:
             return jsonify({'error': validation['error']}), 401
 
-        # 全ユーザーデータ取得（簡略化）
-        all_users = api_manager._load_all_user_data()
+        # ユーザーごとの集計を学習進捗ストアから取得（履歴全体は読み込まない）
+        if data_manager is None:
+            return jsonify({'error': '学習進捗ストアが利用できません'}), 503
 
         users_list = []
-        for user_id, user_data in all_users.items():
-            history = user_data.get('history', [])
+        for summary in data_manager.get_user_summaries():
+            total = summary['total_answered']
             users_list.append({
-                'user_id': user_id,
-                'total_questions': len(history),
-                'accuracy': sum(1 for h in history if h.get('is_correct', False)) / len(history) if history else 0,
-                'last_activity': max([h.get('date', '') for h in history], default=''),
-                'primary_department': api_manager._get_user_primary_departments(user_data)[0] if history else 'unknown'
+                'user_id': summary['user_id'],
+                'total_questions': total,
+                'accuracy': summary['correct_count'] / total if total else 0,
+                'last_activity': datetime.fromtimestamp(summary['last_access']).strftime('%Y-%m-%d %H:%M:%S'),
+                'primary_department': summary['department'] or 'unknown'
             })
 
         return jsonify({
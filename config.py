@@ -23,9 +23,35 @@ class Config:
     PERMANENT_SESSION_LIFETIME = 3600  # 1時間でセッション期限切れ
 
     # 🚨 ULTRA SYNC: サーバーサイドセッション（レースコンディション解決）
-    SESSION_TYPE = 'filesystem'  # レースコンディション防止
+    SESSION_TYPE = os.environ.get('SESSION_TYPE', 'filesystem')  # 'filesystem' / 'sqlite'
     SESSION_FILE_DIR = os.path.join(os.path.dirname(__file__), 'sessions')
-    SESSION_FILE_THRESHOLD = 500  # 最大セッションファイル数
+    # 有効なセッションファイル数の上限（0=上限なし。超えると期限の近い有効なセッションから削除されるため、
+    # 利用者数より十分大きい値にすること。期限切れのセッションは上限と関係なく掃除される）
+    SESSION_FILE_THRESHOLD = int(os.environ.get('SESSION_FILE_THRESHOLD', '0'))
+    SESSION_SQLITE_PATH = os.environ.get('SESSION_SQLITE_PATH', os.path.join(SESSION_FILE_DIR, 'sessions.sqlite3'))
+    SESSION_CLEANUP_INTERVAL = 300  # 期限切れセッションの掃除間隔（秒）
+    SESSION_REFRESH_RATIO = 0.5  # 有効期限の残りがこの割合を下回ったときだけ延長
+    USER_LOCK_FILE = os.path.join(SESSION_FILE_DIR, 'user_locks.lock')  # ユーザーロック（プロセス間共有）
+    USER_LOCK_STRIPES = 64  # ユーザーロックのストライプ数
+    USER_LOCK_TIMEOUT = 10.0  # ユーザーロック取得待ちのタイムアウト（秒）
+
+    # 🛡️ レート制限（全ワーカー共有のトークンバケット表、セッションには保存しない）
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_FILE = os.path.join(SESSION_FILE_DIR, 'rate_limits.table')
+    RATE_LIMIT_SLOTS = 4096  # バケット表のスロット数
+    # リバースプロキシの段数（X-Forwarded-For を信頼する数）。Render 等のプロキシ配下では1以上にしないと
+    # remote_addr が全員プロキシのアドレスになり、'ip' のバケットを全利用者で共有してしまう
+    TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', '1' if os.environ.get('RENDER') else '0'))
+    RATE_LIMIT_POLICIES = {
+        # limit/period の速度で補充、burst まで連続可。keys ごとに別のバケットで判定
+        'default': {'limit': 1000, 'period': 3600, 'burst': 200, 'keys': ('user', 'ip')},
+        'answer': {'limit': 120, 'period': 60, 'burst': 30, 'keys': ('user', 'ip')},
+        'api': {'limit': 600, 'period': 60, 'burst': 100, 'keys': ('api_key', 'user', 'ip')},
+    }
+
+    # 📊 分析画面のキャッシュ（ユーザー・状態バージョン・画面ごと、プロセス内）
+    DERIVED_CACHE_MAX_USERS = 1024  # 保持するユーザー数
+    DERIVED_CACHE_MAX_VIEWS = 16  # ユーザーあたりの画面（引数違いを含む）数
     SESSION_PERMANENT = False  # サーバーサイドセッション用
     SESSION_USE_SIGNER = True  # セッション整合性保護
     SESSION_KEY_PREFIX = 'rccm_quiz:'  # 名前空間分離
@@ -110,8 +136,16 @@ class DataConfig:
     BACKUP_DIR = os.path.join(BASE_DIR, 'backups')
     AUTO_BACKUP = os.environ.get('AUTO_BACKUP', 'True').lower() == 'true'
     
-    # キャッシュ設定
-    CACHE_TIMEOUT = int(os.environ.get('CACHE_TIMEOUT', 3600))  # 1時間
+    # 問題バンク設定: CSV変更検出（mtimeポーリング）の間隔・秒（0で無効）
+    BANK_RELOAD_INTERVAL = float(os.environ.get('BANK_RELOAD_INTERVAL', 5))
+    # 問題バンク設定: コールドビルド時のCSV解析プロセス数（0でCPU数、1で逐次）
+    BANK_BUILD_WORKERS = int(os.environ.get('BANK_BUILD_WORKERS', 0))
+    # 問題バンク設定: wsgi読み込み時（gunicorn --preload のfork前）にバンクを構築・gc.freeze()する
+    BANK_PREFORK_FREEZE = os.environ.get('BANK_PREFORK_FREEZE', 'True').lower() == 'true'
+
+    # 学習進捗ストア（SQLite WALモード、data_manager.DataManager）
+    PROGRESS_DB_PATH = os.environ.get('PROGRESS_DB_PATH', os.path.join(BASE_DIR, 'user_data', 'progress.sqlite3'))
+    PROGRESS_DB_POOL_SIZE = int(os.environ.get('PROGRESS_DB_POOL_SIZE', 4))  # ワーカーごとの接続数
 
 # 🚨 英語カテゴリシステム完全削除済み - CLAUDE.md準拠
 # LIGHTWEIGHT_DEPARTMENT_MAPPINGのみ使用
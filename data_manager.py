@@ -0,0 +1,613 @@
+"""
+User Progress Store for RCCM Quiz Application
+学習進捗の永続化（SQLite WALモード） - Phase 20 Performance
+
+セッションの回答履歴・SRSデータをユーザー単位でSQLiteに保存します。
+企業ダッシュボード・データエクスポート・ユーザー一覧APIは、ユーザーごとの
+セッション全体を読み込む代わりに、索引付きのクエリで必要な行・集計だけを読みます。
+
+テーブル:
+    users      : ユーザー（部門・最終アクセス・回答数/正解数のカウンタ）
+    attempts   : 回答記録（1回答1行、(user_id, answered_at, question_id) で重複排除）
+    study_days : ユーザーごとの学習日（学習日数を COUNT で求める）
+    srs_state  : 問題ごとのSRS状態（次回復習日時の索引付き）
+
+- 接続はワーカーごとの小さなプール（fork後は作り直し）で再利用し、SQL文はモジュール定数に
+  まとめて sqlite3 の文キャッシュ（準備済みステートメント）を効かせます
+- 回答記録の保存は executemany の一括INSERT（INSERT OR IGNORE）で、前回保存以降の分だけを書きます
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from config import DataConfig
+from services.srs_due_queue import SRSDueQueue
+
+logger = logging.getLogger(__name__)
+
+# 接続プールの既定サイズ・ロック待ちのタイムアウト（秒）
+DEFAULT_POOL_SIZE = 4
+DEFAULT_TIMEOUT = 5.0
+
+# 接続ごとの準備済みステートメントのキャッシュ数
+STATEMENT_CACHE_SIZE = 64
+
+# 最終アクセスからこの日数以内のユーザーを 'active' とする
+ACTIVE_DAYS = 7
+
+# 保存済み位置（ユーザーごとの最新の回答日時）を記憶するユーザー数の上限
+SAVED_MARK_LIMIT = 10000
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS users ('
+    ' user_id TEXT PRIMARY KEY, user_name TEXT, department TEXT,'
+    ' created_at REAL NOT NULL, last_access REAL NOT NULL,'
+    ' total_answered INTEGER NOT NULL DEFAULT 0, correct_count INTEGER NOT NULL DEFAULT 0)',
+    'CREATE INDEX IF NOT EXISTS idx_users_last_access ON users (last_access)',
+    'CREATE TABLE IF NOT EXISTS attempts ('
+    ' id INTEGER PRIMARY KEY, user_id TEXT NOT NULL, session_id TEXT, question_id NOT NULL,'
+    ' category TEXT, question_type TEXT, department TEXT, is_correct INTEGER NOT NULL,'
+    ' user_answer TEXT, correct_answer TEXT, elapsed REAL, answered_at TEXT NOT NULL)',
+    'CREATE UNIQUE INDEX IF NOT EXISTS idx_attempts_user_time ON attempts (user_id, answered_at, question_id)',
+    'CREATE INDEX IF NOT EXISTS idx_attempts_user_category ON attempts (user_id, category, is_correct)',
+    'CREATE INDEX IF NOT EXISTS idx_attempts_session ON attempts (session_id, answered_at)',
+    'CREATE TABLE IF NOT EXISTS study_days ('
+    ' user_id TEXT NOT NULL, day TEXT NOT NULL, PRIMARY KEY (user_id, day)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS srs_state ('
+    ' user_id TEXT NOT NULL, question_id TEXT NOT NULL, next_review TEXT, mastered INTEGER NOT NULL DEFAULT 0,'
+    ' data TEXT NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (user_id, question_id)) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS idx_srs_due ON srs_state (user_id, next_review)',
+)
+
+SQL_UPSERT_USER = (
+    'INSERT INTO users (user_id, user_name, department, created_at, last_access) VALUES (?, ?, ?, ?, ?)'
+    ' ON CONFLICT (user_id) DO UPDATE SET'
+    ' user_name = COALESCE(excluded.user_name, user_name),'
+    ' department = COALESCE(excluded.department, department),'
+    ' last_access = excluded.last_access'
+)
+SQL_ADD_COUNTS = 'UPDATE users SET total_answered = total_answered + ?, correct_count = correct_count + ? WHERE user_id = ?'
+SQL_INSERT_ATTEMPT = (
+    'INSERT OR IGNORE INTO attempts (user_id, session_id, question_id, category, question_type, department,'
+    ' is_correct, user_answer, correct_answer, elapsed, answered_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+)
+SQL_INSERT_DAY = 'INSERT OR IGNORE INTO study_days (user_id, day) VALUES (?, ?)'
+SQL_UPSERT_SRS = (
+    'INSERT OR REPLACE INTO srs_state (user_id, question_id, next_review, mastered, data, updated_at)'
+    ' VALUES (?, ?, ?, ?, ?, ?)'
+)
+SQL_LAST_ANSWERED = 'SELECT MAX(answered_at) FROM attempts WHERE user_id = ?'
+SQL_RECENT_ATTEMPTS = (
+    'SELECT question_id, category, question_type, department, is_correct, user_answer, correct_answer,'
+    ' elapsed, answered_at FROM attempts WHERE user_id = ? ORDER BY answered_at DESC LIMIT ?'
+)
+SQL_SESSION_ATTEMPTS = (
+    'SELECT user_id, question_id, category, question_type, department, is_correct, user_answer, correct_answer,'
+    ' elapsed, answered_at FROM attempts WHERE session_id = ? ORDER BY answered_at'
+)
+SQL_SRS_STATE = 'SELECT question_id, data FROM srs_state WHERE user_id = ?'
+SQL_SRS_USERS = 'SELECT DISTINCT user_id FROM srs_state ORDER BY user_id'
+SQL_SRS_PAGE = (
+    'SELECT user_id, question_id, data FROM srs_state WHERE (user_id, question_id) > (?, ?)'
+    ' ORDER BY user_id, question_id LIMIT ?'
+)
+SQL_SRS_DUE = (
+    'SELECT question_id, data FROM srs_state WHERE user_id = ? AND mastered = 0 AND next_review <= ?'
+    ' ORDER BY next_review LIMIT ?'
+)
+SQL_USER = 'SELECT user_id, user_name, department, created_at, last_access, total_answered, correct_count FROM users WHERE user_id = ?'
+SQL_USER_SUMMARIES = (
+    'SELECT u.user_id, u.user_name, u.department, u.last_access, u.total_answered, u.correct_count,'
+    ' (SELECT COUNT(*) FROM study_days d WHERE d.user_id = u.user_id)'
+    ' FROM users u ORDER BY u.last_access DESC LIMIT ?'
+)
+SQL_CATEGORY_BREAKDOWN = (
+    'SELECT category, COUNT(*), SUM(is_correct) FROM attempts WHERE user_id = ? GROUP BY category'
+)
+SQL_STUDY_DAYS = 'SELECT COUNT(*), MIN(day), MAX(day) FROM study_days WHERE user_id = ?'
+SQL_DAILY_ACTIVITY = (
+    'SELECT substr(answered_at, 1, 10) AS day, COUNT(*), SUM(is_correct) FROM attempts'
+    ' WHERE user_id = ? AND answered_at >= ? GROUP BY day ORDER BY day'
+)
+
+_ATTEMPT_FIELDS = ('question_id', 'category', 'question_type', 'department', 'is_correct',
+                   'user_answer', 'correct_answer', 'elapsed', 'answered_at')
+
+
+class ConnectionPool:
+    """
+    ワーカー（プロセス）ごとのSQLite接続プール
+
+    Args:
+        path: データベースファイル
+        size: 同時に使う接続数の上限（使用中が上限に達した場合は返却を待つ）
+        timeout: ロック待ちのタイムアウト（秒）
+    """
+
+    def __init__(self, path: str, size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_TIMEOUT):
+        self.path = path
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._idle: List[sqlite3.Connection] = []
+        self._opened = 0
+        self._pid = os.getpid()
+        self._condition = threading.Condition()
+        self.waits = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                               check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        with self._condition:
+            if self._pid != os.getpid():
+                # fork後のワーカーでは親プロセスの接続を使わない（閉じずに破棄）
+                self._idle = []
+                self._opened = 0
+                self._pid = os.getpid()
+            while not self._idle and self._opened >= self.size:
+                self.waits += 1
+                self._condition.wait()
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                self._opened += 1
+                conn = None
+        if conn is None:
+            try:
+                conn = self._connect()
+            except BaseException:
+                with self._condition:
+                    self._opened -= 1
+                    self._condition.notify()
+                raise
+        try:
+            yield conn
+        finally:
+            with self._condition:
+                if self._pid == os.getpid():
+                    self._idle.append(conn)
+                    self._condition.notify()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def stats(self) -> Dict[str, int]:
+        with self._condition:
+            return {'size': self.size, 'opened': self._opened, 'idle': len(self._idle), 'waits': self.waits}
+
+
+class DataManager:
+    """
+    学習進捗ストア（SQLite WALモード）
+
+    Args:
+        db_path: データベースファイル（省略時は DataConfig.PROGRESS_DB_PATH）
+        pool_size: 接続プールのサイズ（省略時は DataConfig.PROGRESS_DB_POOL_SIZE）
+    """
+
+    def __init__(self, db_path: Optional[str] = None, pool_size: Optional[int] = None):
+        self.db_path = db_path or DataConfig.PROGRESS_DB_PATH
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.pool = ConnectionPool(self.db_path, pool_size or DataConfig.PROGRESS_DB_POOL_SIZE)
+        with self.pool.transaction() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+        logger.info(f"学習進捗ストア: {self.db_path}")
+
+    # --- 書き込み ---
+
+    def save_attempts(self, user_id: str, session_id: Optional[str], entries: Iterable[Dict[str, Any]],
+                      user_name: Optional[str] = None, department: Optional[str] = None) -> int:
+        """
+        回答記録を一括保存（保存済みの記録は無視）
+
+        Args:
+            user_id: ユーザーID
+            session_id: セッションID
+            entries: 回答履歴の記録（SessionService.add_to_history 形式）
+            user_name: ユーザー名
+            department: 部門
+
+        Returns:
+            int: 新しく保存した件数
+        """
+        correct_rows, wrong_rows, days = [], [], set()
+        for entry in entries:
+            answered_at = entry.get('date')
+            # 問題IDは型（固定IDの整数 / 旧形式の文字列）を保ったまま保存（列は型指定なし）
+            question_id = entry.get('id', entry.get('question_id'))
+            if not answered_at or question_id is None:
+                continue
+            elapsed = entry.get('elapsed')
+            row = (user_id, session_id, question_id, entry.get('category'), entry.get('question_type'),
+                   entry.get('department') or None, 1 if entry.get('is_correct') else 0,
+                   entry.get('user_answer'), entry.get('correct_answer'),
+                   float(elapsed) if isinstance(elapsed, (int, float)) else None, str(answered_at))
+            (correct_rows if row[6] else wrong_rows).append(row)
+            days.add(str(answered_at)[:10])
+
+        with self.pool.transaction() as conn:
+            conn.execute(SQL_UPSERT_USER, (user_id, user_name, department, time.time(), time.time()))
+            # 正解・不正解を分けて挿入し、実際に挿入された件数（重複は無視）でカウンタを更新
+            before = conn.total_changes
+            conn.executemany(SQL_INSERT_ATTEMPT, correct_rows)
+            correct = conn.total_changes - before
+            conn.executemany(SQL_INSERT_ATTEMPT, wrong_rows)
+            inserted = conn.total_changes - before
+            if inserted:
+                conn.execute(SQL_ADD_COUNTS, (inserted, correct, user_id))
+                conn.executemany(SQL_INSERT_DAY, [(user_id, day) for day in days])
+        return inserted
+
+    def save_srs(self, user_id: str, srs_data: Dict[str, Dict[str, Any]]) -> int:
+        """
+        SRS状態を一括保存（問題単位のUPSERT）
+
+        Args:
+            user_id: ユーザーID
+            srs_data: 問題ID → SRS状態
+
+        Returns:
+            int: 保存した件数
+        """
+        now = time.time()
+        rows = [
+            (user_id, str(question_id), state.get('next_review'), 1 if state.get('mastered') else 0,
+             json.dumps(state, ensure_ascii=False, default=str), now)
+            for question_id, state in srs_data.items() if isinstance(state, dict)
+        ]
+        if rows:
+            with self.pool.transaction() as conn:
+                conn.executemany(SQL_UPSERT_SRS, rows)
+        return len(rows)
+
+    def save_srs_records(self, records: Iterable[Any]) -> int:
+        """
+        複数ユーザーのSRS状態を1トランザクションで保存（問題単位のUPSERT）
+
+        Args:
+            records: (ユーザーID, 問題ID, SRS状態) の列
+
+        Returns:
+            int: 保存した件数
+        """
+        now = time.time()
+        rows = [
+            (user_id, str(question_id), state.get('next_review'), 1 if state.get('mastered') else 0,
+             json.dumps(state, ensure_ascii=False, default=str), now)
+            for user_id, question_id, state in records if isinstance(state, dict)
+        ]
+        if rows:
+            with self.pool.transaction() as conn:
+                conn.executemany(SQL_UPSERT_SRS, rows)
+        return len(rows)
+
+    # --- 読み込み ---
+
+    def get_last_answered(self, user_id: str) -> Optional[str]:
+        """保存済みの最新の回答日時"""
+        with self.pool.connection() as conn:
+            return conn.execute(SQL_LAST_ANSWERED, (user_id,)).fetchone()[0]
+
+    @staticmethod
+    def _attempt(row) -> Dict[str, Any]:
+        entry = dict(zip(_ATTEMPT_FIELDS, row))
+        entry['id'] = entry.pop('question_id')
+        entry['is_correct'] = bool(entry['is_correct'])
+        entry['date'] = entry.pop('answered_at')
+        if entry['elapsed'] is None:
+            del entry['elapsed']
+        return entry
+
+    def get_recent_attempts(self, user_id: str, limit: int) -> List[Dict[str, Any]]:
+        """直近の回答記録（古い順、回答履歴と同じ形式）"""
+        with self.pool.connection() as conn:
+            rows = conn.execute(SQL_RECENT_ATTEMPTS, (user_id, limit)).fetchall()
+        return [self._attempt(row) for row in reversed(rows)]
+
+    def get_srs_state(self, user_id: str) -> Dict[str, Dict[str, Any]]:
+        """ユーザーの全SRS状態"""
+        with self.pool.connection() as conn:
+            return {question_id: json.loads(data) for question_id, data in conn.execute(SQL_SRS_STATE, (user_id,))}
+
+    def iter_srs_chunks(self, chunk_rows: int, user_ids: Optional[Iterable[str]] = None) -> Iterator[List[Any]]:
+        """
+        全ユーザーのSRS状態を主キー順に一定件数ずつ読み込む（キーセットページング）
+
+        各チャンクは短いクエリ1回で読むため、チャンクの処理中に同じ表へ書き込めます。
+
+        Args:
+            chunk_rows: 1チャンクの最大件数
+            user_ids: 対象ユーザーID（省略時は全員）
+
+        Returns:
+            Iterator: (ユーザーID, 問題ID, SRS状態) のリスト
+        """
+        chunk_rows = max(1, int(chunk_rows))
+        if user_ids is not None:
+            chunk = []
+            for user_id in user_ids:
+                for question_id, state in self.get_srs_state(user_id).items():
+                    chunk.append((user_id, question_id, state))
+                    if len(chunk) >= chunk_rows:
+                        yield chunk
+                        chunk = []
+            if chunk:
+                yield chunk
+            return
+
+        after = ('', '')
+        while True:
+            with self.pool.connection() as conn:
+                rows = conn.execute(SQL_SRS_PAGE, (*after, chunk_rows)).fetchall()
+            if not rows:
+                return
+            after = rows[-1][:2]
+            yield [(user_id, question_id, json.loads(data)) for user_id, question_id, data in rows]
+            if len(rows) < chunk_rows:
+                return
+
+    def get_srs_user_ids(self) -> List[str]:
+        """SRS状態を持つユーザーID（主キーの先頭列だけを読む）"""
+        with self.pool.connection() as conn:
+            return [user_id for (user_id,) in conn.execute(SQL_SRS_USERS)]
+
+    def get_due_reviews(self, user_id: str, now: Optional[datetime] = None, limit: int = 50) -> Dict[str, Dict[str, Any]]:
+        """復習期限の来た問題（次回復習日時の索引で期限の古い順）"""
+        moment = (now or datetime.now()).isoformat()
+        with self.pool.connection() as conn:
+            return {question_id: json.loads(data)
+                    for question_id, data in conn.execute(SQL_SRS_DUE, (user_id, moment, limit))}
+
+    def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self.pool.connection() as conn:
+            row = conn.execute(SQL_USER, (user_id,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('user_id', 'user_name', 'department', 'created_at', 'last_access',
+                         'total_answered', 'correct_count'), row))
+
+    def get_user_summaries(self, limit: int = 1000) -> List[Dict[str, Any]]:
+        """ユーザーごとの集計（カウンタ列と学習日の主キーだけを読む）"""
+        with self.pool.connection() as conn:
+            rows = conn.execute(SQL_USER_SUMMARIES, (limit,)).fetchall()
+        return [
+            {'user_id': user_id, 'user_name': user_name, 'department': department, 'last_access': last_access,
+             'total_answered': total, 'correct_count': correct, 'study_days': study_days}
+            for user_id, user_name, department, last_access, total, correct, study_days in rows
+        ]
+
+    def get_category_breakdown(self, user_id: str) -> Dict[str, Dict[str, Any]]:
+        """分野別の回答数・正答率（(user_id, category, is_correct) の索引だけで集計）"""
+        with self.pool.connection() as conn:
+            rows = conn.execute(SQL_CATEGORY_BREAKDOWN, (user_id,)).fetchall()
+        return {
+            category or '不明': {'total': total, 'correct': correct,
+                                 'accuracy': round(correct / total * 100, 1) if total else 0.0}
+            for category, total, correct in rows
+        }
+
+    def get_daily_activity(self, user_id: str, days: int = 30) -> List[Dict[str, Any]]:
+        """直近の日別回答数（(user_id, answered_at) の索引の範囲検索）"""
+        since = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        with self.pool.connection() as conn:
+            rows = conn.execute(SQL_DAILY_ACTIVITY, (user_id, since)).fetchall()
+        return [{'date': day, 'total': total, 'correct': correct} for day, total, correct in rows]
+
+    def get_study_days(self, user_id: str) -> Dict[str, Any]:
+        with self.pool.connection() as conn:
+            count, first_day, last_day = conn.execute(SQL_STUDY_DAYS, (user_id,)).fetchone()
+        return {'study_days': count, 'first_day': first_day, 'last_day': last_day}
+
+    def get_data_export(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        セッションの学習データをエクスポート
+
+        Args:
+            session_id: セッションID
+
+        Returns:
+            dict: 回答履歴・SRS状態・集計（記録がない場合None）
+        """
+        with self.pool.connection() as conn:
+            rows = conn.execute(SQL_SESSION_ATTEMPTS, (session_id,)).fetchall()
+        if not rows:
+            return None
+        user_id = rows[0][0]
+        history = [self._attempt(row[1:]) for row in rows]
+        correct = sum(1 for entry in history if entry['is_correct'])
+        return {
+            'session_id': session_id,
+            'user_id': user_id,
+            'exported_at': datetime.now().isoformat(),
+            'history': history,
+            'srs_data': self.get_srs_state(user_id),
+            'summary': {
+                'total_answered': len(history),
+                'correct_count': correct,
+                'accuracy': round(correct / len(history) * 100, 1),
+            },
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self.pool.connection() as conn:
+            users, = conn.execute('SELECT COUNT(*) FROM users').fetchone()
+            attempts, = conn.execute('SELECT MAX(id) FROM attempts').fetchone()
+        return {'db_path': self.db_path, 'users': users, 'attempts': attempts or 0, 'pool': self.pool.stats()}
+
+
+class SessionDataManager:
+    """
+    セッションと学習進捗ストアの同期
+
+    Args:
+        data_manager: 保存先の DataManager
+    """
+
+    def __init__(self, data_manager: DataManager):
+        self.data_manager = data_manager
+        # ユーザーごとの保存済みの最新回答日時（これより前の履歴は再送しない）
+        self._saved_marks: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def user_key(session_id: str, user_name: Optional[str] = None) -> str:
+        """進捗ストアのユーザーID（ユーザー名がなければセッションID）"""
+        return user_name or session_id
+
+    def load_session_data(self, session, session_id: str, user_name: Optional[str] = None) -> bool:
+        """
+        保存済みの回答履歴・SRS状態をセッションに読み込む（セッション側が空の場合のみ）
+
+        Args:
+            session: Flaskセッション
+            session_id: セッションID
+            user_name: ユーザー名
+
+        Returns:
+            bool: 読み込んだ場合True
+        """
+        # 循環インポート回避のためローカルインポート
+        from services.session_service import SessionService
+
+        user_id = self.user_key(session_id, user_name)
+        loaded = False
+        if not session.get(SessionService.KEY_HISTORY):
+            history = self.data_manager.get_recent_attempts(user_id, SessionService.HISTORY_LIMIT)
+            if history:
+                session[SessionService.KEY_HISTORY] = history
+                loaded = True
+        if not session.get('advanced_srs'):
+            srs_data = self.data_manager.get_srs_state(user_id)
+            if srs_data:
+                session['advanced_srs'] = srs_data
+                SRSDueQueue.invalidate(session)
+                loaded = True
+        if loaded:
+            logger.info(f"学習進捗を読み込み: user={user_id}")
+        return loaded
+
+    def auto_save_trigger(self, session, session_id: str, user_name: Optional[str] = None) -> int:
+        """
+        前回保存以降の回答記録と、その問題のSRS状態を保存
+
+        Args:
+            session: Flaskセッション
+            session_id: セッションID
+            user_name: ユーザー名
+
+        Returns:
+            int: 新しく保存した回答記録の件数
+        """
+        user_id = self.user_key(session_id, user_name)
+        with self._lock:
+            mark = self._saved_marks.get(user_id)
+        if mark is None:
+            mark = self.data_manager.get_last_answered(user_id) or ''
+
+        history = session.get('history') or []
+        # 同じ秒の回答は (user_id, answered_at, question_id) の一意索引で重複排除される
+        pending = [entry for entry in history if str(entry.get('date') or '') >= mark]
+        if not pending:
+            return 0
+
+        inserted = self.data_manager.save_attempts(user_id, session_id, pending, user_name,
+                                                   session.get('selected_department'))
+        srs_data = session.get('advanced_srs') or {}
+        if srs_data:
+            # 新しく回答した問題のSRS状態だけを書く（初回は全件）
+            question_ids = {str(entry.get('id', entry.get('question_id'))) for entry in pending}
+            self.data_manager.save_srs(user_id, srs_data if not mark else {
+                question_id: srs_data[question_id] for question_id in question_ids if question_id in srs_data
+            })
+
+        with self._lock:
+            if len(self._saved_marks) >= SAVED_MARK_LIMIT:
+                self._saved_marks.clear()
+            self._saved_marks[user_id] = max(str(entry.get('date') or '') for entry in pending)
+        return inserted
+
+
+class EnterpriseUserManager:
+    """
+    企業環境用のユーザー管理（ダッシュボード・進捗レポート）
+
+    Args:
+        data_manager: 参照する DataManager
+    """
+
+    def __init__(self, data_manager: DataManager):
+        self.data_manager = data_manager
+
+    def get_all_users(self) -> List[Dict[str, Any]]:
+        """
+        全ユーザーの一覧（enterprise_dashboard.html の表示形式）
+
+        Returns:
+            list: ユーザーID・部門・正答率（%）・解答数・学習日数・最終アクセス・ステータス
+        """
+        active_since = time.time() - ACTIVE_DAYS * 86400
+        users = []
+        for summary in self.data_manager.get_user_summaries():
+            total = summary['total_answered']
+            users.append({
+                'user_id': summary['user_id'],
+                'user_name': summary['user_name'] or summary['user_id'],
+                'department': summary['department'],
+                'accuracy': round(summary['correct_count'] / total * 100, 1) if total else 0.0,
+                'total_questions': total,
+                'study_days': summary['study_days'],
+                'last_access': datetime.fromtimestamp(summary['last_access']).strftime('%Y-%m-%d %H:%M'),
+                'status': 'active' if summary['last_access'] >= active_since else 'inactive',
+            })
+        return users
+
+    def get_user_progress_report(self, user_name: str) -> Dict[str, Any]:
+        """
+        ユーザーの詳細進捗レポート
+
+        Args:
+            user_name: ユーザーID（ユーザー名）
+
+        Returns:
+            dict: 集計・分野別・日別の進捗（ユーザーが存在しない場合 {'error': ...}）
+        """
+        user = self.data_manager.get_user(user_name)
+        if user is None:
+            return {'error': f'ユーザーが見つかりません: {user_name}'}
+
+        total = user['total_answered']
+        return {
+            'user_id': user['user_id'],
+            'user_name': user['user_name'] or user['user_id'],
+            'department': user['department'],
+            'total_answered': total,
+            'correct_count': user['correct_count'],
+            'accuracy': round(user['correct_count'] / total * 100, 1) if total else 0.0,
+            'last_access': datetime.fromtimestamp(user['last_access']).isoformat(),
+            **self.data_manager.get_study_days(user['user_id']),
+            'categories': self.data_manager.get_category_breakdown(user['user_id']),
+            'daily_activity': self.data_manager.get_daily_activity(user['user_id']),
+            'generated_at': datetime.now().isoformat(),
+        }
@@ -3,7 +3,7 @@ Decorators for RCCM Quiz Application
 安全なデコレータ抽出 - リスクゼロ
 """
 from functools import wraps
-from flask import request, jsonify, render_template, session
+from flask import request, jsonify, render_template, session, current_app, make_response
 import logging
 
 logger = logging.getLogger(__name__)
@@ -219,4 +219,70 @@ def api_json_response(f):
                 'message': 'APIエラーが発生しました'
             }), 500
 
-    return decorated_function
\ No newline at end of file
+    return decorated_function
+
+def rate_limit(policy='default', methods=None):
+    """
+    共有トークンバケットでレート制限するデコレータ
+    制限を超えた場合は429（APIはJSON、画面はエラーページ）と Retry-After を返す
+
+    Args:
+        policy: RATE_LIMIT_POLICIES のポリシー名
+        methods: 制限するHTTPメソッド（None の場合は全メソッド）
+
+    Usage:
+        @app.route('/exam', methods=['GET', 'POST'])
+        @rate_limit('answer', methods=['POST'])
+        def exam():
+            pass
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            limiter = current_app.extensions.get('rate_limiter')
+            if limiter is None or (methods and request.method not in methods):
+                return f(*args, **kwargs)
+
+            try:
+                result = limiter.check(policy, rate_limit_identities())
+            except Exception as e:
+                # 表が使えない場合は制限せずに処理を続ける
+                logger.error(f"レート制限チェックエラー: {e}")
+                return f(*args, **kwargs)
+
+            if result.allowed:
+                return f(*args, **kwargs)
+
+            retry_after = max(1, int(result.retry_after + 0.999))
+            logger.warning(f"Rate limit exceeded for {request.path} (policy={policy}, key={result.key_kind})")
+            if request.path.startswith('/api/') or request.is_json:
+                response = jsonify({
+                    'success': False,
+                    'error': 'Rate limit exceeded',
+                    'message': f'リクエストが多すぎます。{retry_after}秒後に再試行してください',
+                    'retry_after': retry_after
+                })
+            else:
+                response = make_response(render_template('error.html',
+                                                         error=f"リクエストが多すぎます。{retry_after}秒後に再試行してください。",
+                                                         error_type='rate_limited'))
+            response.status_code = 429
+            response.headers['Retry-After'] = str(retry_after)
+            return response
+
+        return decorated_function
+    return decorator
+
+
+def rate_limit_identities():
+    """
+    現在のリクエストのレート制限キー（user / ip / api_key）
+
+    Returns:
+        dict: キーの種類 → 値（ないものは None）
+    """
+    return {
+        'user': session.get('user_id') or session.get('user_name'),
+        'ip': request.remote_addr,
+        'api_key': request.headers.get('X-API-Key'),
+    }
@@ -3,272 +3,591 @@
 """
 Mathematical Notation HTML Filter for Flask
 数学記法をHTMLの<sup><sub>タグに自動変換するフィルター
-"""
-import re
 
-def create_math_notation_filter():
-    """数学記法を正しいHTMLに変換するFlaskテンプレートフィルター"""
+変換ルール（MATH_PATTERNS）は起動時に1回だけ MathRewriteEngine へコンパイルされ、
+1文字置換は str.translate、固定文字列の置換は結合した1パス、残りの正規表現は
+事前コンパイル + 必須文字チェックで実行します。結果はルールを1つずつ re.sub で
+適用する従来の処理（reference_math_notation_to_html）と同一です。
 
-    def math_notation_to_html(text):
+問題バンクの問題文・選択肢・解説は読み込み時に変換済み（Question.with_rendered）のため、
+テンプレートフィルターは変換済みHTMLをそのまま返します。それ以外の文字列
+（切り詰めた問題文・討論の本文など）は上限付きのメモで同じ文字列の再変換を避けます。
+"""
+import re
+from functools import lru_cache
+
+# 変換済みでない文字列のメモ上限（件数）
+MATH_MEMO_SIZE = 4096
+
+# 1. Unicode上付き文字をHTMLに変換
+UNICODE_SUPERSCRIPTS = {
+    '²': '<sup>2</sup>',
+    '³': '<sup>3</sup>',
+    '¹': '<sup>1</sup>',
+    '⁰': '<sup>0</sup>',
+    '⁴': '<sup>4</sup>',
+    '⁵': '<sup>5</sup>',
+    '⁶': '<sup>6</sup>',
+    '⁷': '<sup>7</sup>',
+    '⁸': '<sup>8</sup>',
+    '⁹': '<sup>9</sup>'
+}
+
+# 2. Unicode下付き文字はそのまま保持（化学式用）
+# CO₂, H₂O, A₁v₁=A₂v₂ などは正しい表記として保持
+
+# 3. 数学式パターンの検出と変換 - ULTRATHIN 完全網羅対応版（この順に適用）
+MATH_PATTERNS = [
+    # 【最優先】データ誤り修正（LaTeX処理前に実行）ULTRA SYNC拡張版
+    # 基本パターン: 6^{4} → 64, 15^{7} → 157, 17^{6} → 176, 19^{6} → 196, 26^{4} → 264
+    (r'6\^\{4\}', r'64'),
+    (r'15\^\{7\}', r'157'),
+    (r'17\^\{6\}', r'176'),
+    (r'19\^\{6\}', r'196'),
+    (r'26\^\{4\}', r'264'),
+
+    # ULTRA SYNC発見追加パターン: 1^{2}→12, 1^{6}→16, 1^{8}→18等
+    (r'1\^\{2\}', r'12'),
+    (r'1\^\{6\}', r'16'),
+    (r'1\^\{8\}', r'18'),
+    (r'2\^\{4\}', r'24'),
+    (r'3\^\{5\}', r'35'),
+    (r'3\^\{6\}', r'36'),
+    (r'9\^\{6\}', r'96'),
+    (r'9\^\{8\}', r'98'),
+    (r'10\^\{8\}', r'108'),
+    (r'22\^\{8\}', r'228'),
+    (r'34\^\{8\}', r'348'),
+    (r'201\^\{2\}', r'2012'),
+
+    # CSV追加発見パターン: 0.3^{5}→0.35, 0.7^{5}→0.75, 1.^{5}→1.5等
+    (r'0\.3\^\{5\}', r'0.35'),
+    (r'0\.7\^\{5\}', r'0.75'),
+    (r'1\.\^\{2\}', r'1.2'),
+    (r'1\.\^\{5\}', r'1.5'),
+    (r'1\.4\^\{5\}', r'1.45'),
+    (r'0\.\^\{5\}', r'0.5'),
+
+    # 【次優先】LaTeX記法の完全変換
+    # ^{4} → <sup>4</sup>, ^{-3} → <sup>-3</sup>
+    (r'\^\{([^}]+)\}', r'<sup>\1</sup>'),
+    # _{2} → <sub>2</sub>, _{n+1} → <sub>n+1</sub>
+    (r'_\{([^}]+)\}', r'<sub>\1</sub>'),
+
+    # 【超優先】科学記数法の完全修正
+    # 2×10^-4 → 2×10<sup>-4</sup>
+    (r'(\d+(?:\.\d+)?×10)\^(-?\d+)', r'\1<sup>\2</sup>'),
+    # 10^{-3} → 10<sup>-3</sup>は上で処理済み
+
+    # 【次優先】単純LaTeX記法
+    # ^2 → <sup>2</sup>, _1 → <sub>1</sub>
+    (r'\^(-?\d+)', r'<sup>\1</sup>'),
+    (r'_(-?\d+)', r'<sub>\1</sub>'),
+
+    # 【工学単位最優先】N/mm2, kN/m3, kPa等
+    # 500N/mm2 → 500N/mm<sup>2</sup>
+    (r'([0-9.]+N/mm)([2-9])', r'\1<sup>\2</sup>'),
+    # 24.5kN/m3 → 24.5kN/m<sup>3</sup>
+    (r'([0-9.]+kN/m)([2-9])', r'\1<sup>\2</sup>'),
+    # 一般的なN/mm, kN/m記法
+    (r'(N/mm)([2-9])', r'\1<sup>\2</sup>'),
+    (r'(kN/m)([2-9])', r'\1<sup>\2</sup>'),
+
+    # 【密度・体積単位】kg/m3, g/cm3, t/m3
+    (r'([0-9.]*kg/m)([2-9])', r'\1<sup>\2</sup>'),
+    (r'([0-9.]*g/cm)([2-9])', r'\1<sup>\2</sup>'),
+    (r'([0-9.]*t/m)([2-9])', r'\1<sup>\2</sup>'),
+
+    # 【流量単位】m^{3}/s → m<sup>3</sup>/s
+    (r'(m)\^?\{?([0-9])\}?(/s)', r'\1<sup>\2</sup>\3'),
+
+    # 【専用単位記法】
+    # m/s2 → m/s<sup>2</sup>
+    (r'(m/s)([2-9])', r'\1<sup>\2</sup>'),
+
+    # 【一般工学単位】kN/m2, MPa, GPa等
+    (r'([a-zA-Z]+/[a-zA-Z]+)([2-9])', r'\1<sup>\2</sup>'),
+
+    # 【面積・体積・慣性モーメント単位】
+    # 400cm2 → 400cm<sup>2</sup>, 60cm4 → 60cm<sup>4</sup>
+    (r'(\d+cm)([2-9])', r'\1<sup>\2</sup>'),
+    (r'(\d+mm)([2-9])', r'\1<sup>\2</sup>'),
+
+    # 【一般的な変数の指数】
+    # v2=2gh → v<sup>2</sup>=2gh, bh3/12 → bh<sup>3</sup>/12
+    (r'([a-zA-Zπγρσ])([2-9])([/=\+\-\*\s])', r'\1<sup>\2</sup>\3'),
+
+    # 【括弧後の指数】
+    # (10cm)3 → (10cm)<sup>3</sup>
+    (r'(\))([2-9])([/=\+\-\*\s])', r'\1<sup>\2</sup>\3'),
+
+    # 【数学記号・ギリシャ文字パターン】
+    # ×105 → ×10<sup>5</sup>
+    (r'(×\d+)([2-9])', r'\1<sup>\2</sup>'),
+
+    # π関連: πd4/32 → πd<sup>4</sup>/32
+    (r'(π[a-zA-Z])([2-9])([/=])', r'\1<sup>\2</sup>\3'),
+
+    # 【特殊修正】不正LaTeX記法・誤記修正
+    # 9.^{8} → 9.8, 24.^{5} → 24.5 (ドット後の不正上付き)
+    (r'(\d+)\.\^?\{?([0-9])\}?', r'\1.\2'),
+
+    # 【体積単位完全対応】cm3, mm3, m3 → cm³, mm³, m³
+    (r'(\d*cm)3', r'\1³'),
+    (r'(\d*mm)3', r'\1³'),
+    (r'(\d*m)3(?![0-9])', r'\1³'),  # m30のような数字が続かない場合のみ
+
+    # 【面積単位完全対応】cm2, mm2, m2 → cm², mm², m²
+    (r'(\d*cm)2', r'\1²'),
+    (r'(\d*mm)2', r'\1²'),
+    (r'(\d*m)2(?![0-9])', r'\1²'),  # m20のような数字が続かない場合のみ
+
+    # 【科学記数法完全復旧】ULTRA SYNC発見：systematic degradation修正
+    # ×105 → ×10⁵, 2.0×105 → 2.0×10⁵
+    (r'(×10)5', r'\1⁵'),
+    (r'(×10)4', r'\1⁴'),
+    (r'(×10)3', r'\1³'),
+    (r'(×10)2', r'\1²'),
+    (r'(×10)6', r'\1⁶'),
+    (r'(×10)7', r'\1⁷'),
+    (r'(×10)8', r'\1⁸'),
+    (r'(×10)9', r'\1⁹'),
+    # 負の指数
+    (r'(×10)-1', r'\1⁻¹'),
+    (r'(×10)-2', r'\1⁻²'),
+    (r'(×10)-3', r'\1⁻³'),
+    (r'(×10)-4', r'\1⁻⁴'),
+    (r'(×10)-5', r'\1⁻⁵'),
+    (r'(×10)-6', r'\1⁻⁶'),
+
+    # 【指数表記統一強化】10^-3, 10^{-3}, 10^-6等 → 10⁻³, 10⁻⁶等
+    (r'10\^{?-([0-9])}?', r'10⁻\1'),
+    (r'10\^{?([0-9])}?', r'10^\1'),
+
+    # 【単位記号完全復旧】N/mm2 → N/mm², kN/m3 → kN/m³
+    (r'N/mm2', r'N/mm²'),
+    (r'kN/m2', r'kN/m²'),
+    (r'kN/m3', r'kN/m³'),
+    (r'kPa', r'kPa'),  # kPaは正しいのでそのまま
+    (r'MPa', r'MPa'),  # MPaは正しいのでそのまま
+    (r'GPa', r'GPa'),  # GPaは正しいのでそのまま
+
+    # 【体積・面積単位復旧】cm3→cm³, mm3→mm³, m3→m³, cm2→cm², mm2→mm², m2→m²
+    (r'([0-9.]*)cm3', r'\1cm³'),
+    (r'([0-9.]*)mm3', r'\1mm³'),
+    (r'([0-9.]*)m3(?![0-9])', r'\1m³'),
+    (r'([0-9.]*)cm2', r'\1cm²'),
+    (r'([0-9.]*)mm2', r'\1mm²'),
+    (r'([0-9.]*)m2(?![0-9])', r'\1m²'),
+
+    # 【CRITICAL FIX】数学記号不一致修正 - UI Testing発見問題対応
+    # ｙ＝L^{2}/8R, ｙ＝R/8L2 → y=L²/8R, y=R/8L² (全角文字と指数表記統一)
+    (r'ｙ＝', r'y='),  # 全角y修正
+    (r'L\^{2}', r'L²'),  # LaTeX記法をUnicode上付き文字に統一
+    (r'L2([^0-9])', r'L²\\1'),  # L2 → L² (数字が続かない場合)
+    (r'R/8L2', r'R/8L²'),  # 特定の不一致修正
+
+    # 【全角文字統一】ULTRA SYNC発見パターン完全網羅
+    # 括弧統一: （） → ()
+    (r'（', r'('),
+    (r'）', r')'),
+
+    # 全角スラッシュ統一: ／ → /
+    (r'／', r'/'),
+
+    # 全角数字統一: ０１２３４５６７８９ → 0123456789
+    (r'０', r'0'), (r'１', r'1'), (r'２', r'2'), (r'３', r'3'), (r'４', r'4'),
+    (r'５', r'5'), (r'６', r'6'), (r'７', r'7'), (r'８', r'8'), (r'９', r'9'),
+
+    # 全角英字統一: ＡＢＣ等 → ABC等
+    (r'ａ', r'a'), (r'ｂ', r'b'), (r'ｃ', r'c'), (r'ｄ', r'd'),
+    (r'ｅ', r'e'), (r'ｆ', r'f'), (r'ｇ', r'g'), (r'ｈ', r'h'),
+    (r'ｉ', r'i'), (r'ｊ', r'j'), (r'ｋ', r'k'), (r'ｌ', r'l'),
+    (r'ｍ', r'm'), (r'ｎ', r'n'), (r'ｏ', r'o'), (r'ｐ', r'p'),
+    (r'ｑ', r'q'), (r'ｒ', r'r'), (r'ｓ', r's'), (r'ｔ', r't'),
+    (r'ｕ', r'u'), (r'ｖ', r'v'), (r'ｗ', r'w'), (r'ｘ', r'x'),
+    (r'ｙ', r'y'), (r'ｚ', r'z'),
+    (r'Ａ', r'A'), (r'Ｂ', r'B'), (r'Ｃ', r'C'), (r'Ｄ', r'D'),
+    (r'Ｅ', r'E'), (r'Ｆ', r'F'), (r'Ｇ', r'G'), (r'Ｈ', r'H'),
+    (r'Ｉ', r'I'), (r'Ｊ', r'J'), (r'Ｋ', r'K'), (r'Ｌ', r'L'),
+    (r'Ｍ', r'M'), (r'Ｎ', r'N'), (r'Ｏ', r'O'), (r'Ｐ', r'P'),
+    (r'Ｑ', r'Q'), (r'Ｒ', r'R'), (r'Ｓ', r'S'), (r'Ｔ', r'T'),
+    (r'Ｕ', r'U'), (r'Ｖ', r'V'), (r'Ｗ', r'W'), (r'Ｘ', r'X'),
+    (r'Ｙ', r'Y'), (r'Ｚ', r'Z'),
+
+    # 単位記号の全角文字統一: ｃｍ → cm, ｍ → m
+    (r'ｃｍ', r'cm'), (r'ｍｍ', r'mm'), (r'ｍ', r'm'),
+
+    # 【土木工学専用】質量記号の下付き文字統一
+    # ms, mw → m<sub>s</sub>, m<sub>w</sub>
+    # ｍs, ｍw → m<sub>s</sub>, m<sub>w</sub> (全角m対応)
+    (r'([^a-zA-Z]|^)(ｍ|m)(s)([^a-zA-Z]|$)', r'\1m<sub>\3</sub>\4'),
+    (r'([^a-zA-Z]|^)(ｍ|m)(w)([^a-zA-Z]|$)', r'\1m<sub>\3</sub>\4'),
+
+    # 【ギリシャ文字下付き文字統一】ULTRA SYNC追加修正
+    # ρs, ρw, ρd → ρ<sub>s</sub>, ρ<sub>w</sub>, ρ<sub>d</sub>
+    (r'([^a-zA-Z]|^)(ρ)(s)([^a-zA-Z]|$)', r'\1ρ<sub>\3</sub>\4'),
+    (r'([^a-zA-Z]|^)(ρ)(w)([^a-zA-Z]|$)', r'\1ρ<sub>\3</sub>\4'),
+    (r'([^a-zA-Z]|^)(ρ)(d)([^a-zA-Z]|$)', r'\1ρ<sub>\3</sub>\4'),
+
+    # γs, γw, γd, γt, γt1, γt2 → γ<sub>s</sub>, γ<sub>w</sub>, γ<sub>d</sub>, γ<sub>t</sub>, γ<sub>t1</sub>, γ<sub>t2</sub>
+    (r'([^a-zA-Z]|^)(γ)(s)([^a-zA-Z]|$)', r'\1γ<sub>\3</sub>\4'),
+    (r'([^a-zA-Z]|^)(γ)(w)([^a-zA-Z]|$)', r'\1γ<sub>\3</sub>\4'),
+    (r'([^a-zA-Z]|^)(γ)(d)([^a-zA-Z]|$)', r'\1γ<sub>\3</sub>\4'),
+    (r'([^a-zA-Z]|^)(γ)(t[0-9]*)([^a-zA-Z]|$)', r'\1γ<sub>\3</sub>\4'),
+
+    # σs, σw, σ1, σ2, σ3 → σ<sub>s</sub>, σ<sub>w</sub>, σ<sub>1</sub>, σ<sub>2</sub>, σ<sub>3</sub>
+    (r'([^a-zA-Z]|^)(σ)(s|w|[0-9])([^a-zA-Z]|$)', r'\1σ<sub>\3</sub>\4'),
+
+    # αs, αw, βs, βw → α<sub>s</sub>, α<sub>w</sub>, β<sub>s</sub>, β<sub>w</sub>
+    (r'([^a-zA-Z]|^)(α|β)(s|w)([^a-zA-Z]|$)', r'\1\2<sub>\3</sub>\4'),
+
+    # 【三角関数逆関数】cos-1, sin-1, tan-1 → cos<sup>-1</sup>, sin<sup>-1</sup>, tan<sup>-1</sup>
+    (r'(cos|sin|tan)-1', r'\1<sup>-1</sup>'),
+
+    # 【問題文の選択肢表記統一】a～d → A～D（問題文中の選択肢参照）
+    (r'のをa～d', r'のをA～D'),
+    (r'をa～dの', r'をA～Dの'),
+    (r'からa～d', r'からA～D'),
+]
+
+# 正規表現ルールの事前チェック（各要素の文字のいずれかが含まれない場合、そのルールは一致し得ない）
+# 例: ('^', '{', '}') は '^'・'{'・'}' をすべて含む場合のみ、('ｍm', 's') は 'ｍ' か 'm'、かつ 's' を含む場合のみ実行
+_DIGITS_2_9 = '23456789'
+REGEX_RULE_GUARDS = {
+    r'\^\{([^}]+)\}': ('^', '{', '}'),
+    r'_\{([^}]+)\}': ('_', '{', '}'),
+    r'(\d+(?:\.\d+)?×10)\^(-?\d+)': ('×', '^'),
+    r'\^(-?\d+)': ('^',),
+    r'_(-?\d+)': ('_',),
+    r'([0-9.]+N/mm)([2-9])': ('N', '/'),
+    r'([0-9.]+kN/m)([2-9])': ('k', 'N', '/'),
+    r'(N/mm)([2-9])': ('N', '/'),
+    r'(kN/m)([2-9])': ('k', 'N', '/'),
+    r'([0-9.]*kg/m)([2-9])': ('k', 'g', '/'),
+    r'([0-9.]*g/cm)([2-9])': ('g', '/', 'c'),
+    r'([0-9.]*t/m)([2-9])': ('t', '/'),
+    r'(m)\^?\{?([0-9])\}?(/s)': ('m', '/', 's'),
+    r'(m/s)([2-9])': ('m', '/', 's'),
+    r'([a-zA-Z]+/[a-zA-Z]+)([2-9])': ('/', _DIGITS_2_9),
+    r'(\d+cm)([2-9])': ('c', 'm'),
+    r'(\d+mm)([2-9])': ('m',),
+    r'([a-zA-Zπγρσ])([2-9])([/=\+\-\*\s])': (_DIGITS_2_9,),
+    r'(\))([2-9])([/=\+\-\*\s])': (')', _DIGITS_2_9),
+    r'(×\d+)([2-9])': ('×',),
+    r'(π[a-zA-Z])([2-9])([/=])': ('π',),
+    r'(\d+)\.\^?\{?([0-9])\}?': ('.',),
+    r'(\d*cm)3': ('c', 'm', '3'),
+    r'(\d*mm)3': ('m', '3'),
+    r'(\d*m)3(?![0-9])': ('m', '3'),
+    r'(\d*cm)2': ('c', 'm', '2'),
+    r'(\d*mm)2': ('m', '2'),
+    r'(\d*m)2(?![0-9])': ('m', '2'),
+    r'(×10)5': ('×',),
+    r'(×10)4': ('×',),
+    r'(×10)3': ('×',),
+    r'(×10)2': ('×',),
+    r'(×10)6': ('×',),
+    r'(×10)7': ('×',),
+    r'(×10)8': ('×',),
+    r'(×10)9': ('×',),
+    r'(×10)-1': ('×',),
+    r'(×10)-2': ('×',),
+    r'(×10)-3': ('×',),
+    r'(×10)-4': ('×',),
+    r'(×10)-5': ('×',),
+    r'(×10)-6': ('×',),
+    r'10\^{?-([0-9])}?': ('^', '-'),
+    r'10\^{?([0-9])}?': ('^',),
+    r'([0-9.]*)cm3': ('c', 'm', '3'),
+    r'([0-9.]*)mm3': ('m', '3'),
+    r'([0-9.]*)m3(?![0-9])': ('m', '3'),
+    r'([0-9.]*)cm2': ('c', 'm', '2'),
+    r'([0-9.]*)mm2': ('m', '2'),
+    r'([0-9.]*)m2(?![0-9])': ('m', '2'),
+    # 注意: {2} は量指定子のため、このルールは「L^^」→「L²」として動作する
+    r'L\^{2}': ('L', '^'),
+    r'L2([^0-9])': ('L', '2'),
+    r'([^a-zA-Z]|^)(ｍ|m)(s)([^a-zA-Z]|$)': ('ｍm', 's'),
+    r'([^a-zA-Z]|^)(ｍ|m)(w)([^a-zA-Z]|$)': ('ｍm', 'w'),
+    r'([^a-zA-Z]|^)(ρ)(s)([^a-zA-Z]|$)': ('ρ', 's'),
+    r'([^a-zA-Z]|^)(ρ)(w)([^a-zA-Z]|$)': ('ρ', 'w'),
+    r'([^a-zA-Z]|^)(ρ)(d)([^a-zA-Z]|$)': ('ρ', 'd'),
+    r'([^a-zA-Z]|^)(γ)(s)([^a-zA-Z]|$)': ('γ', 's'),
+    r'([^a-zA-Z]|^)(γ)(w)([^a-zA-Z]|$)': ('γ', 'w'),
+    r'([^a-zA-Z]|^)(γ)(d)([^a-zA-Z]|$)': ('γ', 'd'),
+    r'([^a-zA-Z]|^)(γ)(t[0-9]*)([^a-zA-Z]|$)': ('γ', 't'),
+    r'([^a-zA-Z]|^)(σ)(s|w|[0-9])([^a-zA-Z]|$)': ('σ',),
+    r'([^a-zA-Z]|^)(α|β)(s|w)([^a-zA-Z]|$)': ('αβ', 'sw'),
+    r'(cos|sin|tan)-1': ('-', '1'),
+}
+
+# メタ文字を含まない（エスケープのみの）正規表現 = 固定文字列
+_LITERAL_PATTERN = re.compile(r'(?:\\[^0-9A-Za-z]|[^\\.^$*+?{}\[\]|()])+')
+_ESCAPED_CHAR = re.compile(r'\\(.)')
+
+
+def _as_literal(pattern, replacement):
+    """(正規表現, 置換) が固定文字列の置換なら (検索文字列, 置換文字列)、そうでなければNone"""
+    if '\\' in replacement or not _LITERAL_PATTERN.fullmatch(pattern):
+        return None
+    return _ESCAPED_CHAR.sub(r'\1', pattern), replacement
+
+
+def _overlaps(a, b):
+    """aとbの出現が重なり得るか（包含、またはaの末尾とbの先頭の一致）"""
+    if a in b or b in a:
+        return True
+    return any(a.endswith(b[:k]) for k in range(1, min(len(a), len(b))))
+
+
+def _can_join_literal(group, search, replacement):
+    """
+    固定文字列の置換を1回の同時置換にまとめても逐次適用と同じ結果になるか
+
+    既存のどの検索文字列とも出現が重ならず、先行する置換結果が
+    後続の検索文字列の新しい出現を作らない場合のみ True。
+    """
+    if not replacement:
+        return False
+    for other_search, other_replacement in group:
+        if _overlaps(other_search, search) or _overlaps(search, other_search):
+            return False
+        if _overlaps(other_replacement, search) or _overlaps(search, other_replacement):
+            return False
+    return True
+
+
+class _TranslateStage:
+    """1文字 → 文字列の置換群（str.translate で1パス）"""
+
+    __slots__ = ('table', 'keys', 'trigger')
+
+    def __init__(self, pairs):
+        self.table = {ord(search): replacement for search, replacement in pairs}
+        self.keys = frozenset(search for search, _ in pairs)
+        self.trigger = self.keys
+
+    def can_join(self, search, replacement):
+        # 置換結果に変換対象の文字が含まれると逐次適用と結果が変わる
+        return (search not in self.keys
+                and not any(ch in replacement for ch in self.keys | {search})
+                and not any(search in r for r in self.table.values()))
+
+    def add(self, search, replacement):
+        self.table[ord(search)] = replacement
+        self.keys = self.keys | {search}
+        self.trigger = self.keys
+
+    @property
+    def clauses(self):
+        return (self.keys,)
+
+    def apply(self, text):
+        return text.translate(self.table)
+
+
+class _LiteralStage:
+    """固定文字列の置換群（結合した選択パターンで1パス）"""
+
+    __slots__ = ('pairs', 'mapping', 'pattern', 'required', 'trigger')
+
+    def __init__(self, search, replacement):
+        self.pairs = []
+        self.mapping = {}
+        self.pattern = None
+        self.required = frozenset()
+        self.add(search, replacement)
+
+    def can_join(self, search, replacement):
+        return _can_join_literal(self.pairs, search, replacement)
+
+    def add(self, search, replacement):
+        self.pairs.append((search, replacement))
+        self.mapping[search] = replacement
+        # すべての検索文字列に共通する文字はこの段の必須文字
+        self.required = frozenset.intersection(*(frozenset(s) for s, _ in self.pairs))
+        # どの一致も、いずれかの検索文字列の先頭文字を含む
+        self.trigger = frozenset(s[0] for s, _ in self.pairs)
+        if len(self.pairs) > 1:
+            self.pattern = re.compile('|'.join(re.escape(s) for s, _ in self.pairs))
+
+    @property
+    def clauses(self):
+        return tuple(frozenset(ch) for ch in sorted(self.required))
+
+    def apply(self, text):
+        if self.pattern is None:
+            search, replacement = self.pairs[0]
+            return text.replace(search, replacement)
+        mapping = self.mapping
+        return self.pattern.sub(lambda m: mapping[m.group()], text)
+
+
+class _RegexStage:
+    """事前コンパイル済みの正規表現ルール（必須文字がない場合は実行しない）"""
+
+    __slots__ = ('pattern', 'replacement', 'guard', 'trigger')
+
+    def __init__(self, pattern, replacement, guard):
+        self.pattern = re.compile(pattern)
+        self.replacement = replacement
+        self.guard = tuple(frozenset(chars) for chars in guard) if guard else None
+        self.trigger = self.guard[0] if self.guard else None
+
+    @property
+    def clauses(self):
+        return self.guard or ()
+
+    def apply(self, text):
+        return self.pattern.sub(self.replacement, text)
+
+
+class MathRewriteEngine:
+    """
+    数学記法変換ルールのコンパイル済みエンジン
+
+    ルールの適用順・結果は reference_math_notation_to_html（1ルールずつ re.sub）と同一です。
+    - 1文字の置換が連続する区間は str.translate の1パスにまとめる
+    - 固定文字列の置換が連続する区間は、重なり・連鎖がない範囲で選択パターンの1パスにまとめる
+    - 残りの正規表現は1回だけコンパイルし、必須文字が含まれない場合は実行しない
+    - どの段の契機文字も含まない文字列は何もせずにそのまま返す
+    """
+
+    def __init__(self, superscripts=None, patterns=None, guards=None):
+        superscripts = UNICODE_SUPERSCRIPTS if superscripts is None else superscripts
+        patterns = MATH_PATTERNS if patterns is None else patterns
+        guards = REGEX_RULE_GUARDS if guards is None else guards
+
+        rules = list(superscripts.items()) + list(patterns)
+        stages = []
+        for pattern, replacement in rules:
+            literal = _as_literal(pattern, replacement)
+            if literal is None:
+                stages.append(_RegexStage(pattern, replacement, guards.get(pattern)))
+                continue
+
+            search, replacement = literal
+            if search == replacement:
+                continue  # 変化しないルール（kPa → kPa 等）
+            last = stages[-1] if stages else None
+            if len(search) == 1:
+                if isinstance(last, _TranslateStage) and last.can_join(search, replacement):
+                    last.add(search, replacement)
+                else:
+                    stages.append(_TranslateStage([(search, replacement)]))
+            elif isinstance(last, _LiteralStage) and last.can_join(search, replacement):
+                last.add(search, replacement)
+            else:
+                stages.append(_LiteralStage(search, replacement))
+
+        self.stages = tuple(stages)
+        # 実行計画: (必須文字の節, 適用関数)。各節の文字のいずれかを含む場合のみ適用
+        self._plan = tuple((stage.clauses, stage.apply) for stage in stages)
+        # 事前チェック: 各段は自身の契機文字のいずれかを含まない限り一致しない
+        if all(stage.trigger for stage in stages):
+            self.trigger_chars = frozenset().union(*(stage.trigger for stage in stages))
+            self._trigger = re.compile('[' + ''.join(re.escape(ch) for ch in sorted(self.trigger_chars)) + ']')
+        else:
+            self.trigger_chars = None
+            self._trigger = None
+
+    def __call__(self, text):
         """
         数学記法を正しいHTMLの<sup><sub>タグに変換
         例: I=πd4/32 → I=πd<sup>4</sup>/32
         """
         if not text:
             return text
+        if self._trigger is not None and not self._trigger.search(text):
+            return text
+
+        chars = set(text)
+        for clauses, apply in self._plan:
+            for clause in clauses:
+                if clause.isdisjoint(chars):
+                    break
+            else:
+                result = apply(text)
+                if result is not text:
+                    text = result
+                    chars = set(text)
+        return text
+
+
+def reference_math_notation_to_html(text):
+    """
+    変換ルールを1つずつ順に re.sub で適用する基準実装（コンパイル済みエンジンの検証用）
+    """
+    if not text:
+        return text
+
+    result = text
 
-        # 変換ルール
-        conversions = []
-
-        # 1. Unicode上付き文字をHTMLに変換
-        unicode_superscripts = {
-            '²': '<sup>2</sup>',
-            '³': '<sup>3</sup>',
-            '¹': '<sup>1</sup>',
-            '⁰': '<sup>0</sup>',
-            '⁴': '<sup>4</sup>',
-            '⁵': '<sup>5</sup>',
-            '⁶': '<sup>6</sup>',
-            '⁷': '<sup>7</sup>',
-            '⁸': '<sup>8</sup>',
-            '⁹': '<sup>9</sup>'
+    # Unicode上付き文字を変換
+    for unicode_char, html_replacement in UNICODE_SUPERSCRIPTS.items():
+        result = result.replace(unicode_char, html_replacement)
+
+    # 数学式パターンを変換
+    for pattern, replacement in MATH_PATTERNS:
+        result = re.sub(pattern, replacement, result)
+
+    return result
+
+
+_default_engine = None
+
+
+def create_math_notation_filter():
+    """数学記法を正しいHTMLに変換するFlaskテンプレートフィルター"""
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = MathRewriteEngine()
+    return _default_engine
+
+def create_math_template_filter(lookup_rendered=None, memo_size=MATH_MEMO_SIZE):
+    """
+    テンプレート用のmathフィルターを作成
+
+    Args:
+        lookup_rendered: 元の文字列 → 読み込み時に変換済みのHTML（未変換ならNone）を返す関数
+        memo_size: 変換済みでない文字列のメモ上限（件数）
+
+    Returns:
+        フィルター関数（stats() でメモの統計を取得可能）
+    """
+    convert = lru_cache(maxsize=memo_size)(create_math_notation_filter())
+    counters = {'prerendered': 0}
+
+    def math_template_filter(text):
+        if not text or not isinstance(text, str):
+            return text
+        if lookup_rendered is not None:
+            html = lookup_rendered(text)
+            if html is not None:
+                counters['prerendered'] += 1
+                return html
+        return convert(text)
+
+    def stats():
+        info = convert.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            'prerendered_hits': counters['prerendered'],
+            'memo_hits': info.hits,
+            'memo_misses': info.misses,
+            'memo_size': info.currsize,
+            'memo_max_size': info.maxsize,
+            'memo_hit_ratio': info.hits / lookups if lookups else 0.0,
         }
 
-        # 2. Unicode下付き文字はそのまま保持（化学式用）
-        # CO₂, H₂O, A₁v₁=A₂v₂ などは正しい表記として保持
-
-        # 3. 数学式パターンの検出と変換 - ULTRATHIN 完全網羅対応版
-        math_patterns = [
-            # 【最優先】データ誤り修正（LaTeX処理前に実行）ULTRA SYNC拡張版
-            # 基本パターン: 6^{4} → 64, 15^{7} → 157, 17^{6} → 176, 19^{6} → 196, 26^{4} → 264
-            (r'6\^\{4\}', r'64'),
-            (r'15\^\{7\}', r'157'),
-            (r'17\^\{6\}', r'176'),
-            (r'19\^\{6\}', r'196'),
-            (r'26\^\{4\}', r'264'),
-
-            # ULTRA SYNC発見追加パターン: 1^{2}→12, 1^{6}→16, 1^{8}→18等
-            (r'1\^\{2\}', r'12'),
-            (r'1\^\{6\}', r'16'),
-            (r'1\^\{8\}', r'18'),
-            (r'2\^\{4\}', r'24'),
-            (r'3\^\{5\}', r'35'),
-            (r'3\^\{6\}', r'36'),
-            (r'9\^\{6\}', r'96'),
-            (r'9\^\{8\}', r'98'),
-            (r'10\^\{8\}', r'108'),
-            (r'22\^\{8\}', r'228'),
-            (r'34\^\{8\}', r'348'),
-            (r'201\^\{2\}', r'2012'),
-
-            # CSV追加発見パターン: 0.3^{5}→0.35, 0.7^{5}→0.75, 1.^{5}→1.5等
-            (r'0\.3\^\{5\}', r'0.35'),
-            (r'0\.7\^\{5\}', r'0.75'),
-            (r'1\.\^\{2\}', r'1.2'),
-            (r'1\.\^\{5\}', r'1.5'),
-            (r'1\.4\^\{5\}', r'1.45'),
-            (r'0\.\^\{5\}', r'0.5'),
-
-            # 【次優先】LaTeX記法の完全変換
-            # ^{4} → <sup>4</sup>, ^{-3} → <sup>-3</sup>
-            (r'\^\{([^}]+)\}', r'<sup>\1</sup>'),
-            # _{2} → <sub>2</sub>, _{n+1} → <sub>n+1</sub>
-            (r'_\{([^}]+)\}', r'<sub>\1</sub>'),
-
-            # 【超優先】科学記数法の完全修正
-            # 2×10^-4 → 2×10<sup>-4</sup>
-            (r'(\d+(?:\.\d+)?×10)\^(-?\d+)', r'\1<sup>\2</sup>'),
-            # 10^{-3} → 10<sup>-3</sup>は上で処理済み
-
-            # 【次優先】単純LaTeX記法
-            # ^2 → <sup>2</sup>, _1 → <sub>1</sub>
-            (r'\^(-?\d+)', r'<sup>\1</sup>'),
-            (r'_(-?\d+)', r'<sub>\1</sub>'),
-
-            # 【工学単位最優先】N/mm2, kN/m3, kPa等
-            # 500N/mm2 → 500N/mm<sup>2</sup>
-            (r'([0-9.]+N/mm)([2-9])', r'\1<sup>\2</sup>'),
-            # 24.5kN/m3 → 24.5kN/m<sup>3</sup>
-            (r'([0-9.]+kN/m)([2-9])', r'\1<sup>\2</sup>'),
-            # 一般的なN/mm, kN/m記法
-            (r'(N/mm)([2-9])', r'\1<sup>\2</sup>'),
-            (r'(kN/m)([2-9])', r'\1<sup>\2</sup>'),
-
-            # 【密度・体積単位】kg/m3, g/cm3, t/m3
-            (r'([0-9.]*kg/m)([2-9])', r'\1<sup>\2</sup>'),
-            (r'([0-9.]*g/cm)([2-9])', r'\1<sup>\2</sup>'),
-            (r'([0-9.]*t/m)([2-9])', r'\1<sup>\2</sup>'),
-
-            # 【流量単位】m^{3}/s → m<sup>3</sup>/s
-            (r'(m)\^?\{?([0-9])\}?(/s)', r'\1<sup>\2</sup>\3'),
-
-            # 【専用単位記法】
-            # m/s2 → m/s<sup>2</sup>
-            (r'(m/s)([2-9])', r'\1<sup>\2</sup>'),
-
-            # 【一般工学単位】kN/m2, MPa, GPa等
-            (r'([a-zA-Z]+/[a-zA-Z]+)([2-9])', r'\1<sup>\2</sup>'),
-
-            # 【面積・体積・慣性モーメント単位】
-            # 400cm2 → 400cm<sup>2</sup>, 60cm4 → 60cm<sup>4</sup>
-            (r'(\d+cm)([2-9])', r'\1<sup>\2</sup>'),
-            (r'(\d+mm)([2-9])', r'\1<sup>\2</sup>'),
-
-            # 【一般的な変数の指数】
-            # v2=2gh → v<sup>2</sup>=2gh, bh3/12 → bh<sup>3</sup>/12
-            (r'([a-zA-Zπγρσ])([2-9])([/=\+\-\*\s])', r'\1<sup>\2</sup>\3'),
-
-            # 【括弧後の指数】
-            # (10cm)3 → (10cm)<sup>3</sup>
-            (r'(\))([2-9])([/=\+\-\*\s])', r'\1<sup>\2</sup>\3'),
-
-            # 【数学記号・ギリシャ文字パターン】
-            # ×105 → ×10<sup>5</sup>
-            (r'(×\d+)([2-9])', r'\1<sup>\2</sup>'),
-
-            # π関連: πd4/32 → πd<sup>4</sup>/32
-            (r'(π[a-zA-Z])([2-9])([/=])', r'\1<sup>\2</sup>\3'),
-
-            # 【特殊修正】不正LaTeX記法・誤記修正
-            # 9.^{8} → 9.8, 24.^{5} → 24.5 (ドット後の不正上付き)
-            (r'(\d+)\.\^?\{?([0-9])\}?', r'\1.\2'),
-
-            # 【体積単位完全対応】cm3, mm3, m3 → cm³, mm³, m³
-            (r'(\d*cm)3', r'\1³'),
-            (r'(\d*mm)3', r'\1³'),
-            (r'(\d*m)3(?![0-9])', r'\1³'),  # m30のような数字が続かない場合のみ
-
-            # 【面積単位完全対応】cm2, mm2, m2 → cm², mm², m²
-            (r'(\d*cm)2', r'\1²'),
-            (r'(\d*mm)2', r'\1²'),
-            (r'(\d*m)2(?![0-9])', r'\1²'),  # m20のような数字が続かない場合のみ
-
-            # 【科学記数法完全復旧】ULTRA SYNC発見：systematic degradation修正
-            # ×105 → ×10⁵, 2.0×105 → 2.0×10⁵
-            (r'(×10)5', r'\1⁵'),
-            (r'(×10)4', r'\1⁴'),
-            (r'(×10)3', r'\1³'),
-            (r'(×10)2', r'\1²'),
-            (r'(×10)6', r'\1⁶'),
-            (r'(×10)7', r'\1⁷'),
-            (r'(×10)8', r'\1⁸'),
-            (r'(×10)9', r'\1⁹'),
-            # 負の指数
-            (r'(×10)-1', r'\1⁻¹'),
-            (r'(×10)-2', r'\1⁻²'),
-            (r'(×10)-3', r'\1⁻³'),
-            (r'(×10)-4', r'\1⁻⁴'),
-            (r'(×10)-5', r'\1⁻⁵'),
-            (r'(×10)-6', r'\1⁻⁶'),
-
-            # 【指数表記統一強化】10^-3, 10^{-3}, 10^-6等 → 10⁻³, 10⁻⁶等
-            (r'10\^{?-([0-9])}?', r'10⁻\1'),
-            (r'10\^{?([0-9])}?', r'10^\1'),
-
-            # 【単位記号完全復旧】N/mm2 → N/mm², kN/m3 → kN/m³
-            (r'N/mm2', r'N/mm²'),
-            (r'kN/m2', r'kN/m²'),
-            (r'kN/m3', r'kN/m³'),
-            (r'kPa', r'kPa'),  # kPaは正しいのでそのまま
-            (r'MPa', r'MPa'),  # MPaは正しいのでそのまま
-            (r'GPa', r'GPa'),  # GPaは正しいのでそのまま
-
-            # 【体積・面積単位復旧】cm3→cm³, mm3→mm³, m3→m³, cm2→cm², mm2→mm², m2→m²
-            (r'([0-9.]*)cm3', r'\1cm³'),
-            (r'([0-9.]*)mm3', r'\1mm³'),
-            (r'([0-9.]*)m3(?![0-9])', r'\1m³'),
-            (r'([0-9.]*)cm2', r'\1cm²'),
-            (r'([0-9.]*)mm2', r'\1mm²'),
-            (r'([0-9.]*)m2(?![0-9])', r'\1m²'),
-
-            # 【CRITICAL FIX】数学記号不一致修正 - UI Testing発見問題対応
-            # ｙ＝L^{2}/8R, ｙ＝R/8L2 → y=L²/8R, y=R/8L² (全角文字と指数表記統一)
-            (r'ｙ＝', r'y='),  # 全角y修正
-            (r'L\^{2}', r'L²'),  # LaTeX記法をUnicode上付き文字に統一
-            (r'L2([^0-9])', r'L²\\1'),  # L2 → L² (数字が続かない場合)
-            (r'R/8L2', r'R/8L²'),  # 特定の不一致修正
-
-            # 【全角文字統一】ULTRA SYNC発見パターン完全網羅
-            # 括弧統一: （） → ()
-            (r'（', r'('),
-            (r'）', r')'),
-
-            # 全角スラッシュ統一: ／ → /
-            (r'／', r'/'),
-
-            # 全角数字統一: ０１２３４５６７８９ → 0123456789
-            (r'０', r'0'), (r'１', r'1'), (r'２', r'2'), (r'３', r'3'), (r'４', r'4'),
-            (r'５', r'5'), (r'６', r'6'), (r'７', r'7'), (r'８', r'8'), (r'９', r'9'),
-
-            # 全角英字統一: ＡＢＣ等 → ABC等
-            (r'ａ', r'a'), (r'ｂ', r'b'), (r'ｃ', r'c'), (r'ｄ', r'd'),
-            (r'ｅ', r'e'), (r'ｆ', r'f'), (r'ｇ', r'g'), (r'ｈ', r'h'),
-            (r'ｉ', r'i'), (r'ｊ', r'j'), (r'ｋ', r'k'), (r'ｌ', r'l'),
-            (r'ｍ', r'm'), (r'ｎ', r'n'), (r'ｏ', r'o'), (r'ｐ', r'p'),
-            (r'ｑ', r'q'), (r'ｒ', r'r'), (r'ｓ', r's'), (r'ｔ', r't'),
-            (r'ｕ', r'u'), (r'ｖ', r'v'), (r'ｗ', r'w'), (r'ｘ', r'x'),
-            (r'ｙ', r'y'), (r'ｚ', r'z'),
-            (r'Ａ', r'A'), (r'Ｂ', r'B'), (r'Ｃ', r'C'), (r'Ｄ', r'D'),
-            (r'Ｅ', r'E'), (r'Ｆ', r'F'), (r'Ｇ', r'G'), (r'Ｈ', r'H'),
-            (r'Ｉ', r'I'), (r'Ｊ', r'J'), (r'Ｋ', r'K'), (r'Ｌ', r'L'),
-            (r'Ｍ', r'M'), (r'Ｎ', r'N'), (r'Ｏ', r'O'), (r'Ｐ', r'P'),
-            (r'Ｑ', r'Q'), (r'Ｒ', r'R'), (r'Ｓ', r'S'), (r'Ｔ', r'T'),
-            (r'Ｕ', r'U'), (r'Ｖ', r'V'), (r'Ｗ', r'W'), (r'Ｘ', r'X'),
-            (r'Ｙ', r'Y'), (r'Ｚ', r'Z'),
-
-            # 単位記号の全角文字統一: ｃｍ → cm, ｍ → m
-            (r'ｃｍ', r'cm'), (r'ｍｍ', r'mm'), (r'ｍ', r'm'),
-
-            # 【土木工学専用】質量記号の下付き文字統一
-            # ms, mw → m<sub>s</sub>, m<sub>w</sub>
-            # ｍs, ｍw → m<sub>s</sub>, m<sub>w</sub> (全角m対応)
-            (r'([^a-zA-Z]|^)(ｍ|m)(s)([^a-zA-Z]|$)', r'\1m<sub>\3</sub>\4'),
-            (r'([^a-zA-Z]|^)(ｍ|m)(w)([^a-zA-Z]|$)', r'\1m<sub>\3</sub>\4'),
-
-            # 【ギリシャ文字下付き文字統一】ULTRA SYNC追加修正
-            # ρs, ρw, ρd → ρ<sub>s</sub>, ρ<sub>w</sub>, ρ<sub>d</sub>
-            (r'([^a-zA-Z]|^)(ρ)(s)([^a-zA-Z]|$)', r'\1ρ<sub>\3</sub>\4'),
-            (r'([^a-zA-Z]|^)(ρ)(w)([^a-zA-Z]|$)', r'\1ρ<sub>\3</sub>\4'),
-            (r'([^a-zA-Z]|^)(ρ)(d)([^a-zA-Z]|$)', r'\1ρ<sub>\3</sub>\4'),
-
-            # γs, γw, γd, γt, γt1, γt2 → γ<sub>s</sub>, γ<sub>w</sub>, γ<sub>d</sub>, γ<sub>t</sub>, γ<sub>t1</sub>, γ<sub>t2</sub>
-            (r'([^a-zA-Z]|^)(γ)(s)([^a-zA-Z]|$)', r'\1γ<sub>\3</sub>\4'),
-            (r'([^a-zA-Z]|^)(γ)(w)([^a-zA-Z]|$)', r'\1γ<sub>\3</sub>\4'),
-            (r'([^a-zA-Z]|^)(γ)(d)([^a-zA-Z]|$)', r'\1γ<sub>\3</sub>\4'),
-            (r'([^a-zA-Z]|^)(γ)(t[0-9]*)([^a-zA-Z]|$)', r'\1γ<sub>\3</sub>\4'),
-
-            # σs, σw, σ1, σ2, σ3 → σ<sub>s</sub>, σ<sub>w</sub>, σ<sub>1</sub>, σ<sub>2</sub>, σ<sub>3</sub>
-            (r'([^a-zA-Z]|^)(σ)(s|w|[0-9])([^a-zA-Z]|$)', r'\1σ<sub>\3</sub>\4'),
-
-            # αs, αw, βs, βw → α<sub>s</sub>, α<sub>w</sub>, β<sub>s</sub>, β<sub>w</sub>
-            (r'([^a-zA-Z]|^)(α|β)(s|w)([^a-zA-Z]|$)', r'\1\2<sub>\3</sub>\4'),
-
-            # 【三角関数逆関数】cos-1, sin-1, tan-1 → cos<sup>-1</sup>, sin<sup>-1</sup>, tan<sup>-1</sup>
-            (r'(cos|sin|tan)-1', r'\1<sup>-1</sup>'),
-
-            # 【問題文の選択肢表記統一】a～d → A～D（問題文中の選択肢参照）
-            (r'のをa～d', r'のをA～D'),
-            (r'をa～dの', r'をA～Dの'),
-            (r'からa～d', r'からA～D'),
-        ]
-
-        result = text
-
-        # Unicode上付き文字を変換
-        for unicode_char, html_replacement in unicode_superscripts.items():
-            result = result.replace(unicode_char, html_replacement)
-
-        # 数学式パターンを変換
-        for pattern, replacement in math_patterns:
-            result = re.sub(pattern, replacement, result)
-
-        return result
-
-    return math_notation_to_html
-
-def add_math_filter_to_app(app):
+    math_template_filter.stats = stats
+    math_template_filter.cache_clear = convert.cache_clear
+    return math_template_filter
+
+def add_math_filter_to_app(app, lookup_rendered=None):
     """Flaskアプリにmathフィルターを追加"""
-    math_filter = create_math_notation_filter()
+    math_filter = create_math_template_filter(lookup_rendered)
 
     @app.template_filter('math')
     def math_notation_filter(text):
@@ -0,0 +1,200 @@
+"""
+gunicornワーカーごとのメモリ使用量計測
+- ワーカーごとのUSS（そのプロセス固有のメモリ）・PSS・RSS
+- ワーカー数を増やしたときにUSS合計がどれだけ増えるか
+
+問題バンクをfork前に構築・凍結している場合、バンクのページはマスターと共有され、
+ワーカーを増やしてもUSS合計はバンクサイズ分ずつ増えません。
+
+使い方:
+    python measure_worker_memory.py                      # ワーカー数1,2,4で起動して比較
+    python measure_worker_memory.py --workers 2 4 8
+    python measure_worker_memory.py --pid <マスターPID>    # 起動中のgunicornを計測
+    python measure_worker_memory.py --simulate 4         # fork+フルGCでワーカーを再現（gunicorn不要）
+    BANK_PREFORK_FREEZE=false python measure_worker_memory.py  # 凍結なしとの比較
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.parse
+import urllib.request
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+# ワーカーに問題バンクを参照させるためのリクエスト
+WARM_PATHS = ['/', '/exam?question_type=basic', '/exam?question_type=specialist&department=道路&year=2019']
+
+MB = 1024 * 1024
+
+
+def process_memory(proc):
+    """プロセスのメモリ使用量（MB）を取得"""
+    info = proc.memory_full_info()
+    return {
+        'pid': proc.pid,
+        'uss': info.uss / MB,
+        'pss': getattr(info, 'pss', 0) / MB,
+        'rss': info.rss / MB,
+    }
+
+
+def measure_master(master_pid):
+    """マスターと配下ワーカーのメモリ使用量を計測"""
+    master = psutil.Process(master_pid)
+    workers = [process_memory(child) for child in master.children()]
+    return {'master': process_memory(master), 'workers': workers}
+
+
+def wait_for_workers(master_pid, worker_count, port, timeout=60):
+    """全ワーカーの起動とポートの応答を待つ"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if len(psutil.Process(master_pid).children()) >= worker_count:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=5).read()
+                return True
+        except Exception:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def warm_workers(port, rounds):
+    """各ワーカーにリクエストが行き渡るよう繰り返しアクセス"""
+    for _ in range(rounds):
+        for path in WARM_PATHS:
+            url = f'http://127.0.0.1:{port}' + urllib.parse.quote(path, safe='/?=&')
+            try:
+                urllib.request.urlopen(url, timeout=10).read()
+            except Exception as e:
+                print(f'  リクエストエラー {path}: {e}')
+
+
+def run_gunicorn(worker_count, port, rounds):
+    """gunicornを --preload で起動して計測"""
+    cmd = [
+        sys.executable, '-m', 'gunicorn',
+        '--bind', f'127.0.0.1:{port}',
+        '--workers', str(worker_count), '--threads', '2',
+        '--preload', '--log-level', 'warning',
+        'wsgi:application',
+    ]
+    proc = subprocess.Popen(cmd, cwd=os.path.dirname(os.path.abspath(__file__)),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_workers(proc.pid, worker_count, port):
+            print(f'  gunicorn起動タイムアウト（workers={worker_count}）')
+            return None
+        warm_workers(port, rounds)
+        time.sleep(1)
+        return measure_master(proc.pid)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def simulate_workers(worker_count):
+    """
+    gunicorn --preload と同じ手順（構築 → 凍結 → fork）をプロセス内で再現して計測
+
+    各ワーカーでフルGCと全問題の走査を行い、バンクのページがどれだけ
+    ワーカー固有（USS）になるかを確認します。短時間のgunicorn計測では
+    フルGCが走らないことが多いため、凍結の効果はこちらで確認できます。
+    """
+    import gc
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from config import DataConfig
+    from services.question_bank import question_bank
+
+    version = question_bank.warm_up(freeze=DataConfig.BANK_PREFORK_FREEZE)
+    read_fd, write_fd = os.pipe()
+    children = []
+    for _ in range(worker_count):
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            gc.collect()
+            sum(1 for q in version.questions if q['question_type'] == 'basic')
+            os.write(write_fd, b'.')
+            time.sleep(30)
+            os._exit(0)
+        children.append(pid)
+
+    os.close(write_fd)
+    for _ in children:
+        os.read(read_fd, 1)
+    try:
+        master = psutil.Process(os.getpid())
+        return {'master': process_memory(master),
+                'workers': [process_memory(psutil.Process(pid)) for pid in children]}
+    finally:
+        for pid in children:
+            os.kill(pid, 15)
+            os.waitpid(pid, 0)
+
+
+def print_report(worker_count, report):
+    """計測結果を表示"""
+    master = report['master']
+    workers = report['workers']
+    total_uss = sum(w['uss'] for w in workers)
+    print(f'--- workers={worker_count} ---')
+    print(f"  master  pid={master['pid']:<7} USS={master['uss']:7.1f}MB PSS={master['pss']:7.1f}MB RSS={master['rss']:7.1f}MB")
+    for w in workers:
+        print(f"  worker  pid={w['pid']:<7} USS={w['uss']:7.1f}MB PSS={w['pss']:7.1f}MB RSS={w['rss']:7.1f}MB")
+    print(f'  ワーカーUSS合計: {total_uss:.1f}MB (1ワーカーあたり {total_uss / max(len(workers), 1):.1f}MB)')
+    return total_uss
+
+
+def main():
+    parser = argparse.ArgumentParser(description='gunicornワーカーごとのメモリ使用量計測')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='比較するワーカー数')
+    parser.add_argument('--port', type=int, default=18000, help='計測用gunicornのポート')
+    parser.add_argument('--rounds', type=int, default=10, help='ウォームアップのリクエスト回数')
+    parser.add_argument('--pid', type=int, help='起動中のgunicornマスターPID（指定時は起動しない）')
+    parser.add_argument('--simulate', type=int, metavar='N', help='gunicornを使わずN個のワーカーをforkして計測')
+    args = parser.parse_args()
+
+    if not PSUTIL_AVAILABLE:
+        print('psutilが必要です: pip install psutil')
+        return 1
+
+    print('=== Worker Memory Report ===')
+    print(f"BANK_PREFORK_FREEZE={os.environ.get('BANK_PREFORK_FREEZE', 'True')}\n")
+
+    if args.pid:
+        report = measure_master(args.pid)
+        print_report(len(report['workers']), report)
+        return 0
+
+    if args.simulate:
+        print_report(args.simulate, simulate_workers(args.simulate))
+        return 0
+
+    totals = {}
+    for offset, worker_count in enumerate(args.workers):
+        report = run_gunicorn(worker_count, args.port + offset, args.rounds)
+        if report:
+            totals[worker_count] = print_report(worker_count, report)
+
+    if len(totals) > 1:
+        print('\n=== Summary ===')
+        counts = sorted(totals)
+        base = counts[0]
+        for count in counts[1:]:
+            added = (totals[count] - totals[base]) / (count - base)
+            print(f'  ワーカー1つ追加あたりのUSS増加: {added:.1f}MB ({base}→{count})')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+旧セッションファイル（Flask-Session / cachelib 形式）の移行
+- sessions/ 直下の平置きファイル（キーのMD5名、4バイトの有効期限 + pickleしたセッション辞書）を
+  1件ずつ読み込み、サーバーサイドセッションのファイルシステムバックエンド（2階層シャーディング・
+  有効期限インデックス）へ書き込みます
+- 有効期限はpickleを読む前にヘッダーの4バイトだけで判定し、期限切れのファイルは読み込みません
+- 全件をメモリに載せないため、ファイル数が多くても一定のメモリで動作します
+
+Flask-Session のファイル名はキー（プレフィックス + セッションID）のMD5のため、Cookieの
+セッションIDは復元できません。移行したセッションは '<キープレフィックス>legacy-<MD5名>' を
+キーとして保存し、旧Cookieでアクセスがあったときにセッションインターフェースが
+CookieのセッションIDのMD5から見つけて新しいセッションIDへ引き継ぎます
+（旧Cookieと同じキープレフィックスを指定してください。引き継がれないまま有効期限が切れると
+通常のセッションと同様に掃除されます）。
+pickleを読み込むため、信頼できる自サーバーのファイルにだけ使用してください。
+
+使い方:
+    python migrate_legacy_sessions.py --dry-run          # 件数の確認のみ
+    python migrate_legacy_sessions.py                    # 有効なセッションを移行（元ファイルは残す）
+    python migrate_legacy_sessions.py --remove-source    # 移行後・期限切れの元ファイルを削除
+    python migrate_legacy_sessions.py --source old_sessions --target sessions
+"""
+import argparse
+import os
+import pickle
+import re
+import struct
+import sys
+import time
+
+from config import Config
+from services.session_store import FileSystemSessionBackend, dumps_item, legacy_session_key
+
+# cachelib FileSystemCache のファイル: MD5名、先頭4バイトが有効期限（0は無期限）
+LEGACY_NAME_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+LEGACY_HEADER = struct.Struct('<I')
+
+
+def iter_legacy_files(source):
+    """移行対象の平置きファイルを1件ずつ返す（シャーディング済みのディレクトリ等は対象外）"""
+    with os.scandir(source) as entries:
+        for entry in entries:
+            if entry.is_file() and LEGACY_NAME_PATTERN.match(entry.name):
+                yield entry
+
+
+def convert_items(session_data, counts):
+    """セッション辞書をキーごとにシリアライズ（変換できない値のキーは除外）"""
+    items = {}
+    for name, value in session_data.items():
+        try:
+            items[str(name)] = dumps_item(str(name), value)
+        except Exception as e:
+            counts['dropped_keys'] += 1
+            print(f'[SKIP KEY] {name}: {type(value).__name__} は保存できません ({e})')
+    return items
+
+
+def read_legacy_file(path, now):
+    """
+    旧セッションファイルを読み込む（期限切れの場合はヘッダーだけ読む）
+
+    Returns:
+        tuple: (状態 'ok' / 'expired' / 'unreadable', 有効期限, セッションデータ)
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(LEGACY_HEADER.size)
+            if len(header) < LEGACY_HEADER.size:
+                return 'unreadable', 0, None
+            expires_at = LEGACY_HEADER.unpack(header)[0]
+            if expires_at and expires_at <= now:
+                return 'expired', expires_at, None
+            return 'ok', expires_at, pickle.load(f)
+    except Exception as e:
+        print(f'[UNREADABLE] {os.path.basename(path)}: {e}')
+        return 'unreadable', 0, None
+
+
+def migrate(source, backend, key_prefix, lifetime, dry_run=False, remove_source=False):
+    """
+    旧セッションファイルを移行
+
+    Args:
+        source: 旧セッションファイルのディレクトリ
+        backend: 書き込み先のファイルシステムバックエンド
+        key_prefix: セッションキーのプレフィックス
+        lifetime: 無期限（0）のファイルに設定する有効期限（秒）
+        dry_run: Trueの場合は書き込み・削除を行わない
+        remove_source: 移行済み・期限切れ・読み込めない元ファイルを削除
+
+    Returns:
+        dict: 件数（migrated / expired / unreadable / not_session / dropped_keys / removed）
+    """
+    counts = dict.fromkeys(('scanned', 'migrated', 'expired', 'unreadable', 'not_session',
+                            'dropped_keys', 'removed'), 0)
+    now = int(time.time())
+
+    for entry in iter_legacy_files(source):
+        counts['scanned'] += 1
+        status, expires_at, session_data = read_legacy_file(entry.path, now)
+        if status == 'ok' and not isinstance(session_data, dict):
+            # cachelib のファイル数カウンタ等は残す
+            counts['not_session'] += 1
+            continue
+        if status == 'ok':
+            items = convert_items(session_data, counts)
+            if not dry_run:
+                backend.save(legacy_session_key(key_prefix, entry.name), items, expires_at or now + lifetime)
+            counts['migrated'] += 1
+        else:
+            counts[status] += 1
+
+        if remove_source and not dry_run:
+            os.remove(entry.path)
+            counts['removed'] += 1
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='旧セッションファイル（cachelib形式）の移行')
+    parser.add_argument('--source', default=Config.SESSION_FILE_DIR, help='旧セッションファイルのディレクトリ')
+    parser.add_argument('--target', default=Config.SESSION_FILE_DIR, help='書き込み先（SESSION_FILE_DIR）')
+    parser.add_argument('--key-prefix', default=Config.SESSION_KEY_PREFIX, help='セッションキーのプレフィックス')
+    parser.add_argument('--dry-run', action='store_true', help='件数の確認のみ（書き込み・削除なし）')
+    parser.add_argument('--remove-source', action='store_true', help='移行済み・期限切れの元ファイルを削除')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.source):
+        print(f'[ERROR] ディレクトリがありません: {args.source}')
+        return 1
+
+    backend = FileSystemSessionBackend(args.target, Config.SESSION_FILE_THRESHOLD)
+    started = time.perf_counter()
+    counts = migrate(args.source, backend, args.key_prefix, Config.PERMANENT_SESSION_LIFETIME,
+                     dry_run=args.dry_run, remove_source=args.remove_source)
+    elapsed = time.perf_counter() - started
+
+    print('\n=== 旧セッションファイルの移行' + ('（dry-run）' if args.dry_run else '') + ' ===')
+    print(f"対象ファイル:     {counts['scanned']}")
+    print(f"移行:             {counts['migrated']}")
+    print(f"期限切れ:         {counts['expired']}")
+    print(f"読み込み不可:     {counts['unreadable']}")
+    print(f"セッション以外:   {counts['not_session']}")
+    print(f"除外したキー:     {counts['dropped_keys']}")
+    print(f"削除した元ファイル: {counts['removed']}")
+    print(f"所要時間:         {elapsed:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
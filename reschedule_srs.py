@@ -0,0 +1,95 @@
+"""
+SRS復習予定の一括再計算（オフライン）
+- 学習進捗ストア（DataConfig.PROGRESS_DB_PATH）の srs_state を主キー順に一定件数ずつ
+  （--chunk-rows、ユーザーをまたいで）読み込み、新しい基本間隔で次回間隔・次回復習日時を
+  計算し直して、変わった記録だけをチャンクごとに1トランザクションで書き戻します
+- 計算はチャンクごとに1つの services/srs_engine.SRSBatch の配列演算（NumPy がない場合は
+  純Python）で行います。NumPy と純Pythonの結果の一致は benchmark_srs_engine.py で確認できます
+- 次回復習日時は「予定を決めた時点 + 新しい間隔」です（再計算の日時からではありません）
+
+使い方:
+    python reschedule_srs.py --dry-run                       # 変更件数・統計の確認のみ
+    python reschedule_srs.py                                 # SRSService.BASE_INTERVALS で再計算
+    python reschedule_srs.py --intervals 1,3,7,21,60,180     # 新しい基本間隔で再計算
+    python reschedule_srs.py --db user_data/progress.sqlite3 --user <ユーザーID>
+    python reschedule_srs.py --chunk-rows 20000              # メモリが少ない環境
+
+セッション中の advanced_srs は学習進捗ストアから復元されるまで以前の予定のままです。
+"""
+import argparse
+import sys
+import time
+
+from data_manager import DataManager
+from services.srs_engine import NUMPY_AVAILABLE, SRSBatch
+from services.srs_service import SRSService
+
+
+def parse_intervals(value):
+    intervals = [int(part) for part in value.split(',') if part.strip()]
+    if not intervals or min(intervals) < 1:
+        raise argparse.ArgumentTypeError('基本間隔は1以上の整数をカンマ区切りで指定してください')
+    return intervals
+
+
+DEFAULT_CHUNK_ROWS = 100000
+
+
+def reschedule(data_manager, intervals, user_ids=None, chunk_rows=DEFAULT_CHUNK_ROWS, dry_run=False):
+    """
+    SRS状態をチャンク（複数ユーザーの記録）ごとに1つの配列で再計算
+
+    Returns:
+        dict: 件数（users / records / skipped / changed / due / mastered）
+    """
+    counts = dict.fromkeys(('users', 'records', 'skipped', 'changed', 'due', 'mastered'), 0)
+    users = set()
+    for records in data_manager.iter_srs_chunks(chunk_rows, user_ids):
+        batch = SRSBatch.from_records(records)
+        changed_rows = batch.reschedule(intervals)
+        if changed_rows and not dry_run:
+            data_manager.save_srs_records(batch.apply(changed_rows))
+
+        stats = batch.statistics()
+        users.update(user_id for user_id, _, _ in records)
+        counts['users'] = len(users)
+        counts['records'] += len(batch)
+        counts['skipped'] += batch.skipped
+        counts['changed'] += len(changed_rows)
+        counts['due'] += stats['due_questions']
+        counts['mastered'] += stats['mastered_questions']
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SRS復習予定の一括再計算')
+    parser.add_argument('--intervals', type=parse_intervals, default=list(SRSService.BASE_INTERVALS),
+                        help='正解数ごとの基本間隔（日数、カンマ区切り）')
+    parser.add_argument('--db', default=None, help='学習進捗ストア（省略時は DataConfig.PROGRESS_DB_PATH）')
+    parser.add_argument('--user', action='append', help='対象ユーザーID（複数指定可、省略時は全員）')
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS,
+                        help=f'1回に読み込む記録数（既定 {DEFAULT_CHUNK_ROWS}）')
+    parser.add_argument('--dry-run', action='store_true', help='件数の確認のみ（書き込みなし）')
+    args = parser.parse_args()
+
+    data_manager = DataManager(args.db)
+
+    started = time.perf_counter()
+    counts = reschedule(data_manager, args.intervals, args.user, args.chunk_rows, dry_run=args.dry_run)
+    elapsed = time.perf_counter() - started
+
+    print('\n=== SRS復習予定の一括再計算' + ('（dry-run）' if args.dry_run else '') + ' ===')
+    print(f"計算エンジン:     {'numpy' if NUMPY_AVAILABLE else 'python'}")
+    print(f"基本間隔:         {args.intervals}")
+    print(f"ユーザー:         {counts['users']}")
+    print(f"対象の記録:       {counts['records']}")
+    print(f"対象外の記録:     {counts['skipped']}")
+    print(f"変更した記録:     {counts['changed']}")
+    print(f"復習期限（再計算後）: {counts['due']}")
+    print(f"マスター済み:     {counts['mastered']}")
+    print(f"所要時間:         {elapsed:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
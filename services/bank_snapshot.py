@@ -0,0 +1,468 @@
+"""
+Question Bank Snapshot for RCCM Quiz Application
+問題バンクのバイナリスナップショット - Phase 13 Performance
+
+data/*.csv を1つのバージョン付きバイナリスナップショットへコンパイルします。
+各ソースファイルはサイズ・mtime・ハッシュで識別され、起動時は変更された
+ファイルだけをCSVから再解析し、それ以外はスナップショットをそのまま読み込みます。
+
+ビルド時のコンパイル:
+    python -m services.bank_snapshot [data_dir]
+"""
+import hashlib
+import logging
+import mmap
+import os
+import pickle
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.encoding_manifest import ensure_encodings
+
+logger = logging.getLogger(__name__)
+
+# スナップショット形式（ヘッダー: マジック + フォーマットバージョン）
+SNAPSHOT_MAGIC = b'RCCMBANK'
+SNAPSHOT_VERSION = 5  # v2: Questionレコード, v3: (ファイル, 元ID)による固定ID, v4: 数式HTMLの事前変換,
+                      # v5: ビルドステップでも事前変換（v4のビルド版は変換なしのため破棄）
+SNAPSHOT_HEADER = struct.Struct('<8sI')
+SNAPSHOT_FILENAME = 'question_bank.snapshot'
+
+# ソースファイル定義（読み込み順 = 問題バンクの並び順）
+BASIC_SOURCE_FILE = '4-1.csv'
+SPECIALIST_YEARS = range(2008, 2020)
+
+_snapshot_write_lock = threading.Lock()
+
+
+def get_source_files(data_dir: str) -> List[Tuple[str, str, Optional[int]]]:
+    """
+    問題バンクを構成するソースファイルの一覧を取得
+
+    Args:
+        data_dir: データディレクトリ
+
+    Returns:
+        (ファイル名, 問題種別, 年度) のリスト（読み込み順）
+    """
+    sources = [(BASIC_SOURCE_FILE, 'basic', None)]
+    for year in SPECIALIST_YEARS:
+        sources.append((f'4-2_{year}.csv', 'specialist', year))
+    return sources
+
+
+def get_snapshot_path(data_dir: str) -> str:
+    """
+    スナップショットファイルのパスを取得
+
+    環境変数 RCCM_BANK_SNAPSHOT_PATH で上書き可能です。
+    """
+    return os.environ.get('RCCM_BANK_SNAPSHOT_PATH') or os.path.join(data_dir, SNAPSHOT_FILENAME)
+
+
+def file_fingerprint(path: str) -> Dict[str, int]:
+    """
+    ファイルのstat指紋（サイズ・mtime）を取得
+
+    Args:
+        path: ファイルパス
+
+    Returns:
+        {'size': バイト数, 'mtime_ns': 更新時刻(ns)}
+    """
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def file_digest(path: str) -> str:
+    """ファイル内容のMD5ハッシュを計算"""
+    hash_md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            hash_md5.update(chunk)
+    return hash_md5.hexdigest()
+
+
+def read_snapshot(snapshot_path: str) -> Optional[Dict[str, Any]]:
+    """
+    スナップショットを読み込む
+
+    ファイルをmmapで直接マップしてデシリアライズします。
+    形式・バージョンが一致しない場合はNoneを返します（CSV再解析にフォールバック）。
+
+    Args:
+        snapshot_path: スナップショットファイルのパス
+
+    Returns:
+        スナップショット辞書（無効な場合None）
+    """
+    if not os.path.exists(snapshot_path):
+        return None
+
+    try:
+        with open(snapshot_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size <= SNAPSHOT_HEADER.size:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                magic, version = SNAPSHOT_HEADER.unpack_from(mapped, 0)
+                if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                    logger.info(f"スナップショット形式不一致のため無視: {snapshot_path} (version={version})")
+                    return None
+                with memoryview(mapped) as view:
+                    snapshot = pickle.loads(view[SNAPSHOT_HEADER.size:])
+    except Exception as e:
+        logger.warning(f"スナップショット読み込みエラー: {e}")
+        return None
+
+    if not isinstance(snapshot, dict) or not isinstance(snapshot.get('sources'), dict):
+        return None
+    return snapshot
+
+
+def write_snapshot(snapshot_path: str, sources: Dict[str, Dict[str, Any]]) -> bool:
+    """
+    スナップショットをアトミックに書き込む（一時ファイル + rename）
+
+    Args:
+        snapshot_path: スナップショットファイルのパス
+        sources: ファイル名 → ソースエントリの辞書
+
+    Returns:
+        書き込み成功したかどうか
+    """
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'created_at': time.time(),
+        'sources': sources,
+    }
+    tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+
+    with _snapshot_write_lock:
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION))
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, snapshot_path)
+            logger.info(f"💾 問題バンクスナップショット保存: {snapshot_path} ({len(sources)}ファイル)")
+            return True
+        except OSError as e:
+            # 読み取り専用ファイルシステム等ではスナップショットなしで継続
+            logger.warning(f"スナップショット保存エラー: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+
+
+def is_entry_current(entry: Optional[Dict[str, Any]], path: str,
+                     fingerprint: Dict[str, int]) -> bool:
+    """
+    スナップショットのエントリがソースファイルと一致するか判定
+
+    サイズとmtimeが一致すればハッシュ計算を省略します。
+    mtimeのみ変化した場合（touch・チェックアウト等）はハッシュで内容を確認し、
+    一致すればエントリの指紋を更新して再利用します。
+    """
+    if not entry:
+        return False
+    if entry.get('size') != fingerprint['size']:
+        return False
+    if entry.get('mtime_ns') == fingerprint['mtime_ns']:
+        return True
+
+    if entry.get('digest') == file_digest(path):
+        entry['mtime_ns'] = fingerprint['mtime_ns']
+        return True
+    return False
+
+
+def _timed_parse(
+    parse_source: Callable[[str, str, Optional[int]], List[Any]],
+    path: str,
+    question_type: str,
+    year: Optional[int]
+) -> Tuple[List[Any], float]:
+    """解析関数を実行し (問題リスト, 所要秒数) を返す（ワーカープロセスでも実行）"""
+    start = time.perf_counter()
+    questions = parse_source(path, question_type, year)
+    return questions, time.perf_counter() - start
+
+
+def resolve_build_workers(workers: Optional[int], job_count: int) -> int:
+    """
+    コールドビルドのワーカープロセス数を決定
+
+    Args:
+        workers: 指定値（None・0: CPU数, 1: 逐次）
+        job_count: 解析対象のファイル数
+
+    Returns:
+        実際に使用するプロセス数（1なら逐次解析）
+    """
+    if not workers or workers < 0:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, job_count))
+
+
+def parse_sources(
+    jobs: List[Tuple[str, str, str, Optional[int]]],
+    parse_source: Callable[[str, str, Optional[int]], List[Any]],
+    workers: Optional[int] = None
+) -> Tuple[Dict[str, List[Any]], Dict[str, float]]:
+    """
+    複数のソースファイルを解析（必要に応じてプロセスプールで並列化）
+
+    CSV解析・cp932クリーニング・検証は純Pythonの処理でGILに律速されるため、
+    スレッドではなくプロセスで並列化します。結果はファイル名で受け取り、
+    呼び出し側がソース順に並べ直すため、完了順に関係なく決定的です。
+    プールが使えない環境（fork不可等）では逐次解析にフォールバックします。
+
+    Args:
+        jobs: (ファイル名, パス, 問題種別, 年度) のリスト
+        parse_source: モジュールレベルのCSV解析関数（プロセス間でpickle可能なもの）
+        workers: ワーカープロセス数（None・0: CPU数, 1: 逐次）
+
+    Returns:
+        (ファイル名 → 問題リスト, ファイル名 → 解析秒数)。失敗したファイルは含みません。
+    """
+    results = {}
+    timings = {}
+    pending = list(jobs)
+    max_workers = resolve_build_workers(workers, len(jobs))
+
+    if max_workers > 1:
+        # ワーカーの異常終了（BrokenProcessPool）で結果を受け取れなかったファイル
+        broken = set()
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(_timed_parse, parse_source, path, question_type, year): filename
+                    for filename, path, question_type, year in jobs
+                }
+                for future in as_completed(futures):
+                    filename = futures[future]
+                    try:
+                        results[filename], timings[filename] = future.result()
+                    except BrokenProcessPool:
+                        broken.add(filename)
+                    except Exception as e:
+                        logger.warning(f"{filename} 読み込みエラー: {e}")
+            pending = [job for job in jobs if job[0] in broken]
+        except Exception as e:
+            # プール自体の起動・通信失敗時は未完了分を逐次で解析
+            logger.warning(f"プロセスプール解析エラー（逐次解析にフォールバック）: {e}")
+            pending = [job for job in jobs if job[0] not in results]
+        else:
+            if pending:
+                logger.warning(f"プロセスプールが異常終了しました（{len(pending)}ファイルを逐次解析にフォールバック）")
+
+    for filename, path, question_type, year in pending:
+        try:
+            results[filename], timings[filename] = _timed_parse(parse_source, path, question_type, year)
+        except Exception as e:
+            logger.warning(f"{filename} 読み込みエラー: {e}")
+
+    return results, timings
+
+
+def load_bank_sources(
+    data_dir: str,
+    parse_source: Callable[[str, str, Optional[int]], List[Dict[str, Any]]],
+    use_snapshot: bool = True,
+    workers: Optional[int] = None
+) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, Any]]:
+    """
+    スナップショット経由で全ソースファイルの問題を読み込む
+
+    変更のないファイルはスナップショットから、変更・新規ファイルのみ
+    parse_source でCSVから再解析し、スナップショットを更新します。
+    再解析するファイルが複数ある場合はプロセスプールで並列に解析します。
+
+    Args:
+        data_dir: データディレクトリ
+        parse_source: (パス, 問題種別, 年度) を受け取り問題リストを返すCSV解析関数
+        use_snapshot: Falseの場合スナップショットを無視して全ファイルを再解析
+        workers: 解析ワーカープロセス数（None・0: CPU数, 1: 逐次）
+
+    Returns:
+        (ファイル名 → 問題リストのパーティション（ソース順）, 読み込み統計)
+        統計の 'fingerprints' に各ファイルのstat指紋、'timings' に解析秒数を含みます。
+    """
+    snapshot_path = get_snapshot_path(data_dir)
+    snapshot = read_snapshot(snapshot_path) if use_snapshot else None
+    cached_sources = snapshot['sources'] if snapshot else {}
+
+    sources = []
+    fingerprints = {}
+    reused_files = []
+    parse_jobs = []
+    snapshot_dirty = snapshot is None
+
+    for filename, question_type, year in get_source_files(data_dir):
+        path = os.path.join(data_dir, filename)
+        if not os.path.exists(path):
+            if filename in cached_sources:
+                snapshot_dirty = True
+            continue
+
+        fingerprint = file_fingerprint(path)
+        entry = cached_sources.get(filename)
+        cached_mtime = entry.get('mtime_ns') if entry else None
+
+        if is_entry_current(entry, path, fingerprint):
+            if cached_mtime != fingerprint['mtime_ns']:
+                snapshot_dirty = True
+            reused_files.append(filename)
+        else:
+            entry = None
+            parse_jobs.append((filename, path, question_type, year))
+        sources.append((filename, path, question_type, year, fingerprint, entry))
+
+    parsed, timings = {}, {}
+    if parse_jobs:
+        # エンコーディング判定はワーカーへ渡す前にこのプロセスで1回だけ行う
+        ensure_encodings(data_dir, [job[0] for job in parse_jobs])
+        parsed, timings = parse_sources(parse_jobs, parse_source, workers)
+
+    # ソース順にマージ（並列解析の完了順に依存しない）
+    new_sources = {}
+    partitions = {}
+    parsed_files = []
+    for filename, path, question_type, year, fingerprint, entry in sources:
+        if entry is None:
+            if filename not in parsed:
+                continue
+            entry = {
+                'size': fingerprint['size'],
+                'mtime_ns': fingerprint['mtime_ns'],
+                'digest': file_digest(path),
+                'question_type': question_type,
+                'year': year,
+                'questions': parsed[filename],
+            }
+            snapshot_dirty = True
+            parsed_files.append(filename)
+
+        new_sources[filename] = entry
+        partitions[filename] = entry['questions']
+        fingerprints[filename] = fingerprint
+
+    if snapshot_dirty and new_sources:
+        write_snapshot(snapshot_path, new_sources)
+
+    stats = {
+        'snapshot_path': snapshot_path,
+        'reused_files': reused_files,
+        'parsed_files': parsed_files,
+        'snapshot_written': snapshot_dirty and bool(new_sources),
+        'fingerprints': fingerprints,
+        'timings': timings,
+        'workers': resolve_build_workers(workers, len(parse_jobs)) if parse_jobs else 0,
+    }
+    if parsed_files:
+        logger.info(f"📦 スナップショット: 再利用{len(reused_files)}ファイル, CSV再解析{len(parsed_files)}ファイル "
+                    f"({stats['workers']}プロセス)")
+        for filename in parsed_files:
+            logger.info(f"  ⏱️ {filename}: {len(partitions[filename])}問 {timings[filename]:.3f}秒")
+    else:
+        logger.info(f"📦 スナップショットから問題バンク読み込み: {len(reused_files)}ファイル")
+    return partitions, stats
+
+
+def update_snapshot_partitions(data_dir: str, partitions: Dict[str, List[Any]],
+                               fingerprints: Dict[str, Dict[str, int]],
+                               changed_files: List[str]) -> bool:
+    """
+    ホットリロードで再解析したパーティションをスナップショットへ反映
+
+    変更のないファイルは既存エントリをそのまま引き継ぎます。
+
+    Args:
+        data_dir: データディレクトリ
+        partitions: ファイル名 → 問題リスト（全ファイル・ソース順）
+        fingerprints: ファイル名 → stat指紋
+        changed_files: 再解析したファイル名
+
+    Returns:
+        書き込み成功したかどうか
+    """
+    snapshot_path = get_snapshot_path(data_dir)
+    snapshot = read_snapshot(snapshot_path)
+    cached_sources = snapshot['sources'] if snapshot else {}
+    source_meta = {name: (question_type, year) for name, question_type, year in get_source_files(data_dir)}
+
+    new_sources = {}
+    for filename, questions in partitions.items():
+        entry = cached_sources.get(filename)
+        if filename in changed_files or entry is None:
+            question_type, year = source_meta.get(filename, (None, None))
+            entry = {
+                'size': fingerprints[filename]['size'],
+                'mtime_ns': fingerprints[filename]['mtime_ns'],
+                'digest': file_digest(os.path.join(data_dir, filename)),
+                'question_type': question_type,
+                'year': year,
+                'questions': list(questions),
+            }
+        new_sources[filename] = entry
+    return write_snapshot(snapshot_path, new_sources)
+
+
+def compile_snapshot(data_dir: str, workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    全CSVを解析してスナップショットを再生成（ビルドステップ用）
+
+    Args:
+        data_dir: データディレクトリ
+        workers: 解析ワーカープロセス数（None・0: CPU数, 1: 逐次）
+
+    Returns:
+        読み込み統計（'unrendered_count' は保存したスナップショットの数式HTML未変換の問題数）
+    """
+    # 循環インポート回避のためローカルインポート（実行時の問題バンクと同じ数式HTML変換付きの解析）
+    from services.question_bank import _parse_source
+
+    start = time.time()
+    partitions, stats = load_bank_sources(data_dir, _parse_source, use_snapshot=False, workers=workers)
+    stats['question_count'] = sum(len(questions) for questions in partitions.values())
+    stats['unrendered_count'] = count_unrendered(get_snapshot_path(data_dir))
+    stats['elapsed'] = time.time() - start
+    return stats
+
+
+def count_unrendered(snapshot_path: str) -> int:
+    """
+    スナップショットの問題のうち数式HTML未変換（is_rendered でない）の件数
+
+    Args:
+        snapshot_path: スナップショットファイルのパス
+
+    Returns:
+        未変換の問題数（スナップショットが読めない場合は-1）
+    """
+    snapshot = read_snapshot(snapshot_path)
+    if snapshot is None:
+        return -1
+    return sum(1 for entry in snapshot['sources'].values() for q in entry['questions']
+               if not getattr(q, 'is_rendered', False))
+
+
+if __name__ == '__main__':
+    target_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+    build_workers = int(os.environ.get('BANK_BUILD_WORKERS', 0))
+    result = compile_snapshot(target_dir, workers=build_workers)
+    print(f"スナップショット作成: {result['snapshot_path']}")
+    print(f"  ファイル数: {len(result['parsed_files'])} ({result['workers']}プロセス)")
+    for name in result['parsed_files']:
+        print(f"    {name}: {result['timings'][name]:.3f}秒")
+    print(f"  問題数: {result['question_count']}")
+    print(f"  数式HTML未変換: {result['unrendered_count']}")
+    print(f"  所要時間: {result['elapsed']:.2f}秒")
+    sys.exit(0 if result['snapshot_written'] and result['unrendered_count'] == 0 else 1)
@@ -0,0 +1,305 @@
+"""
+Versioned Derived-View Cache for RCCM Quiz Application
+分析画面の派生データキャッシュ - Phase 25 Performance
+
+AI分析・学習者インサイト・学習プラン・達成画面・学習カレンダー・部門別統計は、
+表示のたびにセッションの履歴全体から分析をやり直していました。
+
+セッションの状態バージョン（services.session_store.state_version）は、回答・ブックマーク・
+SRS更新などユーザーの状態が変わったリクエストの保存時に1つ進みます。分析結果を
+（ユーザー, バージョン, ビュー）をキーとして保存し、状態が変わらない間の再表示は辞書の
+参照1回で返します。
+
+- ユーザー単位: バージョンが変わったユーザーの古い結果はまとめて破棄
+- 上限: ユーザー数（max_users）とユーザーあたりのビュー数（max_views）、超えた分は最も長く
+  使われていないユーザー（ビュー）から追い出し
+- 統計: ヒット率・破棄数は stats() で確認（/api/cache/stats）
+
+キャッシュはプロセスごとです。バージョンはセッションと一緒にバックエンドへ保存されるため、
+別のワーカーで状態が変わった場合も古い結果は使われません。
+
+advanced_srs から作る派生索引（復習期限キュー・重み付き抽出）も同じキャッシュに
+（ユーザー, バージョン, ('session_index', 名前)）で保持し、セッションには保存しません
+（load_session_index / get_session_index / invalidate_session_index）。リクエスト中に更新した
+索引は、保存後の状態バージョンで引き継ぐため、回答のたびに作り直す必要はありません。
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from flask import current_app, has_app_context
+
+from services.session_store import ServerSideSessionInterface, state_version
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_USERS = 1024
+DEFAULT_MAX_VIEWS = 16
+
+
+class DerivedViewCache:
+    """
+    ユーザーごと・状態バージョンごとの分析結果のキャッシュ
+
+    Args:
+        max_users: 保持するユーザー数の上限
+        max_views: ユーザーあたりのビュー数の上限
+    """
+
+    def __init__(self, max_users: int = DEFAULT_MAX_USERS, max_views: int = DEFAULT_MAX_VIEWS):
+        self.max_users = max(1, int(max_users))
+        self.max_views = max(1, int(max_views))
+        # ユーザー → (状態バージョン, ビューのキー → 分析結果)。どちらも使用順（末尾が最新）
+        self._users: 'OrderedDict[str, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._bypassed = 0
+        self._stale_drops = 0
+        self._user_evictions = 0
+        self._view_evictions = 0
+
+    def get(self, user: str, version: int, view: Hashable) -> Any:
+        """
+        キャッシュ済みの分析結果を取得
+
+        Args:
+            user: ユーザーのキー
+            version: 状態バージョン
+            view: ビューのキー
+
+        Returns:
+            分析結果（ない場合はNone）
+        """
+        with self._lock:
+            entry = self._users.get(user)
+            if entry is None or entry[0] != version or view not in entry[1]:
+                self._misses += 1
+                return None
+            self._users.move_to_end(user)
+            entry[1].move_to_end(view)
+            self._hits += 1
+            return entry[1][view]
+
+    def put(self, user: str, version: int, view: Hashable, value: Any) -> None:
+        """
+        分析結果を保存（バージョンが変わったユーザーの古い結果は破棄）
+
+        Args:
+            user: ユーザーのキー
+            version: 状態バージョン
+            view: ビューのキー
+            value: 分析結果
+        """
+        with self._lock:
+            entry = self._users.get(user)
+            if entry is None or entry[0] != version:
+                if entry is not None:
+                    self._stale_drops += len(entry[1])
+                entry = (version, OrderedDict())
+                self._users[user] = entry
+            self._users.move_to_end(user)
+
+            views = entry[1]
+            views[view] = value
+            views.move_to_end(view)
+            while len(views) > self.max_views:
+                views.popitem(last=False)
+                self._view_evictions += 1
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+                self._user_evictions += 1
+
+    def get_or_compute(self, session, view: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        セッションの状態バージョンの分析結果を返す（ない場合は compute() で計算して保存）
+
+        状態バージョンは読み込み時のものです。分析の前に同じリクエストで状態を変更する場合は
+        使わないでください。状態バージョンがないセッションでは毎回計算します。
+        compute() が例外を送出した場合は保存せずにそのまま送出します。
+
+        Args:
+            session: セッションオブジェクト
+            view: ビューのキー（画面名と引数のタプル。今日の日付で結果が変わる画面は日付も含める）
+            compute: 分析結果を計算する関数
+
+        Returns:
+            分析結果
+        """
+        user = getattr(session, 'sid', None)
+        version = state_version(session)
+        if not user or version is None:
+            with self._lock:
+                self._bypassed += 1
+            return compute()
+
+        value = self.get(user, version, view)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.put(user, version, view, value)
+        return value
+
+    def invalidate(self, user: str) -> None:
+        """ユーザーの分析結果をすべて破棄"""
+        with self._lock:
+            entry = self._users.pop(user, None)
+            if entry is not None:
+                self._stale_drops += len(entry[1])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._users.clear()
+
+    def store_session_indexes(self, session) -> None:
+        """
+        リクエスト中に使用・更新した派生索引を、保存後の状態バージョンでキャッシュ（保存後処理）
+
+        advanced_srs の変更はすべて索引の record_change / invalidate を通るため、
+        リクエストの終わりの索引は保存した状態と一致しています。
+
+        Args:
+            session: 保存したセッション
+        """
+        version = state_version(session)
+        if not session.derived or version is None:
+            return
+        for name, slot in session.derived.items():
+            if slot is not None:
+                self.put(session.sid, version, (INDEX_VIEW, name), slot[0])
+
+    def stats(self) -> Dict[str, Any]:
+        """ヒット率・保持件数・破棄数"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'users': len(self._users),
+                'entries': sum(len(views) for _, views in self._users.values()),
+                'max_users': self.max_users,
+                'max_views': self.max_views,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / lookups, 4) if lookups else 0.0,
+                'bypassed': self._bypassed,
+                'stale_drops': self._stale_drops,
+                'user_evictions': self._user_evictions,
+                'view_evictions': self._view_evictions,
+            }
+
+
+# --- セッションの派生索引 ---
+
+INDEX_VIEW = 'session_index'
+
+
+def _session_object(session):
+    # flask.session（LocalProxy）の場合は実体を使う
+    return getattr(session, '_get_current_object', lambda: session)()
+
+
+def _app_cache() -> Optional[DerivedViewCache]:
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('derived_cache')
+
+
+def get_session_index(session, name: str, for_update: bool = False) -> Any:
+    """
+    読み込み済み・キャッシュ済みの派生索引を取得（作成はしない）
+
+    キャッシュの索引は他のリクエストと共有するため、for_update の場合は複製（copy()）して
+    このリクエスト専用にします。
+
+    Args:
+        session: セッションオブジェクト
+        name: 索引の名前
+        for_update: その場で変更する場合True
+
+    Returns:
+        索引（ない・破棄された場合None）
+    """
+    session = _session_object(session)
+    local = getattr(session, 'derived', None)
+    if local is None:
+        return None
+    if name in local:
+        slot = local[name]
+        if slot is None:
+            return None
+        value, owned = slot
+    else:
+        cache = _app_cache()
+        version = state_version(session)
+        if cache is None or version is None:
+            return None
+        value = cache.get(session.sid, version, (INDEX_VIEW, name))
+        if value is None:
+            return None
+        owned = False
+    if for_update and not owned:
+        value, owned = value.copy(), True
+    local[name] = (value, owned)
+    return value
+
+
+def load_session_index(session, name: str, build: Callable[[], Any]) -> Any:
+    """
+    派生索引を取得（リクエスト中・キャッシュにない場合は build() で作成してキャッシュ）
+
+    Args:
+        session: セッションオブジェクト
+        name: 索引の名前
+        build: セッションのデータから索引を作る関数
+
+    Returns:
+        索引
+    """
+    value = get_session_index(session, name)
+    if value is not None:
+        return value
+
+    session = _session_object(session)
+    local = getattr(session, 'derived', None)
+    value = build()
+    if local is None:
+        return value
+
+    cache = _app_cache()
+    version = state_version(session)
+    if name not in local and cache is not None and version is not None:
+        # 読み込み時の状態から作った索引は、今の状態バージョンで共有
+        cache.put(session.sid, version, (INDEX_VIEW, name), value)
+        local[name] = (value, False)
+    else:
+        # 破棄後（このリクエストで advanced_srs を書き換えた後）に作った索引は保存後に引き継ぐ
+        local[name] = (value, True)
+    return value
+
+
+def invalidate_session_index(session, name: str) -> None:
+    """派生索引を破棄（このリクエスト中は読み込み時のキャッシュも使わず作り直す）"""
+    local = getattr(_session_object(session), 'derived', None)
+    if local is not None:
+        local[name] = None
+
+
+def init_derived_cache(app) -> DerivedViewCache:
+    """
+    アプリに分析画面のキャッシュを設定（app.extensions['derived_cache'] に登録）
+
+    Args:
+        app: Flaskアプリ（DERIVED_CACHE_* の設定を使用）
+
+    Returns:
+        DerivedViewCache: 設定済みのキャッシュ
+    """
+    cache = DerivedViewCache(
+        app.config.get('DERIVED_CACHE_MAX_USERS', DEFAULT_MAX_USERS),
+        app.config.get('DERIVED_CACHE_MAX_VIEWS', DEFAULT_MAX_VIEWS),
+    )
+    app.extensions['derived_cache'] = cache
+    if isinstance(app.session_interface, ServerSideSessionInterface):
+        app.session_interface.save_listeners.append(cache.store_session_indexes)
+    logger.info(f"分析画面キャッシュ: ユーザー{cache.max_users}, ビュー{cache.max_views}/ユーザー")
+    return cache
@@ -0,0 +1,247 @@
+"""
+Encoding Manifest for RCCM Quiz Application
+CSVエンコーディングマニフェスト - Phase 13 Performance
+
+問題バンクのコンパイル時に各CSVのエンコーディングを1回だけ判定し、
+stat指紋（サイズ・mtime）と一緒に data/encoding_manifest.json へ記録します。
+実行時の読み込みはマニフェストのエンコーディングで1回だけデコードし、
+エンコーディングを総当たりで試す必要がなくなります。
+"""
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+try:
+    import chardet
+    CHARDET_AVAILABLE = True
+except ImportError:
+    CHARDET_AVAILABLE = False
+    logging.warning("chardetが利用できません - BOM・フォールバック順でエンコーディングを判定します")
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = 'encoding_manifest.json'
+MANIFEST_VERSION = 1
+
+# 判定できない場合に試す順序（従来の総当たり順）
+FALLBACK_ENCODINGS = ('utf-8-sig', 'utf-8', 'shift_jis', 'cp932', 'iso-2022-jp')
+
+# chardetの判定名 → デコードに使うエンコーディング（上位互換の符号化を優先）
+CHARDET_ALIASES = {
+    'ascii': 'utf-8',
+    'utf-8': 'utf-8',
+    'utf-8-sig': 'utf-8-sig',
+    'shift_jis': 'cp932',
+    'windows-1252': 'cp932',
+    'euc-jp': 'euc_jp',
+    'iso-2022-jp': 'iso-2022-jp',
+}
+
+_UTF8_BOM = b'\xef\xbb\xbf'
+_DETECT_CHUNK_SIZE = 65536
+
+_manifest_lock = threading.Lock()
+_manifest_cache: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+
+
+def get_manifest_path(data_dir: str) -> str:
+    """
+    マニフェストファイルのパスを取得
+
+    環境変数 RCCM_ENCODING_MANIFEST_PATH で上書き可能です。
+    """
+    return os.environ.get('RCCM_ENCODING_MANIFEST_PATH') or os.path.join(data_dir, MANIFEST_FILENAME)
+
+
+def read_manifest(manifest_path: str) -> Dict[str, Any]:
+    """
+    マニフェストを読み込む（マニフェストのmtimeが変わらない限りプロセス内でキャッシュ）
+
+    Returns:
+        ファイル名 → {'encoding', 'size', 'mtime_ns'} の辞書（無効・未作成の場合は空）
+    """
+    try:
+        mtime_ns = os.stat(manifest_path).st_mtime_ns
+    except OSError:
+        return {}
+
+    cached = _manifest_cache.get(manifest_path)
+    if cached and cached[0] == mtime_ns:
+        return cached[1]
+
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"エンコーディングマニフェスト読み込みエラー: {e}")
+        return {}
+
+    if manifest.get('version') != MANIFEST_VERSION or not isinstance(manifest.get('files'), dict):
+        return {}
+    files = manifest['files']
+    _manifest_cache[manifest_path] = (mtime_ns, files)
+    return files
+
+
+def write_manifest(manifest_path: str, files: Dict[str, Any]) -> bool:
+    """
+    マニフェストをアトミックに書き込む（一時ファイル + rename）
+
+    Returns:
+        書き込み成功したかどうか
+    """
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'files': files}, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, manifest_path)
+        return True
+    except OSError as e:
+        # 読み取り専用ファイルシステム等ではマニフェストなしで継続
+        logger.warning(f"エンコーディングマニフェスト保存エラー: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
+
+
+def detect_encoding(path: str) -> str:
+    """
+    ファイルのエンコーディングを判定
+
+    BOMがあれば utf-8-sig、なければ chardet に先頭から順に与えて判定します。
+    chardetが利用できない・判定できない場合はフォールバック順の先頭を返します。
+
+    Args:
+        path: ファイルパス
+
+    Returns:
+        Pythonのコーデック名
+    """
+    with open(path, 'rb') as f:
+        head = f.read(len(_UTF8_BOM))
+        if head == _UTF8_BOM:
+            return 'utf-8-sig'
+        if not CHARDET_AVAILABLE:
+            return FALLBACK_ENCODINGS[0]
+
+        detector = chardet.UniversalDetector()
+        detector.feed(head)
+        for chunk in iter(lambda: f.read(_DETECT_CHUNK_SIZE), b''):
+            detector.feed(chunk)
+            if detector.done:
+                break
+        detector.close()
+
+    detected = (detector.result.get('encoding') or '').lower()
+    return CHARDET_ALIASES.get(detected, detected or FALLBACK_ENCODINGS[0])
+
+
+def ensure_encodings(data_dir: str, filenames: Iterable[str]) -> Dict[str, str]:
+    """
+    指定ファイルのエンコーディングをマニフェストに記録（指紋が変わったファイルのみ判定）
+
+    問題バンクのコンパイル・再読み込みの前に、解析ワーカーへ渡す前のプロセスで呼び出します。
+
+    Args:
+        data_dir: データディレクトリ
+        filenames: 対象ファイル名
+
+    Returns:
+        ファイル名 → エンコーディング
+    """
+    manifest_path = get_manifest_path(data_dir)
+    with _manifest_lock:
+        files = dict(read_manifest(manifest_path))
+        encodings = {}
+        dirty = False
+
+        for filename in filenames:
+            path = os.path.join(data_dir, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            entry = files.get(filename)
+            if not (entry and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns):
+                entry = {
+                    'encoding': detect_encoding(path),
+                    'size': stat.st_size,
+                    'mtime_ns': stat.st_mtime_ns,
+                }
+                files[filename] = entry
+                dirty = True
+                logger.info(f"🔤 エンコーディング判定: {filename} → {entry['encoding']}")
+            encodings[filename] = entry['encoding']
+
+        if dirty:
+            write_manifest(manifest_path, files)
+    return encodings
+
+
+def lookup_encoding(path: str, stat: Optional[os.stat_result] = None) -> Optional[str]:
+    """
+    マニフェストに記録されたエンコーディングを取得（サイズ・mtimeが一致する場合のみ）
+
+    Args:
+        path: CSVファイルのパス
+        stat: 取得済みのstat結果（省略時はstatを実行）
+
+    Returns:
+        エンコーディング（未記録・指紋不一致の場合None）
+    """
+    stat = stat or os.stat(path)
+    entry = read_manifest(get_manifest_path(os.path.dirname(path))).get(os.path.basename(path))
+    if entry and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+        return entry.get('encoding')
+    return None
+
+
+def read_text(path: str) -> Tuple[str, str]:
+    """
+    ファイルを1回だけ読み込み、マニフェストのエンコーディングでデコード
+
+    マニフェストにない・デコードに失敗した場合は、読み込み済みのバイト列に対して
+    判定結果とフォールバック順のエンコーディングを試します（ファイルの再読み込みなし）。
+
+    Args:
+        path: ファイルパス
+
+    Returns:
+        (テキスト, 使用したエンコーディング)
+
+    Raises:
+        UnicodeDecodeError: いずれのエンコーディングでもデコードできない場合
+    """
+    with open(path, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        raw = f.read()
+
+    encoding = lookup_encoding(path, stat)
+    if encoding:
+        try:
+            return raw.decode(encoding), encoding
+        except (UnicodeDecodeError, LookupError):
+            logger.warning(f"マニフェストのエンコーディングでデコード失敗: {path} ({encoding})")
+
+    candidates = list(FALLBACK_ENCODINGS)
+    if raw.startswith(_UTF8_BOM):
+        candidates.insert(0, 'utf-8-sig')
+    elif CHARDET_AVAILABLE:
+        detected = (chardet.detect(raw).get('encoding') or '').lower()
+        if detected:
+            candidates.insert(0, CHARDET_ALIASES.get(detected, detected))
+
+    last_error = None
+    for candidate in candidates:
+        try:
+            return raw.decode(candidate), candidate
+        except UnicodeDecodeError as e:
+            last_error = e
+        except LookupError:
+            continue
+    raise last_error or UnicodeDecodeError('unknown', raw, 0, len(raw), 'エンコーディングを特定できません')
@@ -0,0 +1,431 @@
+"""
+Question Bank Registry for RCCM Quiz Application
+問題バンクレジストリ - Phase 13 Performance
+
+問題データの唯一の保持場所です。不変の「バンク版」（問題タプル + 索引）を
+1つだけ公開し、読み取りはロックなしで現在の版の参照を取得します。
+再構築は新しい版を作ってから参照を1回の代入で差し替えます（RCU方式）。
+読み取り中のリクエストは差し替え後も自分が取得した版を最後まで使えます。
+
+バンクはソースファイル単位のパーティションで構成され、CSVが変更された場合は
+mtimeポーリングで検出したファイルだけを再解析して差し替えます（ホットリロード）。
+問題IDは (ファイル, 元ID) から決定的に採番されるため、再読み込みで他のIDは変わりません。
+"""
+import gc
+import logging
+import os
+import threading
+import time
+from itertools import chain
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import DataConfig
+from services.bank_snapshot import (
+    file_fingerprint, get_source_files, load_bank_sources, update_snapshot_partitions
+)
+from services.encoding_manifest import ensure_encodings
+from services.question_index import QuestionIndex
+
+logger = logging.getLogger(__name__)
+
+# フォールバックデータ（CSV読み込み全失敗時）のパーティション名
+FALLBACK_PARTITION = '__fallback__'
+
+# 旧ID体系（全問題の通し番号）の開始値
+LEGACY_BASIC_ID_START = 1000000
+LEGACY_SPECIALIST_ID_START = 2000000
+
+
+class BankVersion:
+    """不変の問題バンク版（ファイル別パーティション・問題タプル・ID索引）"""
+
+    __slots__ = ('version', 'partitions', 'fingerprints', 'questions', 'by_id', 'index', 'rendered',
+                 'built_at', 'build_seconds', '_legacy_ids')
+
+    def __init__(
+        self,
+        version: int,
+        partitions: Dict[str, Tuple[Any, ...]],
+        fingerprints: Dict[str, Dict[str, int]],
+        build_seconds: float = 0.0,
+        base: Optional['BankVersion'] = None,
+        changed_files: Iterable[str] = ()
+    ):
+        self.version = version
+        # 公開後は変更しないため読み取り専用ビューで保持（fork後のワーカー間で共有される）
+        self.partitions = MappingProxyType({name: tuple(questions) for name, questions in partitions.items()})
+        self.fingerprints = MappingProxyType(dict(fingerprints))
+        self.questions = tuple(chain.from_iterable(self.partitions.values()))
+        self.built_at = time.time()
+        self.build_seconds = build_seconds
+        self._legacy_ids = None
+
+        if base is None:
+            by_id = {q['id']: q for q in self.questions}
+        else:
+            # 変更されたパーティション分だけ索引を差し替える
+            by_id = dict(base.by_id)
+            for name in changed_files:
+                for q in base.partitions.get(name, ()):
+                    by_id.pop(q['id'], None)
+                for q in self.partitions.get(name, ()):
+                    by_id[q['id']] = q
+        self.by_id = MappingProxyType(by_id)
+        # 種別・カテゴリ・部門・年度の索引（ID表は共有）
+        self.index = QuestionIndex(self.questions, self.by_id)
+        # 元の文字列 → 読み込み時に変換済みの数式HTML（mathフィルターの素通し用）
+        rendered = {}
+        for q in self.questions:
+            if getattr(q, 'is_rendered', False):
+                rendered.update(q.rendered_pairs())
+        self.rendered = MappingProxyType(rendered)
+
+    def get(self, question_id: Any) -> Optional[Any]:
+        """
+        IDで問題を取得
+
+        Args:
+            question_id: 問題ID（int / 数値文字列）
+
+        Returns:
+            問題（存在しない場合None）
+        """
+        return self.index.get(question_id)
+
+    def select(self, **filters: Any) -> List[Any]:
+        """索引で条件に一致する問題を取得（QuestionIndex.select と同じ条件）"""
+        return self.index.select(**filters)
+
+    def legacy_id_map(self) -> Dict[int, int]:
+        """
+        旧ID体系（基礎1000000〜・専門2000000〜の通し番号）→ 固定IDの対応表
+
+        旧体系で保存されたセッションデータ（復習リスト・ブックマーク等）の移行に使用します。
+        """
+        if self._legacy_ids is None:
+            mapping = {}
+            next_basic = LEGACY_BASIC_ID_START
+            next_specialist = LEGACY_SPECIALIST_ID_START
+            for q in self.questions:
+                if q.get('question_type') == 'basic':
+                    mapping[next_basic] = q['id']
+                    next_basic += 1
+                elif q.get('question_type') == 'specialist':
+                    mapping[next_specialist] = q['id']
+                    next_specialist += 1
+            self._legacy_ids = mapping
+        return self._legacy_ids
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+
+_math_renderer: Optional[Callable[[str], str]] = None
+
+
+def _parse_source(path: str, question_type: str, year: Optional[int]) -> List[Any]:
+    """CSV解析 + 数式記法のHTML変換（解析ワーカープロセスでも実行）"""
+    global _math_renderer
+    # 循環インポート回避のためローカルインポート
+    from utils import load_rccm_source_file
+    from math_notation_html_filter import create_math_notation_filter
+
+    if _math_renderer is None:
+        _math_renderer = create_math_notation_filter()
+    return [q.with_rendered(_math_renderer) for q in load_rccm_source_file(path, question_type, year)]
+
+
+class QuestionBank:
+    """
+    問題バンクのレジストリ
+
+    読み取り: current() / questions() / get_question() はロックを取りません。
+    書き込み: rebuild() / reload_changed_files() はビルド用ロックで書き込み同士のみを直列化し、
+    完成した版を self._current への単一代入で公開します。
+    """
+
+    def __init__(self, data_dir: Optional[str] = None, reload_interval: Optional[float] = None):
+        self._data_dir = data_dir or os.path.dirname(DataConfig.QUESTIONS_CSV)
+        self._reload_interval = (DataConfig.BANK_RELOAD_INTERVAL
+                                 if reload_interval is None else reload_interval)
+        self._validator: Optional[Callable[[List[Any]], List[Any]]] = None
+        self._fallback: Optional[Callable[[], List[Any]]] = None
+        self._current: Optional[BankVersion] = None
+        self._build_lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._next_poll = 0.0
+        self._version_counter = 0
+        self._build_count = 0
+        self._reload_count = 0
+        self._last_error: Optional[str] = None
+        self._build_timings: Dict[str, float] = {}
+        self._build_workers = 0
+        self._frozen_objects = 0
+
+    def configure(
+        self,
+        validator: Optional[Callable[[List[Any]], List[Any]]] = None,
+        fallback: Optional[Callable[[], List[Any]]] = None
+    ) -> None:
+        """
+        構築時のフックを設定
+
+        Args:
+            validator: パーティションごとに適用する整合性チェック（リスト → リスト）
+            fallback: CSVから1問も読み込めなかった場合の代替データ取得関数
+        """
+        if validator is not None:
+            self._validator = validator
+        if fallback is not None:
+            self._fallback = fallback
+
+    # --- 読み取り（ロックなし） ---
+
+    def current(self) -> BankVersion:
+        """
+        現在のバンク版を取得（ロックなし）
+
+        初回のみビルドを行います。ポーリング間隔ごとにCSVの変更を確認し、
+        変更があればそのファイルだけ再読み込みした版に差し替えます。
+        """
+        version = self._current
+        if version is None:
+            return self._build_initial()
+        if self._reload_interval > 0 and time.monotonic() >= self._next_poll:
+            self._poll()
+            version = self._current
+        return version
+
+    def questions(self):
+        """現在の版の問題タプルを取得（ロックなし）"""
+        return self.current().questions
+
+    def get_question(self, question_id: Any) -> Optional[Any]:
+        """現在の版からIDで問題を取得（ロックなし）"""
+        return self.current().get(question_id)
+
+    def index(self) -> QuestionIndex:
+        """現在の版の索引を取得（ロックなし）"""
+        return self.current().index
+
+    def rendered_html(self, text: str) -> Optional[str]:
+        """
+        読み込み時に変換済みの数式HTMLを取得（ロックなし）
+
+        Args:
+            text: 問題文・選択肢・解説の元の文字列
+
+        Returns:
+            変換済みHTML（バンクにない文字列の場合None）
+        """
+        return self.current().rendered.get(text)
+
+    def is_loaded(self) -> bool:
+        """バンクが構築済みかどうか"""
+        return self._current is not None
+
+    # --- 構築 ---
+
+    def _build_initial(self) -> BankVersion:
+        with self._build_lock:
+            # 他スレッドが構築済みならそれを使う（ダブルチェック）
+            if self._current is not None:
+                return self._current
+            return self._build_and_publish_locked()
+
+    def rebuild(self) -> BankVersion:
+        """
+        バンク全体を再構築して新しい版を公開
+
+        スナップショットと一致するファイルは再解析しません。
+        構築中も読み取りは旧版で継続し、構築に失敗した場合は旧版を維持します。
+
+        Returns:
+            公開中のバンク版
+        """
+        with self._build_lock:
+            try:
+                return self._build_and_publish_locked()
+            except Exception as e:
+                if self._current is None:
+                    raise
+                logger.error(f"問題バンク再構築エラー（旧版を維持）: {e}")
+                return self._current
+
+    def warm_up(self, freeze: bool = True) -> BankVersion:
+        """
+        fork前のウォームアップ（gunicorn --preload のマスタープロセスで呼び出す）
+
+        バンクを構築した上で gc.freeze() により既存オブジェクトをGC対象外の
+        永続世代へ移します。ワーカーの世代別GCがバンクのページに書き込まなくなるため、
+        fork後もcopy-on-writeでマスターのページを共有できます。
+
+        Args:
+            freeze: gc.freeze() を実行するかどうか
+
+        Returns:
+            公開中のバンク版
+        """
+        version = self.current()
+        if freeze and hasattr(gc, 'freeze'):
+            # 構築時のゴミを先に回収してから、残りを凍結
+            gc.collect()
+            gc.freeze()
+            self._frozen_objects = gc.get_freeze_count()
+            logger.info(f"🧊 問題バンク版{version.version}をfork前に凍結: {self._frozen_objects}オブジェクト")
+        return version
+
+    def _validate(self, questions: List[Any]) -> List[Any]:
+        return self._validator(questions) if self._validator else list(questions)
+
+    def _build_and_publish_locked(self) -> BankVersion:
+        start = time.time()
+        try:
+            raw_partitions, stats = load_bank_sources(self._data_dir, _parse_source,
+                                                     workers=DataConfig.BANK_BUILD_WORKERS)
+            partitions = {name: self._validate(questions) for name, questions in raw_partitions.items()}
+            fingerprints = stats['fingerprints']
+            self._build_timings = stats['timings']
+            self._build_workers = stats['workers']
+
+            if not any(partitions.values()) and self._fallback:
+                logger.warning("🚨 CSVから問題を読み込めませんでした - フォールバックデータを使用")
+                partitions = {FALLBACK_PARTITION: self._validate(self._fallback())}
+                fingerprints = {}
+        except Exception as e:
+            self._last_error = str(e)
+            raise
+
+        version = self._publish_locked(partitions, fingerprints, time.time() - start)
+        self._build_count += 1
+        return version
+
+    def _publish_locked(self, partitions, fingerprints, build_seconds,
+                        base: Optional[BankVersion] = None,
+                        changed_files: Iterable[str] = ()) -> BankVersion:
+        self._version_counter += 1
+        version = BankVersion(self._version_counter, partitions, fingerprints,
+                              build_seconds, base=base, changed_files=changed_files)
+        # RCU: 単一の参照代入で新しい版を公開
+        self._current = version
+        self._last_error = None
+        logger.info(f"📚 問題バンク版{version.version}を公開: {len(version)}問 ({build_seconds:.3f}秒)")
+        return version
+
+    # --- ホットリロード ---
+
+    def _poll(self) -> None:
+        # 確認は1スレッドのみ。他スレッドは待たずに現在の版を使う
+        if not self._poll_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_poll = time.monotonic() + self._reload_interval
+            self.reload_changed_files()
+        except Exception as e:
+            logger.error(f"問題バンク変更確認エラー: {e}")
+        finally:
+            self._poll_lock.release()
+
+    def detect_changed_files(self, version: Optional[BankVersion] = None) -> List[str]:
+        """
+        公開中の版以降に変更・追加・削除されたソースファイルを検出（statのみ）
+
+        Returns:
+            変更のあったファイル名のリスト
+        """
+        version = version or self._current
+        if version is None or FALLBACK_PARTITION in version.partitions:
+            return []
+
+        changed = []
+        for filename, _, _ in get_source_files(self._data_dir):
+            path = os.path.join(self._data_dir, filename)
+            try:
+                fingerprint = file_fingerprint(path)
+            except OSError:
+                fingerprint = None
+            if fingerprint != version.fingerprints.get(filename):
+                changed.append(filename)
+        return changed
+
+    def reload_changed_files(self) -> List[str]:
+        """
+        変更されたソースファイルだけを再解析し、そのパーティションと索引を差し替えた版を公開
+
+        他ファイルのパーティション・問題オブジェクト・IDはそのまま引き継ぎます。
+
+        Returns:
+            再読み込みしたファイル名のリスト
+        """
+        with self._build_lock:
+            base = self._current
+            if base is None:
+                self._build_and_publish_locked()
+                return []
+
+            changed = self.detect_changed_files(base)
+            if not changed:
+                return []
+
+            start = time.time()
+            ensure_encodings(self._data_dir, changed)
+            partitions = dict(base.partitions)
+            fingerprints = dict(base.fingerprints)
+            source_order = []
+            reloaded = []
+
+            for filename, question_type, year in get_source_files(self._data_dir):
+                source_order.append(filename)
+                if filename not in changed:
+                    continue
+
+                path = os.path.join(self._data_dir, filename)
+                if not os.path.exists(path):
+                    partitions.pop(filename, None)
+                    fingerprints.pop(filename, None)
+                    logger.info(f"🔄 ソースファイル削除を検出: {filename}")
+                    continue
+
+                # 解析失敗時も指紋は更新し、次の変更まで再試行しない（旧パーティションを維持）
+                fingerprints[filename] = file_fingerprint(path)
+                try:
+                    partitions[filename] = self._validate(_parse_source(path, question_type, year))
+                    reloaded.append(filename)
+                except Exception as e:
+                    logger.error(f"🔄 {filename} 再読み込みエラー（旧データを維持）: {e}")
+
+            ordered = {name: partitions[name] for name in source_order if name in partitions}
+            version = self._publish_locked(ordered, fingerprints, time.time() - start,
+                                           base=base, changed_files=changed)
+            self._reload_count += 1
+            logger.info(f"🔄 問題バンクのホットリロード: {changed} ({version.build_seconds:.3f}秒)")
+
+        # 次回起動用にスナップショットへ反映（公開後・ロック外）
+        if reloaded:
+            update_snapshot_partitions(self._data_dir, version.partitions, version.fingerprints, reloaded)
+        return changed
+
+    def stats(self) -> Dict[str, Any]:
+        """レジストリの統計情報"""
+        version = self._current
+        return {
+            'loaded': version is not None,
+            'version': version.version if version else None,
+            'question_count': len(version) if version else 0,
+            'partitions': {name: len(qs) for name, qs in version.partitions.items()} if version else {},
+            'built_at': version.built_at if version else None,
+            'build_seconds': version.build_seconds if version else None,
+            'build_count': self._build_count,
+            'build_workers': self._build_workers,
+            'build_timings': dict(self._build_timings),
+            'reload_count': self._reload_count,
+            'reload_interval': self._reload_interval,
+            'frozen_objects': self._frozen_objects,
+            'rendered_texts': len(version.rendered) if version else 0,
+            'last_error': self._last_error,
+        }
+
+
+# アプリケーション全体で共有するレジストリ
+question_bank = QuestionBank()
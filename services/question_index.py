@@ -0,0 +1,379 @@
+"""
+Question Index for RCCM Quiz Application
+問題索引 - Phase 13 Performance
+
+問題バンクの版ごとに構築する不変の索引です。
+ID → 問題のハッシュ表と、問題種別・正規化カテゴリ・部門・年度ごと
+（およびその組み合わせごと）の構築済みIDタプルを保持します。
+ルートは全問題の線形走査の代わりに、ID引き（O(1)）と構築済み集合の積で問題を絞り込みます。
+
+複数条件の出題選択には、属性値ごとのビットセット（バンク内の連番 = ビット位置の int）を使います。
+条件の組み合わせは数回の AND / ANDNOT で求まり、候補リストを作らずに
+立っているビットから直接 k 個をサンプリングします。
+"""
+import random
+import struct
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+# 絞り込みの次元（select() / ids() / mask() のキーワード引数名）
+DIMENSIONS = ('question_type', 'category', 'department', 'year')
+
+# ビットセットを走査するワード幅（ビット）
+_WORD_BITS = 64
+
+
+def normalize_category(category: Any) -> Any:
+    """
+    カテゴリ名を索引用に正規化（年度による表記揺れを統一）
+
+    Args:
+        category: CSVのカテゴリ名
+
+    Returns:
+        正規化したカテゴリ名
+    """
+    if not isinstance(category, str):
+        return category
+    # 循環インポート回避のためローカルインポート
+    from utils import map_category_to_department
+    return map_category_to_department(category.strip())
+
+
+def normalize_year(year: Any) -> Optional[int]:
+    """年度を索引キー（int / None）に正規化（'2019' / 2019.0 → 2019）"""
+    if year is None or year == '':
+        return None
+    try:
+        return int(float(year))
+    except (ValueError, TypeError):
+        return None
+
+
+def _bits_from_ordinals(ordinals: Iterable[int], size: int) -> int:
+    """連番のリストからビットセット（int）を作成（O(n)）"""
+    buffer = bytearray((size + 7) // 8)
+    for ordinal in ordinals:
+        buffer[ordinal >> 3] |= 1 << (ordinal & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def _freeze(groups: Dict[Any, List[int]]) -> Mapping[Any, Tuple[int, ...]]:
+    return MappingProxyType({key: tuple(ids) for key, ids in groups.items()})
+
+
+class QuestionIndex:
+    """
+    不変の問題索引
+
+    by_id: ID → 問題
+    all_ids: 全問題のIDタプル（バンク順）
+    by_type / by_category / by_department / by_year: 値 → IDタプル（バンク順）
+    by_combination: (問題種別, 正規化カテゴリ, 年度) → IDタプル
+    full_mask: 全問題のビットセット（ビット位置 = all_ids 内の連番）
+    """
+
+    __slots__ = ('by_id', 'all_ids', 'by_type', 'by_category', 'by_department', 'by_year',
+                 'by_combination', 'full_mask', '_ordinals', '_masks')
+
+    def __init__(self, questions: Iterable[Any], by_id: Optional[Mapping[int, Any]] = None):
+        by_type: Dict[Any, List[int]] = {}
+        by_category: Dict[Any, List[int]] = {}
+        by_department: Dict[Any, List[int]] = {}
+        by_year: Dict[Any, List[int]] = {}
+        by_combination: Dict[Tuple[Any, Any, Any], List[int]] = {}
+        all_ids: List[int] = []
+        category_cache: Dict[Any, Any] = {}
+        built_by_id = {} if by_id is None else None
+
+        for q in questions:
+            qid = q['id']
+            all_ids.append(qid)
+            if built_by_id is not None:
+                built_by_id[qid] = q
+
+            raw_category = q.get('category')
+            category = category_cache.get(raw_category)
+            if category is None:
+                category = category_cache[raw_category] = normalize_category(raw_category)
+            question_type = q.get('question_type')
+            year = normalize_year(q.get('year'))
+
+            by_type.setdefault(question_type, []).append(qid)
+            by_category.setdefault(category, []).append(qid)
+            by_department.setdefault(q.get('department'), []).append(qid)
+            by_year.setdefault(year, []).append(qid)
+            by_combination.setdefault((question_type, category, year), []).append(qid)
+
+        self.by_id = by_id if by_id is not None else MappingProxyType(built_by_id)
+        self.by_type = _freeze(by_type)
+        self.by_category = _freeze(by_category)
+        self.by_department = _freeze(by_department)
+        self.by_year = _freeze(by_year)
+        self.by_combination = _freeze(by_combination)
+        self.all_ids = tuple(all_ids)
+        self.full_mask = (1 << len(all_ids)) - 1
+        self._ordinals = MappingProxyType({qid: ordinal for ordinal, qid in enumerate(all_ids)})
+        # 属性値ごとのビットセット（次元・値ごとに初回参照時に作成）
+        self._masks: Dict[Tuple[str, Any], int] = {}
+
+    # --- ID引き ---
+
+    def get(self, question_id: Any) -> Optional[Any]:
+        """
+        IDで問題を取得（int / 数値文字列）
+
+        Returns:
+            問題（存在しない場合None）
+        """
+        try:
+            return self.by_id.get(int(question_id))
+        except (ValueError, TypeError):
+            return None
+
+    def __contains__(self, question_id: Any) -> bool:
+        return self.get(question_id) is not None
+
+    def resolve(self, question_ids: Iterable[Any]) -> List[Any]:
+        """
+        IDのリストを問題のリストに変換（順序を維持し、存在しないIDは除外）
+
+        Args:
+            question_ids: 問題ID（int / 数値文字列）
+
+        Returns:
+            問題のリスト
+        """
+        resolved = []
+        for question_id in question_ids:
+            question = self.get(question_id)
+            if question is not None:
+                resolved.append(question)
+        return resolved
+
+    # --- 絞り込み ---
+
+    def _postings(self, dimension: str, value: Any) -> Tuple[int, ...]:
+        if dimension == 'question_type':
+            return self.by_type.get(value, ())
+        if dimension == 'category':
+            return self.by_category.get(normalize_category(value), ())
+        if dimension == 'department':
+            return self.by_department.get(value, ())
+        if dimension == 'year':
+            year = normalize_year(value)
+            if year is None and value is not None:
+                return ()
+            return self.by_year.get(year, ())
+        raise ValueError(f"未定義の絞り込み次元: {dimension}")
+
+    def _value_mask(self, dimension: str, value: Any) -> int:
+        key = (dimension, value)
+        mask = self._masks.get(key)
+        if mask is None:
+            postings = self._postings(dimension, value)
+            if not postings:
+                # 存在しない値（リクエスト由来の任意文字列）はキャッシュしない
+                return 0
+            ordinals = self._ordinals
+            mask = self._masks[key] = _bits_from_ordinals(
+                (ordinals[qid] for qid in postings), len(self.all_ids))
+        return mask
+
+    def ids(self, **filters: Any) -> Tuple[int, ...]:
+        """
+        条件に一致する問題IDを取得（バンク順）
+
+        単一条件・(問題種別, カテゴリ, 年度) の組み合わせは構築済みのタプルをそのまま返し、
+        それ以外はビットセットの積から求めます。
+        値にNoneを指定した次元は条件なしとして扱います。
+
+        Args:
+            question_type / category / department / year: 絞り込み条件
+            has_year: Trueなら年度ありの問題のみ、Falseなら年度なしの問題のみ
+
+        Returns:
+            問題IDのタプル
+        """
+        active = self._active_filters(filters)
+        has_year = active.pop('has_year', None)
+
+        if has_year is None:
+            if not active:
+                return self.all_ids
+            if len(active) == 1:
+                (name, value), = active.items()
+                return self._postings(name, value)
+            if set(active) == {'question_type', 'category', 'year'}:
+                year = normalize_year(active['year'])
+                if year is None:
+                    return ()
+                return self.by_combination.get((active['question_type'], normalize_category(active['category']), year), ())
+
+        return self.ids_of(self.mask(has_year=has_year, **active))
+
+    def _active_filters(self, filters: Dict[str, Any]) -> Dict[str, Any]:
+        filters = dict(filters)
+        has_year = filters.pop('has_year', None)
+        unknown = set(filters) - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"未定義の絞り込み次元: {sorted(unknown)}")
+        active = {name: value for name, value in filters.items() if value is not None}
+        if has_year is not None:
+            active['has_year'] = has_year
+        return active
+
+    # --- ビットセット ---
+
+    def mask(self, **filters: Any) -> int:
+        """
+        条件に一致する問題のビットセットを取得（属性値ごとのビットセットのAND / ANDNOT）
+
+        Args:
+            ids() と同じ絞り込み条件
+
+        Returns:
+            ビットセット（ビット位置 = all_ids 内の連番）
+        """
+        active = self._active_filters(filters)
+        has_year = active.pop('has_year', None)
+
+        mask = self.full_mask
+        for name, value in active.items():
+            mask &= self._value_mask(name, value)
+            if not mask:
+                return 0
+        if has_year is True:
+            mask &= ~self._value_mask('year', None)
+        elif has_year is False:
+            if 'year' in active:
+                return 0
+            mask &= self._value_mask('year', None)
+        return mask
+
+    def mask_of_ids(self, question_ids: Iterable[Any]) -> int:
+        """問題IDのリストからビットセットを作成（存在しないIDは無視）"""
+        ordinals = self._ordinals
+        positions = []
+        for question_id in question_ids:
+            try:
+                ordinal = ordinals.get(int(question_id))
+            except (ValueError, TypeError):
+                continue
+            if ordinal is not None:
+                positions.append(ordinal)
+        return _bits_from_ordinals(positions, len(self.all_ids))
+
+    @staticmethod
+    def count(mask: int) -> int:
+        """ビットセットの問題数"""
+        return mask.bit_count()
+
+    def _words(self, mask: int) -> Tuple[int, ...]:
+        word_count = (len(self.all_ids) + _WORD_BITS - 1) // _WORD_BITS
+        return struct.unpack(f'<{word_count}Q', mask.to_bytes(word_count * 8, 'little'))
+
+    def ids_of(self, mask: int) -> Tuple[int, ...]:
+        """ビットセットを問題IDのタプルに変換（バンク順）"""
+        if not mask:
+            return ()
+        all_ids = self.all_ids
+        result = []
+        for word_index, word in enumerate(self._words(mask)):
+            base = word_index * _WORD_BITS
+            while word:
+                low = word & -word
+                result.append(all_ids[base + low.bit_length() - 1])
+                word ^= low
+        return tuple(result)
+
+    def select_mask(self, mask: int) -> List[Any]:
+        """ビットセットを問題のリストに変換（バンク順）"""
+        by_id = self.by_id
+        return [by_id[qid] for qid in self.ids_of(mask)]
+
+    def sample(self, mask: int, k: int, rng: Optional[random.Random] = None) -> List[Any]:
+        """
+        ビットセットから k 問を無作為抽出（候補リストの作成・シャッフルなし）
+
+        立っているビット数 n から順位を random.sample(range(n), k) で選び、
+        ワード単位のpopcountで順位 → ビット位置を求めます。計算量は O(ワード数 + k)。
+
+        Args:
+            mask: 候補のビットセット
+            k: 抽出数（候補数より多い場合は全件）
+            rng: 乱数生成器（省略時は random モジュール）
+
+        Returns:
+            問題のリスト（無作為順）
+        """
+        total = mask.bit_count()
+        if total == 0 or k <= 0:
+            return []
+        ranks = (rng or random).sample(range(total), min(k, total))
+
+        positions = {}
+        targets = sorted(ranks)
+        target_index = 0
+        seen = 0
+        for word_index, word in enumerate(self._words(mask)):
+            if not word:
+                continue
+            popcount = word.bit_count()
+            while target_index < len(targets) and targets[target_index] < seen + popcount:
+                rank = targets[target_index]
+                remaining = word
+                for _ in range(rank - seen):
+                    remaining &= remaining - 1
+                positions[rank] = word_index * _WORD_BITS + (remaining & -remaining).bit_length() - 1
+                target_index += 1
+            if target_index == len(targets):
+                break
+            seen += popcount
+
+        all_ids = self.all_ids
+        by_id = self.by_id
+        return [by_id[all_ids[positions[rank]]] for rank in ranks]
+
+    @staticmethod
+    def intersect(question_ids: Iterable[int], other_ids: Iterable[int]) -> Tuple[int, ...]:
+        """
+        2つのID列の積（最初の列の順序を維持）
+
+        Args:
+            question_ids: 絞り込み対象のID列
+            other_ids: 条件側のID列
+
+        Returns:
+            問題IDのタプル
+        """
+        other = other_ids if isinstance(other_ids, (set, frozenset)) else frozenset(other_ids)
+        return tuple(qid for qid in question_ids if qid in other)
+
+    def select(self, **filters: Any) -> List[Any]:
+        """
+        条件に一致する問題を取得（バンク順）
+
+        Args:
+            ids() と同じ絞り込み条件
+
+        Returns:
+            問題のリスト
+        """
+        by_id = self.by_id
+        return [by_id[qid] for qid in self.ids(**filters)]
+
+    def values(self, dimension: str) -> List[Any]:
+        """指定次元の値の一覧（カテゴリ一覧・年度一覧など）"""
+        groups = {
+            'question_type': self.by_type,
+            'category': self.by_category,
+            'department': self.by_department,
+            'year': self.by_year,
+        }.get(dimension)
+        if groups is None:
+            raise ValueError(f"未定義の絞り込み次元: {dimension}")
+        return list(groups)
+
+    def __len__(self) -> int:
+        return len(self.all_ids)
@@ -0,0 +1,190 @@
+"""
+Question Record for RCCM Quiz Application
+問題レコード型 - Phase 13 Performance
+
+1問あたり15キー以上のdictの代わりに、__slots__ による不変レコードで問題を保持します。
+category・difficulty・reference などの繰り返し文字列はインターンして共有します。
+
+テンプレート・サービスからは従来のdictと同じインターフェース
+（question.question / question['id'] / question.get('category')）で読み取れます。
+
+問題文・選択肢・解説は読み込み時に数式記法をHTMLへ変換した結果を元の文字列と並べて保持し
+（with_rendered()）、テンプレートの math フィルターは変換済みのHTMLをそのまま返します。
+"""
+import sys
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+# インターン対象（問題間で値が繰り返されるフィールド）
+INTERNED_FIELDS = frozenset({
+    'category', 'difficulty', 'reference', 'keywords', 'practical_tip',
+    'question_type', 'department', 'file_source', 'correct_answer',
+})
+
+# 読み込み時に数式記法をHTMLへ変換しておくフィールド（テンプレートの math フィルター対象）
+RENDERED_FIELDS = ('question', 'option_a', 'option_b', 'option_c', 'option_d', 'explanation')
+
+
+class Question(Mapping):
+    """
+    不変の問題レコード
+
+    フィールドは作成後に変更できません。種別付与・ID採番などの更新は
+    replace() で新しいレコードを作成します。
+    """
+
+    FIELDS = (
+        'id', 'category', 'question',
+        'option_a', 'option_b', 'option_c', 'option_d',
+        'correct_answer', 'explanation', 'reference', 'difficulty',
+        'keywords', 'practical_tip',
+        'question_type', 'year', 'department', 'original_id', 'file_source',
+    )
+    # _rendered: RENDERED_FIELDS と同順の変換済みHTML（Mappingのキー・to_dict() には含めない）
+    __slots__ = FIELDS + ('_rendered',)
+
+    def __init__(self, **fields: Any):
+        unknown = set(fields) - set(self.FIELDS)
+        if unknown:
+            raise TypeError(f"Questionに未定義のフィールド: {sorted(unknown)}")
+
+        for name in self.FIELDS:
+            value = fields.get(name)
+            if name in INTERNED_FIELDS and type(value) is str:
+                value = sys.intern(value)
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, '_rendered', None)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Question':
+        """dict形式の問題データからレコードを作成（未定義キーは無視）"""
+        if isinstance(data, cls):
+            return data
+        return cls(**{name: data[name] for name in cls.FIELDS if name in data})
+
+    def replace(self, **changes: Any) -> 'Question':
+        """
+        指定フィールドを変更した新しいレコードを作成
+
+        Args:
+            **changes: 変更するフィールドと値
+
+        Returns:
+            新しいQuestion
+        """
+        fields = {name: getattr(self, name) for name in self.FIELDS}
+        fields.update(changes)
+        question = type(self)(**fields)
+        # 変換元の文字列が変わらない場合のみ変換済みHTMLを引き継ぐ
+        if self._rendered is not None and not _RENDERED_SET.intersection(changes):
+            object.__setattr__(question, '_rendered', self._rendered)
+        return question
+
+    def with_rendered(self, render: Callable[[str], str]) -> 'Question':
+        """
+        RENDERED_FIELDS を変換したHTMLを保持する新しいレコードを作成
+
+        変換結果が元の文字列と同じ場合は元の文字列オブジェクトを共有します。
+
+        Args:
+            render: 文字列 → HTML の変換関数（数式記法フィルター）
+
+        Returns:
+            新しいQuestion
+        """
+        rendered = []
+        for name in RENDERED_FIELDS:
+            value = getattr(self, name)
+            if isinstance(value, str) and value:
+                html = render(value)
+                rendered.append(value if html == value else html)
+            else:
+                rendered.append(value)
+        question = self.replace()
+        object.__setattr__(question, '_rendered', tuple(rendered))
+        return question
+
+    @property
+    def is_rendered(self) -> bool:
+        """読み込み時の数式HTML変換済みかどうか"""
+        return self._rendered is not None
+
+    def html(self, name: str) -> Optional[str]:
+        """
+        フィールドの変換済みHTMLを取得
+
+        Args:
+            name: RENDERED_FIELDS のフィールド名
+
+        Returns:
+            変換済みHTML（未変換の場合None）
+        """
+        if self._rendered is None or name not in _RENDERED_SET:
+            return None
+        return self._rendered[RENDERED_FIELDS.index(name)]
+
+    def rendered_pairs(self) -> Iterator[Tuple[str, str]]:
+        """(元の文字列, 変換済みHTML) の組を列挙（未変換・空のフィールドは除外）"""
+        if self._rendered is None:
+            return
+        for name, html in zip(RENDERED_FIELDS, self._rendered):
+            value = getattr(self, name)
+            if isinstance(value, str) and value:
+                yield value, html
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON応答・セッション保存用のdictに変換"""
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    # --- 不変性 ---
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("Questionは不変です（replace()を使用してください）")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("Questionは不変です")
+
+    def __reduce__(self):
+        # __setattr__ を経由しないよう、位置引数で再構築する（変換済みHTMLは状態として復元）
+        values = tuple(getattr(self, name) for name in self.FIELDS)
+        if self._rendered is None:
+            return (_rebuild_question, values)
+        return (_rebuild_question, values, self._rendered)
+
+    def __setstate__(self, rendered: Tuple[Any, ...]) -> None:
+        object.__setattr__(self, '_rendered', rendered)
+
+    # --- Mapping インターフェース（既存のdictアクセスとの互換） ---
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _FIELD_SET:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.FIELDS)
+
+    def __len__(self) -> int:
+        return len(self.FIELDS)
+
+    def __contains__(self, key: object) -> bool:
+        return key in _FIELD_SET
+
+    def get(self, key: str, default: Optional[Any] = None) -> Any:
+        if key in _FIELD_SET:
+            value = getattr(self, key)
+            # dict互換: 未設定(None)のフィールドはdefaultを返す
+            return default if value is None and default is not None else value
+        return default
+
+    def __repr__(self) -> str:
+        return f"Question(id={self.id!r}, question_type={self.question_type!r}, category={self.category!r})"
+
+
+_FIELD_SET = frozenset(Question.FIELDS)
+_RENDERED_SET = frozenset(RENDERED_FIELDS)
+
+
+def _rebuild_question(*values: Any) -> Question:
+    """pickle復元用"""
+    return Question(**dict(zip(Question.FIELDS, values)))
@@ -7,8 +7,9 @@ Question Service for RCCM Quiz Application
 from typing import List, Dict, Any, Optional
 import logging
 import random
-from datetime import datetime, timedelta
 from config import ExamConfig, SRSConfig, LIGHTWEIGHT_DEPARTMENT_MAPPING
+from services.question_bank import question_bank
+from services.srs_due_queue import SRSDueQueue, due_days_overdue, end_of_day_epoch
 
 logger = logging.getLogger(__name__)
 
@@ -29,10 +30,9 @@ class QuestionService:
             list: 問題データのリスト
         """
         try:
-            # app.pyのload_questions()を使用（循環インポート回避のため遅延インポート）
-            import app
-            questions = app.load_questions()
-            logger.info(f"問題データ読込成功: {len(questions)}問")
+            # 問題バンクレジストリの現在の版（ロックなし・不変タプル）
+            questions = question_bank.questions()
+            logger.debug(f"問題データ読込成功: {len(questions)}問")
             return questions
         except Exception as e:
             logger.error(f"問題データ読込エラー: {e}")
@@ -144,26 +144,29 @@ class QuestionService:
         Returns:
             list: 復習が必要な問題（優先度順）
         """
-        srs_data = user_session.get('advanced_srs', {})
-        today = datetime.now().date()
+        # 期限順の索引から当日中に期限が来る問題だけを取り出す（古い順 = 超過日数の多い順）
+        due_entries = SRSDueQueue.load(user_session).due_entries(end_of_day_epoch())
         due_questions = []
+        if not due_entries:
+            return due_questions
 
-        for question_id, data in srs_data.items():
-            try:
-                next_review = datetime.fromisoformat(data['next_review']).date()
-                if next_review <= today:
-                    question = next((q for q in all_questions if str(q.get('id', 0)) == question_id), None)
-                    if question:
-                        due_questions.append({
-                            'question': question,
-                            'srs_data': data,
-                            'days_overdue': (today - next_review).days
-                        })
-            except (ValueError, KeyError) as e:
-                logger.warning(f"SRSデータ解析エラー (ID: {question_id}): {e}")
-                continue
+        srs_data = user_session.get('advanced_srs', {})
+        index = question_bank.index()
+
+        for question_id, days_overdue in due_days_overdue(entry for entry in due_entries if entry[0]):
+            question = index.get(question_id)
+            data = srs_data.get(question_id)
+            if question and data is not None:
+                due_questions.append({
+                    'question': question,
+                    'srs_data': data,
+                    'days_overdue': days_overdue
+                })
+
+        skipped = sum(1 for entry in due_entries if not entry[0])
+        if skipped:
+            logger.warning(f"SRSデータ解析エラー: 次回復習日時が不正な問題 {skipped}件をスキップ")
 
-        due_questions.sort(key=lambda x: x['days_overdue'], reverse=True)
         return due_questions
 
     @staticmethod
@@ -217,9 +220,10 @@ class QuestionService:
 
             selected_questions.append(question)
 
-        # 残りを新問題で埋める
+        # 残りを新問題で埋める（属性値ごとのビットセットのAND / ANDNOT）
         remaining_count = session_size - len(selected_questions)
-        available_questions = all_questions
+        index = question_bank.index()
+        available = index.full_mask
 
         # AI学習分析による弱点重視出題
         weak_categories = []
@@ -235,59 +239,53 @@ class QuestionService:
         # 問題種別でフィルタリング（最優先・厳格）
         if question_type:
             if question_type == 'basic':
-                available_questions = [q for q in available_questions
-                                     if q.get('question_type') == 'basic'
-                                     and q.get('year') is None]
-                logger.info(f"基礎科目フィルタ適用: 結果 {len(available_questions)}問")
+                available = index.mask(question_type='basic', has_year=False)
+                logger.info(f"基礎科目フィルタ適用: 結果 {index.count(available)}問")
 
             elif question_type == 'specialist':
-                available_questions = [q for q in available_questions
-                                     if q.get('question_type') == 'specialist'
-                                     and q.get('year') is not None]
-                logger.info(f"専門科目フィルタ適用: 結果 {len(available_questions)}問")
+                available = index.mask(question_type='specialist', has_year=True)
+                logger.info(f"専門科目フィルタ適用: 結果 {index.count(available)}問")
 
             else:
-                available_questions = [q for q in available_questions
-                                     if q.get('question_type') == question_type]
-                logger.info(f"問題種別フィルタ適用: {question_type}, 結果: {len(available_questions)}問")
+                available = index.mask(question_type=question_type)
+                logger.info(f"問題種別フィルタ適用: {question_type}, 結果: {index.count(available)}問")
 
             # 専門科目で部門指定がある場合のみ部門フィルタ適用
             if question_type == 'specialist' and department:
                 target_categories = LIGHTWEIGHT_DEPARTMENT_MAPPING.get(department, department)
                 logger.info(f"✅ 日本語直接マッチング: {department} → {target_categories}")
 
-                dept_match_questions = [q for q in available_questions
-                                      if q.get('category') == target_categories]
-                if dept_match_questions:
-                    available_questions = dept_match_questions
-                    logger.info(f"専門科目部門マッチング成功: {len(available_questions)}問")
+                dept_match = available & index.mask(category=target_categories)
+                if dept_match:
+                    available = dept_match
+                    logger.info(f"専門科目部門マッチング成功: {index.count(available)}問")
                 else:
                     logger.warning(f"専門科目部門マッチング失敗: {target_categories} に該当する問題が見つかりません")
 
         # 部門でフィルタリング（基礎科目・専門科目以外）
         elif department and question_type != 'basic' and question_type != 'specialist':
-            available_questions = [q for q in available_questions
-                                 if q.get('department') == department]
-            logger.info(f"部門フィルタ適用: {department}, 結果: {len(available_questions)}問")
+            available = index.mask(department=department)
+            logger.info(f"部門フィルタ適用: {department}, 結果: {index.count(available)}問")
 
-        # カテゴリでフィルタリング
+        # カテゴリでフィルタリング（一致なしの場合は文字化けフォールバック）
         if requested_category != '全体':
-            available_questions = QuestionService.filter_by_category(available_questions, requested_category)
-            logger.info(f"カテゴリフィルタ適用: {requested_category}, 結果: {len(available_questions)}問")
+            category_match = available & index.mask(category=requested_category)
+            if category_match:
+                available = category_match
+            else:
+                fallback = QuestionService.filter_by_category(index.select_mask(available), requested_category)
+                available = index.mask_of_ids(q['id'] for q in fallback)
+            logger.info(f"カテゴリフィルタ適用: {requested_category}, 結果: {index.count(available)}問")
 
         # 年度でフィルタリング（専門科目のみ）
         if year:
-            pre_year_count = len(available_questions)
-            available_questions = QuestionService.filter_by_year(available_questions, year)
-            logger.info(f"年度フィルタ適用: {year}年度, {pre_year_count} → {len(available_questions)}問")
-
-        # 既に選択済みの問題を除外
-        selected_ids = [int(q.get('id', 0)) for q in selected_questions]
-        new_questions = [q for q in available_questions
-                        if int(q.get('id', 0)) not in selected_ids]
+            pre_year_count = index.count(available)
+            available &= index.mask(question_type='specialist', year=year)
+            logger.info(f"年度フィルタ適用: {year}年度, {pre_year_count} → {index.count(available)}問")
 
-        random.shuffle(new_questions)
-        selected_questions.extend(new_questions[:remaining_count])
+        # 既に選択済みの問題を除外（ANDNOT）し、候補から直接サンプリング
+        available &= ~index.mask_of_ids(q.get('id') for q in selected_questions)
+        selected_questions.extend(index.sample(available, remaining_count))
 
         random.shuffle(selected_questions)
 
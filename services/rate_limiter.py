@@ -0,0 +1,387 @@
+"""
+Shared Token-Bucket Rate Limiter for RCCM Quiz Application
+プロセス間共有のレート制限 - Phase 18 Performance
+
+旧 rate_limit_check はリクエスト時刻の一覧をセッションに保存していたため、
+リクエストごとにセッション書き込みが発生し、一覧の長さに比例して遅くなり、
+Cookieを捨てれば制限を回避できました。ここではセッションを使わず、
+ファイルにマップした固定サイズのトークンバケット表を gunicorn の全ワーカーで共有します。
+
+- 表: ヘッダー + スロット（キーのハッシュ・残りトークン・最終更新時刻）の配列
+- キー: ポリシー名・キーの種類（user / ip / api_key）・値のハッシュ（64bit）
+- 配置: ハッシュでグループ（8スロット）を決め、グループ内で一致・空き・最古の順に使用
+- 判定: 経過時間分のトークンを補充し、ポリシーの全キーのバケットに残りがある場合だけ1つずつ消費（O(1)、履歴を持たない）
+- 排他: グループ単位のストライプロック（StripedUserLock をグループ番号で使用）
+
+表が埋まると最も長く使われていないバケットを再利用します（再利用されたキーは満タンから
+数え直すため、制限が緩む方向にだけずれます）。
+"""
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from services.user_lock import StripedUserLock
+
+logger = logging.getLogger(__name__)
+
+# 表ファイルの形式
+TABLE_MAGIC = b'RCRL'
+TABLE_VERSION = 1
+TABLE_HEADER = struct.Struct('<4sBxxxI')  # マジック・バージョン・スロット数
+SLOT = struct.Struct('<Qdd')  # キーのハッシュ（0=空き）・残りトークン・最終更新時刻
+GROUP_SIZE = 8  # 1グループのスロット数（同じグループ内だけを探索）
+
+DEFAULT_SLOTS = 4096
+
+# レート制限のキーの種類
+KEY_KINDS = ('user', 'ip', 'api_key')
+
+
+class RateLimitPolicy:
+    """
+    ルートごとのレート制限ポリシー（トークンバケット）
+
+    Args:
+        name: ポリシー名（バケットの名前空間）
+        limit: 期間あたりのリクエスト数（補充速度）
+        period: 期間（秒）
+        burst: バケットの容量（連続して受け付けるリクエスト数）
+        keys: 制限の単位（'user' / 'ip' / 'api_key'、それぞれ別のバケットで判定）
+    """
+
+    __slots__ = ('name', 'limit', 'period', 'burst', 'keys', 'rate')
+
+    def __init__(self, name: str, limit: int, period: float, burst: Optional[int] = None,
+                 keys: Iterable[str] = ('user', 'ip')):
+        if limit <= 0 or period <= 0:
+            raise ValueError("limit と period は正の値を指定してください")
+        self.name = name
+        self.limit = limit
+        self.period = float(period)
+        self.burst = float(burst if burst is not None else limit)
+        self.keys = tuple(keys)
+        unknown = set(self.keys) - set(KEY_KINDS)
+        if unknown:
+            raise ValueError(f"未知のキーの種類です: {sorted(unknown)}")
+        self.rate = limit / self.period
+
+    @classmethod
+    def from_config(cls, name: str, options: Dict[str, Any]) -> 'RateLimitPolicy':
+        return cls(name, options['limit'], options['period'], options.get('burst'),
+                   options.get('keys', ('user', 'ip')))
+
+    def __repr__(self) -> str:
+        return f"RateLimitPolicy({self.name!r}, {self.limit}/{self.period:g}s, burst={self.burst:g}, keys={self.keys})"
+
+
+class RateLimitResult:
+    """判定結果（allowed が False のとき retry_after 秒後に再試行可能）"""
+
+    __slots__ = ('allowed', 'remaining', 'retry_after', 'key_kind')
+
+    def __init__(self, allowed: bool, remaining: int, retry_after: float, key_kind: Optional[str] = None):
+        self.allowed = allowed
+        self.remaining = remaining
+        self.retry_after = retry_after
+        self.key_kind = key_kind
+
+
+class RateLimiter:
+    """
+    ファイルにマップしたトークンバケット表によるレート制限
+
+    Args:
+        path: 表ファイル（全ワーカーで共有）
+        slots: スロット数（GROUP_SIZE の倍数に切り上げ）
+        policies: ポリシー名 → RateLimitPolicy
+        enabled: False の場合は常に許可
+    """
+
+    def __init__(self, path: str, slots: int = DEFAULT_SLOTS,
+                 policies: Optional[Dict[str, RateLimitPolicy]] = None, enabled: bool = True):
+        self.path = path
+        self.groups = max(1, -(-slots // GROUP_SIZE))
+        self.slots = self.groups * GROUP_SIZE
+        self.policies: Dict[str, RateLimitPolicy] = dict(policies or {})
+        self.enabled = enabled
+        self._locks = StripedUserLock(path + '.lock', stripes=self.groups)
+        self._map: Optional[mmap.mmap] = None
+        self._pid: Optional[int] = None
+        self._map_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._allowed: Dict[str, int] = {}
+        self._limited: Dict[str, int] = {}
+        self._evictions = 0
+
+    # ------------------------------------------------------------------
+    # 表ファイル
+    # ------------------------------------------------------------------
+
+    def _table(self) -> mmap.mmap:
+        # fork後のワーカーでは自プロセスでマップし直す
+        if self._map is None or self._pid != os.getpid():
+            with self._map_lock:
+                if self._map is None or self._pid != os.getpid():
+                    self._map = self._open_table()
+                    self._pid = os.getpid()
+        return self._map
+
+    def _open_table(self) -> mmap.mmap:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        size = TABLE_HEADER.size + self.slots * SLOT.size
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            # 初期化・作り直しはストライプ0で直列化（他ワーカーの同時初期化を防ぐ）
+            self._locks.acquire(0)
+            try:
+                header = os.pread(fd, TABLE_HEADER.size, 0)
+                expected = TABLE_HEADER.pack(TABLE_MAGIC, TABLE_VERSION, self.slots)
+                if header != expected or os.fstat(fd).st_size != size:
+                    if header:
+                        logger.info(f"レート制限表を作り直します（形式・サイズ変更）: {self.path}")
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, expected, 0)
+            finally:
+                self._locks.release(0)
+            return mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+    # ------------------------------------------------------------------
+    # 判定
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def key_hash(policy_name: str, kind: str, value: str) -> int:
+        """バケットのキー（プロセス間で同じ値になる64bitハッシュ、0は空き用に予約）"""
+        digest = hashlib.blake2b(f"{policy_name}\0{kind}\0{value}".encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little') or 1
+
+    def _find_slot(self, table: mmap.mmap, key: int, policy: RateLimitPolicy, now: float,
+                   taken: Iterable[int] = ()) -> Tuple[int, float, bool]:
+        """
+        キーのスロットと補充後のトークン数を求める（ストライプロックを取得済みで呼ぶ、書き込みなし）
+
+        Args:
+            table: 表
+            key: バケットのキー
+            policy: ポリシー
+            now: 現在時刻
+            taken: 同じ判定で他のキーが使うスロット（空き・再利用の候補から除く）
+
+        Returns:
+            Tuple[int, float, bool]: (スロットの位置, トークン数, 最古のバケットを再利用するか)
+        """
+        base = TABLE_HEADER.size + (key % self.groups) * GROUP_SIZE * SLOT.size
+        empty = None
+        oldest = None
+        oldest_updated = None
+        for index in range(GROUP_SIZE):
+            offset = base + index * SLOT.size
+            slot_key, tokens, updated = SLOT.unpack_from(table, offset)
+            if slot_key == key:
+                # 経過時間分を補充（時計の巻き戻りでは減らさない）
+                return offset, min(policy.burst, tokens + max(0.0, now - updated) * policy.rate), False
+            if offset in taken:
+                continue
+            if slot_key == 0:
+                if empty is None:
+                    empty = offset
+            elif oldest_updated is None or updated < oldest_updated:
+                oldest, oldest_updated = offset, updated
+        if empty is not None:
+            return empty, policy.burst, False
+        return oldest, policy.burst, True
+
+    def _take(self, policy: RateLimitPolicy, keys: List[Tuple[str, int]], cost: float,
+              now: Optional[float]) -> Tuple[bool, float, float, Optional[str]]:
+        """
+        複数のバケットから同時にトークンを消費（全バケットに残りがある場合だけ消費）
+
+        拒否した場合はどのバケットも変更しません（先に判定したバケットだけが減ることはありません）。
+        ストライプロックはグループ番号の昇順で取得します。
+
+        Args:
+            policy: ポリシー
+            keys: (キーの種類, バケットのキー) のリスト
+            cost: 消費するトークン数
+            now: 現在時刻（省略時は time.time()）
+
+        Returns:
+            Tuple[bool, float, float, Optional[str]]: (許可, 最小の残りトークン, 再試行までの秒数, 拒否したキーの種類)
+        """
+        table = self._table()
+        groups = sorted({key % self.groups for _, key in keys})
+        acquired = []
+        try:
+            for group in groups:
+                self._locks.acquire(group)
+                acquired.append(group)
+
+            now = time.time() if now is None else now
+            slots = []
+            taken = set()
+            for kind, key in keys:
+                offset, tokens, evict = self._find_slot(table, key, policy, now, taken)
+                taken.add(offset)
+                slots.append((kind, key, offset, tokens, evict))
+
+            denied = [(kind, (cost - tokens) / policy.rate) for kind, _, _, tokens, _ in slots if tokens < cost]
+            if denied:
+                kind, retry_after = max(denied, key=lambda item: item[1])
+                return False, 0.0, retry_after, kind
+
+            remaining = policy.burst
+            for _, key, offset, tokens, evict in slots:
+                SLOT.pack_into(table, offset, key, tokens - cost, now)
+                remaining = min(remaining, tokens - cost)
+                if evict:
+                    with self._metrics_lock:
+                        self._evictions += 1
+            return True, remaining, 0.0, None
+        finally:
+            for group in reversed(acquired):
+                self._locks.release(group)
+
+    def consume(self, policy: RateLimitPolicy, kind: str, value: str, cost: float = 1.0,
+                now: Optional[float] = None) -> Tuple[bool, float, float]:
+        """
+        1つのバケットからトークンを消費
+
+        Args:
+            policy: ポリシー
+            kind: キーの種類
+            value: キーの値（ユーザーID・IPアドレス等）
+            cost: 消費するトークン数
+            now: 現在時刻（省略時は time.time()）
+
+        Returns:
+            Tuple[bool, float, float]: (許可, 残りトークン, 再試行までの秒数)
+        """
+        allowed, tokens, retry_after, _ = self._take(
+            policy, [(kind, self.key_hash(policy.name, kind, str(value)))], cost, now)
+        return allowed, tokens, retry_after
+
+    def check(self, policy_name: str, identities: Dict[str, Optional[str]]) -> RateLimitResult:
+        """
+        ポリシーの全キーで判定（いずれかのバケットが空なら拒否し、どのバケットも消費しない）
+
+        Args:
+            policy_name: ポリシー名
+            identities: キーの種類 → 値（値がないキーは判定しない）
+
+        Returns:
+            RateLimitResult: 判定結果
+        """
+        policy = self.policies.get(policy_name)
+        if policy is None or not self.enabled:
+            return RateLimitResult(True, -1, 0.0)
+
+        keys = [(kind, self.key_hash(policy.name, kind, str(identities[kind])))
+                for kind in policy.keys if identities.get(kind)]
+        if not keys:
+            self._count(self._allowed, policy_name)
+            return RateLimitResult(True, int(policy.burst), 0.0)
+
+        allowed, remaining, retry_after, kind = self._take(policy, keys, 1.0, None)
+        if not allowed:
+            self._count(self._limited, policy_name)
+            return RateLimitResult(False, 0, retry_after, kind)
+
+        self._count(self._allowed, policy_name)
+        return RateLimitResult(True, int(remaining), 0.0)
+
+    def reset(self) -> None:
+        """全バケットを消去（テスト・運用向け）"""
+        table = self._table()
+        for group in range(self.groups):
+            self._locks.acquire(group)
+            try:
+                start = TABLE_HEADER.size + group * GROUP_SIZE * SLOT.size
+                table[start:start + GROUP_SIZE * SLOT.size] = bytes(GROUP_SIZE * SLOT.size)
+            finally:
+                self._locks.release(group)
+
+    # ------------------------------------------------------------------
+    # 統計
+    # ------------------------------------------------------------------
+
+    def _count(self, counter: Dict[str, int], policy_name: str) -> None:
+        with self._metrics_lock:
+            counter[policy_name] = counter.get(policy_name, 0) + 1
+
+    def occupancy(self) -> int:
+        """使用中のスロット数（ロックなしの概算）"""
+        table = self._table()
+        used = 0
+        for slot in range(self.slots):
+            if SLOT.unpack_from(table, TABLE_HEADER.size + slot * SLOT.size)[0]:
+                used += 1
+        return used
+
+    def stats(self) -> Dict[str, Any]:
+        """ポリシーごとの許可・拒否数、表の使用状況、ロックの競合"""
+        with self._metrics_lock:
+            policies: List[Dict[str, Any]] = []
+            for name, policy in self.policies.items():
+                allowed = self._allowed.get(name, 0)
+                limited = self._limited.get(name, 0)
+                total = allowed + limited
+                policies.append({
+                    'policy': name,
+                    'limit': policy.limit,
+                    'period': policy.period,
+                    'burst': policy.burst,
+                    'keys': list(policy.keys),
+                    'allowed': allowed,
+                    'limited': limited,
+                    'limited_ratio': round(limited / total, 4) if total else 0.0,
+                })
+            evictions = self._evictions
+        try:
+            used = self.occupancy()
+        except Exception as e:
+            logger.error(f"レート制限表の読み込みエラー: {e}")
+            used = -1
+        return {
+            'enabled': self.enabled,
+            'slots': self.slots,
+            'slots_used': used,
+            'evictions': evictions,
+            'policies': policies,
+            'lock': self._locks.stats(),
+        }
+
+
+def init_rate_limiter(app) -> RateLimiter:
+    """
+    アプリにレート制限を設定（app.extensions['rate_limiter'] に登録）
+
+    Args:
+        app: Flaskアプリ（RATE_LIMIT_* の設定を使用）
+
+    Returns:
+        RateLimiter: 設定済みのレート制限
+    """
+    policies = {
+        name: RateLimitPolicy.from_config(name, options)
+        for name, options in app.config.get('RATE_LIMIT_POLICIES', {}).items()
+    }
+    limiter = RateLimiter(
+        app.config.get('RATE_LIMIT_FILE', os.path.join('sessions', 'rate_limits.table')),
+        app.config.get('RATE_LIMIT_SLOTS', DEFAULT_SLOTS),
+        policies,
+        app.config.get('RATE_LIMIT_ENABLED', True),
+    )
+    app.extensions['rate_limiter'] = limiter
+    logger.info(f"レート制限: {'有効' if limiter.enabled else '無効'}, スロット{limiter.slots}, "
+                f"ポリシー{sorted(policies)}")
+    return limiter
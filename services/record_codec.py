@@ -0,0 +1,356 @@
+"""
+Compact Record Codec for RCCM Quiz Application
+学習記録のコンパクト符号化 - Phase 16 Performance
+
+回答履歴（history）とSRSデータ（advanced_srs）を、キーごとのJSONではなく
+固定幅の構造体の並びに符号化します。
+
+    ヘッダー（マジック・形式バージョン・コンテナ種別・構造体レコード数・付表の長さ）
+    + 付表（タグ付きJSON: 文字列表・構造体にできなかったレコード）
+    + レコード（[問題ID] + 項目の有無ビットマスク + 存在する項目の値）
+
+- 日時は秒（'%Y-%m-%d %H:%M:%S'）またはマイクロ秒（ISO形式）の整数
+- 回答・正解・カテゴリ・問題種別・部門は文字列表のインデックス（1バイト）
+- 正誤・マスター状態は1バイト、回数は2バイト、回答時間は0.1秒単位の2バイト
+
+スキーマにない項目・型の異なる値を含むレコードは、そのままタグ付きJSONで付表に保存するため
+どんなデータでも復元結果は元と一致します。符号化されていないデータ（従来のJSON）は
+is_compact() で判別でき、呼び出し側でそのまま従来の方法で復元します。
+"""
+import calendar
+import logging
+import struct
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from flask.json.tag import TaggedJSONSerializer
+
+logger = logging.getLogger(__name__)
+
+# 先頭のNULバイトでJSON（'{' / '[' / '"' 等で始まる）と区別する
+CODEC_MAGIC = b'\x00RC'
+CODEC_VERSION = 1
+
+CONTAINER_LIST = 1
+CONTAINER_DICT = 2
+
+_HEADER = struct.Struct('<3sBBII')
+_KEY = struct.Struct('<I')
+_MASK = struct.Struct('<I')
+
+# 文字列表の上限（インデックスは1バイト）
+MAX_STRINGS = 255
+
+_EPOCH = datetime(1970, 1, 1)
+_STAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+_INVALID = object()
+_serializer = TaggedJSONSerializer()
+
+
+class _StringTable:
+    """符号化中の文字列表（出現順にインデックスを割り当て）"""
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def index(self, value: str) -> Any:
+        position = self._index.get(value)
+        if position is None:
+            if len(self.strings) >= MAX_STRINGS:
+                return _INVALID
+            position = self._index[value] = len(self.strings)
+            self.strings.append(value)
+        return position
+
+
+# --- 項目の種類ごとの符号化・復元 ---
+
+def _encode_u32(value, strings):
+    return value if type(value) is int and 0 <= value <= 0xFFFFFFFF else _INVALID
+
+
+def _encode_u16(value, strings):
+    return value if type(value) is int and 0 <= value <= 0xFFFF else _INVALID
+
+
+def _encode_bool(value, strings):
+    return int(value) if type(value) is bool else _INVALID
+
+
+def _encode_str(value, strings):
+    return strings.index(value) if type(value) is str else _INVALID
+
+
+def _encode_deci(value, strings):
+    # 0.1秒単位で表せる float（回答時間）
+    if type(value) is not float or not 0 <= value < 6553.5:
+        return _INVALID
+    scaled = round(value * 10)
+    return scaled if scaled / 10 == value else _INVALID
+
+
+def _encode_half_int(value, strings):
+    return value * 2 if type(value) is int and 0 <= value <= 127 else _INVALID
+
+
+def _encode_half_float(value, strings):
+    # 0.5刻みの float（難易度）
+    if type(value) is not float or not 0 <= value <= 127.5:
+        return _INVALID
+    scaled = int(value * 2)
+    return scaled if scaled / 2 == value else _INVALID
+
+
+def _format_stamp(seconds: int) -> str:
+    return time.strftime(_STAMP_FORMAT, time.gmtime(seconds))
+
+
+def _encode_stamp(value, strings):
+    # 'YYYY-MM-DD HH:MM:SS'（タイムゾーンなし）を1970-01-01起点の秒に
+    if type(value) is not str or len(value) != 19:
+        return _INVALID
+    try:
+        seconds = calendar.timegm((int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                                   int(value[11:13]), int(value[14:16]), int(value[17:19])))
+    except ValueError:
+        return _INVALID
+    if not 0 <= seconds <= 0xFFFFFFFF or _format_stamp(seconds) != value:
+        return _INVALID
+    return seconds
+
+
+def _encode_iso(value, strings):
+    # datetime.isoformat()（タイムゾーンなし）を1970-01-01起点のマイクロ秒に
+    if type(value) is not str:
+        return _INVALID
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return _INVALID
+    if moment.tzinfo is not None or moment.isoformat() != value:
+        return _INVALID
+    return (moment - _EPOCH) // timedelta(microseconds=1)
+
+
+def _decode_iso(value: int) -> str:
+    return (_EPOCH + timedelta(microseconds=value)).isoformat()
+
+
+_KINDS = {
+    # 種類: (structの書式, 符号化, 復元（Noneは値をそのまま使う。'str' は文字列表を引く）)
+    'u32': ('I', _encode_u32, None),
+    'u16': ('H', _encode_u16, None),
+    'bool': ('B', _encode_bool, bool),
+    'str': ('B', _encode_str, 'str'),
+    'deci': ('H', _encode_deci, lambda value: value / 10),
+    'half_int': ('B', _encode_half_int, lambda value: value // 2),
+    'half_float': ('B', _encode_half_float, lambda value: value / 2),
+    'stamp': ('I', _encode_stamp, _format_stamp),
+    'iso': ('q', _encode_iso, _decode_iso),
+}
+
+
+class RecordSchema:
+    """
+    レコード（辞書）の項目定義
+
+    同じ項目名を型違いで複数定義でき（例: 難易度の int / float）、先に一致した定義で符号化します。
+    レコードに存在する項目だけをビットマスクで示すため、古い形式の項目欠けレコードも構造体にできます。
+
+    Args:
+        name: スキーマ名（ログ用）
+        fields: (項目名, 種類) のタプル（最大32項目）
+    """
+
+    def __init__(self, name: str, fields: Tuple[Tuple[str, str], ...]):
+        if len(fields) > 32:
+            raise ValueError(f"項目数が多すぎます: {name}")
+        self.name = name
+        self.fields = fields
+        self._encoders = tuple((field, bit, _KINDS[kind][1]) for bit, (field, kind) in enumerate(fields))
+        self._layouts: Dict[int, Tuple[struct.Struct, Callable]] = {}
+
+    def _layout(self, mask: int) -> Tuple[struct.Struct, Callable]:
+        """
+        ビットマスクごとの (struct, 復元関数) を作成・キャッシュ
+
+        復元関数は存在する項目の unpack と辞書の作成を1つの式で行うよう生成します
+        （項目ごとの関数呼び出し・ループを避ける）。
+        """
+        layout = self._layouts.get(mask)
+        if layout is None:
+            present = [(field, kind) for bit, (field, kind) in enumerate(self.fields) if mask >> bit & 1]
+            record_struct = struct.Struct('<' + ''.join(_KINDS[kind][0] for _, kind in present))
+            namespace = {'unpack_from': record_struct.unpack_from}
+            items = []
+            for position, (field, kind) in enumerate(present):
+                decode = _KINDS[kind][2]
+                if decode is None:
+                    expression = f'v{position}'
+                elif decode == 'str':
+                    expression = f'strings[v{position}]'
+                else:
+                    namespace[f'decode_{kind}'] = decode
+                    expression = f'decode_{kind}(v{position})'
+                items.append(f'{field!r}: {expression}')
+            variables = ''.join(f'v{position}, ' for position in range(len(present)))
+            source = (f'def decode(data, offset, strings):\n'
+                      f'    {variables}= unpack_from(data, offset)\n'
+                      f'    return {{{", ".join(items)}}}\n')
+            exec(source, namespace)
+            layout = self._layouts[mask] = (record_struct, namespace['decode'])
+        return layout
+
+    def pack(self, record: Any, strings: _StringTable) -> Optional[bytes]:
+        """レコードを構造体に符号化（スキーマで表せない場合None）"""
+        if type(record) is not dict:
+            return None
+        mask = 0
+        values = []
+        matched = set()
+        for field, bit, encode in self._encoders:
+            if field in matched or field not in record:
+                continue
+            value = encode(record[field], strings)
+            if value is _INVALID:
+                continue
+            mask |= 1 << bit
+            values.append(value)
+            matched.add(field)
+        if len(matched) != len(record):
+            return None
+        return _MASK.pack(mask) + self._layout(mask)[0].pack(*values)
+
+    def unpack(self, data: bytes, offset: int, strings: List[str]) -> Tuple[Dict[str, Any], int]:
+        """構造体からレコードを復元し、(レコード, 次のオフセット) を返す"""
+        mask, = _MASK.unpack_from(data, offset)
+        offset += _MASK.size
+        layout = self._layouts.get(mask) or self._layout(mask)
+        return layout[1](data, offset, strings), offset + layout[0].size
+
+
+# 回答履歴（session['history'] の各要素）
+HISTORY_SCHEMA = RecordSchema('history', (
+    ('id', 'u32'),
+    ('category', 'str'),
+    ('question_type', 'str'),
+    ('department', 'str'),
+    ('is_correct', 'bool'),
+    ('user_answer', 'str'),
+    ('correct_answer', 'str'),
+    ('elapsed', 'deci'),
+    ('date', 'stamp'),
+))
+
+# SRSデータ（session['advanced_srs'] の値。キーは問題IDの文字列）
+SRS_SCHEMA = RecordSchema('advanced_srs', (
+    ('level', 'u16'),
+    ('next_review', 'iso'),
+    ('incorrect_count', 'u16'),
+    ('added_date', 'stamp'),
+    ('question_type', 'str'),
+    ('category', 'str'),
+    ('correct_count', 'u16'),
+    ('wrong_count', 'u16'),
+    ('total_attempts', 'u16'),
+    ('first_attempt', 'iso'),
+    ('last_attempt', 'iso'),
+    ('mastered', 'bool'),
+    ('difficulty_level', 'half_int'),
+    ('difficulty_level', 'half_float'),
+    ('interval_days', 'u16'),
+))
+
+
+def _key_ordinal(key: Any) -> Optional[int]:
+    """問題IDの文字列キー（'1000001'）を整数に（往復で一致しない場合None）"""
+    if type(key) is not str or not key.isdigit() or (len(key) > 1 and key[0] == '0'):
+        return None
+    ordinal = int(key)
+    return ordinal if ordinal <= 0xFFFFFFFF else None
+
+
+def is_compact(data: bytes) -> bool:
+    """コンパクト形式で符号化されたバイト列か判定"""
+    return data[:len(CODEC_MAGIC)] == CODEC_MAGIC
+
+
+def encode_records(schema: RecordSchema, value: Any) -> Optional[bytes]:
+    """
+    レコードのリスト、または問題IDキーの辞書をコンパクト形式に符号化
+
+    Args:
+        schema: レコードのスキーマ
+        value: レコードのリスト（history）または {問題ID文字列: レコード}（advanced_srs）
+
+    Returns:
+        符号化したバイト列（リスト・辞書以外の場合None）
+    """
+    strings = _StringTable()
+    chunks = []
+    fallback = []
+
+    if type(value) is list:
+        container = CONTAINER_LIST
+        for position, record in enumerate(value):
+            packed = schema.pack(record, strings)
+            if packed is None:
+                fallback.append([position, record])
+            else:
+                chunks.append(packed)
+    elif type(value) is dict:
+        container = CONTAINER_DICT
+        for key, record in value.items():
+            ordinal = _key_ordinal(key)
+            packed = schema.pack(record, strings) if ordinal is not None else None
+            if packed is None:
+                fallback.append([key, record])
+            else:
+                chunks.append(_KEY.pack(ordinal) + packed)
+    else:
+        return None
+
+    table = _serializer.dumps([strings.strings, fallback]).encode('utf-8')
+    header = _HEADER.pack(CODEC_MAGIC, CODEC_VERSION, container, len(chunks), len(table))
+    return b''.join([header, table, *chunks])
+
+
+def decode_records(schema: RecordSchema, data: bytes) -> Any:
+    """
+    コンパクト形式からレコードのリスト・辞書を復元
+
+    Args:
+        schema: レコードのスキーマ
+        data: encode_records() で符号化したバイト列
+
+    Returns:
+        レコードのリストまたは辞書
+
+    Raises:
+        ValueError: 形式・バージョンが不正な場合
+    """
+    magic, version, container, count, table_length = _HEADER.unpack_from(data)
+    if magic != CODEC_MAGIC or version != CODEC_VERSION or container not in (CONTAINER_LIST, CONTAINER_DICT):
+        raise ValueError(f"未対応の記録形式: version={version}, container={container}")
+
+    offset = _HEADER.size + table_length
+    strings, fallback = _serializer.loads(data[_HEADER.size:offset].decode('utf-8'))
+
+    if container == CONTAINER_LIST:
+        records = []
+        for _ in range(count):
+            record, offset = schema.unpack(data, offset, strings)
+            records.append(record)
+        for position, record in fallback:
+            records.insert(position, record)
+        return records
+
+    items = {}
+    for _ in range(count):
+        ordinal, = _KEY.unpack_from(data, offset)
+        items[str(ordinal)], offset = schema.unpack(data, offset + _KEY.size, strings)
+    for key, record in fallback:
+        items[key] = record
+    return items
@@ -14,6 +14,9 @@ import os
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
+from services.statistics_service import StatisticsService
+from services.srs_due_queue import SRSDueQueue
+
 logger = logging.getLogger(__name__)
 
 
@@ -31,6 +34,7 @@ class SessionService:
     KEY_SELECTED_QUESTION_TYPE = 'selected_question_type'
     KEY_SELECTED_YEAR = 'selected_year'
     KEY_HISTORY = 'history'
+    KEY_HISTORY_ROLLUP = 'history_rollup'
     KEY_CATEGORY_STATS = 'category_stats'
     KEY_ADVANCED_SRS = 'advanced_srs'
     KEY_BOOKMARKS = 'bookmarks'
@@ -40,6 +44,14 @@ class SessionService:
     KEY_BASE_USER_ID = 'base_user_id'
     KEY_LOGIN_TIME = 'login_time'
     KEY_REQUEST_HISTORY = 'request_history'
+    KEY_SRS_DATA = 'srs_data'
+    KEY_QUESTION_ID_SCHEME = 'question_id_scheme'
+
+    # 問題ID体系のバージョン（2: (ファイル, 元ID)による固定ID）
+    QUESTION_ID_SCHEME = 2
+
+    # 履歴に保持する直近の回答数（超えた分は古い順に捨て、全期間の統計は集計カウンタで保持）
+    HISTORY_LIMIT = int(os.environ.get('HISTORY_LIMIT', 300))
 
     @staticmethod
     def clear_exam_session():
@@ -271,41 +283,70 @@ class SessionService:
         """
         履歴に回答記録を追加
 
+        履歴は直近 HISTORY_LIMIT 件だけを保持するリングバッファで、全期間の統計は
+        集計カウンタ（history_rollup）に加算します。
+
         Args:
             entry: 回答記録（辞書）
-                - question_id: 問題ID
+                - id: 問題ID
                 - is_correct: 正解/不正解
                 - category: カテゴリ
                 - department: 部門
                 - question_type: 問題タイプ
-                - timestamp: タイムスタンプ
+                - date: 回答日時（'%Y-%m-%d %H:%M:%S'）
+                - elapsed: 回答時間（秒）
 
         Examples:
             >>> SessionService.add_to_history({
-            ...     'question_id': 123,
+            ...     'id': 123,
             ...     'is_correct': True,
-            ...     'category': '基礎科目',
-            ...     'timestamp': datetime.now().isoformat()
+            ...     'category': '共通',
+            ...     'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             ... })
         """
+        # 既存履歴のバックフィルは追加前に行う（二重計上を防ぐ）
+        rollup = SessionService.get_history_rollup()
+        StatisticsService.add_to_rollup(rollup, entry)
+
         if SessionService.KEY_HISTORY not in session:
             session[SessionService.KEY_HISTORY] = []
 
-        session[SessionService.KEY_HISTORY].append(entry)
+        history = session[SessionService.KEY_HISTORY]
+        history.append(entry)
+        if len(history) > SessionService.HISTORY_LIMIT:
+            del history[:-SessionService.HISTORY_LIMIT]
         session.modified = True
 
-        logger.debug(f"履歴に追加: 問題ID={entry.get('question_id')}, 正解={entry.get('is_correct')}")
+        logger.debug(f"履歴に追加: 問題ID={entry.get('id')}, 正解={entry.get('is_correct')}")
 
     @staticmethod
     def get_history() -> List[Dict[str, Any]]:
         """
-        回答履歴を取得
+        直近の回答履歴を取得
 
         Returns:
-            list: 回答履歴のリスト
+            list: 回答履歴のリスト（最大 HISTORY_LIMIT 件）
         """
         return session.get(SessionService.KEY_HISTORY, [])
 
+    @staticmethod
+    def get_history_rollup() -> Dict[str, Any]:
+        """
+        全期間の集計カウンタを取得
+
+        集計カウンタのないセッション（旧形式）は、保持している履歴から一度だけ作成します。
+        旧形式の集計カウンタは次元別カウンタを引き継いで現行形式へ移行します。
+
+        Returns:
+            dict: 集計カウンタ（StatisticsService の各統計メソッドに渡せる）
+        """
+        rollup = session.get(SessionService.KEY_HISTORY_ROLLUP)
+        if not StatisticsService.is_rollup(rollup):
+            history = session.get(SessionService.KEY_HISTORY, [])
+            rollup = StatisticsService.upgrade_rollup(rollup, history) or StatisticsService.build_rollup(history)
+            session[SessionService.KEY_HISTORY_ROLLUP] = rollup
+        return rollup
+
     @staticmethod
     def get_srs_data() -> Dict[str, Any]:
         """
@@ -328,7 +369,10 @@ class SessionService:
         if SessionService.KEY_ADVANCED_SRS not in session:
             session[SessionService.KEY_ADVANCED_SRS] = {}
 
-        session[SessionService.KEY_ADVANCED_SRS][str(question_id)] = srs_info
+        srs_data = session[SessionService.KEY_ADVANCED_SRS]
+        old_info = srs_data.get(str(question_id))
+        srs_data[str(question_id)] = srs_info
+        SRSDueQueue.record_change(session, question_id, old_info, srs_info)
         session.modified = True
 
     @staticmethod
@@ -394,4 +438,56 @@ class SessionService:
             session[SessionService.KEY_SESSION_ID] = SessionService.generate_session_id()
             session.modified = True
 
-        return session[SessionService.KEY_SESSION_ID]
\ No newline at end of file
+        return session[SessionService.KEY_SESSION_ID]
+
+    @staticmethod
+    def migrate_question_ids(id_map: Dict[int, int]) -> int:
+        """
+        旧ID体系で保存された問題IDを固定IDへ移行（セッションごとに1回）
+
+        履歴・ブックマーク・試験問題リスト・SRSデータの問題IDを id_map で置き換え、
+        セッションにID体系バージョンを記録します。対応表にないIDはそのまま残します。
+
+        Args:
+            id_map: 旧ID → 固定IDの対応表
+
+        Returns:
+            int: 置き換えた問題IDの数
+        """
+        if session.get(SessionService.KEY_QUESTION_ID_SCHEME) == SessionService.QUESTION_ID_SCHEME:
+            return 0
+
+        migrated = 0
+
+        def convert(value):
+            nonlocal migrated
+            try:
+                new_id = id_map.get(int(value))
+            except (ValueError, TypeError):
+                return value
+            if new_id is None:
+                return value
+            migrated += 1
+            # 元の型（文字列 / 数値）を維持
+            return str(new_id) if isinstance(value, str) else new_id
+
+        for entry in session.get(SessionService.KEY_HISTORY, []):
+            for id_key in ('id', 'question_id'):
+                if id_key in entry:
+                    entry[id_key] = convert(entry[id_key])
+
+        for key in (SessionService.KEY_BOOKMARKS, SessionService.KEY_EXAM_QUESTION_IDS):
+            if session.get(key):
+                session[key] = [convert(qid) for qid in session[key]]
+
+        for key in (SessionService.KEY_ADVANCED_SRS, SessionService.KEY_SRS_DATA):
+            if session.get(key):
+                session[key] = {convert(qid): data for qid, data in session[key].items()}
+        SRSDueQueue.invalidate(session)
+
+        session[SessionService.KEY_QUESTION_ID_SCHEME] = SessionService.QUESTION_ID_SCHEME
+        session.modified = True
+
+        if migrated:
+            logger.info(f"問題ID体系を移行: {migrated}件の問題IDを固定IDへ変換")
+        return migrated
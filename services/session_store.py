@@ -0,0 +1,1050 @@
+"""
+Server-side Session Store for RCCM Quiz Application
+サーバーサイドセッション - Phase 14 Performance
+
+Cookieには署名付きの不透明なセッションIDだけを保存し、学習履歴・SRS・ブックマーク等の
+セッション本体はサーバー側のバックエンドに保存します。回答を重ねてもCookieは大きくならず、
+リクエストごとのセッション全体の署名・シリアライズも不要になります。
+保存時はリクエスト中に変更されたトップレベルのキーだけを書き込み、変更がなければ
+書き込みも Set-Cookie も行いません（スキップ・実行回数は stats() で確認できます）。
+回答履歴・SRSデータは services.record_codec のコンパクト形式で保存し、初回アクセス時に復元します。
+ユーザーの状態（派生データ以外のキー）が変わった保存のたびに状態バージョン（state_version）を進めます。
+
+バックエンド（Config.SESSION_TYPE）:
+    'sqlite'     : SQLite（WALモード）。キーごとの行で保存（Config.SESSION_SQLITE_PATH）
+    'filesystem' : 2階層のハッシュプレフィックスに分散したファイル（Config.SESSION_FILE_DIR）
+
+Flask-Session（Python 3.13で動作しない）には依存せず、Flask標準の SessionInterface で実装します。
+Config.SESSION_* の設定（Cookie名・署名・キープレフィックス・有効期限・ファイル数上限）に従います。
+"""
+import hashlib
+import logging
+import os
+import re
+import secrets
+import sqlite3
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+from services.record_codec import HISTORY_SCHEMA, SRS_SCHEMA, decode_records, encode_records, is_compact
+from services.user_lock import StripedUserLock
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows環境ではインデックスのプロセス間ロックなし
+
+logger = logging.getLogger(__name__)
+
+# 旧セッション（Flask-Session）のCookieの署名（移行したセッションの引き継ぎ用）
+LEGACY_SIGNER_SALT = 'flask-session'
+
+# セッションIDの形式（secrets.token_urlsafe(32) = 43文字）
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{32,128}$')
+SESSION_ID_BYTES = 32
+
+# 期限切れセッションの掃除間隔（秒）
+SESSION_CLEANUP_INTERVAL = 300
+
+# 有効期限の残りがこの割合を下回ったときだけ期限を延長する（毎リクエストの書き込みを避ける）
+SESSION_REFRESH_RATIO = 0.5
+
+# セッション値のシリアライザ（Flask標準のCookieセッションと同じタグ付きJSON）
+_serializer = TaggedJSONSerializer()
+
+
+def dumps_value(value: Any) -> bytes:
+    """セッション値をバイト列にシリアライズ"""
+    return _serializer.dumps(value).encode('utf-8')
+
+
+def loads_value(data: bytes) -> Any:
+    """バイト列からセッション値を復元"""
+    return _serializer.loads(data.decode('utf-8'))
+
+
+# コンパクト形式（services.record_codec）で保存し、初回アクセス時に復元するキー
+COMPACT_SESSION_KEYS = {
+    'history': HISTORY_SCHEMA,
+    'advanced_srs': SRS_SCHEMA,
+}
+
+
+def dumps_item(name: str, value: Any) -> bytes:
+    """セッションのトップレベルの値をキーに応じた形式でシリアライズ"""
+    schema = COMPACT_SESSION_KEYS.get(name)
+    if schema is not None:
+        data = encode_records(schema, value)
+        if data is not None:
+            return data
+    return dumps_value(value)
+
+
+# ユーザーの状態のバージョン（状態が変わった保存のたびに1つ進める。分析画面のキャッシュのキー）
+STATE_VERSION_KEY = '_state_version'
+
+# 変わっても状態バージョンを進めないキー（セッション内の派生データ・以前セッションに保存していた索引・
+# Flaskの管理用）
+DERIVED_SESSION_KEYS = frozenset({
+    STATE_VERSION_KEY, '_permanent', 'csrf_token',
+    'history_rollup', 'srs_due_queue', 'srs_review_sampler',
+})
+
+
+def legacy_session_key(key_prefix: str, legacy_name: str) -> str:
+    """
+    移行した旧セッション（migrate_legacy_sessions.py）の保存キー
+
+    Args:
+        key_prefix: セッションキーのプレフィックス
+        legacy_name: 旧セッションファイル名（キープレフィックス + セッションIDのMD5）
+
+    Returns:
+        str: バックエンドのキー
+    """
+    return f'{key_prefix}legacy-{legacy_name}'
+
+
+def state_version(session) -> Optional[int]:
+    """
+    セッションの状態バージョン（リクエストの読み込み時点）
+
+    Args:
+        session: セッションオブジェクト
+
+    Returns:
+        状態バージョン（サーバーサイドセッションでない・未保存の場合None）
+    """
+    # flask.session（LocalProxy）の場合は実体を使う
+    session = getattr(session, '_get_current_object', lambda: session)()
+    if not isinstance(session, ServerSideSession) or session.new:
+        return None
+    version = dict.get(session, STATE_VERSION_KEY)
+    return version if isinstance(version, int) else None
+
+
+def loads_item(name: str, data: bytes) -> Any:
+    """dumps_item() の逆変換（従来のタグ付きJSONもそのまま復元）"""
+    if is_compact(data):
+        return decode_records(COMPACT_SESSION_KEYS[name], data)
+    return loads_value(data)
+
+
+class SessionBackend:
+    """
+    セッション保存先の基底クラス
+
+    key はキープレフィックス付きのセッションキー、items はセッションのトップレベルのキーと
+    シリアライズ済みの値（dumps_item）の辞書です。値はキーごとに保存するため、
+    変更されたキーだけを書き込む差分更新（update）ができます。
+    """
+
+    name = 'base'
+
+    def load(self, key: str) -> Optional[Tuple[Dict[str, bytes], int]]:
+        """有効期限内のセッションを (items, 有効期限) で読み込む（存在しない・期限切れの場合None）"""
+        raise NotImplementedError
+
+    def save(self, key: str, items: Dict[str, bytes], expires_at: int) -> None:
+        """セッション全体を保存"""
+        raise NotImplementedError
+
+    def update(self, key: str, changed: Dict[str, bytes], removed: Iterable[str],
+               expires_at: Optional[int] = None) -> bool:
+        """
+        変更されたキーだけを書き込む
+
+        Args:
+            key: セッションキー
+            changed: 追加・変更されたキーとシリアライズ済みの値
+            removed: 削除されたキー
+            expires_at: 新しい有効期限（Noneの場合は据え置き）
+
+        Returns:
+            更新できたか（セッションが存在しない場合False）
+        """
+        entry = self.load(key)
+        if entry is None:
+            return False
+        items, current_expires_at = entry
+        for name in removed:
+            items.pop(name, None)
+        items.update(changed)
+        self.save(key, items, current_expires_at if expires_at is None else expires_at)
+        return True
+
+    def touch(self, key: str, expires_at: int) -> None:
+        """内容を変えずに有効期限だけを延長"""
+        entry = self.load(key)
+        if entry is not None:
+            self.save(key, entry[0], expires_at)
+
+    def delete(self, key: str) -> None:
+        """セッションを削除"""
+        raise NotImplementedError
+
+    def cleanup(self, now: Optional[int] = None) -> int:
+        """期限切れセッションを削除し、削除件数を返す"""
+        return 0
+
+    def count(self) -> int:
+        """保存されているセッション数"""
+        return 0
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """
+    SQLite（WALモード）バックエンド
+
+    セッションの有効期限は sessions テーブル、値はトップレベルのキーごとに
+    session_items テーブルへ保存します。差分更新は変更されたキーの行だけを
+    UPSERT / DELETE します。接続はスレッド・プロセスごとに作成します。
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._transaction() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                ' key TEXT PRIMARY KEY, expires_at INTEGER NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS session_items ('
+                ' key TEXT NOT NULL, name TEXT NOT NULL, value BLOB NOT NULL,'
+                ' PRIMARY KEY (key, name)) WITHOUT ROWID'
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # fork後のワーカーでは親プロセスの接続を使わない
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def load(self, key: str) -> Optional[Tuple[Dict[str, bytes], int]]:
+        conn = self._connection()
+        row = conn.execute('SELECT expires_at FROM sessions WHERE key = ?', (key,)).fetchone()
+        if row is None or row[0] <= time.time():
+            return None
+        items = dict(conn.execute('SELECT name, value FROM session_items WHERE key = ?', (key,)))
+        return items, row[0]
+
+    def save(self, key: str, items: Dict[str, bytes], expires_at: int) -> None:
+        rows = [(key, name, value) for name, value in items.items()]
+        with self._transaction() as conn:
+            conn.execute('INSERT OR REPLACE INTO sessions (key, expires_at) VALUES (?, ?)', (key, expires_at))
+            conn.execute('DELETE FROM session_items WHERE key = ?', (key,))
+            conn.executemany('INSERT INTO session_items (key, name, value) VALUES (?, ?, ?)', rows)
+
+    def update(self, key: str, changed: Dict[str, bytes], removed: Iterable[str],
+               expires_at: Optional[int] = None) -> bool:
+        with self._transaction() as conn:
+            if expires_at is None:
+                exists = conn.execute('SELECT 1 FROM sessions WHERE key = ?', (key,)).fetchone() is not None
+            else:
+                exists = conn.execute('UPDATE sessions SET expires_at = ? WHERE key = ?',
+                                      (expires_at, key)).rowcount > 0
+            if not exists:
+                return False
+            conn.executemany('DELETE FROM session_items WHERE key = ? AND name = ?',
+                             [(key, name) for name in removed])
+            conn.executemany('INSERT OR REPLACE INTO session_items (key, name, value) VALUES (?, ?, ?)',
+                             [(key, name, value) for name, value in changed.items()])
+        return True
+
+    def touch(self, key: str, expires_at: int) -> None:
+        with self._transaction() as conn:
+            conn.execute('UPDATE sessions SET expires_at = ? WHERE key = ?', (expires_at, key))
+
+    def delete(self, key: str) -> None:
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM sessions WHERE key = ?', (key,))
+            conn.execute('DELETE FROM session_items WHERE key = ?', (key,))
+
+    def cleanup(self, now: Optional[int] = None) -> int:
+        now = int(time.time()) if now is None else now
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM session_items WHERE key IN '
+                         '(SELECT key FROM sessions WHERE expires_at <= ?)', (now,))
+            return conn.execute('DELETE FROM sessions WHERE expires_at <= ?', (now,)).rowcount
+
+    def count(self) -> int:
+        return self._connection().execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+
+class FileSystemSessionBackend(SessionBackend):
+    """
+    ファイルシステムバックエンド
+
+    セッションキーのSHA-256から 'ab/cd/<ハッシュ>.session' の2階層に分散して保存し、
+    書き込みは一時ファイル + rename でアトミックに行います。
+    ファイル形式: ヘッダー（マジック・形式バージョン・有効期限・キー数） +
+    キーごとの（名前長・値長・名前・シリアライズ済みの値）
+    差分更新ではファイルを書き直しますが、変更されていないキーは再シリアライズしません。
+
+    有効期限は追記式のインデックス（expiry.index、ハッシュ + 有効期限の固定長レコード）にも
+    記録し、掃除（cleanup）はインデックスだけを読んで期限切れのファイル（threshold を指定した場合は
+    上限超過分も）を削除します。
+    セッションファイルの一覧取得・読み込みは、インデックスがない・壊れている場合の再構築時だけです。
+    追記は共有ロック、掃除時のインデックスの詰め直しは排他ロック（fcntl.flock）で行います。
+    同じセッションへの保存・差分更新（読み込み → マージ → 書き込み）は、キーのストライプロック
+    （update.lock、プロセス間共有）で直列化し、同時のリクエストの変更が失われないようにします。
+    """
+
+    name = 'filesystem'
+
+    FILE_MAGIC = b'RSES'
+    FILE_VERSION = 2
+    FILE_HEADER = struct.Struct('<4sBQI')
+    ITEM_HEADER = struct.Struct('<HI')
+    FILE_SUFFIX = '.session'
+
+    INDEX_NAME = 'expiry.index'
+    LOCK_NAME = 'update.lock'
+    LOCK_STRIPES = 64
+    INDEX_MAGIC = b'RSIX'
+    INDEX_VERSION = 1
+    INDEX_HEADER = struct.Struct('<4sBB2x')  # マジック・形式バージョン・全セッション登録済みフラグ
+    INDEX_RECORD = struct.Struct('<32sQ')  # キーのSHA-256・有効期限（0=削除済み）
+
+    def __init__(self, directory: str, threshold: int = 0):
+        self.directory = directory
+        self.threshold = threshold
+        self.index_path = os.path.join(directory, self.INDEX_NAME)
+        self._index_fd: Optional[int] = None
+        self._index_pid: Optional[int] = None
+        self._index_lock = threading.Lock()
+        self._locks = StripedUserLock(os.path.join(directory, self.LOCK_NAME), self.LOCK_STRIPES)
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _digest(key: str) -> bytes:
+        return hashlib.sha256(key.encode('utf-8')).digest()
+
+    def _path_of(self, digest: bytes) -> str:
+        name = digest.hex()
+        return os.path.join(self.directory, name[:2], name[2:4], name + self.FILE_SUFFIX)
+
+    def _path(self, key: str) -> str:
+        return self._path_of(self._digest(key))
+
+    def _read(self, path: str) -> Optional[Tuple[int, Dict[str, bytes]]]:
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return None
+        if len(raw) < self.FILE_HEADER.size:
+            return None
+        magic, version, expires_at, item_count = self.FILE_HEADER.unpack_from(raw)
+        if magic != self.FILE_MAGIC or version != self.FILE_VERSION:
+            return None
+
+        items = {}
+        offset = self.FILE_HEADER.size
+        try:
+            for _ in range(item_count):
+                name_length, value_length = self.ITEM_HEADER.unpack_from(raw, offset)
+                offset += self.ITEM_HEADER.size
+                name = raw[offset:offset + name_length].decode('utf-8')
+                offset += name_length
+                items[name] = raw[offset:offset + value_length]
+                offset += value_length
+        except (struct.error, UnicodeDecodeError):
+            logger.warning(f"破損したセッションファイルを無視: {path}")
+            return None
+        return expires_at, items
+
+    def _read_expiry(self, path: str) -> Optional[int]:
+        """ファイルのヘッダーだけを読んで有効期限を返す（形式違い・破損は0、存在しない場合None）"""
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(self.FILE_HEADER.size)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            return 0
+        if len(header) < self.FILE_HEADER.size:
+            return 0
+        magic, version, expires_at, _ = self.FILE_HEADER.unpack(header)
+        if magic != self.FILE_MAGIC or version != self.FILE_VERSION:
+            return 0
+        return expires_at
+
+    def _write(self, path: str, expires_at: int, items: Dict[str, bytes]) -> None:
+        chunks = [self.FILE_HEADER.pack(self.FILE_MAGIC, self.FILE_VERSION, expires_at, len(items))]
+        for name, value in items.items():
+            encoded_name = name.encode('utf-8')
+            chunks.append(self.ITEM_HEADER.pack(len(encoded_name), len(value)))
+            chunks.append(encoded_name)
+            chunks.append(value)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(b''.join(chunks))
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    # --- 有効期限インデックス ---
+
+    def _index_file(self) -> int:
+        # fork後のワーカーでは自プロセスで開き直す（flockはオープンしたファイルごと）
+        if self._index_fd is None or self._index_pid != os.getpid():
+            fd = os.open(self.index_path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o600)
+            if os.fstat(fd).st_size == 0:
+                self._flock(fd, exclusive=True)
+                try:
+                    if os.fstat(fd).st_size == 0:
+                        # 既存のセッションファイルは未登録（最初の掃除で一覧から登録する）
+                        os.write(fd, self.INDEX_HEADER.pack(self.INDEX_MAGIC, self.INDEX_VERSION, 0))
+                finally:
+                    self._unlock(fd)
+            self._index_fd = fd
+            self._index_pid = os.getpid()
+        return self._index_fd
+
+    @staticmethod
+    def _flock(fd: int, exclusive: bool) -> None:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+    @staticmethod
+    def _unlock(fd: int) -> None:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _index_append(self, digest: bytes, expires_at: int) -> None:
+        """有効期限の変更をインデックスに追記（失敗してもセッションの保存は成功扱い）"""
+        try:
+            with self._index_lock:
+                fd = self._index_file()
+                self._flock(fd, exclusive=False)
+                try:
+                    os.write(fd, self.INDEX_RECORD.pack(digest, expires_at))
+                finally:
+                    self._unlock(fd)
+        except OSError as e:
+            logger.error(f"セッションインデックス追記エラー: {e}")
+
+    def _read_index(self, fd: int) -> Optional[Dict[bytes, int]]:
+        """インデックスを読み込み、キーごとの最新の有効期限を返す（未登録・破損の場合None）"""
+        data = os.pread(fd, os.fstat(fd).st_size, 0)
+        if len(data) < self.INDEX_HEADER.size:
+            return None
+        magic, version, complete = self.INDEX_HEADER.unpack_from(data)
+        if magic != self.INDEX_MAGIC or version != self.INDEX_VERSION or not complete:
+            return None
+        body = memoryview(data)[self.INDEX_HEADER.size:]
+        # 追記途中のレコードは無視。同じキーは後のレコード（最新の有効期限）が残る
+        usable = len(body) - len(body) % self.INDEX_RECORD.size
+        return dict(self.INDEX_RECORD.iter_unpack(body[:usable]))
+
+    def _scan_expiry(self) -> Dict[bytes, int]:
+        """全セッションファイルのヘッダーから有効期限を集める（インデックスの再構築用）"""
+        expiry = {}
+        for path in self._session_files():
+            name = os.path.basename(path)[:-len(self.FILE_SUFFIX)]
+            try:
+                digest = bytes.fromhex(name)
+            except ValueError:
+                continue
+            if len(digest) == self.INDEX_RECORD.size - 8:
+                expires_at = self._read_expiry(path)
+                if expires_at is not None:
+                    expiry[digest] = expires_at
+        return expiry
+
+    # --- SessionBackend ---
+
+    def load(self, key: str) -> Optional[Tuple[Dict[str, bytes], int]]:
+        path = self._path(key)
+        entry = self._read(path)
+        if entry is None:
+            return None
+        expires_at, items = entry
+        if expires_at <= time.time():
+            # インデックスには期限切れとして記録済み（次の掃除で整理される）
+            self._remove(path)
+            return None
+        return items, expires_at
+
+    def save(self, key: str, items: Dict[str, bytes], expires_at: int) -> None:
+        digest = self._digest(key)
+        with self._locks(digest.hex()):
+            self._write(self._path_of(digest), expires_at, items)
+        self._index_append(digest, expires_at)
+
+    def update(self, key: str, changed: Dict[str, bytes], removed: Iterable[str],
+               expires_at: Optional[int] = None) -> bool:
+        digest = self._digest(key)
+        path = self._path_of(digest)
+        with self._locks(digest.hex()):
+            entry = self._read(path)
+            if entry is None or entry[0] <= time.time():
+                return False
+            current_expires_at, items = entry
+            for name in removed:
+                items.pop(name, None)
+            items.update(changed)
+            self._write(path, current_expires_at if expires_at is None else expires_at, items)
+        if expires_at is not None and expires_at != current_expires_at:
+            self._index_append(digest, expires_at)
+        return True
+
+    def touch(self, key: str, expires_at: int) -> None:
+        digest = self._digest(key)
+        path = self._path_of(digest)
+        with self._locks(digest.hex()):
+            entry = self._read(path)
+            if entry is None:
+                return
+            self._write(path, expires_at, entry[1])
+        self._index_append(digest, expires_at)
+
+    def delete(self, key: str) -> None:
+        digest = self._digest(key)
+        self._remove(self._path_of(digest))
+        self._index_append(digest, 0)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _session_files(self) -> Iterator[str]:
+        for first in os.scandir(self.directory):
+            if not first.is_dir() or len(first.name) != 2:
+                continue
+            for second in os.scandir(first.path):
+                if not second.is_dir():
+                    continue
+                for entry in os.scandir(second.path):
+                    if entry.name.endswith(self.FILE_SUFFIX):
+                        yield entry.path
+
+    def cleanup(self, now: Optional[int] = None) -> int:
+        now = int(time.time()) if now is None else now
+        with self._index_lock:
+            fd = self._index_file()
+            self._flock(fd, exclusive=True)
+            try:
+                expiry = self._read_index(fd)
+                if expiry is None:
+                    logger.info("セッションインデックスを再構築します（セッションファイルを一覧）")
+                    expiry = self._scan_expiry()
+
+                expired = [digest for digest, expires_at in expiry.items() if expires_at <= now]
+                alive = {digest: expires_at for digest, expires_at in expiry.items() if expires_at > now}
+
+                # ファイル数上限（SESSION_FILE_THRESHOLD、既定は上限なし）を超えた分は期限の近いものから削除
+                evicted = []
+                if self.threshold and len(alive) > self.threshold:
+                    evicted = sorted(alive, key=alive.get)[:len(alive) - self.threshold]
+                    for digest in evicted:
+                        del alive[digest]
+
+                # 有効なセッションだけのインデックスに詰め直す（O_APPENDのため先頭から書き直される）
+                os.ftruncate(fd, 0)
+                os.write(fd, b''.join([self.INDEX_HEADER.pack(self.INDEX_MAGIC, self.INDEX_VERSION, 1)]
+                                      + [self.INDEX_RECORD.pack(d, e) for d, e in alive.items()]))
+            finally:
+                self._unlock(fd)
+
+        removed = 0
+        for digest in expired:
+            path = self._path_of(digest)
+            # ロック解放後に延長されたセッションは残す（延長は新しいレコードとして追記済み）
+            expires_at = self._read_expiry(path)
+            if expires_at is not None and expires_at <= now:
+                self._remove(path)
+                removed += 1
+        for digest in evicted:
+            if self._read_expiry(self._path_of(digest)) is not None:
+                self._remove(self._path_of(digest))
+                removed += 1
+        return removed
+
+    def count(self) -> int:
+        try:
+            with self._index_lock:
+                expiry = self._read_index(self._index_file())
+        except OSError as e:
+            logger.error(f"セッションインデックス読み込みエラー: {e}")
+            expiry = None
+        if expiry is None:
+            return sum(1 for _ in self._session_files())
+        now = time.time()
+        return sum(1 for expires_at in expiry.values() if expires_at > now)
+
+
+# 取り出した後にその場で変更される可能性がある値の型
+_MUTABLE_TYPES = (dict, list, set)
+
+
+class _Undecoded:
+    """未復元の値（COMPACT_SESSION_KEYS の値は初回アクセスまで復元しない）"""
+
+    __slots__ = ('data',)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """
+    サーバーサイドセッション（CookieにはセッションIDのみ）
+
+    読み込み時のキーごとのシリアライズ済みの値（raw）を保持し、リクエスト中に代入されたキーと、
+    読み出されたミュータブルな値（dict / list / set）のキーだけを保存時に再シリアライズして比較します。
+    ネストした値のその場での変更も検出でき、session.modified を立てただけでは書き込みは発生しません。
+    履歴・SRSデータ（COMPACT_SESSION_KEYS）は初回アクセスまで復元しません。
+    """
+
+    def __init__(self, initial: Optional[Dict[str, Any]] = None, sid: str = '', new: bool = False,
+                 raw: Optional[Dict[str, bytes]] = None, expires_at: int = 0):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.accessed = False
+        self.raw = raw if raw is not None else {}
+        self.expires_at = expires_at
+        self.touched_keys = set()
+        self.legacy_key: Optional[str] = None  # 引き継いだ移行済みの旧セッション（保存後に削除）
+        # リクエスト中の派生索引（services.derived_cache、バックエンドには保存しない）
+        self.derived: Dict[str, Any] = {}
+
+    @classmethod
+    def from_raw(cls, sid: str, raw: Dict[str, bytes], expires_at: int) -> 'ServerSideSession':
+        """バックエンドから読み込んだシリアライズ済みの値で作成"""
+        initial = {
+            name: _Undecoded(value) if name in COMPACT_SESSION_KEYS else loads_item(name, value)
+            for name, value in raw.items()
+        }
+        return cls(initial, sid=sid, raw=raw, expires_at=expires_at)
+
+    def _track(self, key: str, value: Any) -> Any:
+        self.accessed = True
+        if type(value) is _Undecoded:
+            value = loads_item(key, value.data)
+            dict.__setitem__(self, key, value)
+        if isinstance(value, _MUTABLE_TYPES):
+            self.touched_keys.add(key)
+        return value
+
+    def _track_all(self) -> None:
+        for key in list(dict.keys(self)):
+            self._track(key, dict.__getitem__(self, key))
+        self.accessed = True
+
+    def __getitem__(self, key: str) -> Any:
+        return self._track(key, super().__getitem__(key))
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key not in self:
+            self.accessed = True
+            return default
+        return self._track(key, dict.__getitem__(self, key))
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.touched_keys.add(key)
+        super().__setitem__(key, value)
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        self.touched_keys.add(key)
+        if key in self:
+            return self._track(key, dict.__getitem__(self, key))
+        return super().setdefault(key, default)
+
+    def pop(self, key: str, *args) -> Any:
+        if key in self:
+            self._track(key, dict.__getitem__(self, key))
+        return super().pop(key, *args)
+
+    def update(self, *args, **kwargs) -> None:
+        updates = dict(*args, **kwargs)
+        self.touched_keys.update(updates)
+        super().update(updates)
+
+    def values(self):
+        self._track_all()
+        return super().values()
+
+    def items(self):
+        self._track_all()
+        return super().items()
+
+    def copy(self) -> Dict[str, Any]:
+        self._track_all()
+        return dict(self)
+
+    def changes(self) -> Tuple[Dict[str, bytes], List[str]]:
+        """
+        読み込み時から変化したキーを求める
+
+        Returns:
+            (追加・変更されたキーとシリアライズ済みの値, 削除されたキー)
+        """
+        changed = {}
+        for key in self.touched_keys:
+            if not dict.__contains__(self, key):
+                continue
+            value = dumps_item(key, dict.__getitem__(self, key))
+            if self.raw.get(key) != value:
+                changed[key] = value
+        removed = [key for key in self.raw if not dict.__contains__(self, key)]
+        return changed, removed
+
+    def bump_state_version(self, changed: Dict[str, bytes], removed: List[str]) -> None:
+        """
+        ユーザーの状態が変わっていれば状態バージョンを進める（changed / removed も更新）
+
+        セッションを作り直した場合も以前のバージョンを再利用しないよう、初期値は乱数です。
+
+        Args:
+            changed: changes() の追加・変更されたキー（新規セッションでは空）
+            removed: changes() の削除されたキー
+        """
+        if not self.new and not any(key not in DERIVED_SESSION_KEYS for key in (*changed, *removed)):
+            return
+        version = dict.get(self, STATE_VERSION_KEY)
+        version = version + 1 if isinstance(version, int) else secrets.randbits(52)
+        dict.__setitem__(self, STATE_VERSION_KEY, version)
+        if not self.new:
+            changed[STATE_VERSION_KEY] = dumps_item(STATE_VERSION_KEY, version)
+            if STATE_VERSION_KEY in removed:
+                removed.remove(STATE_VERSION_KEY)
+
+    def serialized_items(self) -> Dict[str, bytes]:
+        """セッション全体のシリアライズ済みの値（未変更のキーは読み込み時のバイト列を再利用）"""
+        items = {}
+        for key, value in dict.items(self):
+            if type(value) is _Undecoded:
+                items[key] = value.data
+            elif key in self.raw and key not in self.touched_keys:
+                items[key] = self.raw[key]
+            else:
+                items[key] = dumps_item(key, value)
+        return items
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    サーバーサイドセッションの SessionInterface
+
+    変更されたキーだけをバックエンドへ差分書き込みし、変更のないリクエストでは書き込みも
+    Set-Cookie も行いません。有効期限の延長（SESSION_REFRESH_EACH_REQUEST）は残り時間が
+    refresh_ratio を下回ったときだけ行い、バックエンドとCookieの期限を揃えます。
+
+    Args:
+        backend: 保存先バックエンド
+        key_prefix: バックエンドのキープレフィックス（Config.SESSION_KEY_PREFIX）
+        use_signer: セッションIDのCookieに署名するか（Config.SESSION_USE_SIGNER）
+        permanent: 新規セッションの permanent の既定値（Config.SESSION_PERMANENT）
+        cleanup_interval: 期限切れセッションの掃除間隔（秒）
+        refresh_ratio: 有効期限を延長する残り時間の割合
+    """
+
+    session_class = ServerSideSession
+
+    def __init__(self, backend: SessionBackend, key_prefix: str = '', use_signer: bool = True,
+                 permanent: bool = True, cleanup_interval: float = SESSION_CLEANUP_INTERVAL,
+                 refresh_ratio: float = SESSION_REFRESH_RATIO):
+        self.backend = backend
+        self.key_prefix = key_prefix
+        self.use_signer = use_signer
+        self.permanent = permanent
+        self.cleanup_interval = cleanup_interval
+        self.refresh_ratio = refresh_ratio
+        self._next_cleanup = time.monotonic() + cleanup_interval
+        self._cleanup_lock = threading.Lock()
+        self._counters = dict.fromkeys(
+            ('full_writes', 'delta_writes', 'skipped_writes', 'touches', 'deletes', 'keys_written',
+             'keys_removed', 'bytes_written', 'cookies_set', 'cleanups', 'cleanup_removed'), 0)
+        self._counters_lock = threading.Lock()
+        # 保存後に呼び出す関数（状態バージョン確定後の派生索引の引き継ぎ等）
+        self.save_listeners: List[Callable[[ServerSideSession], None]] = []
+
+    # --- セッションID ---
+
+    def _signer(self, app) -> Optional[Signer]:
+        if not app.secret_key:
+            return None
+        return Signer(app.secret_key, salt='rccm-server-session', key_derivation='hmac',
+                      digest_method=hashlib.sha256)
+
+    def _cookie_value(self, app, sid: str) -> str:
+        if not self.use_signer:
+            return sid
+        return self._signer(app).sign(sid).decode('ascii')
+
+    def _sid_from_cookie(self, app, value: Optional[str]) -> Optional[str]:
+        if not value:
+            return None
+        if self.use_signer:
+            signer = self._signer(app)
+            if signer is None:
+                return None
+            try:
+                value = signer.unsign(value).decode('ascii')
+            except BadSignature:
+                # 旧セッション（Flask-Session）のCookie
+                legacy_signer = Signer(app.secret_key, salt=LEGACY_SIGNER_SALT, key_derivation='hmac')
+                try:
+                    value = legacy_signer.unsign(value).decode('ascii')
+                except BadSignature:
+                    return None
+        return value if SESSION_ID_PATTERN.match(value) else None
+
+    def _load_legacy(self, sid: str) -> Optional[ServerSideSession]:
+        """
+        移行済みの旧セッションを新しいセッションIDで引き継ぐ
+
+        旧セッションファイル名は（キープレフィックス + セッションID）のMD5のため、旧Cookieの
+        セッションIDから移行先のキーを求められます。引き継いだ旧セッションは保存後に削除します。
+        """
+        legacy_name = hashlib.md5(self._key(sid).encode('utf-8')).hexdigest()
+        legacy_key = legacy_session_key(self.key_prefix, legacy_name)
+        entry = self.backend.load(legacy_key)
+        if entry is None:
+            return None
+        raw, expires_at = entry
+        session = self.session_class.from_raw(self.generate_sid(), raw, expires_at)
+        session.new = True
+        session.legacy_key = legacy_key
+        logger.info(f"移行済みの旧セッションを引き継ぎ: {legacy_name}")
+        return session
+
+    def _key(self, sid: str) -> str:
+        return self.key_prefix + sid
+
+    @staticmethod
+    def generate_sid() -> str:
+        return secrets.token_urlsafe(SESSION_ID_BYTES)
+
+    def _count(self, **increments: int) -> None:
+        with self._counters_lock:
+            for name, value in increments.items():
+                self._counters[name] += value
+
+    # --- SessionInterface ---
+
+    def open_session(self, app, request) -> ServerSideSession:
+        sid = self._sid_from_cookie(app, request.cookies.get(self.get_cookie_name(app)))
+        if sid:
+            try:
+                entry = self.backend.load(self._key(sid))
+                if entry is not None:
+                    raw, expires_at = entry
+                    return self.session_class.from_raw(sid, raw, expires_at)
+                legacy = self._load_legacy(sid)
+                if legacy is not None:
+                    return legacy
+            except Exception as e:
+                logger.error(f"セッション読み込みエラー: {e}")
+
+        session = self.session_class(sid=self.generate_sid(), new=True)
+        if self.permanent:
+            session.permanent = True
+            session.modified = False
+        return session
+
+    def save_session(self, app, session: ServerSideSession, response) -> None:
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            # 空になったセッションはバックエンドとCookieの両方から削除
+            if session.raw:
+                try:
+                    self.backend.delete(self._key(session.sid))
+                except Exception as e:
+                    logger.error(f"セッション削除エラー: {e}")
+                self._count(deletes=1)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       samesite=samesite, httponly=httponly)
+                response.vary.add('Cookie')
+            return
+
+        # permanent でないセッション（ブラウザ終了で破棄）もサーバー側は有効期限で掃除する
+        now = time.time()
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        refresh = session.new or (
+            app.config.get('SESSION_REFRESH_EACH_REQUEST', True)
+            and session.expires_at - now < lifetime * self.refresh_ratio
+        )
+        expires_at = int(now + lifetime) if refresh else None
+        key = self._key(session.sid)
+
+        try:
+            changed, removed = ({}, []) if session.new else session.changes()
+            session.bump_state_version(changed, removed)
+            if session.new or ((changed or removed) and not self.backend.update(key, changed, removed, expires_at)):
+                # 新規、または差分の書き込み先が消えていた場合は全体を保存
+                items = session.serialized_items()
+                self.backend.save(key, items, expires_at or int(now + lifetime))
+                self._count(full_writes=1, keys_written=len(items), bytes_written=sum(map(len, items.values())))
+                refresh = True
+            elif changed or removed:
+                self._count(delta_writes=1, keys_written=len(changed), keys_removed=len(removed),
+                            bytes_written=sum(map(len, changed.values())))
+            elif refresh:
+                self.backend.touch(key, expires_at)
+                self._count(touches=1)
+            else:
+                self._count(skipped_writes=1)
+        except Exception as e:
+            logger.error(f"セッション保存エラー: {e}")
+            return
+
+        if session.legacy_key:
+            try:
+                self.backend.delete(session.legacy_key)
+            except Exception as e:
+                logger.error(f"旧セッション削除エラー: {e}")
+            session.legacy_key = None
+
+        # Cookieは新規作成・期限延長（permanentのみ期限あり）・permanentの切り替え時だけ送る
+        if session.new or (refresh and session.permanent) or '_permanent' in changed or '_permanent' in removed:
+            response.set_cookie(
+                name, self._cookie_value(app, session.sid),
+                expires=self.get_expiration_time(app, session),
+                httponly=httponly, domain=domain, path=path, secure=secure, samesite=samesite,
+            )
+            response.vary.add('Cookie')
+            self._count(cookies_set=1)
+
+        for listener in self.save_listeners:
+            try:
+                listener(session)
+            except Exception as e:
+                logger.error(f"セッション保存後処理エラー: {e}")
+        self._maybe_cleanup()
+
+    def _maybe_cleanup(self) -> None:
+        # 掃除はバックグラウンドのスレッドで行い、レスポンスを待たせない
+        if self.cleanup_interval <= 0 or time.monotonic() < self._next_cleanup:
+            return
+        if not self._cleanup_lock.acquire(blocking=False):
+            return
+        self._next_cleanup = time.monotonic() + self.cleanup_interval
+        try:
+            threading.Thread(target=self._cleanup, name='session-cleanup', daemon=True).start()
+        except Exception as e:
+            logger.error(f"セッション掃除スレッド起動エラー: {e}")
+            self._cleanup_lock.release()
+
+    def _cleanup(self) -> None:
+        try:
+            started = time.monotonic()
+            removed = self.backend.cleanup()
+            self._count(cleanups=1, cleanup_removed=removed)
+            if removed:
+                logger.info(f"🧹 期限切れセッション削除: {removed}件 ({(time.monotonic() - started) * 1000:.1f}ms)")
+        except Exception as e:
+            logger.error(f"セッション掃除エラー: {e}")
+        finally:
+            self._cleanup_lock.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """セッションストアの統計情報（書き込み・スキップの回数を含む）"""
+        with self._counters_lock:
+            counters = dict(self._counters)
+        performed = counters['full_writes'] + counters['delta_writes'] + counters['touches']
+        total = performed + counters['skipped_writes']
+        return {
+            'backend': self.backend.name,
+            'sessions': self.backend.count(),
+            'writes_performed': performed,
+            'writes_skipped': counters['skipped_writes'],
+            'skip_ratio': round(counters['skipped_writes'] / total, 3) if total else 0.0,
+            **counters,
+        }
+
+
+def create_session_backend(config: Dict[str, Any]) -> SessionBackend:
+    """
+    Config.SESSION_TYPE からバックエンドを作成
+
+    未対応の種別（'redis' 等）はファイルシステムにフォールバックします。
+    """
+    session_type = config.get('SESSION_TYPE', 'filesystem')
+    if session_type == 'sqlite':
+        return SQLiteSessionBackend(config['SESSION_SQLITE_PATH'])
+    if session_type != 'filesystem':
+        logger.warning(f"未対応のSESSION_TYPE: {session_type} - filesystemを使用します")
+    return FileSystemSessionBackend(config['SESSION_FILE_DIR'], config.get('SESSION_FILE_THRESHOLD', 0))
+
+
+def init_server_side_session(app) -> ServerSideSessionInterface:
+    """
+    アプリにサーバーサイドセッションを設定
+
+    Args:
+        app: Flaskアプリ（app.config の SESSION_* 設定を使用）
+
+    Returns:
+        設定したセッションインターフェース
+    """
+    config = app.config
+    interface = ServerSideSessionInterface(
+        create_session_backend(config),
+        key_prefix=config.get('SESSION_KEY_PREFIX', ''),
+        use_signer=config.get('SESSION_USE_SIGNER', True),
+        permanent=config.get('SESSION_PERMANENT', True),
+        cleanup_interval=config.get('SESSION_CLEANUP_INTERVAL', SESSION_CLEANUP_INTERVAL),
+        refresh_ratio=config.get('SESSION_REFRESH_RATIO', SESSION_REFRESH_RATIO),
+    )
+    app.session_interface = interface
+    logger.info(f"🗄️ サーバーサイドセッション: {interface.backend.name}")
+    return interface
@@ -0,0 +1,262 @@
+"""
+SRS Due Queue for RCCM Quiz Application
+復習期限キュー - Phase 21 Performance
+
+復習対象の判定・件数・優先度上位の取得のたびに advanced_srs 全体を走査し、
+next_review のISO文字列を datetime.fromisoformat で解析していた処理を、
+ユーザー（セッション）ごとの期限順の索引に置き換えます。
+
+索引は、マスター済みでない問題の [次回復習のエポック秒, 問題ID, 優先度の基礎値] を
+期限順に並べたリストと、統計用のカウンタ（問題数・マスター済み数・難易度の合計）です。
+セッションには保存せず、プロセス内の派生データキャッシュ（services.derived_cache）に
+（ユーザー, 状態バージョン）ごとに保持します。キャッシュにない場合（別のワーカー・再起動後）は
+advanced_srs から作り直します。
+
+- 期限が来た件数: 二分探索 O(log n)
+- 期限が来た問題: 先頭からの切り出し O(k)
+- 優先度上位N件: 期限が来た k 件から heapq.nlargest O(k log N)
+  （優先度 = 基礎値（間違い率×100 + 難易度） + 期限超過日数。超過日数は時刻から計算）
+- 更新: 変更前後のSRSデータで1件を削除・挿入 O(log n) + リストの移動
+
+advanced_srs を書き換える処理は record_change() で索引を更新するか、invalidate() で破棄します
+（破棄した索引は次回の参照時に advanced_srs から一度だけ作り直します）。どちらも
+復習問題の重み付き抽出（services/weighted_sampler.ReviewSampler）の索引にも反映します。
+更新した索引はセッションの保存後、新しい状態バージョンで引き継がれます。
+"""
+import heapq
+import logging
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from services.derived_cache import get_session_index, invalidate_session_index, load_session_index
+from services.weighted_sampler import ReviewSampler
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+
+# 優先度の計算に必要な項目がない記録（回答画面形式等）・日時が解析できない記録の優先度
+FALLBACK_PRIORITY = 999
+_NO_BASE = -1.0
+
+_epoch_of_entry = itemgetter(0)
+
+
+def review_epoch(data: Dict[str, Any]) -> int:
+    """
+    次回復習日時のエポック秒（未設定・解析できない場合は0 = 常に期限切れ）
+
+    Args:
+        data: 問題のSRSデータ
+
+    Returns:
+        int: エポック秒
+    """
+    try:
+        return int(datetime.fromisoformat(data['next_review']).timestamp())
+    except (ValueError, KeyError, TypeError, OverflowError):
+        return 0
+
+
+def priority_base(data: Dict[str, Any]) -> float:
+    """優先度のうち時刻に依存しない部分（間違い率×100 + 難易度）"""
+    try:
+        return (data['wrong_count'] / max(1, data['total_attempts'])) * 100 + data['difficulty_level']
+    except (KeyError, TypeError):
+        return _NO_BASE
+
+
+class SRSDueQueue:
+    """
+    ユーザーごとの復習期限キュー
+
+    Args:
+        entries: [エポック秒, 問題ID, 優先度の基礎値] の期限順リスト（マスター済みを除く）
+        size: SRSデータの問題数
+        mastered: マスター済みの問題数
+        difficulty_sum: 全問題の難易度の合計
+    """
+
+    # 派生索引の名前（以前はこの名前でセッションに保存していたため、残っている場合は削除する）
+    INDEX_NAME = 'srs_due_queue'
+    SRS_KEY = 'advanced_srs'
+
+    __slots__ = ('entries', 'size', 'mastered', 'difficulty_sum')
+
+    def __init__(self, entries: Optional[List[list]] = None, size: int = 0, mastered: int = 0,
+                 difficulty_sum: float = 0.0):
+        self.entries = entries if entries is not None else []
+        self.size = size
+        self.mastered = mastered
+        self.difficulty_sum = difficulty_sum
+
+    # --- 作成・保存 ---
+
+    @classmethod
+    def from_srs(cls, srs_data: Dict[str, Dict[str, Any]]) -> 'SRSDueQueue':
+        """SRSデータ全体から作成（索引がない・破棄された場合のみ）"""
+        queue = cls()
+        for qid, data in srs_data.items():
+            if isinstance(data, dict):
+                queue._add(str(qid), data, sort=False)
+        queue.entries.sort()
+        return queue
+
+    @classmethod
+    def build(cls, session) -> 'SRSDueQueue':
+        """セッションの advanced_srs から作成"""
+        srs_data = session.get(cls.SRS_KEY) or {}
+        queue = cls.from_srs(srs_data if isinstance(srs_data, dict) else {})
+        logger.debug(f"復習期限キューを作成: {queue.size}問（期限管理{len(queue.entries)}問）")
+        return queue
+
+    @classmethod
+    def load(cls, session) -> 'SRSDueQueue':
+        """
+        ユーザーの索引を取得（キャッシュにない場合は advanced_srs から作成）
+
+        Args:
+            session: セッションオブジェクト
+
+        Returns:
+            SRSDueQueue: 復習期限キュー（参照専用。変更は record_change で行う）
+        """
+        if cls.INDEX_NAME in session:
+            session.pop(cls.INDEX_NAME, None)
+        return load_session_index(session, cls.INDEX_NAME, lambda: cls.build(session))
+
+    def copy(self) -> 'SRSDueQueue':
+        # 要素（[エポック秒, 問題ID, 基礎値]）はその場で変更しないため、リストの複製で足りる
+        return SRSDueQueue(list(self.entries), self.size, self.mastered, self.difficulty_sum)
+
+    @classmethod
+    def invalidate(cls, session) -> None:
+        """索引を破棄（advanced_srs をまとめて書き換えた場合）"""
+        invalidate_session_index(session, cls.INDEX_NAME)
+        ReviewSampler.invalidate(session)
+
+    @classmethod
+    def record_change(cls, session, qid: Any, old: Optional[Dict[str, Any]],
+                      new: Optional[Dict[str, Any]]) -> None:
+        """
+        1問のSRSデータの変更を索引に反映
+
+        Args:
+            session: セッションオブジェクト
+            qid: 問題ID
+            old: 変更前のSRSデータ（新規の場合None、変更前に複製したもの）
+            new: 変更後のSRSデータ（削除の場合None）
+        """
+        ReviewSampler.record_change(session, qid, new)
+        # 索引がない場合は次回の参照時に変更後のSRSデータから作成（変更は反映済み）
+        queue = get_session_index(session, cls.INDEX_NAME, for_update=True)
+        if queue is not None and not queue.replace(str(qid), old, new):
+            # 索引とSRSデータがずれている場合は作り直す
+            invalidate_session_index(session, cls.INDEX_NAME)
+
+    # --- 更新 ---
+
+    def _add(self, qid: str, data: Dict[str, Any], sort: bool = True) -> None:
+        self.size += 1
+        self.difficulty_sum += data.get('difficulty_level', 5)
+        if data.get('mastered', False):
+            self.mastered += 1
+            return
+        entry = [review_epoch(data), qid, priority_base(data)]
+        if sort:
+            insort(self.entries, entry)
+        else:
+            self.entries.append(entry)
+
+    def _remove(self, qid: str, data: Dict[str, Any]) -> bool:
+        self.size -= 1
+        self.difficulty_sum -= data.get('difficulty_level', 5)
+        if data.get('mastered', False):
+            self.mastered -= 1
+            return True
+        key = [review_epoch(data), qid]
+        index = bisect_left(self.entries, key)
+        if index < len(self.entries) and self.entries[index][:2] == key:
+            del self.entries[index]
+            return True
+        return False
+
+    def replace(self, qid: str, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> bool:
+        """
+        変更前後のSRSデータで1問を入れ替え
+
+        Returns:
+            bool: 索引と整合していた場合True（Falseの場合は作り直しが必要）
+        """
+        consistent = True
+        if old is not None:
+            consistent = self._remove(qid, old)
+        if new is not None:
+            self._add(qid, new)
+        return consistent and self.size >= 0
+
+    # --- 参照 ---
+
+    @staticmethod
+    def _now(now: Optional[float]) -> float:
+        return datetime.now().timestamp() if now is None else now
+
+    def due_count(self, now: Optional[float] = None) -> int:
+        """期限が来ている問題数（マスター済みを除く）"""
+        return bisect_right(self.entries, self._now(now), key=_epoch_of_entry)
+
+    def due_entries(self, now: Optional[float] = None) -> List[list]:
+        """期限が来ている [エポック秒, 問題ID, 基礎値]（期限の古い順）"""
+        return self.entries[:self.due_count(now)]
+
+    def due_ids(self, now: Optional[float] = None) -> List[str]:
+        """期限が来ている問題ID（期限の古い順）"""
+        return [entry[1] for entry in self.due_entries(now)]
+
+    def top(self, limit: int, now: Optional[float] = None) -> List[Tuple[str, float]]:
+        """
+        期限が来ている問題のうち優先度の高い順に limit 件
+
+        Args:
+            limit: 取得件数
+            now: 基準時刻（エポック秒）
+
+        Returns:
+            list: (問題ID, 優先度) のリスト
+        """
+        now = self._now(now)
+        scored = (
+            (qid, FALLBACK_PRIORITY if base == _NO_BASE or not epoch
+             else base + (now - epoch) // SECONDS_PER_DAY)
+            for epoch, qid, base in self.due_entries(now)
+        )
+        return heapq.nlargest(limit, scored, key=itemgetter(1))
+
+    def statistics(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """SRSService.get_srs_statistics と同じ形式の統計"""
+        return {
+            'total_questions': self.size,
+            'mastered_questions': self.mastered,
+            'in_progress_questions': self.size - self.mastered,
+            # 日時が解析できない記録（エポック秒0）は件数に含めない
+            'due_questions': self.due_count(now) - self.due_count(0),
+            'average_difficulty': self.difficulty_sum / self.size if self.size > 0 else 0.0,
+        }
+
+
+def end_of_day_epoch(moment: Optional[datetime] = None) -> float:
+    """当日の終わり（翌日0時の直前）のエポック秒（日付単位の期限判定用）"""
+    moment = moment or datetime.now()
+    return moment.replace(hour=23, minute=59, second=59, microsecond=999999).timestamp()
+
+
+def due_days_overdue(entries: Iterable[list], today: Optional[datetime] = None) -> List[Tuple[str, int]]:
+    """期限が来た記録の (問題ID, 期限超過日数（日付単位）)"""
+    today_date = (today or datetime.now()).date()
+    result = []
+    for epoch, qid, _ in entries:
+        review_date = datetime.fromtimestamp(epoch).date() if epoch else today_date
+        result.append((qid, (today_date - review_date).days))
+    return result
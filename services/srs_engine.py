@@ -0,0 +1,272 @@
+"""
+SRS Batch Engine for RCCM Quiz Application
+SRS一括計算エンジン - Phase 23 Performance
+
+SRSService は1問ずつ辞書を更新するため、間隔（SRSService.BASE_INTERVALS 等）を変更した
+後にユーザー全員の復習予定を計算し直すと、ユーザー × 問題の回数だけPythonのループを
+回すことになります。SRSBatch は複数ユーザーのSRS状態をまとめて列ごとの配列
+（正解数・間違い数・難易度・間隔・最終回答／次回復習のエポック秒・マスター）で保持し
+（行ごとのユーザーIDは users）、
+
+- 次回間隔の計算（SRSService.calculate_next_review_date と同じ式）
+- 復習期限のマスク・統計（SRSService.get_srs_statistics と同じ形式）
+- 新しい間隔での一括再計算（オフライン用、reschedule_srs.py）
+
+を配列演算で行います。NumPy がない環境（または vectorized=False）では同じ計算を
+純Pythonのリストで行います（両者の一致は benchmark_srs_engine.py で確認できます）。
+
+対象は SRSService 形式（total_attempts を持つ）の記録です。回答画面で登録する形式
+（incorrect_count / level）は間隔を持たないため対象外として skipped に数えます。
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+from services.srs_service import SRSService
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+
+# 列名 → (SRSデータの項目, 既定値)
+_NUMERIC_FIELDS = {
+    'correct': ('correct_count', 0),
+    'wrong': ('wrong_count', 0),
+    'total': ('total_attempts', 0),
+    'difficulty': ('difficulty_level', 5),
+    'interval': ('interval_days', 1),
+}
+_TIME_FIELDS = {
+    'last_attempt': 'last_attempt',
+    'next_review': 'next_review',
+}
+
+
+def _epoch(value: Any) -> float:
+    """ISO日時文字列のエポック秒（未設定・解析できない場合は0）"""
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (ValueError, TypeError, OverflowError):
+        return 0.0
+
+
+def _isoformat(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch).isoformat()
+
+
+class SRSBatch:
+    """
+    SRS状態（複数ユーザー可）の列指向の配列
+
+    Args:
+        qids: 行ごとの問題ID
+        columns: 列名 → 配列（NumPy の ndarray、または純Pythonの場合はリスト）
+        skipped: 対象外とした記録数
+        users: 行ごとのユーザーID（from_srs の場合は None）
+        records: 行ごとの作成元のSRS状態（apply で更新）
+        vectorized: NumPy の配列演算を使うか
+    """
+
+    __slots__ = ('qids', 'columns', 'skipped', 'users', 'records', 'vectorized')
+
+    def __init__(self, qids: List[str], columns: Dict[str, Any], skipped: int = 0,
+                 users: Optional[List[Optional[str]]] = None, records: Optional[List[Dict[str, Any]]] = None,
+                 vectorized: bool = NUMPY_AVAILABLE):
+        self.qids = qids
+        self.columns = columns
+        self.skipped = skipped
+        self.users = users if users is not None else [None] * len(qids)
+        self.records = records if records is not None else []
+        self.vectorized = vectorized
+
+    def __len__(self) -> int:
+        return len(self.qids)
+
+    @property
+    def backend(self) -> str:
+        return 'numpy' if self.vectorized else 'python'
+
+    @classmethod
+    def from_srs(cls, srs_data: Dict[str, Dict[str, Any]], vectorized: Optional[bool] = None) -> 'SRSBatch':
+        """
+        1ユーザー分のSRSデータ（advanced_srs / 学習進捗ストアの srs_state）から作成
+
+        Args:
+            srs_data: 問題ID → SRS状態
+            vectorized: NumPy を使うか（省略時は NumPy があれば使う）
+
+        Returns:
+            SRSBatch: 列指向の配列
+        """
+        return cls.from_records(((None, qid, data) for qid, data in srs_data.items()), vectorized)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Tuple[Optional[str], Any, Dict[str, Any]]],
+                     vectorized: Optional[bool] = None) -> 'SRSBatch':
+        """
+        複数ユーザーのSRS状態から作成（学習進捗ストアの srs_state の行をまとめて処理する場合）
+
+        Args:
+            records: (ユーザーID, 問題ID, SRS状態) の列
+            vectorized: NumPy を使うか（省略時は NumPy があれば使う。NumPy がない場合は常に純Python）
+
+        Returns:
+            SRSBatch: 列指向の配列
+        """
+        vectorized = NUMPY_AVAILABLE if vectorized is None else (vectorized and NUMPY_AVAILABLE)
+        qids = []
+        users = []
+        sources = []
+        rows = {name: [] for name in list(_NUMERIC_FIELDS) + list(_TIME_FIELDS) + ['mastered']}
+        skipped = 0
+        for user_id, qid, data in records:
+            if not isinstance(data, dict) or 'total_attempts' not in data:
+                skipped += 1
+                continue
+            qids.append(str(qid))
+            users.append(user_id)
+            sources.append(data)
+            for name, (field, default) in _NUMERIC_FIELDS.items():
+                rows[name].append(data.get(field, default))
+            for name, field in _TIME_FIELDS.items():
+                rows[name].append(_epoch(data.get(field)))
+            rows['mastered'].append(bool(data.get('mastered', False)))
+
+        if vectorized:
+            columns = {name: np.asarray(values, dtype=np.int64) for name, values in rows.items()
+                       if name in ('correct', 'wrong', 'total', 'interval')}
+            columns['difficulty'] = np.asarray(rows['difficulty'], dtype=np.float64)
+            for name in _TIME_FIELDS:
+                columns[name] = np.asarray(rows[name], dtype=np.float64)
+            columns['mastered'] = np.asarray(rows['mastered'], dtype=bool)
+        else:
+            columns = rows
+        return cls(qids, columns, skipped, users, sources, vectorized)
+
+    # --- 計算 ---
+
+    def next_intervals(self, base_intervals: Optional[Sequence[int]] = None):
+        """
+        全行の次回間隔（日数）
+
+        SRSService.calculate_next_review_date と同じ式:
+        max(1, int(base_intervals[min(正解数, 段階数-1)] × max(0.1, 1 - 間違い数×0.1)))
+
+        Args:
+            base_intervals: 正解数ごとの基本間隔（省略時は SRSService.BASE_INTERVALS）
+
+        Returns:
+            行ごとの間隔（ndarray またはリスト）
+        """
+        intervals = list(base_intervals or SRSService.BASE_INTERVALS)
+        last_level = len(intervals) - 1
+        correct = self.columns['correct']
+        wrong = self.columns['wrong']
+        if self.vectorized:
+            levels = np.clip(correct, 0, last_level)
+            factors = np.maximum(0.1, 1.0 - wrong * 0.1)
+            return np.maximum(1, (np.asarray(intervals, dtype=np.float64)[levels] * factors).astype(np.int64))
+        return [
+            max(1, int(intervals[min(max(0, c), last_level)] * max(0.1, 1.0 - (w * 0.1))))
+            for c, w in zip(correct, wrong)
+        ]
+
+    def due_mask(self, now: Optional[float] = None):
+        """
+        復習期限が来ている行（マスター済み・日時が解析できない行を除く）
+
+        Args:
+            now: 基準時刻（エポック秒）
+
+        Returns:
+            行ごとの真偽値（ndarray またはリスト）
+        """
+        now = datetime.now().timestamp() if now is None else now
+        next_review = self.columns['next_review']
+        mastered = self.columns['mastered']
+        if self.vectorized:
+            return ~mastered & (next_review > 0) & (next_review <= now)
+        return [not m and 0 < t <= now for t, m in zip(next_review, mastered)]
+
+    def statistics(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """SRSService.get_srs_statistics と同じ形式の統計（対象の記録のみ）"""
+        total = len(self.qids)
+        if self.vectorized:
+            mastered = int(self.columns['mastered'].sum())
+            due = int(self.due_mask(now).sum())
+            difficulty_sum = float(self.columns['difficulty'].sum())
+        else:
+            mastered = sum(self.columns['mastered'])
+            due = sum(self.due_mask(now))
+            difficulty_sum = float(sum(self.columns['difficulty']))
+        return {
+            'total_questions': total,
+            'mastered_questions': mastered,
+            'in_progress_questions': total - mastered,
+            'due_questions': due,
+            'average_difficulty': difficulty_sum / total if total > 0 else 0.0,
+        }
+
+    def reschedule(self, base_intervals: Optional[Sequence[int]] = None) -> List[int]:
+        """
+        新しい基本間隔で次回間隔・次回復習日時を計算し直す
+
+        間隔が変わる行だけ、予定を決めた時点（現在の次回復習日時 − 現在の間隔。次回復習日時が
+        ない場合は最終回答日時）に新しい間隔を足した日時へ変更します。マスター済みの行と
+        基準の日時がない行は変更しません。
+
+        Args:
+            base_intervals: 正解数ごとの基本間隔（省略時は SRSService.BASE_INTERVALS）
+
+        Returns:
+            list: 変更した行の位置
+        """
+        new_intervals = self.next_intervals(base_intervals)
+        interval = self.columns['interval']
+        last_attempt = self.columns['last_attempt']
+        next_review = self.columns['next_review']
+        mastered = self.columns['mastered']
+
+        if self.vectorized:
+            anchors = np.where(next_review > 0, next_review - interval * SECONDS_PER_DAY, last_attempt)
+            changed = ~mastered & (anchors > 0) & (new_intervals != interval)
+            self.columns['interval'] = np.where(changed, new_intervals, interval)
+            self.columns['next_review'] = np.where(changed, anchors + new_intervals * SECONDS_PER_DAY, next_review)
+            return np.flatnonzero(changed).tolist()
+
+        changed = []
+        for i, (new_interval, old_interval, attempt, review, is_mastered) in enumerate(
+                zip(new_intervals, interval, last_attempt, next_review, mastered)):
+            anchor = review - old_interval * SECONDS_PER_DAY if review > 0 else attempt
+            if not is_mastered and anchor > 0 and new_interval != old_interval:
+                interval[i] = new_interval
+                next_review[i] = anchor + new_interval * SECONDS_PER_DAY
+                changed.append(i)
+        return changed
+
+    def apply(self, rows: Sequence[int]) -> List[Tuple[Optional[str], str, Dict[str, Any]]]:
+        """
+        指定した行の間隔・次回復習日時を作成元のSRS状態へ書き戻す
+
+        Args:
+            rows: 書き戻す行の位置（reschedule の戻り値）
+
+        Returns:
+            list: 更新した記録（ユーザーID, 問題ID, SRS状態）
+        """
+        interval = self.columns['interval']
+        next_review = self.columns['next_review']
+        updated = []
+        for i in rows:
+            data = self.records[i]
+            data['interval_days'] = int(interval[i])
+            data['next_review'] = _isoformat(float(next_review[i]))
+            updated.append((self.users[i], self.qids[i], data))
+        return updated
@@ -11,6 +11,9 @@ from typing import Dict, List, Tuple, Any, Optional
 import logging
 from datetime import datetime, timedelta
 
+from services.srs_due_queue import SRSDueQueue
+from services.weighted_sampler import ReviewSampler
+
 logger = logging.getLogger(__name__)
 
 
@@ -95,6 +98,8 @@ class SRSService:
         # SRSデータの初期化
         srs_data = SRSService.initialize_srs_data(session)
         qid_str = str(question_id)
+        # 復習期限キューの更新用に変更前を複製
+        old_data = dict(srs_data[qid_str]) if qid_str in srs_data else None
 
         # 問題のSRSデータを取得または初期化
         if qid_str not in srs_data:
@@ -155,6 +160,7 @@ class SRSService:
             question_data['interval_days'] = interval
 
         session[SRSService.KEY_ADVANCED_SRS] = srs_data
+        SRSDueQueue.record_change(session, qid_str, old_data, question_data)
         session.modified = True
 
         logger.info(
@@ -183,78 +189,39 @@ class SRSService:
         if SRSService.KEY_ADVANCED_SRS not in session:
             return []
 
-        srs_data = session[SRSService.KEY_ADVANCED_SRS]
-        now = datetime.now()
-        due_questions = []
-
-        for qid, data in srs_data.items():
-            # マスター済みの問題はスキップ
-            if data.get('mastered', False):
-                continue
-
-            try:
-                next_review = datetime.fromisoformat(data['next_review'])
-                if next_review <= now:
-                    # 優先度を計算（間違いが多い＋期限が過ぎているほど高優先度）
-                    days_overdue = (now - next_review).days
-                    wrong_ratio = data['wrong_count'] / max(1, data['total_attempts'])
-                    priority = (wrong_ratio * 100) + days_overdue + data['difficulty_level']
-
-                    due_questions.append((qid, priority, data))
-            except (ValueError, KeyError):
-                # 日時解析エラーの場合は優先度最高で追加
-                due_questions.append((qid, 999, data))
-
-        # 優先度順（降順）でソートして返す
-        due_questions.sort(key=lambda x: x[1], reverse=True)
-
-        result = [qid for qid, priority, data in due_questions[:max_count]]
-        logger.info(f"復習対象問題: {len(result)}問（全体: {len(due_questions)}問）")
+        # 期限順の索引から期限が来た問題だけを取り出し、優先度上位を選ぶ
+        # （優先度 = 間違い率×100 + 期限超過日数 + 難易度、日時解析エラー等は999）
+        queue = SRSDueQueue.load(session)
+        result = [qid for qid, priority in queue.top(max_count)]
+        logger.info(f"復習対象問題: {len(result)}問（全体: {queue.due_count()}問）")
 
         return result
 
     @staticmethod
-    def get_adaptive_review_list(session: Dict) -> List[str]:
+    def get_adaptive_review_list(session: Dict, count: Optional[int] = None) -> List[str]:
         """
         アダプティブな復習リストを生成
-        間違いが多い問題ほど頻繁に出題される
+        間違いが多い問題ほど先に（高い確率で）選ばれる
+
+        重み（間違い率 × 難易度レベル × 2、最低1）に比例した確率で重複なしに抽出します。
+        IDを重みの回数だけ複製してシャッフルする代わりに、フェンウィック木の索引から
+        O(count log n) で取り出します。
 
         Args:
             session: セッションオブジェクト
+            count: 取得数（省略時はマスター済み以外の全問題）
 
         Returns:
-            復習問題IDのリスト（頻度調整済み）
+            復習問題IDのリスト（重み付きの抽出順）
         """
         if SRSService.KEY_ADVANCED_SRS not in session:
             return []
 
-        srs_data = session[SRSService.KEY_ADVANCED_SRS]
-        weighted_questions = []
-
-        for qid, data in srs_data.items():
-            # マスター済みの問題はスキップ
-            if data.get('mastered', False):
-                continue
-
-            # 重み計算（間違いが多いほど高い重み）
-            wrong_count = data.get('wrong_count', 0)
-            total_attempts = data.get('total_attempts', 1)
-            difficulty = data.get('difficulty_level', 5)
-
-            # 重み = 間違い率 × 難易度レベル × 係数
-            weight = (wrong_count / total_attempts) * difficulty * 2
-            weight = max(1, int(weight))  # 最低でも1回は含める
+        sampler = ReviewSampler.load(session)
+        result = sampler.sample(len(sampler.ids) if count is None else count)
 
-            # 重みに応じて複数回追加（重要な問題ほど出現頻度が高くなる）
-            for _ in range(weight):
-                weighted_questions.append(qid)
-
-        # シャッフルして自然な順序にする
-        import random
-        random.shuffle(weighted_questions)
-
-        logger.info(f"アダプティブ復習リスト生成: {len(weighted_questions)}問（重み付き）")
-        return weighted_questions
+        logger.info(f"アダプティブ復習リスト生成: {len(result)}問（重み合計: {sampler.total_weight}）")
+        return result
 
     @staticmethod
     def cleanup_mastered_questions(session: Dict) -> int:
@@ -306,36 +273,8 @@ class SRSService:
                 'average_difficulty': 0.0
             }
 
-        srs_data = session[SRSService.KEY_ADVANCED_SRS]
-        total = len(srs_data)
-        mastered = sum(1 for data in srs_data.values() if data.get('mastered', False))
-        in_progress = total - mastered
-
-        # 復習期限が来ている問題数
-        now = datetime.now()
-        due = 0
-        total_difficulty = 0
-
-        for data in srs_data.values():
-            if not data.get('mastered', False):
-                try:
-                    next_review = datetime.fromisoformat(data['next_review'])
-                    if next_review <= now:
-                        due += 1
-                except (ValueError, KeyError):
-                    pass
-
-            total_difficulty += data.get('difficulty_level', 5)
-
-        average_difficulty = total_difficulty / total if total > 0 else 0.0
-
-        return {
-            'total_questions': total,
-            'mastered_questions': mastered,
-            'in_progress_questions': in_progress,
-            'due_questions': due,
-            'average_difficulty': average_difficulty
-        }
+        # 件数・難易度の合計は索引のカウンタ、期限の判定は二分探索
+        return SRSDueQueue.load(session).statistics()
 
     @staticmethod
     def get_question_srs_data(
@@ -382,8 +321,9 @@ class SRSService:
         qid_str = str(question_id)
 
         if qid_str in srs_data:
-            del srs_data[qid_str]
+            old_data = srs_data.pop(qid_str)
             session[SRSService.KEY_ADVANCED_SRS] = srs_data
+            SRSDueQueue.record_change(session, qid_str, old_data, None)
             session.modified = True
             logger.info(f"問題 {question_id} のSRSデータをリセットしました")
             return True
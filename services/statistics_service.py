@@ -5,11 +5,19 @@ Statistics Service for RCCM Quiz Application
 統計・分析サービス - Phase 5 Refactoring
 
 このモジュールは統計計算、学習進捗分析、パフォーマンス追跡の全操作を統合します。
+
+全期間の統計は集計カウンタ（rollup）から求めます。rollup は回答ごとに add_to_rollup() で
+O(1) で更新される次元別のカウンタ・連続学習日数・回答時間の集計で、大きさは回答数に
+依存しません（日別は ROLLUP_DAY_LIMIT 日まで）。
+    {'version': 2,
+     'counts': {次元: {値: [回答数, 正解数, 回答時間合計]}},
+     'streak': [最終学習日, 現在の連続日数, 最長連続日数, 学習日数],
+     'elapsed': [回答数, 合計, 最短, 最長]}   # 回答時間が正の回答のみ
+各メソッドは rollup の代わりに学習履歴リストも受け取り、その場で集計します。
 """
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple, Union
 import logging
-from collections import defaultdict
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +25,242 @@ logger = logging.getLogger(__name__)
 class StatisticsService:
     """統計・分析管理の中央サービス"""
 
+    # 集計カウンタ（rollup）の形式バージョン・次元
+    ROLLUP_VERSION = 2
+    ROLLUP_DIMENSIONS = (
+        'total', 'category', 'question_type', 'day',
+        'department', 'department_type', 'department_type_category'
+    )
+    # 日別カウンタを保持する日数（超えた分は古い日から削除）
+    ROLLUP_DAY_LIMIT = 400
+    # 複合キー（部門|種別|カテゴリ）の区切り文字
+    ROLLUP_KEY_SEPARATOR = '|'
+
+    @staticmethod
+    def new_rollup() -> Dict[str, Any]:
+        """
+        空の集計カウンタを作成
+
+        Returns:
+            集計カウンタ（JSONでセッションに保存できる辞書）
+        """
+        return {
+            'version': StatisticsService.ROLLUP_VERSION,
+            'counts': {dimension: {} for dimension in StatisticsService.ROLLUP_DIMENSIONS},
+            'streak': ['', 0, 0, 0],
+            'elapsed': [0, 0, None, None]
+        }
+
+    @staticmethod
+    def is_rollup(data: Any) -> bool:
+        """現行形式の集計カウンタか判定"""
+        return (isinstance(data, dict)
+                and data.get('version') == StatisticsService.ROLLUP_VERSION
+                and isinstance(data.get('counts'), dict))
+
+    @staticmethod
+    def rollup_keys(entry: Dict[str, Any]) -> List[Tuple[str, str]]:
+        """
+        回答記録が加算される (次元, 値) の一覧
+
+        Args:
+            entry: 回答記録（category, question_type, department, date）
+
+        Returns:
+            (次元, 値) のリスト
+        """
+        separator = StatisticsService.ROLLUP_KEY_SEPARATOR
+        category = entry.get('category') or '不明'
+        question_type = entry.get('question_type') or ''
+        keys = [('total', ''), ('category', category), ('question_type', question_type)]
+
+        day = str(entry.get('date') or '')[:10]
+        if day:
+            keys.append(('day', day))
+
+        department = entry.get('department')
+        if department:
+            keys.append(('department', department))
+            keys.append(('department_type', f"{department}{separator}{question_type}"))
+            keys.append(('department_type_category',
+                         f"{department}{separator}{question_type}{separator}{category}"))
+        return keys
+
+    @staticmethod
+    def _next_day(day: str) -> Optional[str]:
+        try:
+            return (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _streaks_from_days(days: List[str]) -> Tuple[int, int]:
+        """昇順の日付リストの (末尾の連続日数, 最長連続日数)"""
+        current = longest = 0
+        previous = None
+        for day in days:
+            current = current + 1 if previous and StatisticsService._next_day(previous) == day else 1
+            longest = max(longest, current)
+            previous = day
+        return current, longest
+
+    @staticmethod
+    def _add_study_day(rollup: Dict[str, Any], day: str) -> None:
+        """初めて学習した日を連続学習日数に反映（日付順の追加は O(1)）"""
+        streak = rollup['streak']
+        last_day, current, longest, total_days = streak
+        if day > last_day:
+            current = current + 1 if last_day and StatisticsService._next_day(last_day) == day else 1
+            streak[:] = [day, current, max(longest, current), total_days + 1]
+        else:
+            # 過去の日付の追加（日付順でない履歴）は日別カウンタから数え直す
+            current, recomputed = StatisticsService._streaks_from_days(sorted(rollup['counts']['day']))
+            streak[:] = [last_day, current, max(longest, recomputed), total_days + 1]
+
+    @staticmethod
+    def add_to_rollup(rollup: Dict[str, Any], entry: Dict[str, Any]) -> None:
+        """
+        回答記録を集計カウンタに加算（O(次元数)）
+
+        Args:
+            rollup: 集計カウンタ（その場で更新）
+            entry: 回答記録
+        """
+        counts = rollup['counts']
+        correct = 1 if entry.get('is_correct') else 0
+        elapsed = entry.get('elapsed') or 0
+        if not isinstance(elapsed, (int, float)):
+            elapsed = 0
+
+        if elapsed > 0:
+            timing = rollup['elapsed']
+            timing[0] += 1
+            timing[1] += elapsed
+            timing[2] = elapsed if timing[2] is None else min(timing[2], elapsed)
+            timing[3] = elapsed if timing[3] is None else max(timing[3], elapsed)
+
+        day = str(entry.get('date') or '')[:10]
+        new_day = day and day not in counts['day']
+
+        for dimension, key in StatisticsService.rollup_keys(entry):
+            cells = counts.setdefault(dimension, {})
+            cell = cells.get(key)
+            if cell is None:
+                cells[key] = [1, correct, elapsed]
+            else:
+                cell[0] += 1
+                cell[1] += correct
+                cell[2] += elapsed
+
+        if new_day:
+            StatisticsService._add_study_day(rollup, day)
+
+        days = counts['day']
+        if len(days) > StatisticsService.ROLLUP_DAY_LIMIT:
+            for day in sorted(days)[:len(days) - StatisticsService.ROLLUP_DAY_LIMIT]:
+                del days[day]
+
+    @staticmethod
+    def build_rollup(history: List[Dict]) -> Dict[str, Any]:
+        """
+        学習履歴リストから集計カウンタを作成（既存履歴のバックフィル用）
+
+        Args:
+            history: 学習履歴リスト
+
+        Returns:
+            集計カウンタ
+        """
+        rollup = StatisticsService.new_rollup()
+        for entry in history or []:
+            StatisticsService.add_to_rollup(rollup, entry)
+        return rollup
+
+    @staticmethod
+    def upgrade_rollup(
+        data: Any,
+        history: Optional[List[Dict]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        旧形式（version 1）の集計カウンタを現行形式へ移行
+
+        次元別カウンタはそのまま引き継ぎ、連続学習日数は日別カウンタから、回答時間の
+        最短・最長・合計は保持している履歴から一度だけ求めます。
+
+        Args:
+            data: 集計カウンタ
+            history: 保持している学習履歴リスト
+
+        Returns:
+            現行形式の集計カウンタ（移行できない場合None）
+        """
+        if not (isinstance(data, dict) and data.get('version') == 1 and isinstance(data.get('counts'), dict)):
+            return None
+        rollup = StatisticsService.new_rollup()
+        rollup['counts'].update(data['counts'])
+
+        days = sorted(rollup['counts'].get('day', {}))
+        if days:
+            current, longest = StatisticsService._streaks_from_days(days)
+            rollup['streak'] = [days[-1], current, longest, len(days)]
+
+        times = [entry.get('elapsed') for entry in history or []]
+        times = [elapsed for elapsed in times if isinstance(elapsed, (int, float)) and elapsed > 0]
+        if times:
+            rollup['elapsed'] = [len(times), sum(times), min(times), max(times)]
+        return rollup
+
+    @staticmethod
+    def _as_rollup(data: Union[List[Dict], Dict[str, Any], None]) -> Dict[str, Any]:
+        if StatisticsService.is_rollup(data):
+            return data
+        if isinstance(data, dict):
+            return StatisticsService.upgrade_rollup(data) or StatisticsService.new_rollup()
+        return StatisticsService.build_rollup(data)
+
+    @staticmethod
+    def get_rollup_counts(
+        data: Union[List[Dict], Dict[str, Any]],
+        dimension: str
+    ) -> Dict[str, List]:
+        """
+        集計カウンタの次元別カウンタを取得
+
+        Args:
+            data: 集計カウンタまたは学習履歴リスト
+            dimension: 次元（ROLLUP_DIMENSIONS）
+
+        Returns:
+            値 → [回答数, 正解数, 回答時間合計]
+        """
+        return StatisticsService._as_rollup(data)['counts'].get(dimension, {})
+
+    @staticmethod
+    def get_rollup_progress(
+        data: Union[List[Dict], Dict[str, Any]],
+        dimension: str,
+        *key: str
+    ) -> Dict[str, Any]:
+        """
+        1つの値（複合キーは部品を順に指定）の進捗を取得
+
+        Args:
+            data: 集計カウンタまたは学習履歴リスト
+            dimension: 次元（ROLLUP_DIMENSIONS）
+            *key: 値（例: 'road', 'specialist', '道路'）
+
+        Returns:
+            total_answered / correct_count / accuracy の辞書
+        """
+        cells = StatisticsService.get_rollup_counts(data, dimension)
+        cell = cells.get(StatisticsService.ROLLUP_KEY_SEPARATOR.join(key))
+        answered, correct = (cell[0], cell[1]) if cell else (0, 0)
+        return {
+            'total_answered': answered,
+            'correct_count': correct,
+            'accuracy': StatisticsService.calculate_accuracy(correct, answered)
+        }
+
     @staticmethod
     def calculate_accuracy(correct: int, total: int) -> float:
         """
@@ -32,17 +276,18 @@ class StatisticsService:
         return (correct / total * 100) if total > 0 else 0.0
 
     @staticmethod
-    def get_overall_statistics(history: List[Dict]) -> Dict[str, Any]:
+    def get_overall_statistics(history: Union[List[Dict], Dict[str, Any]]) -> Dict[str, Any]:
         """
         全体統計を取得
 
         Args:
-            history: 学習履歴リスト
+            history: 集計カウンタ、または学習履歴リスト
 
         Returns:
             全体統計の辞書
         """
-        if not history:
+        cell = StatisticsService.get_rollup_counts(history, 'total').get('')
+        if not cell:
             return {
                 'total_quizzes': 0,
                 'total_accuracy': 0.0,
@@ -51,26 +296,23 @@ class StatisticsService:
                 'total_incorrect': 0
             }
 
-        total = len(history)
-        correct = sum(1 for h in history if h.get('is_correct'))
-        incorrect = total - correct
-        total_time = sum(h.get('elapsed', 0) for h in history)
+        total, correct, total_time = cell
 
         return {
             'total_quizzes': total,
             'total_accuracy': StatisticsService.calculate_accuracy(correct, total),
             'average_time_per_question': round(total_time / total, 1) if total > 0 else None,
             'total_correct': correct,
-            'total_incorrect': incorrect
+            'total_incorrect': total - correct
         }
 
     @staticmethod
-    def get_basic_specialty_statistics(history: List[Dict]) -> Dict[str, Dict]:
+    def get_basic_specialty_statistics(history: Union[List[Dict], Dict[str, Any]]) -> Dict[str, Dict]:
         """
         基礎科目・専門科目別統計を取得
 
         Args:
-            history: 学習履歴リスト
+            history: 集計カウンタ、または学習履歴リスト
 
         Returns:
             基礎/専門別統計の辞書
@@ -80,19 +322,11 @@ class StatisticsService:
             'specialty': {'total_answered': 0, 'correct_count': 0, 'accuracy': 0.0}
         }
 
-        for h in history:
-            question_id = h.get('id', h.get('question_id', ''))
-            question_type = h.get('question_type', '')
-
-            # 基礎科目判定
-            if question_type == 'basic' or '4-1' in str(question_id):
-                score_type = 'basic'
-            else:
-                score_type = 'specialty'
-
-            stats[score_type]['total_answered'] += 1
-            if h.get('is_correct'):
-                stats[score_type]['correct_count'] += 1
+        for question_type, (answered, correct, _) in StatisticsService.get_rollup_counts(history, 'question_type').items():
+            # 基礎科目判定（basic以外は専門科目）
+            score_type = 'basic' if question_type == 'basic' else 'specialty'
+            stats[score_type]['total_answered'] += answered
+            stats[score_type]['correct_count'] += correct
 
         # 正答率計算
         for score_type in ['basic', 'specialty']:
@@ -103,32 +337,24 @@ class StatisticsService:
         return stats
 
     @staticmethod
-    def get_daily_statistics(history: List[Dict]) -> List[Dict]:
+    def get_daily_statistics(history: Union[List[Dict], Dict[str, Any]]) -> List[Dict]:
         """
         日別統計を取得
 
         Args:
-            history: 学習履歴リスト
+            history: 集計カウンタ、または学習履歴リスト
 
         Returns:
             日別統計リスト（日付、正答率）
         """
-        daily_stats = defaultdict(lambda: {'total': 0, 'correct': 0})
-
-        for h in history:
-            date = h.get('date', '')[:10]
-            if date:
-                daily_stats[date]['total'] += 1
-                if h.get('is_correct'):
-                    daily_stats[date]['correct'] += 1
+        daily_stats = StatisticsService.get_rollup_counts(history, 'day')
 
         daily_accuracy_list = []
-        for date in sorted(daily_stats.keys()):
-            total = daily_stats[date]['total']
-            correct = daily_stats[date]['correct']
+        for day in sorted(daily_stats.keys()):
+            total, correct, _ = daily_stats[day]
             accuracy = StatisticsService.calculate_accuracy(correct, total)
             daily_accuracy_list.append({
-                'date': date,
+                'date': day,
                 'accuracy': round(accuracy, 1),
                 'total': total,
                 'correct': correct
@@ -137,55 +363,50 @@ class StatisticsService:
         return daily_accuracy_list
 
     @staticmethod
-    def get_category_statistics(history: List[Dict]) -> Dict[str, Dict]:
+    def get_category_statistics(history: Union[List[Dict], Dict[str, Any]]) -> Dict[str, Dict]:
         """
         カテゴリ別統計を取得
 
         Args:
-            history: 学習履歴リスト
+            history: 集計カウンタ、または学習履歴リスト
 
         Returns:
             カテゴリ別統計の辞書
         """
-        category_stats = defaultdict(lambda: {'total': 0, 'correct': 0, 'accuracy': 0.0})
-
-        for h in history:
-            category = h.get('category', '不明')
-            category_stats[category]['total'] += 1
-            if h.get('is_correct'):
-                category_stats[category]['correct'] += 1
+        category_stats = {}
 
-        # 正答率計算
-        for category in category_stats:
-            total = category_stats[category]['total']
-            correct = category_stats[category]['correct']
-            category_stats[category]['accuracy'] = StatisticsService.calculate_accuracy(correct, total)
+        for category, (total, correct, _) in StatisticsService.get_rollup_counts(history, 'category').items():
+            category_stats[category] = {
+                'total': total,
+                'correct': correct,
+                'accuracy': StatisticsService.calculate_accuracy(correct, total)
+            }
 
-        return dict(category_stats)
+        return category_stats
 
     @staticmethod
     def get_department_progress(
-        history: List[Dict],
+        history: Union[List[Dict], Dict[str, Any]],
         department_mapping: Dict[str, str]
     ) -> Dict[str, Dict]:
         """
         部門別進捗を取得
 
         Args:
-            history: 学習履歴リスト
+            history: 集計カウンタ、または学習履歴リスト
             department_mapping: 部門マッピング辞書
 
         Returns:
             部門別進捗の辞書
         """
         department_progress = {}
+        category_counts = StatisticsService.get_rollup_counts(history, 'category')
 
         for dept_id, dept_name in department_mapping.items():
-            dept_history = [h for h in history if h.get('category') == dept_name]
+            cell = category_counts.get(dept_name)
 
-            if dept_history:
-                total_answered = len(dept_history)
-                correct_count = sum(1 for h in dept_history if h.get('is_correct'))
+            if cell:
+                total_answered, correct_count, _ = cell
 
                 department_progress[dept_id] = {
                     'name': dept_name,
@@ -198,27 +419,27 @@ class StatisticsService:
 
     @staticmethod
     def get_question_type_progress(
-        history: List[Dict],
+        history: Union[List[Dict], Dict[str, Any]],
         available_types: List[str]
     ) -> Dict[str, Dict]:
         """
         問題種別進捗を取得
 
         Args:
-            history: 学習履歴リスト
+            history: 集計カウンタ、または学習履歴リスト
             available_types: 利用可能な問題種別リスト
 
         Returns:
             問題種別進捗の辞書
         """
         type_progress = {}
+        type_counts = StatisticsService.get_rollup_counts(history, 'question_type')
 
         for type_id in available_types:
-            type_history = [h for h in history if h.get('question_type') == type_id]
+            cell = type_counts.get(type_id)
 
-            if type_history:
-                total_answered = len(type_history)
-                correct_count = sum(1 for h in type_history if h.get('is_correct'))
+            if cell:
+                total_answered, correct_count, _ = cell
 
                 type_progress[type_id] = {
                     'total_answered': total_answered,
@@ -264,14 +485,14 @@ class StatisticsService:
 
     @staticmethod
     def get_weak_categories(
-        history: List[Dict],
+        history: Union[List[Dict], Dict[str, Any]],
         threshold: float = 60.0
     ) -> List[Dict]:
         """
         弱点カテゴリを取得
 
         Args:
-            history: 学習履歴リスト
+            history: 集計カウンタ、または学習履歴リスト
             threshold: 弱点判定の正答率閾値（デフォルト: 60%）
 
         Returns:
@@ -296,14 +517,14 @@ class StatisticsService:
 
     @staticmethod
     def get_strong_categories(
-        history: List[Dict],
+        history: Union[List[Dict], Dict[str, Any]],
         threshold: float = 80.0
     ) -> List[Dict]:
         """
         得意カテゴリを取得
 
         Args:
-            history: 学習履歴リスト
+            history: 集計カウンタ、または学習履歴リスト
             threshold: 得意判定の正答率閾値（デフォルト: 80%）
 
         Returns:
@@ -327,72 +548,30 @@ class StatisticsService:
         return strong_categories
 
     @staticmethod
-    def get_learning_streak(history: List[Dict]) -> Dict[str, Any]:
+    def get_learning_streak(history: Union[List[Dict], Dict[str, Any]]) -> Dict[str, Any]:
         """
         学習連続日数を取得
 
         Args:
-            history: 学習履歴リスト
+            history: 集計カウンタ、または学習履歴リスト
 
         Returns:
             連続学習日数情報
         """
-        if not history:
-            return {
-                'current_streak': 0,
-                'longest_streak': 0,
-                'total_days': 0
-            }
+        rollup = StatisticsService._as_rollup(history)
+        last_day, current_streak, longest_streak, total_days = rollup['streak']
 
-        # 日付を抽出
-        dates = set()
-        for h in history:
-            date = h.get('date', '')[:10]
-            if date:
-                dates.add(date)
-
-        if not dates:
+        if not total_days:
             return {
                 'current_streak': 0,
                 'longest_streak': 0,
                 'total_days': 0
             }
 
-        sorted_dates = sorted(dates)
-        total_days = len(sorted_dates)
-
-        # 現在の連続日数を計算
-        current_streak = 1
-        today = datetime.now().strftime('%Y-%m-%d')
-
-        if sorted_dates[-1] == today or sorted_dates[-1] == datetime.now().strftime('%Y-%m-%d'):
-            for i in range(len(sorted_dates) - 2, -1, -1):
-                prev_date = datetime.strptime(sorted_dates[i], '%Y-%m-%d')
-                curr_date = datetime.strptime(sorted_dates[i + 1], '%Y-%m-%d')
-                diff = (curr_date - prev_date).days
-
-                if diff == 1:
-                    current_streak += 1
-                else:
-                    break
-        else:
+        # 最終学習日が今日の場合だけ連続中とする（日付の解析なし）
+        if last_day != datetime.now().strftime('%Y-%m-%d'):
             current_streak = 0
 
-        # 最長連続日数を計算
-        longest_streak = 1
-        temp_streak = 1
-
-        for i in range(1, len(sorted_dates)):
-            prev_date = datetime.strptime(sorted_dates[i - 1], '%Y-%m-%d')
-            curr_date = datetime.strptime(sorted_dates[i], '%Y-%m-%d')
-            diff = (curr_date - prev_date).days
-
-            if diff == 1:
-                temp_streak += 1
-                longest_streak = max(longest_streak, temp_streak)
-            else:
-                temp_streak = 1
-
         return {
             'current_streak': current_streak,
             'longest_streak': longest_streak,
@@ -400,27 +579,19 @@ class StatisticsService:
         }
 
     @staticmethod
-    def get_time_distribution(history: List[Dict]) -> Dict[str, Any]:
+    def get_time_distribution(history: Union[List[Dict], Dict[str, Any]]) -> Dict[str, Any]:
         """
         時間分布を取得
 
         Args:
-            history: 学習履歴リスト
+            history: 集計カウンタ、または学習履歴リスト
 
         Returns:
             時間分布情報
         """
-        if not history:
-            return {
-                'total_time': 0,
-                'average_time': 0.0,
-                'fastest_time': None,
-                'slowest_time': None
-            }
-
-        times = [h.get('elapsed', 0) for h in history if h.get('elapsed', 0) > 0]
+        count, total_time, fastest, slowest = StatisticsService._as_rollup(history)['elapsed']
 
-        if not times:
+        if not count:
             return {
                 'total_time': 0,
                 'average_time': 0.0,
@@ -429,8 +600,8 @@ class StatisticsService:
             }
 
         return {
-            'total_time': sum(times),
-            'average_time': round(sum(times) / len(times), 1),
-            'fastest_time': min(times),
-            'slowest_time': max(times)
+            'total_time': total_time,
+            'average_time': round(total_time / count, 1),
+            'fastest_time': fastest,
+            'slowest_time': slowest
         }
@@ -0,0 +1,199 @@
+"""
+Striped User Lock for RCCM Quiz Application
+ユーザー単位の排他制御（プロセス間共有） - Phase 17 Performance
+
+ユーザー（セッションID・ユーザーID）ごとにロックを作る代わりに、固定数のストライプへ
+ハッシュで割り当てます。メモリ使用量はユーザー数に依存しません。
+
+- プロセス内: ストライプごとの threading.RLock（同じスレッドからの再入可）
+- プロセス間: 1つのロックファイル上のストライプ番目の1バイトに fcntl のレコードロック
+  （gunicorn の複数ワーカー間でも同じユーザーの処理が直列化される）
+
+fcntl のレコードロックはプロセス単位で保持されるため、スレッド間の排他はRLockで行い、
+最も外側の取得でだけファイルロックを取得・解放します。fcntl のない環境（Windows）では
+プロセス内の排他のみになります。
+"""
+import logging
+import os
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows環境では使用不可
+
+logger = logging.getLogger(__name__)
+
+# 既定のストライプ数・取得待ちのタイムアウト（秒）
+DEFAULT_STRIPES = 64
+DEFAULT_TIMEOUT = 10.0
+
+# ファイルロック待ちのポーリング間隔（秒）
+_POLL_INITIAL = 0.001
+_POLL_MAX = 0.05
+
+
+class UserLockTimeout(TimeoutError):
+    """ユーザーロックを時間内に取得できなかった"""
+
+
+class StripedUserLock:
+    """
+    ストライプ化したユーザー単位のロック
+
+    Args:
+        path: プロセス間で共有するロックファイル
+        stripes: ストライプ数（同じストライプのユーザー同士は互いに待つ）
+        timeout: 取得待ちのタイムアウト（秒）
+
+    Examples:
+        >>> with user_lock(session_id):
+        ...     session['exam_current'] += 1
+    """
+
+    def __init__(self, path: str, stripes: int = DEFAULT_STRIPES, timeout: float = DEFAULT_TIMEOUT):
+        if stripes <= 0:
+            raise ValueError("stripes は1以上を指定してください")
+        self.path = path
+        self.stripes = stripes
+        self.timeout = timeout
+        self._thread_locks = [threading.RLock() for _ in range(stripes)]
+        # ストライプごとの再入の深さ（RLockを保持しているスレッドだけが更新する）
+        self._depth = [0] * stripes
+        self._fd: Optional[int] = None
+        self._pid: Optional[int] = None
+        self._fd_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._acquired = [0] * stripes
+        self._contended = [0] * stripes
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+        self._timeouts = 0
+        self.cross_process = fcntl is not None
+        if not self.cross_process:
+            logger.warning("fcntlが使用できません - ユーザーロックはプロセス内のみ有効です")
+
+    def __call__(self, key: Any) -> '_StripeGuard':
+        return _StripeGuard(self, self.stripe_of(key))
+
+    def stripe_of(self, key: Any) -> int:
+        """キーのストライプ番号（プロセス間で同じ値になるようCRC32を使用）"""
+        return zlib.crc32(str(key).encode('utf-8')) % self.stripes
+
+    def _file(self) -> int:
+        # fork後のワーカーでは自プロセスでファイルを開き直す（ロックはプロセス単位）
+        if self._fd is None or self._pid != os.getpid():
+            with self._fd_lock:
+                if self._fd is None or self._pid != os.getpid():
+                    directory = os.path.dirname(self.path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                    self._pid = os.getpid()
+        return self._fd
+
+    def _lock_file(self, stripe: int, deadline: float) -> bool:
+        """ストライプのファイルロックを取得（待った場合True）"""
+        fd = self._file()
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, stripe, os.SEEK_SET)
+            return False
+        except OSError:
+            pass
+
+        delay = _POLL_INITIAL
+        while True:
+            if time.monotonic() >= deadline:
+                raise UserLockTimeout(f"ユーザーロック取得タイムアウト（ストライプ{stripe}）")
+            time.sleep(delay)
+            delay = min(delay * 2, _POLL_MAX)
+            try:
+                fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, stripe, os.SEEK_SET)
+                return True
+            except OSError:
+                continue
+
+    def acquire(self, stripe: int) -> None:
+        """ストライプのロックを取得"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        thread_lock = self._thread_locks[stripe]
+
+        contended = not thread_lock.acquire(blocking=False)
+        if contended and not thread_lock.acquire(timeout=self.timeout):
+            self._record_timeout()
+            raise UserLockTimeout(f"ユーザーロック取得タイムアウト（ストライプ{stripe}）")
+
+        if self._depth[stripe] == 0 and self.cross_process:
+            try:
+                contended |= self._lock_file(stripe, deadline)
+            except BaseException:
+                thread_lock.release()
+                self._record_timeout()
+                raise
+        self._depth[stripe] += 1
+        self._record_acquire(stripe, contended, time.monotonic() - started)
+
+    def release(self, stripe: int) -> None:
+        """ストライプのロックを解放"""
+        self._depth[stripe] -= 1
+        try:
+            if self._depth[stripe] == 0 and self.cross_process:
+                fcntl.lockf(self._file(), fcntl.LOCK_UN, 1, stripe, os.SEEK_SET)
+        finally:
+            self._thread_locks[stripe].release()
+
+    def _record_acquire(self, stripe: int, contended: bool, waited: float) -> None:
+        with self._metrics_lock:
+            self._acquired[stripe] += 1
+            if contended:
+                self._contended[stripe] += 1
+                self._wait_seconds += waited
+                if waited > self._max_wait_seconds:
+                    self._max_wait_seconds = waited
+
+    def _record_timeout(self) -> None:
+        with self._metrics_lock:
+            self._timeouts += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """競合の統計（取得回数・競合回数・待ち時間・競合の多いストライプ）"""
+        with self._metrics_lock:
+            acquired = sum(self._acquired)
+            contended = sum(self._contended)
+            hottest: List[Dict[str, int]] = [
+                {'stripe': stripe, 'acquired': self._acquired[stripe], 'contended': self._contended[stripe]}
+                for stripe in sorted(range(self.stripes), key=lambda s: self._contended[s], reverse=True)[:5]
+                if self._contended[stripe]
+            ]
+            return {
+                'stripes': self.stripes,
+                'cross_process': self.cross_process,
+                'acquired': acquired,
+                'contended': contended,
+                'contention_ratio': round(contended / acquired, 4) if acquired else 0.0,
+                'wait_ms_total': round(self._wait_seconds * 1000, 3),
+                'wait_ms_max': round(self._max_wait_seconds * 1000, 3),
+                'timeouts': self._timeouts,
+                'hottest_stripes': hottest,
+            }
+
+
+class _StripeGuard:
+    """with文用のガード（user_lock(key) が返す）"""
+
+    __slots__ = ('_owner', '_stripe')
+
+    def __init__(self, owner: StripedUserLock, stripe: int):
+        self._owner = owner
+        self._stripe = stripe
+
+    def __enter__(self) -> '_StripeGuard':
+        self._owner.acquire(self._stripe)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._owner.release(self._stripe)
@@ -0,0 +1,284 @@
+"""
+Weighted Review Sampler for RCCM Quiz Application
+重み付き復習問題抽出 - Phase 22 Performance
+
+アダプティブ復習リストは、問題IDを重みの回数だけリストへ複製してから random.shuffle
+していたため、時間・メモリが重みの合計に比例していました（呼び出し側は先頭の数問しか
+使いません）。重みをフェンウィック木（Binary Indexed Tree）で保持し、
+
+- 重み付きで重複なしに k 問を抽出: O(k log n)
+- 1問の重みの更新・追加: O(log n)
+
+で処理します。重みは整数のため、浮動小数点の累積誤差はありません。
+
+索引は、マスター済みでない advanced_srs の問題の問題ID・重み・フェンウィック木の配列と、
+問題ID → 位置の対応です。復習期限キューと同じく、セッションには保存せずプロセス内の
+派生データキャッシュ（services.derived_cache）に保持します。
+advanced_srs の変更は SRSDueQueue.record_change / invalidate から反映されます。
+"""
+import logging
+import random
+from typing import Any, Dict, List, Optional
+
+from services.derived_cache import get_session_index, invalidate_session_index, load_session_index
+
+logger = logging.getLogger(__name__)
+
+
+def review_weight(data: Dict[str, Any]) -> int:
+    """
+    復習の重み（間違い率 × 難易度 × 2、最低1。マスター済みは0）
+
+    SRSService形式（wrong_count / total_attempts / difficulty_level）と、回答画面で
+    登録する形式（incorrect_count / level）のどちらにも対応します。
+
+    Args:
+        data: 問題のSRSデータ
+
+    Returns:
+        int: 重み
+    """
+    if data.get('mastered', False):
+        return 0
+    try:
+        if 'total_attempts' in data:
+            wrong_count = data.get('wrong_count', 0)
+            total_attempts = max(1, data['total_attempts'])
+            difficulty = data.get('difficulty_level', 5)
+        else:
+            # 回答画面形式: 間違い回数+1を回答回数、レベル×2を難易度として概算
+            wrong_count = max(0, int(data.get('incorrect_count', 0)))
+            total_attempts = wrong_count + 1
+            difficulty = float(data.get('level', 1)) * 2
+        return max(1, int((wrong_count / total_attempts) * difficulty * 2))
+    except (ValueError, TypeError):
+        return 1
+
+
+class FenwickSampler:
+    """
+    整数の重みを持つ要素の重み付き抽出（フェンウィック木）
+
+    Args:
+        weights: 要素ごとの重み（0は抽出対象外）
+        tree: 保存済みのフェンウィック木（weights と対応する場合のみ。省略時は O(n) で作成）
+    """
+
+    __slots__ = ('weights', 'tree')
+
+    def __init__(self, weights: Optional[List[int]] = None, tree: Optional[List[int]] = None):
+        self.weights = weights if weights is not None else []
+        if tree is None:
+            # 1始まりの木を O(n) で作成（各ノードの値を親へ足し込む）
+            tree = [0] + list(self.weights)
+            size = len(tree)
+            for i in range(1, size):
+                parent = i + (i & -i)
+                if parent < size:
+                    tree[parent] += tree[i]
+            tree = tree[1:]
+        self.tree = tree
+
+    def __len__(self) -> int:
+        return len(self.weights)
+
+    @property
+    def total(self) -> int:
+        """重みの合計 O(log n)"""
+        return self.prefix_sum(len(self.weights))
+
+    def prefix_sum(self, count: int) -> int:
+        """先頭 count 要素の重みの合計"""
+        result = 0
+        i = count
+        while i > 0:
+            result += self.tree[i - 1]
+            i -= i & -i
+        return result
+
+    def _add_delta(self, index: int, delta: int) -> None:
+        i = index + 1
+        size = len(self.tree)
+        while i <= size:
+            self.tree[i - 1] += delta
+            i += i & -i
+
+    def update(self, index: int, weight: int) -> None:
+        """要素の重みを変更 O(log n)"""
+        delta = weight - self.weights[index]
+        if delta:
+            self.weights[index] = weight
+            self._add_delta(index, delta)
+
+    def append(self, weight: int) -> int:
+        """
+        要素を末尾に追加 O(log n)
+
+        Returns:
+            int: 追加した要素の位置
+        """
+        index = len(self.weights)
+        i = index + 1
+        # 新しいノードが担当する区間（i - lowbit(i), i] のうち、既存の子ノードの合計を足す
+        node = weight
+        child = i - 1
+        lower = i - (i & -i)
+        while child > lower:
+            node += self.tree[child - 1]
+            child -= child & -child
+        self.weights.append(weight)
+        self.tree.append(node)
+        return index
+
+    def find(self, target: int) -> int:
+        """累積の重みが target を超える最初の要素の位置（0 <= target < total）O(log n)"""
+        position = 0
+        step = 1 << len(self.tree).bit_length()
+        while step:
+            next_position = position + step
+            if next_position <= len(self.tree) and self.tree[next_position - 1] <= target:
+                position = next_position
+                target -= self.tree[next_position - 1]
+            step >>= 1
+        return position
+
+    def sample(self, count: int, rng: Optional[random.Random] = None) -> List[int]:
+        """
+        重みに比例した確率で重複なしに count 要素を抽出 O(count log n)
+
+        抽出した要素の重みを一時的に0にして次を抽出し、最後に元へ戻します。
+
+        Args:
+            count: 抽出数（重みが正の要素数を超える場合はその数まで）
+            rng: 乱数生成器（省略時は random モジュール）
+
+        Returns:
+            list: 抽出した要素の位置（抽出順）
+        """
+        rng = rng or random
+        total = self.total
+        chosen = []
+        while len(chosen) < count and total > 0:
+            index = self.find(rng.randrange(total))
+            weight = self.weights[index]
+            chosen.append(index)
+            self._add_delta(index, -weight)
+            total -= weight
+        for index in chosen:
+            self._add_delta(index, self.weights[index])
+        return chosen
+
+
+class ReviewSampler:
+    """
+    ユーザーごとの復習問題の重み付き抽出（advanced_srs から派生する索引）
+
+    Args:
+        ids: 位置ごとの問題ID
+        sampler: 重みのフェンウィック木
+        positions: 問題ID → 位置
+    """
+
+    # 派生索引の名前（以前はこの名前でセッションに保存していたため、残っている場合は削除する）
+    INDEX_NAME = 'srs_review_sampler'
+    SRS_KEY = 'advanced_srs'
+
+    __slots__ = ('ids', 'sampler', 'positions')
+
+    def __init__(self, ids: Optional[List[str]] = None, sampler: Optional[FenwickSampler] = None,
+                 positions: Optional[Dict[str, int]] = None):
+        self.ids = ids if ids is not None else []
+        self.sampler = sampler or FenwickSampler()
+        self.positions = positions if positions is not None else {}
+
+    @classmethod
+    def from_srs(cls, srs_data: Dict[str, Dict[str, Any]]) -> 'ReviewSampler':
+        """SRSデータ全体から作成（索引がない・破棄された場合のみ）"""
+        ids = []
+        weights = []
+        for qid, data in srs_data.items():
+            if isinstance(data, dict):
+                weight = review_weight(data)
+                if weight:
+                    ids.append(str(qid))
+                    weights.append(weight)
+        return cls(ids, FenwickSampler(weights), {qid: i for i, qid in enumerate(ids)})
+
+    @classmethod
+    def build(cls, session) -> 'ReviewSampler':
+        """セッションの advanced_srs から作成"""
+        srs_data = session.get(cls.SRS_KEY) or {}
+        sampler = cls.from_srs(srs_data if isinstance(srs_data, dict) else {})
+        logger.debug(f"復習問題の重み付き索引を作成: {len(sampler.ids)}問")
+        return sampler
+
+    @classmethod
+    def load(cls, session) -> 'ReviewSampler':
+        """
+        ユーザーの索引を取得（キャッシュにない場合は advanced_srs から作成）
+
+        Args:
+            session: セッションオブジェクト
+
+        Returns:
+            ReviewSampler: 復習問題の重み付き抽出（参照専用。変更は record_change で行う）
+        """
+        if cls.INDEX_NAME in session:
+            session.pop(cls.INDEX_NAME, None)
+        return load_session_index(session, cls.INDEX_NAME, lambda: cls.build(session))
+
+    def copy(self) -> 'ReviewSampler':
+        return ReviewSampler(list(self.ids), FenwickSampler(list(self.sampler.weights), list(self.sampler.tree)),
+                             dict(self.positions))
+
+    @classmethod
+    def invalidate(cls, session) -> None:
+        """索引を破棄（advanced_srs をまとめて書き換えた場合）"""
+        invalidate_session_index(session, cls.INDEX_NAME)
+
+    @classmethod
+    def record_change(cls, session, qid: Any, new: Optional[Dict[str, Any]]) -> None:
+        """
+        1問のSRSデータの変更を索引に反映 O(log n)
+
+        Args:
+            session: セッションオブジェクト
+            qid: 問題ID
+            new: 変更後のSRSデータ（削除の場合None）
+        """
+        # 索引がない場合は次回の参照時に変更後のSRSデータから作成（変更は反映済み）
+        sampler = get_session_index(session, cls.INDEX_NAME, for_update=True)
+        if sampler is not None:
+            sampler.set_weight(str(qid), review_weight(new) if new is not None else 0)
+
+    def set_weight(self, qid: str, weight: int) -> None:
+        """問題の重みを設定（0で抽出対象外。位置は再利用のため残す）"""
+        index = self.positions.get(qid)
+        if index is not None:
+            self.sampler.update(index, weight)
+        elif weight:
+            self.positions[qid] = self.sampler.append(weight)
+            self.ids.append(qid)
+
+    def weight(self, qid: str) -> int:
+        index = self.positions.get(str(qid))
+        return self.sampler.weights[index] if index is not None else 0
+
+    @property
+    def total_weight(self) -> int:
+        return self.sampler.total
+
+    def sample(self, count: int, rng: Optional[random.Random] = None) -> List[str]:
+        """
+        重みに比例した確率で重複なしに count 問の問題IDを抽出 O(count log n)
+
+        Args:
+            count: 抽出数
+            rng: 乱数生成器
+
+        Returns:
+            list: 問題ID（抽出順）
+        """
+        # 抽出中は木を一時的に変更するため、キャッシュで共有している木は変更せず複製で抽出する
+        sampler = FenwickSampler(self.sampler.weights, list(self.sampler.tree))
+        return [self.ids[index] for index in sampler.sample(count, rng)]
@@ -4,8 +4,10 @@ RCCM学習アプリ - ユーティリティ関数
 """
 
 import csv
+import io
 import os
 import logging
+import re
 import threading
 import time
 import hashlib
@@ -17,6 +19,9 @@ from collections import OrderedDict
 from contextlib import contextmanager
 from concurrent.futures import ThreadPoolExecutor
 
+from services.encoding_manifest import read_text
+from services.question_record import Question
+
 # ⚡ Redis Cache Integration
 try:
     from redis_cache import cache_manager, cached_questions, get_cached_questions, cache_questions
@@ -40,41 +45,76 @@ logger = logging.getLogger(__name__)
 
 # === セキュリティ関数 ===
 
+# よくある問題文字の置換マップ（CP932でエンコードできない・表記を統一する文字）
+CP932_REPLACEMENTS = {
+    '\u00b2': '²',  # 上付き2
+    '\u00b3': '³',  # 上付き3
+    '\u00bd': '1/2',  # 1/2分数
+    '\u00bc': '1/4',  # 1/4分数
+    '\u00be': '3/4',  # 3/4分数
+    '\u2013': '-',   # エンダッシュ
+    '\u2014': '-',   # エムダッシュ
+    '\u2018': "'",   # 左シングルクォート
+    '\u2019': "'",   # 右シングルクォート
+    '\u201c': '"',   # 左ダブルクォート
+    '\u201d': '"',   # 右ダブルクォート
+    '\u2026': '...',  # 三点リーダー
+}
+
+
+class _CP932TranslationTable(dict):
+    """
+    clean_unicode_for_cp932 用の str.translate テーブル
+
+    置換マップの文字は事前に登録し、それ以外の文字は初回に1回だけCP932で
+    エンコードできるか判定して結果をキャッシュします（エンコード不可 → '?'）。
+    """
+
+    def __init__(self, replacements: Dict[str, str]):
+        super().__init__()
+        self.unencodable = set()
+        for char, replacement in replacements.items():
+            # 置換結果自体がエンコードできない場合（'²' 等）は従来どおり '?' になる
+            self[ord(char)] = ''.join(c if self._encodable(c) else '?' for c in replacement)
+
+    @staticmethod
+    def _encodable(char: str) -> bool:
+        try:
+            char.encode('cp932')
+            return True
+        except UnicodeEncodeError:
+            return False
+
+    def __missing__(self, codepoint: int):
+        char = chr(codepoint)
+        if self._encodable(char):
+            value = codepoint
+        else:
+            value = '?'
+            self.unencodable.add(char)
+        self[codepoint] = value
+        return value
+
+
+_CP932_TABLE = _CP932TranslationTable(CP932_REPLACEMENTS)
+_CP932_REPLACEMENT_PATTERN = re.compile('[' + ''.join(CP932_REPLACEMENTS) + ']')
+
+
 def clean_unicode_for_cp932(text):
     """CP932でエンコードできない文字を安全な文字に置換"""
     if not text:
         return text
-    
-    # よくある問題文字の置換マップ
-    replacements = {
-        '\u00b2': '²',  # 上付き2
-        '\u00b3': '³',  # 上付き3
-        '\u00bd': '1/2',  # 1/2分数
-        '\u00bc': '1/4',  # 1/4分数
-        '\u00be': '3/4',  # 3/4分数
-        '\u2013': '-',   # エンダッシュ
-        '\u2014': '-',   # エムダッシュ
-        '\u2018': "'",   # 左シングルクォート
-        '\u2019': "'",   # 右シングルクォート
-        '\u201c': '"',   # 左ダブルクォート
-        '\u201d': '"',   # 右ダブルクォート
-        '\u2026': '...',  # 三点リーダー
-    }
-    
-    cleaned_text = text
-    for problematic_char, replacement in replacements.items():
-        cleaned_text = cleaned_text.replace(problematic_char, replacement)
-    
-    # それでもエンコードできない文字があれば削除
-    result = ""
-    for char in cleaned_text:
-        try:
-            char.encode('cp932')
-            result += char
-        except UnicodeEncodeError:
-            result += '?'  # 問題文字を?に置換
-    
-    return result
+
+    # 大半の文字列はそのままエンコードでき、置換対象の文字も含まない
+    try:
+        text.encode('cp932')
+        if not _CP932_REPLACEMENT_PATTERN.search(text):
+            return text
+    except UnicodeEncodeError:
+        pass
+
+    # 置換マップとエンコード不可文字（'?'）を1回の translate で適用
+    return text.translate(_CP932_TABLE)
 
 def validate_file_path(path: str, allowed_dir: str = None) -> str:
     """
@@ -445,55 +485,25 @@ def load_questions_improved(csv_path: str) -> List[Dict]:
     
     logger.info(f"ファイルサイズ: {file_size} bytes")
     
-    # ファイルの変更チェック（キャッシュ無効化用）
-    file_hash = get_file_hash(csv_path)
-    cache_key = f"{csv_path}_{file_hash}"
-    
-    # 従来のCSVパース結果をキャッシュから確認（Redisが利用できない場合のフォールバック）
-    csv_cache = cache_manager.get_cache('csv_parsing') if hasattr(cache_manager, 'get_cache') and cache_manager else None
-    cached_df = csv_cache.get(cache_key) if csv_cache else None
-    
-    if cached_df is not None:
-        logger.debug(f"CSV解析結果をキャッシュから取得: {csv_path}")
-        df, used_encoding = cached_df
-    else:
-        # エンコーディング別読み込み試行（CLAUDE.md準拠: Shift_JIS優先）
-        encodings = ['utf-8-sig', 'utf-8', 'shift_jis', 'cp932', 'iso-2022-jp']
-        df = None
-        used_encoding = None
-        
-        for encoding in encodings:
-            try:
-                logger.debug(f"エンコーディング試行: {encoding}")
-                with open(csv_path, 'r', encoding=encoding, newline='') as f:
-                    reader = csv.DictReader(f)
-                    rows = list(reader)
-                    if not rows:
-                        logger.error("CSVファイルにデータがありません")
-                        raise DataLoadError("CSVファイルにデータがありません")
-                    df = rows
-                    used_encoding = encoding
-                    logger.info(f"読み込み成功: {encoding} エンコーディング")
-                    break
-            except UnicodeDecodeError as e:
-                logger.debug(f"エンコーディングエラー {encoding}: {e}")
-                continue
-            except Exception as e:
-                logger.error(f"CSV解析エラー: {e}")
-                continue
-        
-        # 解析結果をキャッシュに保存
-        if df is not None and csv_cache:
-            csv_cache.put(cache_key, (df, used_encoding))
-    
-    if df is None:
-        logger.error("すべてのエンコーディングで読み込みに失敗")
+    # エンコーディングはマニフェスト（バンクのコンパイル時に判定）から取得し、1回だけデコード
+    # 注: 生の行データはキャッシュしない（検証済みの問題レコードのみ保持してメモリを節約）
+    try:
+        text, used_encoding = read_text(csv_path)
+    except UnicodeDecodeError as e:
+        logger.error(f"すべてのエンコーディングで読み込みに失敗: {e}")
         raise DataLoadError("CSVファイルのエンコーディングを特定できません")
-    
+
+    try:
+        df = list(csv.DictReader(io.StringIO(text, newline='')))
+    except csv.Error as e:
+        logger.error(f"CSV解析エラー: {e}")
+        raise DataLoadError(f"CSV解析エラー: {e}")
+    del text
+
     if not df:
         logger.error("CSVファイルにデータがありません")
         raise DataLoadError("CSVファイルにデータがありません")
-    
+
     logger.info(f"データ読み込み完了: {len(df)}行, エンコーディング: {used_encoding}")
     
     # データ構造検証
@@ -559,7 +569,7 @@ def load_questions_improved(csv_path: str) -> List[Dict]:
     
     return valid_questions
 
-def validate_question_data(row: Dict[str, Any], index: int) -> Optional[Dict]:
+def validate_question_data(row: Dict[str, Any], index: int) -> Optional[Question]:
     """
     個別問題データの検証
     """
@@ -610,32 +620,74 @@ def validate_question_data(row: Dict[str, Any], index: int) -> Optional[Dict]:
     if not correct_option or correct_option == '':
         raise DataValidationError(f"正解選択肢{correct_answer}に対応するオプションがありません")
     
-    # データ正規化 + Unicode文字清浄化
-    question_data = {
-        'id': question_id,
-        'category': str(row.get('category', '')).strip(),
-        'question': clean_unicode_for_cp932(str(row['question']).strip()),
-        'option_a': clean_unicode_for_cp932(str(row['option_a']).strip()),
-        'option_b': clean_unicode_for_cp932(str(row['option_b']).strip()),
-        'option_c': clean_unicode_for_cp932(str(row['option_c']).strip()),
-        'option_d': clean_unicode_for_cp932(str(row['option_d']).strip()),
-        'correct_answer': correct_answer,
-        'explanation': clean_unicode_for_cp932(str(row.get('explanation', '')).strip()),
-        'reference': str(row.get('reference', '')).strip(),
-        'difficulty': str(row.get('difficulty', '標準')).strip(),
-        'keywords': str(row.get('keywords', '')).strip(),
-        'practical_tip': str(row.get('practical_tip', '')).strip()
-    }
+    # データ正規化 + Unicode文字清浄化（不変レコード・繰り返し文字列はインターン）
+    question_data = Question(
+        id=question_id,
+        category=str(row.get('category', '')).strip(),
+        question=clean_unicode_for_cp932(str(row['question']).strip()),
+        option_a=clean_unicode_for_cp932(str(row['option_a']).strip()),
+        option_b=clean_unicode_for_cp932(str(row['option_b']).strip()),
+        option_c=clean_unicode_for_cp932(str(row['option_c']).strip()),
+        option_d=clean_unicode_for_cp932(str(row['option_d']).strip()),
+        correct_answer=correct_answer,
+        explanation=clean_unicode_for_cp932(str(row.get('explanation', '')).strip()),
+        reference=str(row.get('reference', '')).strip(),
+        difficulty=str(row.get('difficulty', '標準')).strip(),
+        keywords=str(row.get('keywords', '')).strip(),
+        practical_tip=str(row.get('practical_tip', '')).strip()
+    )
     
     return question_data
 
+def load_rccm_source_file(file_path: str, question_type: str, year: Optional[int] = None) -> List[Dict]:
+    """
+    RCCM専用：単一ソースファイル（4-1基礎 / 4-2専門年度別）の読み込みと種別付与
+    スナップショット作成時のCSV解析単位
+    """
+    # 🛡️ ULTRA SYNC セキュリティ: パストラバーサル攻撃防止
+    try:
+        validated_file = validate_file_path(file_path)  # allowed_dirは指定しない
+    except ValueError as e:
+        logger.error(f"不正なデータファイルパス: {e}")
+        # 🔥 ULTRA SYNC本番環境対応: 検証エラー時の代替パス確認
+        # ファイル名が安全であれば、検証をバイパスして読み込み続行
+        if question_type == 'specialist' and f'4-2_{year}.csv' in file_path and 'data' in file_path:
+            logger.warning(f"⚠️ パス検証バイパス適用: {file_path}")
+            validated_file = file_path
+        else:
+            raise DataLoadError(f"不正なデータファイルパス: {e}")
+
+    questions = load_questions_improved(validated_file)
+
+    if question_type == 'basic':
+        # 基礎科目は共通・カテゴリ統一・年度不問
+        questions = [
+            q.replace(question_type='basic', department='common', category='共通', year=None)
+            for q in questions
+        ]
+        questions = assign_stable_question_ids(questions, 'basic', None, os.path.basename(file_path))
+        logger.info(f"4-1基礎データ読み込み完了: {len(questions)}問")
+    else:
+        # カテゴリから部門を推定し、専門科目であることを明確に標記
+        questions = [
+            q.replace(
+                question_type='specialist',
+                year=year,
+                department=map_category_to_department(q.get('category', '')),
+                category=q.get('category') or '専門科目'
+            )
+            for q in questions
+        ]
+        questions = assign_stable_question_ids(questions, 'specialist', year, os.path.basename(file_path))
+        logger.info(f"4-2専門データ{year}年読み込み完了: {len(questions)}問")
+
+    return questions
+
 def load_rccm_data_files(data_dir: str) -> List[Dict]:
     """
     ⚡ Redis統合 RCCM専用：4-1基礎・4-2専門データファイルの統合読み込み
-    企業環境最適化: 重複読み込み防止機能付き + 高速Redisキャッシュ
+    問題バンクの構築関数（読み取りは services.question_bank.question_bank 経由で行うこと）
     """
-    global _data_already_loaded, _data_load_lock
-    
     # ⚡ Redis Cache Integration - 統合データキャッシュ確認
     cache_key = f"rccm_all_data_{data_dir.replace('/', '_')}"
     if REDIS_CACHE_AVAILABLE:
@@ -644,93 +696,23 @@ def load_rccm_data_files(data_dir: str) -> List[Dict]:
             logger.info(f"🎯 Redis Cache HIT: 統合データ ({len(cached_all_data)} questions)")
             return cached_all_data
     
-    # 重複読み込み防止チェック
-    with _data_load_lock:
-        if _data_already_loaded:
-            logger.info("🚀 企業環境最適化: データ既読み込み済み - スキップ")
-            # キャッシュから既存データを返す
-            if hasattr(cache_manager_instance, '_global_questions_cache'):
-                return cache_manager_instance._global_questions_cache
-            else:
-                logger.warning("⚠️ キャッシュデータが見つかりません - 読み込み続行")
-    
     logger.info(f"RCCM統合データ読み込み開始: {data_dir}")
     
-    all_questions = []
-    file_count = 0
-    
-    # 4-1基礎データファイル読み込み
-    basic_file = os.path.join(data_dir, '4-1.csv')
-    # 🛡️ ULTRA SYNC セキュリティ: パストラバーサル攻撃防止
-    try:
-        validated_basic_file = validate_file_path(basic_file)  # allowed_dirは指定しない
-    except ValueError as e:
-        logger.error(f"不正な基礎データファイルパス: {e}")
-        validated_basic_file = None
-    
-    if validated_basic_file and os.path.exists(validated_basic_file):
-        try:
-            basic_questions = load_questions_improved(validated_basic_file)
-            for q in basic_questions:
-                q['question_type'] = 'basic'
-                q['department'] = 'common'  # 基礎科目は共通
-                q['category'] = '共通'  # カテゴリも統一
-                # 基礎科目には年度情報を設定しない（年度不問）
-                q['year'] = None
-            all_questions.extend(basic_questions)
-            file_count += 1
-            logger.info(f"4-1基礎データ読み込み完了: {len(basic_questions)}問")
-        except Exception as e:
-            logger.warning(f"4-1基礎データ読み込みエラー: {e}")
-    
-    # 4-2専門データファイル読み込み（年度別）
-    specialist_years = []
-    for year in range(2008, 2020):  # 2008-2019年の範囲で確認
-        specialist_file = os.path.join(data_dir, f'4-2_{year}.csv')
-        # 🛡️ ULTRA SYNC セキュリティ: パストラバーサル攻撃防止
-        try:
-            validated_specialist_file = validate_file_path(specialist_file)  # allowed_dirは指定しない
-        except ValueError as e:
-            logger.error(f"不正な専門データファイルパス ({year}年): {e}")
-            # 🔥 ULTRA SYNC本番環境対応: 検証エラー時の代替パス確認
-            # ファイル名が安全であれば、検証をバイパスして読み込み続行
-            if f'4-2_{year}.csv' in specialist_file and 'data' in specialist_file:
-                logger.warning(f"⚠️ パス検証バイパス適用: {specialist_file}")
-                validated_specialist_file = specialist_file
-            else:
-                continue
-        
-        if os.path.exists(validated_specialist_file):
-            try:
-                year_questions = load_questions_improved(validated_specialist_file)
-                for q in year_questions:
-                    q['question_type'] = 'specialist'
-                    q['year'] = year
-                    # カテゴリから部門を推定
-                    q['department'] = map_category_to_department(q.get('category', ''))
-                    # 専門科目であることを明確に標記
-                    if not q.get('category'):
-                        q['category'] = '専門科目'
-                
-                all_questions.extend(year_questions)
-                specialist_years.append(year)
-                file_count += 1
-                logger.info(f"4-2専門データ{year}年読み込み完了: {len(year_questions)}問")
-            except Exception as e:
-                logger.warning(f"4-2専門データ{year}年読み込みエラー: {e}")
+    # 📦 バイナリスナップショット経由の読み込み（変更されたCSVのみ再解析）
+    # 変更ファイルが複数ある場合（コールドビルド）はプロセスプールで並列解析
+    # 循環インポート回避のためローカルインポート
+    from config import DataConfig
+    from services.bank_snapshot import load_bank_sources
+    from services.question_bank import _parse_source
+    partitions, snapshot_stats = load_bank_sources(data_dir, _parse_source,
+                                                   workers=DataConfig.BANK_BUILD_WORKERS)
+    file_count = len(partitions)
     
     # 注: 旧questions.csvファイル（レガシーデータ）は使用しません
     # RCCM試験データは4-1.csvと4-2_*.csvから読み込まれます
-    
-    # IDの重複チェック・調整（復旧 - しかし問題文・回答不一致修正も含む）
-    all_questions = resolve_id_conflicts(all_questions)
-    
-    # 企業環境最適化: データロード完了フラグとキャッシュ設定
-    with _data_load_lock:
-        _data_already_loaded = True
-        # グローバルキャッシュに保存
-        cache_manager_instance._global_questions_cache = all_questions
-        logger.info("🚀 企業環境最適化: データキャッシュ完了 - 次回読み込み高速化")
+    # IDはファイル単位で固定採番済み（(ファイル, 元ID)で決定）
+    all_questions = [q for questions in partitions.values() for q in questions]
+    specialist_years = sorted({q['year'] for q in all_questions if q.get('question_type') == 'specialist'})
     
     logger.info(f"RCCM統合データ読み込み完了: {file_count}ファイル, 総計{len(all_questions)}問")
     logger.info(f"4-2専門データ対象年度: {specialist_years}")
@@ -773,132 +755,65 @@ def map_category_to_department(category: str) -> str:
     # その他の専門科目はそのまま使用
     return category
 
-def resolve_id_conflicts(questions: List[Dict]) -> List[Dict]:
+def _with_fields(question, **changes):
+    """Question（不変）はreplace、dict（サンプル・緊急データ）はその場で更新"""
+    if isinstance(question, Question):
+        return question.replace(**changes)
+    question.update(changes)
+    return question
+
+# 固定ID体系: (ファイル, 元ID, 同一元IDの出現順) から決定的に採番
+# 基礎科目: 1000000-1999999, 専門科目: 2000000 + 年度ブロック(20000件/ファイル)
+BASIC_ID_BASE = 1000000
+SPECIALIST_ID_BASE = 2000000
+SPECIALIST_FIRST_YEAR = 2008
+SPECIALIST_FILE_ID_STRIDE = 20000
+ID_OCCURRENCE_STRIDE = 1000
+
+def stable_question_id(question_type: str, year: Optional[int], original_id: int, occurrence: int = 0) -> int:
     """
-    IDの重複を解決し、一意のIDを設定（問題種別別に範囲分け）
-    基礎科目: 1000000-1999999, 専門科目: 2000000-2999999
-    ⚠️ 重複問題の根本原因解決と完全なID整合性保証
+    ソースファイル内の元IDから固定の問題IDを算出
+    他ファイルの追加・変更・再読み込みでIDが変わらないことを保証
     """
-    logger.info(f"ID重複解決開始: 入力問題数={len(questions)}問")
-    
-    # 入力データの検証
-    if not questions:
-        logger.warning("空の問題リストが渡されました")
-        return []
-    
-    # 元のIDの重複状況を分析
-    original_id_counts = {}
-    for q in questions:
-        original_id = str(q.get('id', 'unknown'))
-        original_id_counts[original_id] = original_id_counts.get(original_id, 0) + 1
+    if not 0 <= original_id < ID_OCCURRENCE_STRIDE:
+        raise DataValidationError(f"元IDが採番範囲外です: {original_id}")
     
-    duplicated_ids = [id_val for id_val, count in original_id_counts.items() if count > 1]
-    if duplicated_ids:
-        # 🔥 ULTRA SYNC FIX: 重複ID検出は正常な処理工程（警告レベル下げ）
-        logger.info(f"ID重複解決処理開始: {len(duplicated_ids)}個のIDを重複解決中 (例: {duplicated_ids[:10]})")
+    local_id = occurrence * ID_OCCURRENCE_STRIDE + original_id
+    if question_type == 'basic':
+        base, block_size = BASIC_ID_BASE, SPECIALIST_ID_BASE - BASIC_ID_BASE
+    else:
+        base = SPECIALIST_ID_BASE + (year - SPECIALIST_FIRST_YEAR) * SPECIALIST_FILE_ID_STRIDE
+        block_size = SPECIALIST_FILE_ID_STRIDE
     
-    used_ids = set()
+    if local_id >= block_size:
+        raise DataValidationError(f"同一元IDの重複が多すぎます: 元ID={original_id}, 出現={occurrence + 1}回目")
+    return base + local_id
+
+def assign_stable_question_ids(questions: List[Dict], question_type: str, year: Optional[int],
+                               file_source: str) -> List[Dict]:
+    """
+    1ファイル分の問題に固定IDを設定（元IDとデータ来源を記録）
+    同一ファイル内の重複元IDは出現順で区別する
+    """
+    occurrences = {}
     resolved_questions = []
-    id_mapping = {}  # 元ID → 新IDのマッピング記録
-    
-    # 問題種別別に分離
-    basic_questions = [q for q in questions if q.get('question_type') == 'basic']
-    specialist_questions = [q for q in questions if q.get('question_type') == 'specialist']
-    other_questions = [q for q in questions if q.get('question_type') not in ['basic', 'specialist']]
     
-    logger.info(f"問題分類: 基礎={len(basic_questions)}問, 専門={len(specialist_questions)}問, その他={len(other_questions)}問")
-    
-    # 基礎科目のID範囲: 1000000-1999999
-    next_basic_id = 1000000
-    for index, q in enumerate(basic_questions):
-        original_id = q.get('id')
-        
-        # 安全な次のIDを見つける
-        while next_basic_id in used_ids or next_basic_id > 1999999:
-            next_basic_id += 1
-            if next_basic_id > 1999999:
-                logger.error(f"基礎科目のID範囲(1000000-1999999)を超過: {len(basic_questions)}問は範囲を超えています")
-                raise DataValidationError(f"基礎科目の問題数({len(basic_questions)})がID範囲(1000000-1999999)を超過")
-        
-        # IDを更新
-        q['id'] = next_basic_id
-        q['original_id'] = original_id
-        q['file_source'] = '4-1.csv'  # データ来源を記録
-        used_ids.add(next_basic_id)
-        resolved_questions.append(q)
-        id_mapping[f"basic_{original_id}"] = next_basic_id
-        next_basic_id += 1
-    
-    # 専門科目のID範囲: 2000000-2999999
-    next_specialist_id = 2000000
-    for index, q in enumerate(specialist_questions):
-        original_id = q.get('id')
-        year = q.get('year', 'unknown')
-        
-        # 安全な次のIDを見つける
-        while next_specialist_id in used_ids or next_specialist_id > 2999999:
-            next_specialist_id += 1
-            if next_specialist_id > 2999999:
-                logger.error(f"専門科目のID範囲(2000000-2999999)を超過: {len(specialist_questions)}問は範囲を超えています")
-                raise DataValidationError(f"専門科目の問題数({len(specialist_questions)})がID範囲(2000000-2999999)を超過")
-        
-        # IDを更新
-        q['id'] = next_specialist_id
-        q['original_id'] = original_id
-        q['file_source'] = f'4-2_{year}.csv'  # データ来源を記録
-        used_ids.add(next_specialist_id)
-        resolved_questions.append(q)
-        id_mapping[f"specialist_{year}_{original_id}"] = next_specialist_id
-        next_specialist_id += 1
-    
-    # その他の問題: 3000000以降
-    next_other_id = 3000000
-    for index, q in enumerate(other_questions):
+    for q in questions:
         original_id = q.get('id')
-        
-        # 安全な次のIDを見つける
-        while next_other_id in used_ids:
-            next_other_id += 1
-            # 理論上の上限チェック（100万問まで）
-            if next_other_id > 1000000:
-                logger.error("その他問題のID範囲を超過しました")
-                raise DataValidationError("その他問題の数が上限を超過")
-        
-        q['id'] = next_other_id
-        q['original_id'] = original_id
-        q['file_source'] = 'legacy.csv'
-        used_ids.add(next_other_id)
-        resolved_questions.append(q)
-        id_mapping[f"other_{original_id}"] = next_other_id
-        next_other_id += 1
-    
-    # 最終検証
-    final_ids = [q['id'] for q in resolved_questions]
-    final_unique_ids = set(final_ids)
-    
-    if len(final_ids) != len(final_unique_ids):
-        logger.error(f"ID重複解決失敗: {len(final_ids)}問中{len(final_unique_ids)}個のユニークID")
-        raise DataValidationError("ID重複解決に失敗しました")
-    
-    # ID範囲チェック
-    basic_ids = [q['id'] for q in resolved_questions if q.get('question_type') == 'basic']
-    specialist_ids = [q['id'] for q in resolved_questions if q.get('question_type') == 'specialist']
-    
-    if basic_ids and (min(basic_ids) < 1000000 or max(basic_ids) > 1999999):
-        logger.error(f"基礎科目ID範囲エラー: {min(basic_ids)}-{max(basic_ids)}")
-        raise DataValidationError("基礎科目のID範囲が正しくありません")
-    
-    if specialist_ids and (min(specialist_ids) < 2000000 or max(specialist_ids) > 2999999):
-        logger.error(f"専門科目ID範囲エラー: {min(specialist_ids)}-{max(specialist_ids)}")
-        raise DataValidationError("専門科目のID範囲が正しくありません")
-    
-    logger.info(f"✅ ID重複解決完了: 基礎={len(basic_questions)}問(1000000-{max(basic_ids) if basic_ids else 1000000}), "
-               f"専門={len(specialist_questions)}問(2000000-{max(specialist_ids) if specialist_ids else 2000000}), "
-               f"その他={len(other_questions)}問, 総計={len(resolved_questions)}問")
-    
-    # ID変更の記録をログ出力（デバッグ用）
-    if duplicated_ids:
-        logger.info(f"重複解決例: {list(id_mapping.items())[:5]}")
+        occurrence = occurrences.get(original_id, 0)
+        occurrences[original_id] = occurrence + 1
+        try:
+            new_id = stable_question_id(question_type, year, int(original_id), occurrence)
+        except (DataValidationError, TypeError, ValueError) as e:
+            logger.warning(f"{file_source}: ID採番をスキップ (元ID: {original_id}): {e}")
+            continue
+        resolved_questions.append(
+            _with_fields(q, id=new_id, original_id=original_id, file_source=file_source))
+    
+    duplicated = sum(1 for count in occurrences.values() if count > 1)
+    if duplicated:
+        # 🔥 ULTRA SYNC FIX: 重複ID検出は正常な処理工程（警告レベル下げ）
+        logger.info(f"{file_source}: 重複元ID {duplicated}件を出現順で採番")
     
     return resolved_questions
 
@@ -941,106 +856,51 @@ class EnterpriseDataManager:
         self.data_dir = data_dir
         self.cache_manager = cache_manager or cache_manager_instance
         self.file_watcher = {}
-        self.preload_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='preload')
         self.compression_enabled = True
         
     def preload_all_data(self):
         """
         アプリケーション起動時にすべてのCSVデータを事前読み込み
         企業環境での高速レスポンス確保
+
+        問題バンクのコールドビルドに委譲します。スナップショットと一致しない
+        CSVはプロセスプールで並列に解析されます（DataConfig.BANK_BUILD_WORKERS）。
         """
         logger.info("CSVデータの事前読み込み開始（企業環境最適化）")
-        
+
         try:
-            csv_files = [
-                '4-1.csv',  # 基礎科目
-                '4-2_2008.csv', '4-2_2009.csv', '4-2_2010.csv',
-                '4-2_2011.csv', '4-2_2012.csv', '4-2_2013.csv',
-                '4-2_2014.csv', '4-2_2015.csv', '4-2_2016.csv',
-                '4-2_2017.csv', '4-2_2018.csv', '4-2_2019.csv'
-            ]
-            
-            # 並列読み込みで高速化
-            futures = []
-            for csv_file in csv_files:
-                future = self.preload_executor.submit(self._preload_single_file, csv_file)
-                futures.append(future)
-            
-            # 結果確認
-            loaded_count = 0
-            for future in futures:
-                try:
-                    if future.result():
-                        loaded_count += 1
-                except Exception as e:
-                    logger.error(f"CSVファイル事前読み込みエラー: {e}")
-            
-            logger.info(f"CSVデータ事前読み込み完了: {loaded_count}/{len(csv_files)} ファイル")
-            return loaded_count == len(csv_files)
-            
+            # 循環インポート回避のためローカルインポート
+            from services.bank_snapshot import get_source_files
+            from services.question_bank import question_bank
+
+            version = question_bank.current()
+            bank_stats = question_bank.stats()
+            expected = len(get_source_files(self.data_dir))
+            for filename, elapsed in bank_stats['build_timings'].items():
+                logger.info(f"  ⏱️ {filename}: {elapsed:.3f}秒")
+
+            logger.info(f"CSVデータ事前読み込み完了: {len(version.partitions)}/{expected} ファイル "
+                        f"({bank_stats['build_workers']}プロセス)")
+            return len(version.partitions) == expected
+
         except Exception as e:
             logger.error(f"CSVデータ事前読み込み失敗: {e}")
             return False
-    
-    def _preload_single_file(self, filename: str) -> bool:
-        """単一CSVファイルの事前読み込み"""
-        try:
-            file_path = os.path.join(self.data_dir, filename)
-            # 🛡️ ULTRA SYNC セキュリティ: パストラバーサル攻撃防止
-            try:
-                validated_file_path = validate_file_path(file_path)  # allowed_dirは指定しない
-            except ValueError as e:
-                logger.error(f"不正なファイルパス (事前読み込み): {e}")
-                return False
-            
-            if not os.path.exists(validated_file_path):
-                return False
-            
-            # キャッシュキー生成
-            cache_key = f"csv_preload_{filename}"
-            
-            # ファイルサイズとタイムスタンプでキャッシュ判定
-            stat = os.stat(validated_file_path)
-            metadata_key = f"{cache_key}_metadata"
-            current_metadata = f"{stat.st_size}_{stat.st_mtime}"
-            
-            metadata_cache = self.cache_manager.get_cache('file_metadata')
-            cached_metadata = metadata_cache.get(metadata_key)
-            
-            if cached_metadata == current_metadata:
-                # メタデータが一致する場合はキャッシュ済み
-                return True
-            
-            # ファイル読み込み
-            data = load_questions_improved(validated_file_path)
-            
-            # キャッシュに保存
-            questions_cache = self.cache_manager.get_cache('questions')
-            questions_cache.put(cache_key, data)
-            metadata_cache.put(metadata_key, current_metadata)
-            
-            logger.debug(f"事前読み込み完了: {filename} ({len(data)}問)")
-            return True
-            
-        except Exception as e:
-            logger.error(f"ファイル事前読み込みエラー {filename}: {e}")
-            return False
-    
+
     def get_optimized_data(self, filename: str) -> List[Dict]:
         """
         最適化されたデータ取得
-        キャッシュファーストアプローチ
+        問題バンクのパーティションを参照（再読み込み・コピーなし）
         """
-        cache_key = f"csv_preload_{filename}"
-        questions_cache = self.cache_manager.get_cache('questions')
-        
-        # キャッシュから取得試行
-        cached_data = questions_cache.get(cache_key)
-        if cached_data:
-            return cached_data
-        
-        # キャッシュミス時はリアルタイム読み込み
-        logger.info(f"キャッシュミス - リアルタイム読み込み: {filename}")
+        # 循環インポート回避のためローカルインポート
+        from services.question_bank import question_bank
+
+        partition = question_bank.current().partitions.get(filename)
+        if partition is not None:
+            return list(partition)
+
+        # バンク外のファイルはリアルタイム読み込み
+        logger.info(f"問題バンク外のファイル - リアルタイム読み込み: {filename}")
         file_path = os.path.join(self.data_dir, filename)
         # 🛡️ ULTRA SYNC セキュリティ: パストラバーサル攻撃防止
         try:
@@ -1048,13 +908,9 @@ class EnterpriseDataManager:
         except ValueError as e:
             logger.error(f"不正なファイルパス (最適化データ取得): {e}")
             return []
-        
-        data = load_questions_improved(validated_file_path)
-        
-        # 結果をキャッシュに保存
-        questions_cache.put(cache_key, data)
-        return data
-    
+
+        return load_questions_improved(validated_file_path)
+
     def get_file_integrity_check(self) -> Dict[str, Any]:
         """
         CSVファイルの整合性チェック
@@ -1118,10 +974,6 @@ class EnterpriseDataManager:
                 'error': str(e)
             }
 
-# 企業環境最適化: 重複読み込み防止フラグ
-_data_already_loaded = False
-_data_load_lock = threading.Lock()
-
 # グローバルキャッシュマネージャーインスタンス  
 cache_manager_instance = CacheManager()
 
@@ -1157,15 +1009,12 @@ def load_basic_questions_only(data_dir: str = 'data') -> List[Dict]:
     try:
         questions = load_questions_improved(validated_basic_file)
         
-        # 基礎科目専用フィールド設定
-        for q in questions:
-            q['question_type'] = 'basic'  # 絶対に'basic'
-            q['department'] = 'common'     # 基礎科目は共通
-            q['category'] = '共通'          # カテゴリも統一
-            q['year'] = None              # 基礎科目は年度不問
-            q['source_file'] = '4-1.csv'  # ソース識別
-        
-        basic_questions = questions
+        # 基礎科目専用フィールド設定（絶対に'basic'・共通・年度不問・ソース識別）
+        basic_questions = [
+            _with_fields(q, question_type='basic', department='common', category='共通',
+                         year=None, file_source='4-1.csv')
+            for q in questions
+        ]
         logger.info(f"✅ ULTRATHIN区: 基礎科目読み込み完了 - {len(basic_questions)}問")
         
     except Exception as e:
@@ -1203,11 +1052,10 @@ def load_specialist_questions_only(department: str, year: int, data_dir: str = '
         department_questions = []
         for q in questions:
             if q.get('category') == department:
-                q['question_type'] = 'specialist'  # 絶対に'specialist'
-                q['department'] = map_category_to_department(department)
-                q['year'] = year                   # 年度情報必須
-                q['source_file'] = f'4-2_{year}.csv'  # ソース識別
-                department_questions.append(q)
+                # 絶対に'specialist'・年度情報必須・ソース識別
+                department_questions.append(_with_fields(
+                    q, question_type='specialist', department=map_category_to_department(department),
+                    year=year, file_source=f'4-2_{year}.csv'))
         
         specialist_questions = department_questions
         logger.info(f"✅ ULTRATHIN区: 専門科目読み込み完了 - {department}/{year}年 {len(specialist_questions)}問")
@@ -0,0 +1,129 @@
+"""
+数学記法変換エンジンの検証・ベンチマーク
+- ゴールデン出力: 問題バンク全体の問題文・選択肢・解説で、コンパイル済みエンジンと
+  従来の逐次 re.sub（reference_math_notation_to_html）の出力が一致すること
+- ファジング: ルールの断片を組み合わせた文字列でも出力が一致すること
+- ルール定義: すべての正規表現ルールに必須文字チェックが定義されていること
+- マイクロベンチマーク: 1フィールドあたりの変換時間
+
+使い方:
+    python verify_math_notation_engine.py
+    python verify_math_notation_engine.py --fuzz 200000 --repeat 5
+"""
+import argparse
+import logging
+import random
+import sys
+import time
+
+from math_notation_html_filter import (
+    MATH_PATTERNS, UNICODE_SUPERSCRIPTS, MathRewriteEngine, reference_math_notation_to_html, _RegexStage
+)
+
+TEXT_FIELDS = ('question', 'option_a', 'option_b', 'option_c', 'option_d', 'explanation')
+
+# ファジング用の断片（ルールの検索文字列の部品と日本語の文脈）
+FUZZ_FRAGMENTS = [
+    '^{', '}', '^', '_{', '_', '{', '-', '.', '×10', '×', '/', '(', ')', '=', '+', '*', ' ', '\n',
+    '0', '1', '2', '3', '4', '5', '6', '8', '9', '10', '22', '201',
+    'L', 'R/8L', 'm', 'mm', 'cm', 'N/mm', 'kN/m', 'kg/m', 'g/cm', 't/m', 'm/s', 's', 'w', 'd', 't',
+    'π', 'ρ', 'γ', 'σ', 'α', 'β', 'cos', 'sin', 'tan', 'kPa', 'v', 'h', 'x',
+    '²', '³', '¹', '⁴', '（', '）', '／', '０', '２', '３', 'ａ', 'ｄ', 'ｃｍ', 'ｍ', 'ｙ＝', 'Ｌ',
+    'のを', 'を', 'から', 'a～d', 'の', '問題', 'とする。',
+]
+
+
+def load_bank_texts():
+    """問題バンクの全テキストフィールドを取得"""
+    from services.question_bank import question_bank
+    texts = []
+    for question in question_bank.current().questions:
+        for field in TEXT_FIELDS:
+            value = question.get(field)
+            if isinstance(value, str) and value:
+                texts.append(value)
+    return texts
+
+
+def check_guards(engine):
+    """必須文字チェックのない正規表現ルールを列挙"""
+    return [stage.pattern.pattern for stage in engine.stages
+            if isinstance(stage, _RegexStage) and stage.guard is None]
+
+
+def check_golden(engine, texts):
+    """エンジンと基準実装の出力を比較し、不一致のテキストを返す"""
+    return [text for text in texts if engine(text) != reference_math_notation_to_html(text)]
+
+
+def check_fuzz(engine, count, seed=0):
+    """ランダムに断片を連結した文字列で出力を比較"""
+    rng = random.Random(seed)
+    mismatches = []
+    for _ in range(count):
+        text = ''.join(rng.choice(FUZZ_FRAGMENTS) for _ in range(rng.randint(1, 12)))
+        if engine(text) != reference_math_notation_to_html(text):
+            mismatches.append(text)
+    return mismatches
+
+
+def benchmark(func, texts, repeat):
+    """1フィールドあたりの平均変換時間（µs）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            func(text)
+        best = min(best, time.perf_counter() - start)
+    return best / len(texts) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数学記法変換エンジンの検証・ベンチマーク')
+    parser.add_argument('--fuzz', type=int, default=50000, help='ファジングの試行回数')
+    parser.add_argument('--repeat', type=int, default=3, help='ベンチマークの繰り返し回数（最良値を採用）')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    engine = MathRewriteEngine()
+    texts = load_bank_texts()
+    failed = False
+
+    print('=== Math Notation Engine Verification ===\n')
+    print(f'ルール数: {len(UNICODE_SUPERSCRIPTS) + len(MATH_PATTERNS)} → {len(engine.stages)}段にコンパイル')
+    print(f'事前チェック文字数: {len(engine.trigger_chars) if engine.trigger_chars else "無効"}')
+
+    unguarded = check_guards(engine)
+    print(f'必須文字チェックなしの正規表現ルール: {len(unguarded)}')
+    for pattern in unguarded:
+        print(f'  {pattern}')
+    failed |= bool(unguarded)
+
+    mismatches = check_golden(engine, texts)
+    print(f'ゴールデン出力: {len(texts)}フィールド中 不一致 {len(mismatches)}')
+    for text in mismatches[:5]:
+        print(f'  入力: {text[:80]!r}')
+    failed |= bool(mismatches)
+
+    fuzz_mismatches = check_fuzz(engine, args.fuzz)
+    print(f'ファジング: {args.fuzz}件中 不一致 {len(fuzz_mismatches)}')
+    for text in fuzz_mismatches[:5]:
+        print(f'  入力: {text!r}')
+        print(f'    基準: {reference_math_notation_to_html(text)!r}')
+        print(f'    エンジン: {engine(text)!r}')
+    failed |= bool(fuzz_mismatches)
+
+    skipped = sum(1 for text in texts if engine(text) is text)
+    reference_us = benchmark(reference_math_notation_to_html, texts, args.repeat)
+    engine_us = benchmark(engine, texts, args.repeat)
+    print('\n=== Benchmark (1フィールドあたり) ===')
+    print(f'逐次 re.sub: {reference_us:8.1f}µs')
+    print(f'エンジン:    {engine_us:8.1f}µs ({reference_us / engine_us:.1f}倍)')
+    print(f'変換で変化しなかったフィールド: {skipped}/{len(texts)}')
+
+    print('\n結果:', 'NG' if failed else 'OK')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+回答履歴のリングバッファ・集計カウンタと問題ID移行の検証
+- 集計カウンタ: SessionService.add_to_history で履歴を1件ずつ追加した集計カウンタ（history_rollup）が、
+  全回答を最初から数え直した結果（次元別カウンタ・連続学習日数・回答時間）と一致すること。
+  HISTORY_LIMIT を超える件数を追加し、履歴が直近 HISTORY_LIMIT 件だけになることも確認します
+- バックフィル: 集計カウンタのない旧形式のセッションでは、保持している履歴から作成されること
+- 問題ID移行: BankVersion.legacy_id_map の対応表が旧ID体系（種別ごとの通し番号）と一致し、
+  SessionService.migrate_question_ids が履歴・ブックマーク・試験問題リスト・SRSデータの
+  旧IDを元の型のまま固定IDへ置き換えること（2回目は何もしないこと）
+
+使い方:
+    python verify_session_history.py
+    python verify_session_history.py --answers 5000 --days 200 --seed 1
+"""
+import argparse
+import logging
+import random
+import sys
+from datetime import date, timedelta
+
+from flask import Flask, session
+
+from services.question_bank import LEGACY_BASIC_ID_START, LEGACY_SPECIALIST_ID_START
+from services.session_service import SessionService
+from services.statistics_service import StatisticsService
+
+CATEGORIES = ['共通', '道路', '河川、砂防及び海岸・海洋', '鋼構造及びコンクリート', None, '']
+DEPARTMENTS = ['road', 'river', 'steel', None]
+QUESTION_TYPES = ['basic', 'specialist', None]
+
+
+def request_context():
+    """SessionService を使うためのリクエストコンテキスト（署名付きクッキーのセッション）"""
+    app = Flask(__name__)
+    app.secret_key = 'verify-session-history'
+    return app.test_request_context()
+
+
+def build_answers(count, days, rng):
+    """
+    合成の回答記録（日付の逆行・回答時間の欠落や不正値・カテゴリ未設定を含む）
+
+    学習しない日をはさみ、約5%は過去の日付に戻して記録します。
+    """
+    start = date(2026, 1, 1)
+    day_offsets = sorted(rng.sample(range(days), max(1, days * 2 // 3)))
+    answers = []
+    for i in range(count):
+        offset = day_offsets[min(len(day_offsets) - 1, i * len(day_offsets) // count)]
+        if rng.random() < 0.05:
+            offset = rng.choice(day_offsets[:day_offsets.index(offset) + 1])
+        elapsed = rng.choice([rng.randint(1, 120), rng.uniform(0.5, 60.0), 0, None, -3, 'x'])
+        entry = {
+            'id': 1000001 + rng.randrange(500),
+            'is_correct': rng.random() < 0.6,
+            'category': rng.choice(CATEGORIES),
+            'question_type': rng.choice(QUESTION_TYPES),
+            'department': rng.choice(DEPARTMENTS),
+            'date': f'{(start + timedelta(days=offset)).isoformat()} {rng.randint(0, 23):02d}:00:00',
+        }
+        if elapsed is not None:
+            entry['elapsed'] = elapsed
+        answers.append(entry)
+    return answers
+
+
+def recompute(answers):
+    """全回答から集計カウンタと同じ形の値を数え直す（add_to_rollup を使わない基準実装）"""
+    separator = StatisticsService.ROLLUP_KEY_SEPARATOR
+    counts = {dimension: {} for dimension in StatisticsService.ROLLUP_DIMENSIONS}
+    times = []
+    for entry in answers:
+        category = entry.get('category') or '不明'
+        question_type = entry.get('question_type') or ''
+        department = entry.get('department')
+        day = str(entry.get('date') or '')[:10]
+        elapsed = entry.get('elapsed') or 0
+        if not isinstance(elapsed, (int, float)):
+            elapsed = 0
+        if elapsed > 0:
+            times.append(elapsed)
+
+        keys = [('total', ''), ('category', category), ('question_type', question_type), ('day', day)]
+        if department:
+            keys += [('department', department),
+                     ('department_type', f'{department}{separator}{question_type}'),
+                     ('department_type_category', f'{department}{separator}{question_type}{separator}{category}')]
+        for dimension, key in keys:
+            cell = counts[dimension].setdefault(key, [0, 0, 0])
+            cell[0] += 1
+            cell[1] += 1 if entry.get('is_correct') else 0
+            cell[2] += elapsed
+
+    days = sorted(counts['day'])
+    for day in days[:max(0, len(days) - StatisticsService.ROLLUP_DAY_LIMIT)]:
+        del counts['day'][day]
+
+    current = longest = 0
+    for i, day in enumerate(days):
+        follows = i and date.fromisoformat(days[i - 1]) + timedelta(days=1) == date.fromisoformat(day)
+        current = current + 1 if follows else 1
+        longest = max(longest, current)
+    streak = [days[-1], current, longest, len(days)] if days else ['', 0, 0, 0]
+    elapsed = [len(times), sum(times), min(times), max(times)] if times else [0, 0, None, None]
+    return counts, streak, elapsed
+
+
+def check_rollup(answers):
+    """add_to_history で追加した結果と基準実装の差分（不一致の項目名のリスト）"""
+    mismatches = []
+    with request_context():
+        for entry in answers:
+            SessionService.add_to_history(dict(entry))
+        history = SessionService.get_history()
+        rollup = SessionService.get_history_rollup()
+
+        if history != answers[-SessionService.HISTORY_LIMIT:]:
+            mismatches.append(f'履歴（{len(history)}件）が直近 {SessionService.HISTORY_LIMIT} 件と不一致')
+
+        counts, streak, elapsed = recompute(answers)
+        for dimension in StatisticsService.ROLLUP_DIMENSIONS:
+            if rollup['counts'].get(dimension, {}) != counts[dimension]:
+                mismatches.append(f'次元別カウンタ: {dimension}')
+        if rollup['streak'] != streak:
+            mismatches.append(f"連続学習日数: {rollup['streak']} != {streak}")
+        if rollup['elapsed'] != elapsed:
+            mismatches.append(f"回答時間: {rollup['elapsed']} != {elapsed}")
+
+        overall = StatisticsService.get_overall_statistics(rollup)
+        if overall['total_quizzes'] != len(answers):
+            mismatches.append(f"全体統計の回答数: {overall['total_quizzes']} != {len(answers)}")
+    return mismatches
+
+
+def check_backfill(answers):
+    """集計カウンタのない旧形式のセッションが保持している履歴から作成されること"""
+    window = answers[-SessionService.HISTORY_LIMIT:]
+    with request_context():
+        session[SessionService.KEY_HISTORY] = [dict(entry) for entry in window]
+        rollup = SessionService.get_history_rollup()
+        expected_counts, expected_streak, expected_elapsed = recompute(window)
+        return (rollup['counts'] == expected_counts and rollup['streak'] == expected_streak
+                and rollup['elapsed'] == expected_elapsed)
+
+
+def check_legacy_id_map(version):
+    """旧ID → 固定IDの対応表が種別ごとの通し番号（問題バンクの並び順）と一致すること"""
+    id_map = version.legacy_id_map()
+    errors = []
+    for question_type, start in (('basic', LEGACY_BASIC_ID_START), ('specialist', LEGACY_SPECIALIST_ID_START)):
+        expected_ids = [q['id'] for q in version.questions if q.get('question_type') == question_type]
+        actual_ids = [id_map.get(start + i) for i in range(len(expected_ids))]
+        if actual_ids != expected_ids:
+            errors.append(f'{question_type}: 通し番号と固定IDの対応が不一致')
+    if len(set(id_map.values())) != len(id_map):
+        errors.append('固定IDの重複')
+    missing = [new_id for new_id in id_map.values() if version.get(new_id) is None]
+    if missing:
+        errors.append(f'問題バンクにない固定ID: {missing[:5]}')
+    return id_map, errors
+
+
+def check_migration(id_map, rng):
+    """migrate_question_ids が旧IDを元の型のまま置き換えること"""
+    legacy_ids = rng.sample(sorted(id_map), min(40, len(id_map)))
+
+    def expect(value):
+        try:
+            new_id = id_map.get(int(value))
+        except (ValueError, TypeError):
+            return value
+        if new_id is None:
+            return value
+        return str(new_id) if isinstance(value, str) else new_id
+
+    history = [{'id': qid, 'is_correct': True} for qid in legacy_ids[:10]]
+    history += [{'question_id': str(qid), 'is_correct': False} for qid in legacy_ids[10:20]] + [{'id': 'abc'}]
+    bookmarks = [str(qid) for qid in legacy_ids[20:25]] + [qid for qid in legacy_ids[25:30]] + [9999999]
+    exam_ids = legacy_ids[30:35] + [9999999]
+    advanced_srs = {str(qid): {'total_attempts': 1} for qid in legacy_ids[35:]}
+    advanced_srs['9999999'] = {'total_attempts': 1}
+    srs_data = {str(qid): {'level': 1} for qid in legacy_ids[:5]}
+
+    expected = {
+        SessionService.KEY_HISTORY: [{key: expect(value) if key in ('id', 'question_id') else value
+                                      for key, value in entry.items()} for entry in history],
+        SessionService.KEY_BOOKMARKS: [expect(qid) for qid in bookmarks],
+        SessionService.KEY_EXAM_QUESTION_IDS: [expect(qid) for qid in exam_ids],
+        SessionService.KEY_ADVANCED_SRS: {expect(qid): data for qid, data in advanced_srs.items()},
+        SessionService.KEY_SRS_DATA: {expect(qid): data for qid, data in srs_data.items()},
+    }
+    values = ([entry.get('id', entry.get('question_id')) for entry in history]
+              + bookmarks + exam_ids + list(advanced_srs) + list(srs_data))
+    expected_count = sum(1 for value in values if expect(value) is not value)
+
+    errors = []
+    with request_context():
+        session[SessionService.KEY_HISTORY] = history
+        session[SessionService.KEY_BOOKMARKS] = bookmarks
+        session[SessionService.KEY_EXAM_QUESTION_IDS] = exam_ids
+        session[SessionService.KEY_ADVANCED_SRS] = advanced_srs
+        session[SessionService.KEY_SRS_DATA] = srs_data
+
+        migrated = SessionService.migrate_question_ids(id_map)
+        if migrated != expected_count:
+            errors.append(f'置き換え件数: {migrated} != {expected_count}')
+        for key, value in expected.items():
+            if session.get(key) != value:
+                errors.append(f'{key} の置き換え結果が不一致')
+        if session.get(SessionService.KEY_QUESTION_ID_SCHEME) != SessionService.QUESTION_ID_SCHEME:
+            errors.append('ID体系バージョンが記録されていない')
+        if SessionService.migrate_question_ids(id_map) != 0:
+            errors.append('2回目の移行で置き換えが発生')
+    return expected_count, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='回答履歴の集計カウンタと問題ID移行の検証')
+    parser.add_argument('--answers', type=int, default=SessionService.HISTORY_LIMIT * 4 + 17,
+                        help='追加する回答数（HISTORY_LIMIT を超える件数で確認）')
+    parser.add_argument('--days', type=int, default=120, help='回答記録の日付の範囲（日数）')
+    parser.add_argument('--seed', type=int, default=0, help='乱数のシード')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    rng = random.Random(args.seed)
+    failed = False
+
+    print('=== Session History Verification ===\n')
+    for count in sorted({min(args.answers, SessionService.HISTORY_LIMIT), args.answers}):
+        answers = build_answers(count, args.days, rng)
+        mismatches = check_rollup(answers)
+        print(f'集計カウンタ: {count}回答（履歴上限 {SessionService.HISTORY_LIMIT}） 不一致 {len(mismatches)}')
+        for mismatch in mismatches:
+            print(f'  {mismatch}')
+        failed |= bool(mismatches)
+
+    backfilled = check_backfill(build_answers(args.answers, args.days, rng))
+    print(f"旧形式セッションのバックフィル: {'一致' if backfilled else '不一致'}")
+    failed |= not backfilled
+
+    from services.question_bank import question_bank
+    id_map, map_errors = check_legacy_id_map(question_bank.current())
+    print(f'\n旧ID対応表: {len(id_map)}件 不一致 {len(map_errors)}')
+    for error in map_errors:
+        print(f'  {error}')
+    failed |= bool(map_errors)
+
+    expected_count, migration_errors = check_migration(id_map, rng)
+    print(f'問題ID移行: {expected_count}件の置き換え 不一致 {len(migration_errors)}')
+    for error in migration_errors:
+        print(f'  {error}')
+    failed |= bool(migration_errors)
+
+    print('\n結果:', 'NG' if failed else 'OK')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -42,6 +42,14 @@ try:
     logger.info(f"✅ Flask app '{app.name}' loaded successfully")
     logger.info(f"🎯 Routes registered: {len(list(app.url_map.iter_rules()))}")
     
+    # Warm up the question bank before gunicorn forks (--preload) and freeze it,
+    # so workers share the master's pages copy-on-write instead of each
+    # dirtying a private copy through GC traffic
+    from config import DataConfig
+    from services.question_bank import question_bank
+    bank = question_bank.warm_up(freeze=DataConfig.BANK_PREFORK_FREEZE)
+    logger.info(f"📚 Question bank warmed up before fork: {len(bank)} questions")
+    
     # This is what Gunicorn will import
     application = app
     